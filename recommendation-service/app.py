@@ -1,125 +1,536 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+import atexit
+import logging
 import os
 from dotenv import load_dotenv
-from models.collaborative_filtering import CollaborativeFilteringModel
-from database import get_database_connection
+from models import create_model
+from models.materialization import export_to_mongo, materialize_recommendations
+from models.snapshot import load_latest_snapshot, save_snapshot
+from database import get_database_connection, get_product_by_id, insert_interactions, ping_database, pool_events
+from cache import ResultCache, SqliteResultStore
+from config import (batch_settings, cache_settings, delta_settings, env_bool, incremental_settings,
+                    interaction_queue_settings, materialization_settings, metrics_settings, model_settings,
+                    snapshot_settings)
+from metrics import (CONTENT_TYPE, ErrorCountingHandler, MetricsRegistry, RequestProfiler, instrument,
+                     register_service_metrics)
+from ingestion import InteractionQueue, QueueFull
+from model_store import ModelStore
+from models.snapshot import training_lock
+from training import IncrementalUpdater, SharedTrainingJobs, SnapshotWatcher, TrainingManager, TrainingSkipped
 
 # Charger les variables d'environnement
 load_dotenv()
 
+# Les erreurs sont journalisées avec leur trace (sortie d'erreur)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(process)d %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 CORS(app, supports_credentials=True)
 
 # Initialiser le modèle de recommandation
-recommendation_model = CollaborativeFilteringModel()
+snapshot_config = snapshot_settings()
+delta_config = delta_settings()
+
+def load_latest_model():
+    """Charger le dernier instantané du modèle, s'il existe, au démarrage du service"""
+    try:
+        model = load_latest_snapshot(snapshot_config['root'], n_jobs=model_settings()['n_jobs'])
+        if model is not None:
+            logger.info("Modèle %s chargé depuis %s", model.version, snapshot_config['root'])
+            return model
+    except Exception:
+        logger.exception("Erreur lors du chargement du dernier instantané du modèle")
+    return create_model(**model_settings())
+
+model_store = ModelStore(load_latest_model())
+
+def materialize(model, path):
+    """Précalculer les recommandations de tous les utilisateurs dans l'instantané du modèle"""
+    materialization_config = materialization_settings()
+    if not materialization_config['enabled']:
+        return
+    
+    try:
+        model.materialized = materialize_recommendations(
+            path, materialization_config['n_recommendations'], n_jobs=materialization_config['n_jobs'], model=model
+        )
+        if materialization_config['export_to_mongo']:
+            export_to_mongo(get_database_connection(), model, model.materialized)
+    except Exception:
+        logger.exception("Erreur lors du précalcul des recommandations")
+
+def train_delta_model():
+    """
+    Entraîner un modèle à partir du dernier instantané et des seules données arrivées depuis
+    
+    L'instantané (et non le modèle servi, qui a déjà reçu des interactions par
+    /record-interaction) sert de base: les interactions lues depuis son filigrane ne
+    sont pas comptées deux fois. Un entraînement complet est préféré si les
+    paramètres du modèle ont changé, si le modèle a trop dérivé ou après
+    `full_every` entraînements différentiels successifs.
+    
+    Returns:
+        Modèle entraîné, ou None si un entraînement complet est nécessaire
+    """
+    if not delta_config['enabled']:
+        return None
+    
+    settings = model_settings()
+    try:
+        base = load_latest_snapshot(snapshot_config['root'], n_jobs=settings['n_jobs'])
+        if (base is None or not base.can_train_delta()
+                or base.settings() != create_model(**settings).settings()
+                or base.delta_trainings >= delta_config['full_every']
+                or base.drift() >= incremental_settings()['drift_threshold']):
+            return None
+        return base.train_delta(get_database_connection())
+    except Exception:
+        logger.exception("Erreur lors de l'entraînement différentiel, entraînement complet")
+        return None
+
+def train_new_model():
+    """
+    Entraîner un nouveau modèle à partir de la base et l'enregistrer en instantané
+    
+    Un seul worker entraîne à la fois (verrou sur le répertoire des instantanés);
+    les autres chargent l'instantané publié avec SnapshotWatcher. Seules les
+    données arrivées depuis le dernier instantané sont lues quand c'est possible.
+    """
+    with training_lock(snapshot_config['root']) as acquired:
+        if not acquired:
+            raise TrainingSkipped("Entraînement déjà en cours dans un autre worker")
+        
+        model = train_delta_model()
+        if model is None:
+            model = create_model(**model_settings())
+            if not model.train(get_database_connection()):
+                raise RuntimeError("Erreur lors de l'entraînement du modèle")
+        
+        # Enregistrer un instantané pour les prochains démarrages et les autres workers,
+        # avec les recommandations précalculées
+        try:
+            save_snapshot(model, snapshot_config['root'], keep=snapshot_config['keep'],
+                          prepare=lambda path: materialize(model, path))
+        except Exception:
+            logger.exception("Erreur lors de l'enregistrement de l'instantané du modèle")
+        return model
+
+def install_model(model):
+    """Mettre en service un modèle entraîné en lui transmettant les interactions en attente"""
+    model_store.swap(model)
+
+def lookup_product(product_id):
+    """Document d'un produit inconnu du modèle, pour les mises à jour incrémentales"""
+    return get_product_by_id(get_database_connection(), product_id)
+
+# Les entraînements tournent en arrière-plan; le modèle servi n'est remplacé qu'en cas de succès.
+# Les tâches sont partagées entre workers: /train/<job_id> répond quel que soit le worker interrogé
+training_manager = TrainingManager(train_new_model, install_model, jobs=SharedTrainingJobs(snapshot_config['root']))
+
+# Les nouvelles interactions sont appliquées au modèle servi par lots, en arrière-plan
+incremental_updater = IncrementalUpdater(model_store, training_manager, product_lookup=lookup_product,
+                                         **incremental_settings())
+
+# Les instantanés entraînés par un autre worker sont mis en service dès leur publication
+snapshot_watcher = SnapshotWatcher(model_store, snapshot_config['root'], install_model,
+                                   interval=snapshot_config['poll_interval'] or 0,
+                                   n_jobs=model_settings()['n_jobs'])
+
+def persist_interactions(batch):
+    """Enregistrer dans MongoDB un lot d'interactions de la file; retourne leurs _id"""
+    return insert_interactions(get_database_connection(), batch)
+
+def queue_interactions(batch, interaction_ids=None):
+    """Mettre en attente dans le modèle servi un lot d'interactions de la file"""
+    model = model_store.queue(
+        ((user_id, product_id, interaction_type) for user_id, product_id, interaction_type, _ in batch),
+        interaction_ids
+    )
+    # Les entrées filtrées par catégorie sont des variantes de la clé de l'utilisateur
+    result_cache.invalidate_with_variants(user_cache_key(model, user_id)
+                                          for user_id in {interaction[0] for interaction in batch})
+    incremental_updater.notify()
+
+# Les interactions reçues sont mises en file et écrites par lots en arrière-plan; leur
+# enregistrement dans MongoDB est optionnel (le serveur Node les enregistre déjà)
+interaction_queue_config = interaction_queue_settings()
+interaction_queue = InteractionQueue(
+    queue_interactions,
+    persist=persist_interactions if interaction_queue_config['persist'] else None,
+    max_size=interaction_queue_config['max_size'],
+    batch_size=interaction_queue_config['batch_size'],
+    flush_interval=interaction_queue_config['flush_interval'],
+    put_timeout=interaction_queue_config['put_timeout']
+)
+
+def start_background_services():
+    """
+    Démarrer les threads d'arrière-plan du processus
+    
+    Sous gunicorn (gunicorn.conf.py), l'application est chargée avant le fork
+    des workers et les threads ne survivent pas au fork: ils sont démarrés
+    dans chaque worker par le hook post_fork.
+    """
+    interaction_queue.start()
+    incremental_updater.start()
+    if snapshot_config['poll_interval']:
+        snapshot_watcher.start()
+
+def stop_background_services():
+    """
+    Arrêter les threads d'arrière-plan après avoir écrit les interactions acceptées
+    
+    Appelé à l'arrêt d'un worker gunicorn (hook worker_exit), une fois les
+    requêtes en cours terminées, ou du serveur de développement.
+    """
+    interaction_queue.stop()
+    incremental_updater.stop()
+    snapshot_watcher.stop()
+
+if not env_bool('DEFER_BACKGROUND_SERVICES'):
+    start_background_services()
+
+# Les résultats sont mis en cache par révision du modèle: un nouveau modèle ou un lot
+# d'interactions appliqué rend les entrées précédentes inaccessibles
+cache_config = cache_settings()
+result_cache = ResultCache(
+    max_entries=cache_config['max_entries'],
+    ttl=cache_config['ttl'],
+    shared=SqliteResultStore(cache_config['shared_path'], max_errors=cache_config['shared_max_errors'],
+                             retry_after=cache_config['shared_retry_after']) if cache_config['shared_path'] else None
+)
+
+# Instrumentation: latences par endpoint, jauges du modèle, du cache et du pool MongoDB, erreurs journalisées
+metrics_config = metrics_settings()
+metrics_registry = MetricsRegistry()
+if metrics_config['enabled']:
+    register_service_metrics(metrics_registry, model_store, result_cache, pool_events.stats,
+                             interaction_queue.stats)
+    logging.getLogger().addHandler(ErrorCountingHandler(metrics_registry.counter(
+        'recommendation_logged_errors_total', 'Erreurs journalisées', ('logger',)
+    )))
+instrument(app, metrics_registry if metrics_config['enabled'] else None,
+           RequestProfiler(metrics_config['profile_every'], metrics_config['profile_dir']))
+
+def internal_error(e):
+    """Journaliser une erreur inattendue d'un endpoint, avec sa trace, et répondre 500"""
+    logger.exception("Erreur lors du traitement de %s %s", request.method, request.path)
+    return jsonify({
+        'success': False,
+        'message': f'Erreur: {str(e)}'
+    }), 500
+
+def user_cache_key(model, user_id, category=None):
+    key = f"user:{model.revision}:{user_id}"
+    return key if category is None else f"{key}:category:{category}"
+
+def similar_cache_key(model, product_id, category=None):
+    key = f"similar:{model.revision}:{product_id}"
+    return key if category is None else f"{key}:category:{category}"
+
+def cached_recommendations(model, user_limits, category=None):
+    """
+    Recommandations de plusieurs utilisateurs, en ne calculant que celles absentes du cache
+    
+    Args:
+        model: Modèle servi
+        user_limits (dict): Nombre maximum de recommandations par ID d'utilisateur
+        category (str): Ne recommander que des produits de cette catégorie
+    
+    Returns:
+        dict: Liste des produits recommandés par ID d'utilisateur
+    """
+    recommendations, missing = {}, {}
+    for user_id, limit in user_limits.items():
+        recommendations[user_id] = result_cache.get(user_cache_key(model, user_id, category), limit)
+        if recommendations[user_id] is None:
+            missing[user_id] = limit
+    
+    for user_id, user_recommendations in model.recommend_for_users(missing, category=category).items():
+        result_cache.set(user_cache_key(model, user_id, category), missing[user_id], user_recommendations)
+        recommendations[user_id] = user_recommendations
+    return recommendations
+
+def cached_similar_products(model, product_limits, category=None):
+    """
+    Produits similaires à plusieurs produits, en ne calculant que ceux absents du cache
+    
+    Chaque entrée est calculée pour au moins `n_item_neighbors` résultats, la
+    taille des listes de voisins: elle sert ensuite toute limite inférieure.
+    
+    Args:
+        model: Modèle servi
+        product_limits (dict): Nombre maximum de produits similaires par ID de produit
+        category (str): Ne retourner que des produits de cette catégorie
+    
+    Returns:
+        dict: Liste des produits similaires par ID de produit
+    """
+    similar_products, missing = {}, {}
+    for product_id, limit in product_limits.items():
+        similar_products[product_id] = result_cache.get(similar_cache_key(model, product_id, category), limit)
+        if similar_products[product_id] is None:
+            missing[product_id] = max(limit, model.n_item_neighbors)
+    
+    for product_id, products in model.find_similar_products_batch(missing, category=category).items():
+        result_cache.set(similar_cache_key(model, product_id, category), missing[product_id], products)
+        similar_products[product_id] = products[:product_limits[product_id]]
+    return similar_products
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Vérifier que le service est en cours d'exécution"""
+    """Vérifier que le service est en cours d'exécution et que la base de données répond"""
+    database = ping_database()
     return jsonify({
-        'status': 'ok',
-        'message': 'Le service de recommandation est opérationnel'
+        'status': 'ok' if database['status'] == 'ok' else 'degraded',
+        'message': 'Le service de recommandation est opérationnel',
+        'database': database,
+        'cache': result_cache.stats(),
+        'interactions': interaction_queue.stats()
     })
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Métriques du processus au format texte Prometheus"""
+    if not metrics_config['enabled']:
+        return jsonify({
+            'success': False,
+            'message': 'Métriques désactivées (METRICS_ENABLED)'
+        }), 404
+    
+    return Response(metrics_registry.render(), content_type=CONTENT_TYPE)
+
 @app.route('/train', methods=['POST'])
 def train_model():
-    """Entraîner le modèle de recommandation avec les données actuelles"""
+    """Lancer l'entraînement du modèle de recommandation en arrière-plan"""
     try:
-        # Récupérer les données d'entraînement depuis la base de données
-        db = get_database_connection()
+        job, coalesced = training_manager.submit()
         
-        # Entraîner le modèle
-        success = recommendation_model.train(db)
-        
-        if success:
-            return jsonify({
-                'success': True,
-                'message': 'Modèle entraîné avec succès'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': 'Erreur lors de l\'entraînement du modèle'
-            }), 500
+        return jsonify({
+            'success': True,
+            'message': 'Entraînement déjà en cours' if coalesced else 'Entraînement du modèle lancé',
+            'jobId': job['jobId'],
+            'status': job['status']
+        }), 202
     except Exception as e:
+        return internal_error(e)
+
+@app.route('/train/<job_id>', methods=['GET'])
+def get_training_status(job_id):
+    """Obtenir l'état d'un entraînement lancé par /train"""
+    job = training_manager.get(job_id)
+    if job is None:
         return jsonify({
             'success': False,
-            'message': f'Erreur: {str(e)}'
-        }), 500
+            'message': 'Entraînement introuvable'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': job
+    })
 
 @app.route('/recommend/user/<user_id>', methods=['GET'])
 def get_recommendations_for_user(user_id):
-    """Obtenir des recommandations pour un utilisateur spécifique"""
+    """Obtenir des recommandations pour un utilisateur spécifique, éventuellement dans une catégorie"""
     try:
-        limit = request.args.get('limit', default=5, type=int)
+        limit = max(0, request.args.get('limit', default=5, type=int))
+        category = request.args.get('category') or None
         
         # Obtenir les recommandations
-        recommendations = recommendation_model.recommend_for_user(user_id, limit)
+        recommendations = cached_recommendations(model_store.get(), {user_id: limit}, category)[user_id]
         
         return jsonify({
             'success': True,
             'data': recommendations
         })
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'message': f'Erreur: {str(e)}'
-        }), 500
+        return internal_error(e)
 
 @app.route('/recommend/similar/<product_id>', methods=['GET'])
 def get_similar_products(product_id):
-    """Obtenir des produits similaires à un produit spécifique"""
+    """Obtenir des produits similaires à un produit spécifique, éventuellement dans une catégorie"""
     try:
-        limit = request.args.get('limit', default=5, type=int)
+        limit = max(0, request.args.get('limit', default=5, type=int))
+        category = request.args.get('category') or None
         
         # Obtenir les produits similaires
-        similar_products = recommendation_model.find_similar_products(product_id, limit)
+        similar_products = cached_similar_products(model_store.get(), {product_id: limit}, category)[product_id]
         
         return jsonify({
             'success': True,
             'data': similar_products
         })
     except Exception as e:
+        return internal_error(e)
+
+def parse_batch_entries(entries, default_limit):
+    """
+    Lire les éléments d'une requête par lot: un ID ou un objet {"id", "limit"}
+    
+    Args:
+        entries (list): Éléments de la requête
+        default_limit (int): Limite des éléments qui n'en précisent pas
+    
+    Returns:
+        dict: Limite par ID, dans l'ordre de la requête
+    """
+    if not isinstance(entries, list):
+        raise ValueError('une liste est attendue')
+    
+    limits = {}
+    for entry in entries:
+        if isinstance(entry, dict):
+            entry_id, limit = entry.get('id'), entry.get('limit', default_limit)
+        else:
+            entry_id, limit = entry, default_limit
+        if not isinstance(entry_id, str) or not entry_id:
+            raise ValueError(f'ID invalide: {entry_id!r}')
+        if not isinstance(limit, int) or isinstance(limit, bool) or limit < 0:
+            raise ValueError(f'limite invalide pour {entry_id}: {limit!r}')
+        limits[entry_id] = limit
+    return limits
+
+@app.route('/recommend/batch', methods=['POST'])
+def get_batch_recommendations():
+    """Obtenir en un seul appel des recommandations pour plusieurs utilisateurs et produits"""
+    try:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({
+                'success': False,
+                'message': 'Paramètres invalides: le corps doit être un objet JSON'
+            }), 400
+        try:
+            default_limit = data.get('limit', 5)
+            user_limits = parse_batch_entries(data.get('users', []), default_limit)
+            product_limits = parse_batch_entries(data.get('products', []), default_limit)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f'Paramètres invalides: {str(e)}'
+            }), 400
+        
+        max_items = batch_settings()['max_items']
+        if len(user_limits) + len(product_limits) > max_items:
+            return jsonify({
+                'success': False,
+                'message': f'Trop d\'éléments dans le lot (maximum {max_items})'
+            }), 400
+        
+        # Un seul modèle pour tout le lot, même si un autre est mis en service entre-temps
+        model = model_store.get()
+        
         return jsonify({
-            'success': False,
-            'message': f'Erreur: {str(e)}'
-        }), 500
+            'success': True,
+            'data': {
+                'users': cached_recommendations(model, user_limits),
+                'products': cached_similar_products(model, product_limits)
+            }
+        })
+    except Exception as e:
+        return internal_error(e)
+
+def parse_interaction(data):
+    """
+    Lire une interaction du corps d'une requête
+    
+    Returns:
+        tuple: (user_id, product_id, interaction_type), ou None si un paramètre manque
+    """
+    if not isinstance(data, dict):
+        return None
+    user_id = data.get('userId')
+    product_id = data.get('productId')
+    interaction_type = data.get('interactionType')
+    if not user_id or not product_id or not interaction_type:
+        return None
+    return str(user_id), str(product_id), interaction_type
+
+def queue_full_response(e):
+    """Réponse 503 quand la file des interactions est pleine: le client doit réessayer"""
+    response = jsonify({
+        'success': False,
+        'message': f'{str(e)}, réessayer plus tard'
+    })
+    response.headers['Retry-After'] = '1'
+    return response, 503
 
 @app.route('/record-interaction', methods=['POST'])
 def record_interaction():
     """Enregistrer une nouvelle interaction utilisateur-produit"""
     try:
-        data = request.json
-        user_id = data.get('userId')
-        product_id = data.get('productId')
-        interaction_type = data.get('interactionType')
-        
-        if not user_id or not product_id or not interaction_type:
+        interaction = parse_interaction(request.json)
+        if interaction is None:
             return jsonify({
                 'success': False,
                 'message': 'Paramètres manquants'
             }), 400
-            
-        # Enregistrer l'interaction dans la base de données
-        db = get_database_connection()
         
-        # Mettre à jour le modèle avec la nouvelle interaction
-        recommendation_model.update_with_interaction(user_id, product_id, interaction_type)
+        # L'interaction est écrite (et appliquée au modèle) en arrière-plan
+        interaction_queue.submit([interaction])
         
         return jsonify({
             'success': True,
             'message': 'Interaction enregistrée avec succès'
         })
+    except QueueFull as e:
+        return queue_full_response(e)
     except Exception as e:
+        return internal_error(e)
+
+@app.route('/record-interactions', methods=['POST'])
+def record_interactions():
+    """Enregistrer plusieurs interactions utilisateur-produit en un seul appel"""
+    try:
+        data = request.json or {}
+        items = data.get('interactions') if isinstance(data, dict) else None
+        if not isinstance(items, list) or not items:
+            return jsonify({
+                'success': False,
+                'message': 'Paramètre interactions manquant'
+            }), 400
+        
+        # Un lot plus grand que la file ne pourrait jamais y être ajouté
+        max_items = min(batch_settings()['max_items'], interaction_queue_config['max_size'])
+        if len(items) > max_items:
+            return jsonify({
+                'success': False,
+                'message': f'Trop d\'interactions dans le lot (maximum {max_items})'
+            }), 400
+        
+        interactions = [parse_interaction(item) for item in items]
+        invalid = [idx for idx, interaction in enumerate(interactions) if interaction is None]
+        if invalid:
+            return jsonify({
+                'success': False,
+                'message': f'Paramètres manquants (interactions {", ".join(map(str, invalid[:10]))})'
+            }), 400
+        
+        accepted = interaction_queue.submit(interactions)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Interactions enregistrées avec succès',
+            'accepted': accepted
+        })
+    except QueueFull as e:
+        return queue_full_response(e)
+    except ValueError as e:
         return jsonify({
             'success': False,
-            'message': f'Erreur: {str(e)}'
-        }), 500
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return internal_error(e)
 
 if __name__ == '__main__':
     # Récupérer le port depuis les variables d'environnement ou utiliser 5001 par défaut
     port = int(os.environ.get('PORT', 5001))
     
-    # Démarrer le serveur Flask
-    app.run(host='0.0.0.0', port=port, debug=True)
+    # Démarrer le serveur de développement Flask (en production: gunicorn -c gunicorn.conf.py app:app)
+    atexit.register(stop_background_services)
+    app.run(host='0.0.0.0', port=port, debug=env_bool('FLASK_DEBUG'))
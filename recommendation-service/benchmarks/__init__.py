@@ -0,0 +1 @@
+# Benchmarks du service de recommandation (à lancer depuis recommendation-service/)
@@ -0,0 +1,130 @@
+"""
+Benchmark du modèle ALS implicite contre le modèle cosinus
+
+Pour chaque modèle: durée d'entraînement et pic de RSS (dans un processus
+séparé), taille des structures servies, latence de recommend_for_user et
+taux de succès hors ligne (hit-rate@K): une paire utilisateur-produit par
+utilisateur évalué est retirée de l'entraînement, puis on vérifie si le
+produit retiré figure dans les K recommandations de l'utilisateur. La
+popularité globale sert de référence.
+
+Usage:
+    python -m benchmarks.bench_als [--interactions 200000] [--factors 64] [--iterations 15]
+                                   [--regularization 100] [--alpha 1]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.common import current_rss_mb, latency_percentiles, peak_rss_mb, print_table, run_isolated, timed
+from benchmarks.synthetic import InMemoryDatabase, generate_interaction_documents, generate_product_documents
+
+
+def split_leave_one_out(interactions, n_eval_users, seed=0):
+    """
+    Retirer une paire (utilisateur, produit) par utilisateur évalué
+    
+    Returns:
+        tuple: (interactions d'entraînement, {utilisateur: produit retiré})
+    """
+    rng = np.random.default_rng(seed)
+    products_by_user = {}
+    for interaction in interactions:
+        products_by_user.setdefault(interaction['userId'], set()).add(interaction['productId'])
+    
+    candidates = sorted(user_id for user_id, products in products_by_user.items() if len(products) >= 2)
+    eval_users = rng.choice(candidates, size=min(n_eval_users, len(candidates)), replace=False)
+    held_out = {user_id: rng.choice(sorted(products_by_user[user_id])) for user_id in eval_users}
+    train = [
+        interaction for interaction in interactions
+        if held_out.get(interaction['userId']) != interaction['productId']
+    ]
+    return train, held_out
+
+
+def served_mb(model):
+    arrays = [model.item_neighbor_indices, model.item_neighbor_scores]
+    if getattr(model, 'user_factors', None) is not None:
+        arrays += [model.user_factors, model.item_factors]
+    else:
+        arrays += [model.user_vectors.data, model.user_vectors.indices, model.user_vectors.indptr]
+    return sum(array.nbytes for array in arrays) / (1024 * 1024)
+
+
+def measure(kind, args):
+    """Entraîner et évaluer un modèle (dans le processus courant)"""
+    from models import create_model
+    
+    interactions = generate_interaction_documents(args.interactions)
+    train, held_out = split_leave_one_out(interactions, args.eval_users)
+    product_ids = sorted({interaction['productId'] for interaction in interactions})
+    database = InMemoryDatabase(train, generate_product_documents(product_ids, collected_ratio=0))
+    
+    settings = {'n_jobs': args.jobs}
+    if kind == 'als':
+        settings.update({'factors': args.factors, 'iterations': args.iterations,
+                         'regularization': args.regularization, 'alpha': args.alpha})
+    model = create_model(kind, **settings)
+    rss_before = current_rss_mb()
+    _, train_s = timed(model.train, database)
+    
+    hits, latencies = 0, []
+    for user_id, product_id in held_out.items():
+        start = time.perf_counter()
+        recommendations = model.recommend_for_user(user_id, args.k)
+        latencies.append(time.perf_counter() - start)
+        hits += product_id in {product['_id'] for product in recommendations}
+    
+    return {'model': kind, 'shape': f'{model.user_item_matrix.shape[0]}x{model.user_item_matrix.shape[1]}',
+            'train_s': train_s, 'peak_rss_delta_mb': peak_rss_mb() - rss_before, 'served_mb': served_mb(model),
+            f'hit_rate@{args.k}': hits / len(held_out), **latency_percentiles(latencies)}
+
+
+def popularity_hit_rate(args):
+    """Taux de succès des K produits les plus populaires (hors produits déjà vus)"""
+    interactions = generate_interaction_documents(args.interactions)
+    train, held_out = split_leave_one_out(interactions, args.eval_users)
+    counts, seen = {}, {}
+    for interaction in train:
+        counts[interaction['productId']] = counts.get(interaction['productId'], 0) + 1
+        seen.setdefault(interaction['userId'], set()).add(interaction['productId'])
+    ranking = sorted(counts, key=counts.get, reverse=True)
+    
+    hits = 0
+    for user_id, product_id in held_out.items():
+        top = [candidate for candidate in ranking[:args.k + len(seen[user_id])] if candidate not in seen[user_id]]
+        hits += product_id in top[:args.k]
+    return hits / len(held_out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interactions', type=int, default=200_000)
+    parser.add_argument('--factors', type=int, default=64)
+    parser.add_argument('--iterations', type=int, default=15)
+    parser.add_argument('--regularization', type=float, default=100.0)
+    parser.add_argument('--alpha', type=float, default=1.0)
+    parser.add_argument('--jobs', type=int, default=1)
+    parser.add_argument('--eval-users', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--worker', choices=['cosine', 'als'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        print(json.dumps(measure(args.worker, args)))
+        return
+    
+    options = ['--interactions', args.interactions, '--factors', args.factors, '--iterations', args.iterations,
+               '--regularization', args.regularization, '--alpha', args.alpha,
+               '--jobs', args.jobs, '--eval-users', args.eval_users, '--k', args.k]
+    rows = [run_isolated('benchmarks.bench_als', *options, '--worker', kind) for kind in ['cosine', 'als']]
+    rows.append({'model': 'popularity', f'hit_rate@{args.k}': popularity_hit_rate(args)})
+    
+    print_table(rows, ['model', 'shape', 'train_s', 'peak_rss_delta_mb', 'served_mb', f'hit_rate@{args.k}',
+                       'p50_ms', 'p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
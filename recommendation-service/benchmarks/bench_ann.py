@@ -0,0 +1,91 @@
+"""
+Benchmark des index approchés (models.ann) contre la recherche exacte
+
+Deux espaces de recherche issus d'un jeu synthétique: les facteurs ALS des
+produits (complétés pour la recherche du produit scalaire maximal, comme
+pour recommend_for_user) et les vecteurs normalisés des utilisateurs du
+modèle cosinus (recherche des voisins). Pour chaque configuration:
+durée de construction, rappel@K par rapport à la recherche exacte et
+débit (requêtes/s, une requête à la fois).
+
+Usage:
+    python -m benchmarks.bench_ann [--interactions 200000] [--k 10] [--queries 500]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import print_table, timed
+from benchmarks.synthetic import generate_database
+
+# Configurations comparées: (nom, type d'index, paramètres)
+CONFIGURATIONS = [
+    ('brute', 'brute', {}),
+    ('lsh 4x10 p2', 'lsh', {'n_tables': 4, 'n_bits': 10, 'n_probes': 2}),
+    ('lsh 8x12 p4', 'lsh', {'n_tables': 8, 'n_bits': 12, 'n_probes': 4}),
+    ('lsh 16x12 p6', 'lsh', {'n_tables': 16, 'n_bits': 12, 'n_probes': 6}),
+    ('lsh 16x8 p4', 'lsh', {'n_tables': 16, 'n_bits': 8, 'n_probes': 4}),
+    ('hnsw ef=50', 'hnsw', {'ef': 50}),
+    ('hnsw ef=200', 'hnsw', {'ef': 200})
+]
+
+
+def search_spaces(n_interactions):
+    """Vecteurs indexés et requêtes de chaque espace de recherche"""
+    from models.als import ImplicitALSModel
+    from models.collaborative_filtering import CollaborativeFilteringModel
+    
+    database = generate_database(n_interactions)
+    als = ImplicitALSModel(factors=64, iterations=10)
+    als.train(database)
+    user_factors = np.hstack([als.user_factors, np.zeros((len(als.user_factors), 1), dtype=np.float32)])
+    
+    cosine = CollaborativeFilteringModel()
+    cosine.train(database)
+    return [('als items', als._ann_vectors(), user_factors),
+            ('cosine users', cosine.user_vectors, cosine.user_vectors)]
+
+
+def measure(index, queries, k):
+    """Résultats et débit de requêtes une à une"""
+    results = []
+    start = time.perf_counter()
+    for row in range(queries.shape[0]):
+        results.append(index.query(queries[row:row + 1], k)[0][0])
+    return np.array(results), queries.shape[0] / (time.perf_counter() - start)
+
+
+def main():
+    from models.ann import build_index
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interactions', type=int, default=200_000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    rows = []
+    for space, vectors, all_queries in search_spaces(args.interactions):
+        queries = all_queries[rng.choice(all_queries.shape[0], size=args.queries, replace=False)]
+        exact = None
+        for name, kind, params in CONFIGURATIONS:
+            try:
+                index, build_s = timed(build_index, kind, vectors, **params)
+            except ImportError as e:
+                print(f'{space} / {name}: {e}')
+                continue
+            found, qps = measure(index, queries, args.k)
+            if exact is None:
+                exact = found
+            recall = np.mean([
+                len(set(row[row >= 0]) & set(exact_row)) / len(exact_row) for row, exact_row in zip(found, exact)
+            ])
+            rows.append({'space': f'{space} {vectors.shape[0]}x{vectors.shape[1]}', 'index': name,
+                         'build_s': build_s, f'recall@{args.k}': recall, 'qps': qps})
+    print_table(rows, ['space', 'index', 'build_s', f'recall@{args.k}', 'qps'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark de l'endpoint POST /recommend/batch
+
+Compare, via le client de test Flask, N appels successifs à
+/recommend/user/<id> et /recommend/similar/<id> à un seul appel
+/recommend/batch couvrant les mêmes utilisateurs et produits. Rapporte le
+débit (recommandations/s) et la latence d'une requête par lot. Le client de
+test n'a pas de coût réseau: le gain réel, avec un aller-retour HTTP par
+appel, est supérieur.
+
+Usage:
+    python -m benchmarks.bench_batch [--interactions 200000] [--batch-sizes 10 50 200]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import latency_percentiles, print_table, timed
+from benchmarks.synthetic import generate_database
+
+
+def run_sequential(client, user_ids, product_ids, limit):
+    for user_id in user_ids:
+        assert client.get(f'/recommend/user/{user_id}?limit={limit}').status_code == 200
+    for product_id in product_ids:
+        assert client.get(f'/recommend/similar/{product_id}?limit={limit}').status_code == 200
+
+
+def run_batch(client, user_ids, product_ids, limit):
+    response = client.post('/recommend/batch', json={
+        'users': list(user_ids), 'products': list(product_ids), 'limit': limit
+    })
+    assert response.status_code == 200
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interactions', type=int, default=200_000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--limit', type=int, default=5)
+    args = parser.parse_args()
+    
+    # Ne pas charger d'instantané existant au démarrage de l'application
+    os.environ['MODEL_SNAPSHOT_DIR'] = tempfile.mkdtemp()
+    os.environ['RECOMMENDATION_BATCH_MAX_ITEMS'] = str(2 * max(args.batch_sizes))
+    from app import app, incremental_updater, model_store
+    from models.collaborative_filtering import CollaborativeFilteringModel
+    
+    incremental_updater.stop()
+    model = CollaborativeFilteringModel()
+    _, train_s = timed(model.train, generate_database(args.interactions))
+    model_store.swap(model)
+    client = app.test_client()
+    
+    rng = np.random.default_rng(0)
+    user_ids = np.array(list(model.user_id_mapping))
+    product_ids = np.array(list(model.product_id_mapping))
+    
+    rows = []
+    for batch_size in args.batch_sizes:
+        for mode, function in [('sequential', run_sequential), ('batch', run_batch)]:
+            latencies = []
+            for _ in range(args.repeats):
+                users = rng.choice(user_ids, size=batch_size, replace=False)
+                products = rng.choice(product_ids, size=batch_size, replace=False)
+                start = time.perf_counter()
+                function(client, users, products, args.limit)
+                latencies.append(time.perf_counter() - start)
+            rows.append({'mode': mode, 'batch': batch_size,
+                         'items_per_s': 2 * batch_size * args.repeats / sum(latencies),
+                         **latency_percentiles(latencies)})
+    
+    print(f'Modèle {model.user_item_matrix.shape} entraîné en {train_s:.1f} s; '
+          'un lot = N utilisateurs + N produits')
+    print_table(rows, ['mode', 'batch', 'items_per_s', 'p50_ms', 'p95_ms', 'mean_ms'])
+
+
+if __name__ == '__main__':
+    main()
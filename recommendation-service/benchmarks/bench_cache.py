@@ -0,0 +1,79 @@
+"""
+Benchmark du cache des résultats de recommandation
+
+Rejoue, via le client de test Flask, un flux de requêtes /recommend/user et
+/recommend/similar dont les IDs suivent une loi de puissance (quelques
+utilisateurs et produits très demandés), avec des limites variées. Compare
+le service sans cache (RESULT_CACHE_SIZE=0) et avec des caches de
+différentes tailles: taux de succès, débit et latences.
+
+Usage:
+    python -m benchmarks.bench_cache [--interactions 200000] [--requests 5000]
+                                     [--sizes 0 1000 10000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import latency_percentiles, print_table
+from benchmarks.synthetic import generate_database, power_law_probabilities
+
+
+def request_stream(model, n_requests, seed=0):
+    """Chemins des requêtes: moitié utilisateurs, moitié produits, IDs en loi de puissance"""
+    rng = np.random.default_rng(seed)
+    user_ids = list(model.user_id_mapping)
+    product_ids = list(model.product_id_mapping)
+    users = rng.choice(len(user_ids), size=n_requests, p=power_law_probabilities(len(user_ids), 1.0, rng))
+    products = rng.choice(len(product_ids), size=n_requests, p=power_law_probabilities(len(product_ids), 1.0, rng))
+    limits = rng.choice([5, 10, 20], size=n_requests)
+    return [
+        f'/recommend/user/{user_ids[users[idx]]}?limit={limits[idx]}' if idx % 2 == 0
+        else f'/recommend/similar/{product_ids[products[idx]]}?limit={limits[idx]}'
+        for idx in range(n_requests)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interactions', type=int, default=200_000)
+    parser.add_argument('--requests', type=int, default=5_000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[0, 1000, 10000])
+    args = parser.parse_args()
+    
+    # Ne pas charger d'instantané existant au démarrage de l'application
+    os.environ['MODEL_SNAPSHOT_DIR'] = tempfile.mkdtemp()
+    import app as service
+    from cache import ResultCache
+    from models.collaborative_filtering import CollaborativeFilteringModel
+    
+    service.incremental_updater.stop()
+    model = CollaborativeFilteringModel()
+    model.train(generate_database(args.interactions))
+    service.model_store.swap(model)
+    client = service.app.test_client()
+    paths = request_stream(model, args.requests)
+    
+    rows = []
+    for size in args.sizes:
+        service.result_cache = ResultCache(max_entries=size, ttl=None)
+        latencies = []
+        for path in paths:
+            start = time.perf_counter()
+            assert client.get(path).status_code == 200
+            latencies.append(time.perf_counter() - start)
+        stats = service.result_cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        rows.append({'cache_size': size, 'hit_ratio': stats['hits'] / lookups if lookups else None,
+                     'evictions': stats['evictions'], 'requests_per_s': len(paths) / sum(latencies),
+                     **latency_percentiles(latencies)})
+    
+    print(f'Modèle {model.user_item_matrix.shape}, {len(paths)} requêtes')
+    print_table(rows, ['cache_size', 'hit_ratio', 'evictions', 'requests_per_s', 'p50_ms', 'p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
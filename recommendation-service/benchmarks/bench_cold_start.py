@@ -0,0 +1,72 @@
+"""
+Benchmark des replis de popularité pour les utilisateurs et produits inconnus
+
+Compare la latence des classements précalculés à l'entraînement
+(recommend_for_user et find_similar_products sur des ID inconnus) à un
+repli calculé à chaque requête comme celui du serveur Node: lecture des
+interactions récentes dans MongoDB, comptage par produit, puis lecture des
+produits retenus. MongoDB est simulé par mongomock, sauf avec --uri:
+mongomock trie en Python, ce qui surévalue le coût du repli à la requête
+par rapport à un mongod indexé.
+
+Usage:
+    python -m benchmarks.bench_cold_start [--interactions 20000] [--requests 20] [--uri mongodb://...]
+"""
+import argparse
+import time
+from collections import Counter
+
+from benchmarks.common import latency_percentiles, print_table, timed
+from benchmarks.synthetic import connect_database, seed_database
+
+
+def query_time_fallback(db, limit, window=1000):
+    """Repli calculé à la requête: produits les plus fréquents parmi les interactions récentes"""
+    recent = db.productinteractions.find({}, {'productId': 1}).sort('timestamp', -1).limit(window)
+    counts = Counter(str(interaction['productId']) for interaction in recent)
+    top_ids = [product_id for product_id, _ in counts.most_common(limit)]
+    products = {str(product['_id']): product for product in db.productstree.find({'_id': {'$in': top_ids},
+                                                                                   'isCollected': False})}
+    return [products[product_id] for product_id in top_ids if product_id in products]
+
+
+def measure(function, requests):
+    latencies = []
+    for request in range(requests):
+        start = time.perf_counter()
+        function(request)
+        latencies.append(time.perf_counter() - start)
+    return latency_percentiles(latencies)
+
+
+def main():
+    from models.collaborative_filtering import CollaborativeFilteringModel
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interactions', type=int, default=20_000)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--uri', help='URI d\'un mongod local (mongomock par défaut)')
+    args = parser.parse_args()
+    
+    db = connect_database(args.uri)
+    seed_database(db, args.interactions)
+    
+    model = CollaborativeFilteringModel()
+    _, train_s = timed(model.train, db)
+    print(f'Entraînement (classements de popularité compris): {train_s:.2f} s, '
+          f'{len(model.popularity.category_names)} catégories')
+    
+    rows = [
+        {'path': 'recommend_for_user (inconnu)',
+         **measure(lambda request: model.recommend_for_user(f'unknown{request}', args.limit), args.requests)},
+        {'path': 'find_similar_products (inconnu)',
+         **measure(lambda request: model.find_similar_products(f'unknown{request}', args.limit), args.requests)},
+        {'path': 'repli à la requête (MongoDB)',
+         **measure(lambda request: query_time_fallback(db, args.limit), args.requests)}
+    ]
+    print_table(rows, ['path', 'p50_ms', 'p95_ms', 'p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
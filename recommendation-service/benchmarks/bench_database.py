@@ -0,0 +1,70 @@
+"""
+Benchmark de la latence par requête de get_database_connection
+
+Compare l'ancien comportement (un nouveau MongoClient à chaque requête) au
+client partagé du processus. Chaque « requête » obtient la base puis lit un
+document, comme /record-interaction ou /train. Sans --uri, mongomock remplace
+MongoDB: il ne mesure que le coût côté Python (pas de handshake ni de TLS);
+avec --uri vers un mongod local, les deux coûts sont mesurés.
+
+Usage:
+    python -m benchmarks.bench_database [--uri mongodb://localhost:27017/bench] [--requests 500]
+"""
+import argparse
+import os
+import time
+
+from benchmarks.common import latency_percentiles, print_table
+
+
+def legacy_get_database_connection(mongo_client_class):
+    """Ancienne implémentation: un client (et un pool) neuf par appel"""
+    mongo_uri = os.environ['MONGO_URI']
+    client = mongo_client_class(mongo_uri)
+    return client[mongo_uri.split('/')[-1]], client
+
+
+def main():
+    import database
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uri', help='URI d\'un mongod local (mongomock par défaut)')
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+    
+    os.environ['MONGO_URI'] = args.uri or 'mongodb://localhost:27017/bench'
+    if args.uri:
+        from pymongo import MongoClient as mongo_client_class
+    else:
+        import mongomock
+        mongo_client_class = mongomock.MongoClient
+        database.mongo_client_class = lambda: mongomock.MongoClient
+    database.reset_client()
+    database.get_database_connection().productinteractions.insert_one({'userId': 'bench'})
+    
+    rows = []
+    latencies = []
+    clients = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        db, client = legacy_get_database_connection(mongo_client_class)
+        db.productinteractions.find_one()
+        latencies.append(time.perf_counter() - start)
+        clients.append(client)
+    rows.append({'method': 'client per request', 'clients': len(clients), **latency_percentiles(latencies)})
+    for client in clients:
+        client.close()
+    
+    latencies = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        database.get_database_connection().productinteractions.find_one()
+        latencies.append(time.perf_counter() - start)
+    rows.append({'method': 'shared client', 'clients': 1, **latency_percentiles(latencies)})
+    
+    print(f"Base: {'mongod ' + args.uri if args.uri else 'mongomock'}")
+    print_table(rows, ['method', 'clients', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'])
+
+
+if __name__ == '__main__':
+    main()
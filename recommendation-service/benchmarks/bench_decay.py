@@ -0,0 +1,100 @@
+"""
+Benchmark de la décroissance temporelle des poids des interactions
+
+Compare, sur un jeu synthétique daté uniformément sur `--max-age-days`
+jours:
+- le calcul des poids: poids fixes par type contre poids décroissants
+  (vectorisé sur les tableaux de types et de dates);
+- l'entraînement complet avec poids fixes contre poids décroissants (une
+  matrice par demi-vie en plus de la matrice combinée);
+- le vieillissement des poids sans relecture (`decay_to`) avec une seule
+  demi-vie (facteur commun: rien à recalculer) et une demi-vie par type
+  (structures servies recalculées).
+
+Usage:
+    python -m benchmarks.bench_decay [--interactions 1000000] [--half-lives view=7 cart=30 purchase=180]
+"""
+import argparse
+
+import numpy as np
+
+from benchmarks.common import print_table, timed
+from benchmarks.synthetic import generate_database
+
+
+def date_interactions(database, max_age_days, seed=0):
+    """Dater les interactions d'une base en mémoire uniformément sur les `max_age_days` derniers jours"""
+    rng = np.random.default_rng(seed)
+    now = np.datetime64('now', 'ms')
+    ages = rng.uniform(0, max_age_days, size=len(database.productinteractions.documents))
+    timestamps = now - (ages * 86_400_000).astype('timedelta64[ms]')
+    for interaction, timestamp in zip(database.productinteractions.documents, timestamps.astype(object)):
+        interaction['timestamp'] = timestamp
+
+
+def main():
+    from models.collaborative_filtering import (CollaborativeFilteringModel, decayed_interaction_weights,
+                                                interaction_weights)
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interactions', type=int, default=1_000_000)
+    parser.add_argument('--max-age-days', type=float, default=180.0)
+    parser.add_argument('--half-lives', nargs='+', default=['view=7', 'cart=30', 'purchase=180'])
+    parser.add_argument('--aggregation', choices=['max', 'sum'], default='sum')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    half_lives = {name: float(days) for name, days in (item.split('=') for item in args.half_lives)}
+    
+    database = generate_database(args.interactions)
+    date_interactions(database, args.max_age_days)
+    documents = database.productinteractions.documents
+    interaction_types = np.array([document['interactionType'] for document in documents], dtype=object)
+    timestamps = np.array([document['timestamp'] for document in documents], dtype='datetime64[ms]')
+    now = np.datetime64('now', 'ms')
+    
+    weighting = [
+        {'step': 'poids fixes',
+         'seconds': min(timed(interaction_weights, interaction_types)[1] for _ in range(args.repeat))},
+        {'step': 'poids décroissants',
+         'seconds': min(timed(decayed_interaction_weights, interaction_types, timestamps, now, half_lives)[1]
+                        for _ in range(args.repeat))}
+    ]
+    print(f'Calcul des poids de {len(documents)} interactions')
+    print_table(weighting, ['step', 'seconds'])
+    
+    # Importer les dépendances chargées à la demande (pandas, à l'étape popularity) avant la mesure, puis
+    # entraîner chaque mode une fois sans mesure: le premier mode ne paie pas seul les coûts du premier appel
+    import pandas  # noqa: F401
+    modes = [('poids fixes', None), ('décroissance', half_lives)]
+    warmup = generate_database(min(args.interactions, 10_000))
+    date_interactions(warmup, args.max_age_days)
+    for _, model_half_lives in modes:
+        CollaborativeFilteringModel(aggregation=args.aggregation, interaction_half_lives=model_half_lives).train(warmup)
+    
+    rows = []
+    models = {}
+    for name, model_half_lives in modes:
+        model = CollaborativeFilteringModel(aggregation=args.aggregation, interaction_half_lives=model_half_lives)
+        _, train_s = timed(model.train, database)
+        models[name] = model
+        matrix_bytes = sum(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+                           for matrix in [model.user_item_matrix, *(model.decay_components or [])])
+        rows.append({'mode': name, 'train_s': train_s, **model.training_stages, 'matrix_mb': matrix_bytes / 2 ** 20})
+    print()
+    print_table(rows, ['mode', 'train_s', 'fetch', 'matrix', 'fit', 'catalog', 'popularity', 'matrix_mb'])
+    
+    uniform = CollaborativeFilteringModel(aggregation=args.aggregation,
+                                          interaction_half_lives={name: 30.0 for name in half_lives})
+    uniform.train(database)
+    later = now + np.timedelta64(1, 'D')
+    decay_rows = [
+        {'mode': 'decay_to (une demi-vie)', 'seconds': timed(uniform.decay_to, later)[1]},
+        {'mode': 'decay_to (demi-vie par type)', 'seconds': timed(models['décroissance'].decay_to, later)[1]},
+        {'mode': 'entraînement complet', 'seconds': rows[1]['train_s']}
+    ]
+    print()
+    print_table(decay_rows, ['mode', 'seconds'])
+
+
+if __name__ == '__main__':
+    main()
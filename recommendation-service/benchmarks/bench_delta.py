@@ -0,0 +1,94 @@
+"""
+Benchmark de l'entraînement différentiel contre l'entraînement complet
+
+Entraîne un modèle sur un jeu synthétique, puis ajoute `--change` (1 % par
+défaut) de nouvelles interactions, dont certaines sur des produits absents
+du catalogue, et modifie la même part des produits existants. Compare la
+durée de `train_delta` (lecture depuis le filigrane, fusion, voisins des
+seuls produits touchés) à celle d'un réentraînement complet sur les mêmes
+données, étape par étape. MongoDB est simulé par mongomock, sauf avec
+--uri: mongomock filtre en Python, ce qui surévalue le coût de la lecture
+différentielle par rapport à un mongod indexé sur _id.
+
+Usage:
+    python -m benchmarks.bench_delta [--interactions 50000] [--change 0.01] [--uri mongodb://...]
+"""
+import argparse
+import datetime
+
+import numpy as np
+
+from benchmarks.common import print_table, timed
+from benchmarks.synthetic import (connect_database, generate_interaction_documents, generate_product_documents,
+                                  seed_database)
+
+
+def add_changes(db, n_interactions, n_users, n_products, product_ratio, seed=7):
+    """
+    Ajouter de nouvelles interactions et modifier une part des produits existants
+    
+    Les nouvelles interactions couvrent 1 % de produits de plus que le jeu
+    initial: les documents des produits inconnus sont insérés avec elles.
+    
+    Returns:
+        dict: Nombre d'interactions ajoutées, de produits ajoutés et modifiés
+    """
+    now = datetime.datetime.utcnow()
+    interactions = generate_interaction_documents(n_interactions, n_users=n_users,
+                                                  n_products=int(n_products * 1.01) + 1, seed=seed)
+    for interaction in interactions:
+        interaction['timestamp'] = now
+    
+    known = {product['_id'] for product in db.productstree.find({}, {'_id': 1})}
+    new_ids = sorted({interaction['productId'] for interaction in interactions} - known)
+    new_products = generate_product_documents(new_ids, seed=seed)
+    for product in new_products:
+        product['updatedAt'] = now
+    
+    rng = np.random.default_rng(seed)
+    changed = rng.choice(sorted(known), size=int(len(known) * product_ratio), replace=False).tolist()
+    
+    db.productinteractions.insert_many(interactions)
+    if new_products:
+        db.productstree.insert_many(new_products)
+    db.productstree.update_many({'_id': {'$in': changed}}, [{'$set': {'isCollected': {'$not': '$isCollected'},
+                                                                     'updatedAt': now}}])
+    return {'interactions': len(interactions), 'new_products': len(new_products), 'changed_products': len(changed)}
+
+
+def main():
+    from models.collaborative_filtering import CollaborativeFilteringModel
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interactions', type=int, default=50_000)
+    parser.add_argument('--change', type=float, default=0.01, help='part de nouvelles données')
+    parser.add_argument('--aggregate-in-database', action='store_true')
+    parser.add_argument('--uri', help='URI d\'un mongod local (mongomock par défaut)')
+    args = parser.parse_args()
+    
+    db = connect_database(args.uri)
+    n_base = int(args.interactions * (1 - args.change))
+    dataset = seed_database(db, n_base)
+    
+    base = CollaborativeFilteringModel(aggregate_in_database=args.aggregate_in_database)
+    _, base_s = timed(base.train, db)
+    
+    changes = add_changes(db, args.interactions - n_base, dataset['users'], dataset['products'], args.change)
+    print(f"Modèle initial: {n_base} interactions ({base_s:.2f} s); ajout de {changes['interactions']} "
+          f"interactions, {changes['new_products']} nouveaux produits, {changes['changed_products']} produits modifiés")
+    
+    delta, delta_s = timed(base.train_delta, db)
+    full = CollaborativeFilteringModel(aggregate_in_database=args.aggregate_in_database)
+    _, full_s = timed(full.train, db)
+    
+    rows = [
+        {'mode': 'complet', 'total_s': full_s, **full.training_stages},
+        {'mode': 'différentiel', 'total_s': delta_s, **delta.training_stages}
+    ]
+    stages = sorted({stage for row in rows for stage in row} - {'mode', 'total_s'})
+    print_table(rows, ['mode', 'total_s'] + stages)
+    print(f'Accélération: {full_s / delta_s:.1f}x, dérive après le delta: {delta.drift():.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Benchmark du démarrage du service: durée d'import et mémoire par worker
+
+Un modèle synthétique est entraîné et enregistré en instantané. Pour chaque
+mode, N processus importent `app` (qui charge l'instantané en projection
+mémoire), servent quelques requêtes /recommend/* avec le client de test
+Flask puis attendent; leur RSS et leur PSS sont lus dans /proc. Le premier
+processus est lancé avec `-X importtime` pour lister les paquets les plus
+coûteux à importer.
+
+Modes:
+    service       `import app` seul: pandas et pymongo ne sont chargés
+                  qu'à l'entraînement et au premier accès à la base
+    avant         pandas et pymongo importés avant `app`, comme lorsqu'ils
+                  étaient importés au chargement des modules
+    + sklearn     idem avec scikit-learn (cosine_similarity à l'entraînement)
+
+Usage:
+    python -m benchmarks.bench_import [--interactions 100000] [--workers 2]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from benchmarks.bench_snapshot import memory_usage_mb
+from benchmarks.common import print_table
+from benchmarks.synthetic import generate_database
+
+MODES = {
+    'service': [],
+    'avant': ['pandas', 'pymongo'],
+    '+ sklearn': ['pandas', 'pymongo', 'sklearn.metrics.pairwise']
+}
+
+HEAVY_PACKAGES = ['app', 'flask', 'numpy', 'scipy', 'pandas', 'pymongo', 'sklearn']
+
+WORKER_SCRIPT = """
+import json
+import sys
+import time
+start = time.perf_counter()
+for module in {preload!r}:
+    __import__(module)
+import app
+import_s = time.perf_counter() - start
+client = app.app.test_client()
+for user_id, product_id in zip({user_ids!r}, {product_ids!r}):
+    client.get('/recommend/user/' + user_id)
+    client.get('/recommend/similar/' + product_id)
+heavy = sorted({{'pandas', 'sklearn', 'pymongo', 'bson'}} & set(sys.modules))
+print(json.dumps({{'import_s': import_s, 'modules': len(sys.modules), 'heavy': heavy}}), flush=True)
+sys.stdin.read()
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Durée cumulée d'import des paquets de premier niveau (sortie de -X importtime)
+    
+    Returns:
+        dict: Durée en millisecondes par paquet
+    """
+    durations = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        name = name.rstrip()
+        if name.strip() in HEAVY_PACKAGES:
+            # La première occurrence d'un paquet est son import réel
+            durations.setdefault(name.strip(), int(cumulative) / 1000)
+    return durations
+
+
+def measure_mode(mode, preload, root, user_ids, product_ids, n_workers):
+    """Lancer `n_workers` processus du service dans un mode et mesurer import et mémoire"""
+    script = WORKER_SCRIPT.format(preload=preload, user_ids=user_ids, product_ids=product_ids)
+    env = dict(os.environ, MODEL_SNAPSHOT_DIR=root, DEFER_BACKGROUND_SERVICES='true', RESULT_CACHE_SIZE='0',
+               RESULT_CACHE_SQLITE_PATH='', METRICS_ENABLED='false')
+    # La sortie de -X importtime dépasse la taille d'un tube: elle est écrite dans un fichier
+    with tempfile.TemporaryFile('w+') as importtime_log:
+        workers = [
+            subprocess.Popen(
+                [sys.executable, *(['-X', 'importtime'] if idx == 0 else []), '-c', script],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=importtime_log if idx == 0 else None,
+                text=True, env=env
+            )
+            for idx in range(n_workers)
+        ]
+        try:
+            # Le service affiche d'abord le chargement de l'instantané
+            results = [json.loads(next(line for line in worker.stdout if line.startswith('{')))
+                       for worker in workers]
+            usages = [memory_usage_mb(worker.pid) for worker in workers]
+        finally:
+            for worker in workers:
+                worker.stdin.close()
+                worker.wait()
+        importtime_log.seek(0)
+        importtime = parse_importtime(importtime_log.read())
+    
+    return {
+        'mode': mode,
+        'import_s': float(np.mean([result['import_s'] for result in results])),
+        'modules': results[0]['modules'],
+        'heavy': ','.join(results[0]['heavy']) or '-',
+        'rss_per_worker_mb': float(np.mean([usage['rss_mb'] for usage in usages])),
+        'pss_per_worker_mb': float(np.mean([usage['pss_mb'] for usage in usages]))
+    }, importtime
+
+
+def main():
+    from models.collaborative_filtering import CollaborativeFilteringModel
+    from models.snapshot import save_snapshot
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interactions', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+    
+    model = CollaborativeFilteringModel()
+    model.train(generate_database(args.interactions))
+    rng = np.random.default_rng(0)
+    user_ids = [str(user_id) for user_id in rng.choice(list(model.user_id_mapping), args.queries)]
+    product_ids = [str(product_id) for product_id in rng.choice(list(model.product_id_mapping), args.queries)]
+    
+    rows, import_rows = [], []
+    with tempfile.TemporaryDirectory() as root:
+        save_snapshot(model, root)
+        for mode, preload in MODES.items():
+            row, importtime = measure_mode(mode, preload, root, user_ids, product_ids, args.workers)
+            rows.append(row)
+            import_rows.append({'mode': mode, **{f'{name}_ms': importtime.get(name, 0.0)
+                                                 for name in HEAVY_PACKAGES}})
+    
+    print(f'{args.interactions} interactions, {args.workers} processus par mode, '
+          f'{args.queries} requêtes /recommend/user et /recommend/similar chacun')
+    print_table(rows, ['mode', 'import_s', 'modules', 'heavy', 'rss_per_worker_mb', 'pss_per_worker_mb'])
+    print()
+    print('-X importtime (cumulé, premier import de chaque paquet)')
+    print_table(import_rows, ['mode', *[f'{name}_ms' for name in HEAVY_PACKAGES]])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark du débit des mises à jour incrémentales
+
+Entraîne un modèle sur un jeu synthétique, puis lui applique un flux
+soutenu de nouvelles interactions (tirées de la même distribution, avec de
+nouveaux utilisateurs et produits) par micro-lots de différentes tailles.
+Rapporte le débit (interactions/s), la latence d'application d'un lot et,
+pour comparaison, la durée d'un réentraînement complet.
+
+Usage:
+    python -m benchmarks.bench_incremental [--interactions 200000] [--events 5000]
+                                           [--batch-sizes 10 100 1000]
+"""
+import argparse
+import time
+
+from benchmarks.common import latency_percentiles, print_table, timed
+from benchmarks.synthetic import generate_database, generate_interaction_documents
+
+
+def main():
+    from models.collaborative_filtering import CollaborativeFilteringModel
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interactions', type=int, default=200_000)
+    parser.add_argument('--events', type=int, default=5_000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--aggregation', choices=['max', 'sum'], default='max')
+    args = parser.parse_args()
+    
+    database = generate_database(args.interactions)
+    model = CollaborativeFilteringModel(aggregation=args.aggregation)
+    _, train_s = timed(model.train, database)
+    
+    # Le flux couvre 10% d'utilisateurs et de produits de plus que l'entraînement
+    n_users, n_products = model.user_item_matrix.shape
+    events = [
+        (event['userId'], event['productId'], event['interactionType'])
+        for event in generate_interaction_documents(args.events, n_users=int(n_users * 1.1),
+                                                    n_products=int(n_products * 1.1), seed=7)
+    ]
+    
+    rows = [{'mode': 'full retrain', 'batch': args.interactions, 'events_per_s': args.interactions / train_s,
+             'p50_ms': train_s * 1000, 'p99_ms': train_s * 1000}]
+    for batch_size in args.batch_sizes:
+        current = model
+        latencies = []
+        start = time.perf_counter()
+        for batch_start in range(0, len(events), batch_size):
+            for user_id, product_id, interaction_type in events[batch_start:batch_start + batch_size]:
+                current.update_with_interaction(user_id, product_id, interaction_type)
+            batch_begin = time.perf_counter()
+            current = current.apply_pending_interactions()
+            latencies.append(time.perf_counter() - batch_begin)
+        duration = time.perf_counter() - start
+        rows.append({'mode': 'incremental', 'batch': batch_size, 'events_per_s': len(events) / duration,
+                     **latency_percentiles(latencies), 'drift': current.drift()})
+    
+    print(f'Modèle {model.user_item_matrix.shape}, {model.user_item_matrix.nnz} paires, {len(events)} événements')
+    print_table(rows, ['mode', 'batch', 'events_per_s', 'p50_ms', 'p99_ms', 'drift'])
+
+
+if __name__ == '__main__':
+    main()
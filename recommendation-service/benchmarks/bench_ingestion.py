@@ -0,0 +1,87 @@
+"""
+Benchmark de la lecture des interactions depuis MongoDB
+
+Compare l'ancienne lecture (list(find()) de documents complets) au
+chargement par morceaux projetés de `CollaborativeFilteringModel` et à
+l'agrégation $group côté serveur, sur une base locale peuplée de documents
+d'interactions synthétiques. Le pic mémoire est mesuré avec tracemalloc (les
+allocations du client MongoDB comprises). mongomock est lent et copie
+chaque document: utiliser --uri vers un mongod local pour les gros volumes.
+
+Usage:
+    python -m benchmarks.bench_ingestion [--interactions 50000] [--batch-sizes 1000 10000]
+                                         [--uri mongodb://localhost:27017/bench]
+"""
+import argparse
+import datetime
+import time
+import tracemalloc
+
+from benchmarks.common import print_table
+from benchmarks.synthetic import generate_interaction_documents
+
+
+def seed(db, n_interactions):
+    """Peupler la collection avec des documents complets, comme ceux de Mongoose"""
+    now = datetime.datetime.utcnow()
+    documents = generate_interaction_documents(n_interactions)
+    for document in documents:
+        document.update({'timestamp': now, 'createdAt': now, 'updatedAt': now, '__v': 0})
+    db.productinteractions.delete_many({})
+    db.productinteractions.insert_many(documents)
+
+
+def legacy_load(db, aggregation):
+    from database import interaction_columns
+    from models.collaborative_filtering import build_user_item_matrix
+    
+    interactions = list(db.productinteractions.find())
+    return build_user_item_matrix(*interaction_columns(interactions), aggregation=aggregation)[0]
+
+
+def streaming_load(db, aggregation, batch_size, in_database):
+    from models.collaborative_filtering import CollaborativeFilteringModel
+    
+    model = CollaborativeFilteringModel(aggregation=aggregation, batch_size=batch_size,
+                                        aggregate_in_database=in_database)
+    return model._load_interactions(db).build(aggregation)[0]
+
+
+def measure(name, function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    matrix = function(*args)
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'method': name, 'nnz': matrix.nnz, 'load_s': duration, 'peak_mb': peak / (1024 * 1024)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interactions', type=int, default=50_000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1_000, 10_000])
+    parser.add_argument('--aggregation', choices=['max', 'sum'], default='max')
+    parser.add_argument('--uri', help='URI d\'un mongod local (mongomock par défaut)')
+    args = parser.parse_args()
+    
+    if args.uri:
+        from pymongo import MongoClient
+        db = MongoClient(args.uri)[args.uri.split('/')[-1]]
+    else:
+        import mongomock
+        db = mongomock.MongoClient().bench
+    seed(db, args.interactions)
+    
+    rows = [measure('list(find())', legacy_load, db, args.aggregation)]
+    for batch_size in args.batch_sizes:
+        rows.append(measure(f'stream batch={batch_size}', streaming_load, db, args.aggregation, batch_size, False))
+    rows.append(measure(f'$group batch={args.batch_sizes[-1]}', streaming_load, db, args.aggregation,
+                        args.batch_sizes[-1], True))
+    
+    print(f"{args.interactions} interactions, base: {'mongod ' + args.uri if args.uri else 'mongomock'}")
+    print_table(rows, ['method', 'nnz', 'load_s', 'peak_mb'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark du précalcul des recommandations
+
+Entraîne un modèle sur un jeu synthétique, l'enregistre en instantané puis
+précalcule les recommandations de tous les utilisateurs avec différents
+nombres de processus. Rapporte le débit du job (utilisateurs/s), ce débit
+rapporté au nombre de processus, et la latence de recommend_for_user avec
+et sans lignes précalculées.
+
+Usage:
+    python -m benchmarks.bench_materialize [--interactions 200000] [--jobs 1 2 4]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import latency_percentiles, print_table, timed
+from benchmarks.synthetic import generate_database
+
+
+def measure_recommend(model, user_ids, limit):
+    latencies = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        model.recommend_for_user(user_id, limit)
+        latencies.append(time.perf_counter() - start)
+    return latency_percentiles(latencies)
+
+
+def main():
+    from models.collaborative_filtering import CollaborativeFilteringModel
+    from models.materialization import materialize_recommendations
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interactions', type=int, default=200_000)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--top-n', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+    
+    model = CollaborativeFilteringModel()
+    model.train(generate_database(args.interactions))
+    directory = tempfile.mkdtemp()
+    model.save(directory)
+    n_users = model.user_item_matrix.shape[0]
+    
+    rows = []
+    for n_jobs in args.jobs:
+        _, duration = timed(materialize_recommendations, directory, args.top_n, n_jobs=n_jobs)
+        rows.append({'jobs': n_jobs, 'users': n_users, 'duration_s': duration,
+                     'users_per_s': n_users / duration, 'users_per_s_per_job': n_users / duration / n_jobs})
+    print(f'Modèle {model.user_item_matrix.shape}, top-{args.top_n}, {os.cpu_count()} cœur(s) disponible(s)')
+    print_table(rows, ['jobs', 'users', 'duration_s', 'users_per_s', 'users_per_s_per_job'])
+    
+    loaded = CollaborativeFilteringModel.load(directory)
+    user_ids = np.random.default_rng(0).choice(list(model.user_id_mapping), size=args.queries)
+    latency_rows = [
+        {'mode': 'live', **measure_recommend(model, user_ids, 5)},
+        {'mode': 'materialized', **measure_recommend(loaded, user_ids, 5)}
+    ]
+    print()
+    print_table(latency_rows, ['mode', 'p50_ms', 'p95_ms', 'p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark du coût de l'instrumentation (metrics.py)
+
+Compare, via le client de test Flask, la latence par requête d'une même
+application sans instrumentation, avec la mesure des latences, et avec
+en plus le profilage échantillonné (une requête sur --profile-every). Les
+modes sont alternés à chaque tour pour que la dérive de la machine pèse
+sur tous de la même façon. Mesure aussi le coût d'une observation
+d'histogramme et d'une lecture de /metrics.
+
+Usage:
+    python -m benchmarks.bench_metrics [--interactions 100000] [--requests 2000] [--rounds 5]
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import print_table
+from benchmarks.synthetic import generate_database
+
+
+def build_app(model, mode, profile_every):
+    """Application minimale servant le modèle, instrumentée selon `mode`"""
+    from flask import Flask, jsonify
+    
+    from metrics import MetricsRegistry, RequestProfiler, instrument
+    
+    app = Flask(f'bench-{mode}')
+    
+    @app.route('/recommend/similar/<product_id>')
+    def similar(product_id):
+        return jsonify({'success': True, 'data': model.find_similar_products(product_id, 5)})
+    
+    @app.route('/recommend/user/<user_id>')
+    def user(user_id):
+        return jsonify({'success': True, 'data': model.recommend_for_user(user_id, 5)})
+    
+    registry = MetricsRegistry()
+    if mode == 'metrics':
+        instrument(app, registry)
+    elif mode == 'metrics+profile':
+        instrument(app, registry, RequestProfiler(profile_every, tempfile.mkdtemp()))
+    return app.test_client(), registry
+
+
+def run_requests(client, paths):
+    start = time.perf_counter()
+    for path in paths:
+        client.get(path)
+    return time.perf_counter() - start
+
+
+def main():
+    from cache import ResultCache
+    from metrics import MetricsRegistry, register_service_metrics
+    from model_store import ModelStore
+    from models.collaborative_filtering import CollaborativeFilteringModel
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interactions', type=int, default=100_000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--profile-every', type=int, default=100)
+    args = parser.parse_args()
+    
+    model = CollaborativeFilteringModel()
+    model.train(generate_database(args.interactions))
+    rng = np.random.default_rng(0)
+    endpoints = {
+        'similar': [f'/recommend/similar/{product_id}'
+                    for product_id in rng.choice(list(model.product_id_mapping), size=args.requests)],
+        'user': [f'/recommend/user/{user_id}' for user_id in rng.choice(list(model.user_id_mapping), size=args.requests)]
+    }
+    modes = ['bare', 'metrics', 'metrics+profile']
+    clients = {mode: build_app(model, mode, args.profile_every)[0] for mode in modes}
+    
+    rows = []
+    for endpoint, paths in endpoints.items():
+        for client in clients.values():
+            run_requests(client, paths[:100])
+        durations = {mode: [] for mode in modes}
+        for _ in range(args.rounds):
+            for mode in modes:
+                durations[mode].append(run_requests(clients[mode], paths))
+        bare_us = np.median(durations['bare']) / args.requests * 1e6
+        for mode in modes:
+            request_us = np.median(durations[mode]) / args.requests * 1e6
+            rows.append({'endpoint': endpoint, 'mode': mode, 'us_per_request': request_us,
+                         'overhead_us': request_us - bare_us, 'overhead_pct': 100 * (request_us / bare_us - 1)})
+    print_table(rows, ['endpoint', 'mode', 'us_per_request', 'overhead_us', 'overhead_pct'])
+    
+    # Coût unitaire d'une observation et d'une lecture de /metrics
+    registry = MetricsRegistry()
+    register_service_metrics(registry, ModelStore(model), ResultCache(), lambda: {'in_use': 0})
+    histogram = registry.histogram('latency', 'Latence', ('endpoint', 'method', 'status'))
+    values = rng.exponential(0.01, size=100_000)
+    start = time.perf_counter()
+    for value in values:
+        histogram.observe(value, '/recommend/user/<user_id>', 'GET', '200')
+    observe_ns = (time.perf_counter() - start) / len(values) * 1e9
+    
+    start = time.perf_counter()
+    for _ in range(100):
+        registry.render()
+    render_ms = (time.perf_counter() - start) / 100 * 1000
+    print(f'Histogram.observe: {observe_ns:.0f} ns; lecture de /metrics: {render_ms:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
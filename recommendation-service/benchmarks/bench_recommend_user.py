@@ -0,0 +1,95 @@
+"""
+Benchmark de la latence de recommend_for_user
+
+Compare l'ancienne double boucle Python (produits × utilisateurs) au calcul
+vectorisé (produits matrice-vecteur creux + argpartition) de
+`CollaborativeFilteringModel._predict_scores`.
+
+Usage:
+    python -m benchmarks.bench_recommend_user [--users 500 2000 5000] [--legacy-queries 3]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import latency_percentiles, print_table
+from benchmarks.synthetic import generate_interaction_columns
+
+
+def legacy_recommend(ratings, similarity, user_idx, limit):
+    """Reproduction de l'ancienne boucle de recommend_for_user (matrice dense)"""
+    similar_users = similarity[user_idx]
+    interacted_products = np.where(ratings[user_idx] > 0)[0]
+    prediction_scores = np.zeros(ratings.shape[1])
+    for product_idx in range(ratings.shape[1]):
+        if product_idx in interacted_products:
+            continue
+        weighted_sum = 0
+        similarity_sum = 0
+        for other_user_idx in range(ratings.shape[0]):
+            if other_user_idx == user_idx:
+                continue
+            user_similarity = similar_users[other_user_idx]
+            rating = ratings[other_user_idx, product_idx]
+            if rating > 0 and user_similarity > 0:
+                weighted_sum += user_similarity * rating
+                similarity_sum += user_similarity
+        if similarity_sum > 0:
+            prediction_scores[product_idx] = weighted_sum / similarity_sum
+    return np.argsort(prediction_scores)[::-1][:limit]
+
+
+def build_model(n_users):
+    from sklearn.metrics.pairwise import cosine_similarity
+    from models.collaborative_filtering import CollaborativeFilteringModel, build_user_item_matrix
+    from models.neighbors import l2_normalize_rows
+    
+    model = CollaborativeFilteringModel()
+    model.user_item_matrix, _, _ = build_user_item_matrix(*generate_interaction_columns(
+        n_users * 10, n_users=n_users, n_products=max(100, n_users // 5)
+    ))
+    model.user_vectors = l2_normalize_rows(model.user_item_matrix)
+    return model, cosine_similarity(model.user_item_matrix)
+
+
+def measure(function, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        function(query)
+        latencies.append(time.perf_counter() - start)
+    return latency_percentiles(latencies)
+
+
+def main():
+    from models.neighbors import select_top_k
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[500, 2000, 5000])
+    parser.add_argument('--limit', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--legacy-queries', type=int, default=3)
+    args = parser.parse_args()
+    
+    rows = []
+    for n_users in args.users:
+        model, legacy_similarity = build_model(n_users)
+        queries = np.random.default_rng(0).integers(0, model.user_item_matrix.shape[0], size=args.queries)
+        shape = f'{model.user_item_matrix.shape[0]}x{model.user_item_matrix.shape[1]}'
+        
+        ratings = model.user_item_matrix.toarray()
+        rows.append({'method': 'legacy', 'shape': shape, **measure(
+            lambda user_idx: legacy_recommend(ratings, legacy_similarity, user_idx, args.limit),
+            queries[:args.legacy_queries]
+        )})
+        rows.append({'method': 'vectorized', 'shape': shape, **measure(
+            lambda user_idx: select_top_k(model._predict_scores(user_idx)[np.newaxis, :], args.limit),
+            queries
+        )})
+    
+    print_table(rows, ['method', 'shape', 'p50_ms', 'p95_ms', 'p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark du débit soutenu d'enregistrement des interactions
+
+Persistance (dans le processus): des producteurs (threads) enregistrent
+des interactions pendant une durée fixe, soit une par une avec insert_one
+(écriture synchrone), soit par la file d'écriture (InteractionQueue,
+insert_many non ordonné par lots). Rapporte le débit accepté, le débit
+écrit, la latence d'un ajout et les refus de la file pleine. MongoDB est
+simulé par mongomock, sauf avec --uri.
+
+HTTP (avec --http): le service est lancé avec gunicorn et chargé sur
+/record-interaction (un événement par requête) et /record-interactions
+(`--bulk` événements par requête); le débit est rapporté en événements/s.
+
+Usage:
+    python -m benchmarks.bench_record [--producers 4] [--duration 5] [--uri mongodb://...]
+                                      [--http] [--workers 1] [--clients 8] [--bulk 50]
+"""
+import argparse
+import datetime
+import threading
+import time
+
+from benchmarks.common import latency_percentiles, print_table, timed
+from benchmarks.synthetic import connect_database, generate_interaction_columns
+
+
+def produce(record, interactions, duration, latencies, rejected):
+    """Producteur: enregistrer des interactions en boucle jusqu'à la fin de la durée"""
+    from ingestion import QueueFull
+    
+    deadline = time.monotonic() + duration
+    idx = 0
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            record(interactions[idx % len(interactions)])
+            latencies.append(time.perf_counter() - start)
+        except QueueFull:
+            rejected.append(1)
+            time.sleep(0.001)
+        idx += 1
+
+
+def run_producers(record, interactions, n_producers, duration):
+    latencies, rejected = [], []
+    threads = [
+        threading.Thread(target=produce,
+                         args=(record, interactions[offset::n_producers], duration, latencies, rejected))
+        for offset in range(n_producers)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, len(rejected), time.perf_counter() - start
+
+
+def bench_persistence(db, interactions, args):
+    from database import insert_interactions
+    from ingestion import InteractionQueue
+    
+    rows = []
+    
+    def insert_one(interaction):
+        user_id, product_id, interaction_type = interaction
+        db.productinteractions.insert_one({'userId': user_id, 'productId': product_id,
+                                           'interactionType': interaction_type,
+                                           'timestamp': datetime.datetime.utcnow()})
+    
+    db.productinteractions.drop()
+    latencies, rejected, elapsed = run_producers(insert_one, interactions, args.producers, args.duration)
+    rows.append({'mode': 'insert_one synchrone', 'accepted_per_s': len(latencies) / elapsed,
+                 'written_per_s': len(latencies) / elapsed, 'rejected': rejected, **latency_percentiles(latencies)})
+    
+    for batch_size in args.batch_sizes:
+        db.productinteractions.drop()
+        queue = InteractionQueue(lambda batch, interaction_ids: None,
+                                 persist=lambda batch: insert_interactions(db, batch), max_size=args.queue_size,
+                                 batch_size=batch_size, flush_interval=0.1, put_timeout=0)
+        queue.start()
+        latencies, rejected, elapsed = run_producers(lambda interaction: queue.submit([interaction]), interactions,
+                                                     args.producers, args.duration)
+        _, drain_s = timed(queue.stop)
+        stats = queue.stats()
+        assert stats['persisted'] == stats['accepted'] == db.productinteractions.count_documents({})
+        rows.append({'mode': f'file (lots de {batch_size})', 'accepted_per_s': len(latencies) / elapsed,
+                     'written_per_s': stats['persisted'] / (elapsed + drain_s), 'rejected': rejected,
+                     'drain_s': drain_s, **latency_percentiles(latencies)})
+    return rows
+
+
+def bench_http(interactions, args):
+    from benchmarks.load import run_load, start_service
+    
+    single = [('record-interaction', 'POST', '/record-interaction',
+               {'userId': user_id, 'productId': product_id, 'interactionType': interaction_type})
+              for user_id, product_id, interaction_type in interactions[:1000]]
+    bulk = [('record-interactions', 'POST', '/record-interactions',
+             {'interactions': [request[3] for request in single[start:start + args.bulk]]})
+            for start in range(0, len(single) - args.bulk + 1, args.bulk)]
+    
+    rows = []
+    with start_service('/metrics', WEB_CONCURRENCY=str(args.workers),
+                       MODEL_SNAPSHOT_DIR='/nonexistent-bench-record') as (url, _):
+        for name, requests, events_per_request in [('/record-interaction', single, 1),
+                                                   ('/record-interactions', bulk, args.bulk)]:
+            summary = run_load(url, requests, n_clients=args.clients, duration=args.duration)
+            rows.append({'endpoint': name, 'events_per_request': events_per_request,
+                         'requests_per_s': summary['requests_per_s'],
+                         'events_per_s': summary['requests_per_s'] * events_per_request,
+                         'error_rate': summary['error_rate'], 'p50_ms': summary['p50_ms'],
+                         'p99_ms': summary['p99_ms']})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--producers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--queue-size', type=int, default=10_000)
+    parser.add_argument('--uri', help='URI d\'un mongod local (mongomock par défaut)')
+    parser.add_argument('--http', action='store_true', help='charger aussi les endpoints avec gunicorn')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--bulk', type=int, default=50)
+    args = parser.parse_args()
+    
+    interactions = list(zip(*generate_interaction_columns(100_000)))
+    
+    rows = bench_persistence(connect_database(args.uri), interactions, args)
+    print_table(rows, ['mode', 'accepted_per_s', 'written_per_s', 'rejected', 'drain_s', 'p50_ms', 'p99_ms'])
+    
+    if args.http:
+        print()
+        print_table(bench_http(interactions, args),
+                    ['endpoint', 'events_per_request', 'requests_per_s', 'events_per_s', 'error_rate', 'p50_ms',
+                     'p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
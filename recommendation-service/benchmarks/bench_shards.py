@@ -0,0 +1,106 @@
+"""
+Benchmark des fragments par catégorie
+
+Entraîne un modèle sur un jeu synthétique puis:
+- calcule les fragments par catégorie avec différents nombres de processus
+  (durée, accélération par rapport à 1 processus), à comparer au calcul de
+  l'index global des produits similaires;
+- mesure la latence des requêtes filtrées par catégorie, lues dans les
+  fragments, contre le post-filtrage des résultats non filtrés: voisins de
+  l'index global filtrés (listes plus courtes, rapportées en nombre moyen de
+  résultats) et classement complet de l'utilisateur filtré.
+
+Usage:
+    python -m benchmarks.bench_shards [--interactions 1000000] [--jobs 1 2 4]
+"""
+import argparse
+import copy
+import os
+import time
+
+import numpy as np
+
+from benchmarks.common import latency_percentiles, print_table, timed
+from benchmarks.synthetic import generate_database
+
+
+def measure(function, queries):
+    """Latences de `function` sur chaque requête, et nombre moyen de résultats"""
+    latencies, sizes = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results = function(*query)
+        latencies.append(time.perf_counter() - start)
+        sizes.append(len(results))
+    return {**latency_percentiles(latencies), 'results': float(np.mean(sizes))}
+
+
+def post_filtered_recommendations(model, user_id, limit, category):
+    """Classement complet d'un utilisateur, filtré par catégorie après coup"""
+    ranking = model.recommend_for_user(user_id, limit=model.user_item_matrix.shape[1])
+    return [product for product in ranking if product['category'] == category][:limit]
+
+
+def main():
+    from models.collaborative_filtering import CollaborativeFilteringModel
+    from models.neighbors import topk_neighbors
+    from models.shards import CategoryShards
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interactions', type=int, default=1_000_000)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+    
+    model = CollaborativeFilteringModel(category_shards=True)
+    model.train(generate_database(args.interactions))
+    vectors, categories = model._item_vectors(), model.catalog.categories()
+    k = model.n_item_neighbors
+    
+    _, global_duration = timed(topk_neighbors, vectors, k)
+    rows = [{'index': 'global', 'jobs': 1, 'duration_s': global_duration, 'speedup': '-'}]
+    for n_jobs in args.jobs:
+        _, duration = timed(CategoryShards.build, vectors, categories, k, n_jobs=n_jobs)
+        rows.append({'index': 'shards', 'jobs': n_jobs, 'duration_s': duration})
+    for row in rows[1:]:
+        row['speedup'] = rows[1]['duration_s'] / row['duration_s']
+    sizes = np.diff(model.shards.category_indptr)
+    print(f'Modèle {model.user_item_matrix.shape}, {len(sizes)} catégories '
+          f'({sizes.min()} à {sizes.max()} produits), k = {k}, {os.cpu_count()} cœur(s) disponible(s)')
+    print_table(rows, ['index', 'jobs', 'duration_s', 'speedup'])
+    
+    # Même modèle sans fragments: les requêtes filtrées post-filtrent les résultats globaux
+    unsharded = copy.copy(model)
+    unsharded.shards = None
+    
+    rng = np.random.default_rng(0)
+    product_ids = rng.choice(list(model.product_id_mapping), size=args.queries)
+    own = [(product_id, args.limit, model._product_category(product_id, model.product_id_mapping[product_id]))
+           for product_id in product_ids]
+    other = [(product_id, args.limit, str(rng.choice(model.shards.category_names))) for product_id in product_ids]
+    users = [(user_id, args.limit, str(rng.choice(model.shards.category_names)))
+             for user_id in rng.choice(list(model.user_id_mapping), size=args.queries)]
+    
+    latency_rows = [
+        {'query': 'similar, sans filtre', **measure(lambda product_id, limit, _: model.find_similar_products(
+            product_id, limit), own)},
+        {'query': 'similar, sa catégorie, fragment', **measure(
+            lambda *query: model.find_similar_products(*query), own)},
+        {'query': 'similar, sa catégorie, post-filtrage', **measure(
+            lambda *query: unsharded.find_similar_products(*query), own)},
+        {'query': 'similar, autre catégorie, fragment', **measure(
+            lambda *query: model.find_similar_products(*query), other)},
+        {'query': 'similar, autre catégorie, post-filtrage', **measure(
+            lambda *query: unsharded.find_similar_products(*query), other)},
+        {'query': 'user, fragment', **measure(lambda *query: model.recommend_for_user(*query), users)},
+        {'query': 'user, post-filtrage', **measure(
+            lambda *query: post_filtered_recommendations(model, *query), users)}
+    ]
+    print()
+    print(f'{args.queries} requêtes, limit = {args.limit}')
+    print_table(latency_rows, ['query', 'p50_ms', 'p95_ms', 'p99_ms', 'results'])
+
+
+if __name__ == '__main__':
+    main()
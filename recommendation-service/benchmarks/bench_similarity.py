@@ -0,0 +1,94 @@
+"""
+Benchmark de l'index de voisins produits
+
+Compare l'ancienne matrice dense produits × produits (cosine_similarity +
+argsort par requête) à l'index top-K (tableaux int32/float32 calculés par
+blocs) utilisé par `find_similar_products`: temps de construction, mémoire
+des structures, pic de RSS et latence p50/p99 d'une recherche.
+
+Usage:
+    python -m benchmarks.bench_similarity [--products 1000 5000 10000] [--k 50]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.common import (current_rss_mb, latency_percentiles, peak_rss_mb, print_table,
+                               run_isolated, timed)
+from benchmarks.synthetic import generate_interaction_columns
+
+DEFAULT_PRODUCTS = [1_000, 5_000, 10_000]
+
+
+def build_matrix(n_products):
+    from models.collaborative_filtering import build_user_item_matrix
+    
+    matrix, _, _ = build_user_item_matrix(*generate_interaction_columns(
+        n_products * 50, n_users=n_products * 5, n_products=n_products
+    ))
+    return matrix
+
+
+def measure(method, n_products, k, limit, n_queries):
+    """Mesurer une méthode dans le processus courant"""
+    from sklearn.metrics.pairwise import cosine_similarity
+    from models.neighbors import topk_neighbors
+    
+    matrix = build_matrix(n_products)
+    rss_before = current_rss_mb()
+    queries = np.random.default_rng(0).integers(0, matrix.shape[1], size=n_queries)
+    latencies = []
+    
+    if method == 'dense':
+        similarity, build_s = timed(cosine_similarity, matrix.T)
+        structure_mb = similarity.nbytes / (1024 * 1024)
+        for product_idx in queries:
+            start = time.perf_counter()
+            np.argsort(similarity[product_idx])[::-1][1:limit + 1]
+            latencies.append(time.perf_counter() - start)
+    else:
+        (indices, scores), build_s = timed(topk_neighbors, matrix.T, k)
+        structure_mb = (indices.nbytes + scores.nbytes) / (1024 * 1024)
+        for product_idx in queries:
+            start = time.perf_counter()
+            row = indices[product_idx]
+            row[row >= 0][:limit]
+            latencies.append(time.perf_counter() - start)
+    
+    return {
+        'method': method,
+        'products': int(matrix.shape[1]),
+        'build_s': build_s,
+        'structure_mb': structure_mb,
+        'peak_rss_delta_mb': peak_rss_mb() - rss_before,
+        **latency_percentiles(latencies)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, nargs='+', default=DEFAULT_PRODUCTS)
+    parser.add_argument('--k', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--worker', nargs=2, metavar=('METHOD', 'PRODUCTS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        method, n_products = args.worker
+        print(json.dumps(measure(method, int(n_products), args.k, args.limit, args.queries)))
+        return
+    
+    rows = []
+    for n_products in args.products:
+        for method in ['dense', 'topk']:
+            rows.append(run_isolated('benchmarks.bench_similarity', '--k', args.k, '--limit', args.limit,
+                                     '--queries', args.queries, '--worker', method, n_products))
+    
+    print_table(rows, ['method', 'products', 'build_s', 'structure_mb', 'peak_rss_delta_mb', 'p50_ms', 'p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
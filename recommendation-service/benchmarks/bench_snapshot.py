@@ -0,0 +1,117 @@
+"""
+Benchmark du démarrage à partir d'un instantané du modèle
+
+Mesure le temps de démarrage d'un worker (réentraînement complet contre
+chargement d'un instantané, avec ou sans projection mémoire) puis la mémoire
+de N workers qui chargent le même instantané et servent des requêtes: RSS et
+PSS (part proportionnelle des pages partagées) par worker.
+
+Usage:
+    python -m benchmarks.bench_snapshot [--interactions 1000000] [--workers 4]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import print_table, timed
+from benchmarks.synthetic import generate_database
+
+
+def serve_queries(model, n_queries):
+    """Exécuter des requêtes pour toucher les pages réellement utilisées au service"""
+    rng = np.random.default_rng(os.getpid())
+    user_ids = list(model.user_id_mapping)
+    product_ids = list(model.product_id_mapping)
+    for _ in range(n_queries):
+        model.recommend_for_user(user_ids[rng.integers(len(user_ids))])
+        model.find_similar_products(product_ids[rng.integers(len(product_ids))])
+
+
+def memory_usage_mb(pid):
+    """RSS et PSS d'un processus (Mo), lus dans /proc/<pid>/smaps_rollup"""
+    usage = {}
+    with open(f'/proc/{pid}/smaps_rollup') as smaps:
+        for line in smaps:
+            fields = line.split()
+            if fields[0] in ('Rss:', 'Pss:'):
+                usage[fields[0][:-1].lower() + '_mb'] = int(fields[1]) / 1024
+    return usage
+
+
+def run_worker(path, mode, n_queries):
+    """Processus worker: charger l'instantané, servir, signaler puis attendre"""
+    from models.collaborative_filtering import CollaborativeFilteringModel
+    
+    model, load_s = timed(CollaborativeFilteringModel.load, path, mmap=(mode == 'mmap'))
+    serve_queries(model, n_queries)
+    print(json.dumps({'load_s': load_s}), flush=True)
+    sys.stdin.read()
+
+
+def measure_workers(path, mode, n_workers, n_queries):
+    """Lancer `n_workers` workers sur le même instantané et mesurer leur mémoire"""
+    workers = [
+        subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.bench_snapshot', '--worker', path, mode, str(n_queries)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        for _ in range(n_workers)
+    ]
+    try:
+        load_times = [json.loads(worker.stdout.readline())['load_s'] for worker in workers]
+        usages = [memory_usage_mb(worker.pid) for worker in workers]
+    finally:
+        for worker in workers:
+            worker.stdin.close()
+            worker.wait()
+    
+    return {
+        'mode': f'{mode} x{n_workers}',
+        'startup_s': float(np.mean(load_times)),
+        'rss_per_worker_mb': float(np.mean([usage['rss_mb'] for usage in usages])),
+        'pss_per_worker_mb': float(np.mean([usage['pss_mb'] for usage in usages])),
+        'total_pss_mb': float(np.sum([usage['pss_mb'] for usage in usages]))
+    }
+
+
+def main():
+    from models.collaborative_filtering import CollaborativeFilteringModel
+    from models.snapshot import save_snapshot
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interactions', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--worker', nargs=3, metavar=('PATH', 'MODE', 'QUERIES'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        path, mode, n_queries = args.worker
+        run_worker(path, mode, int(n_queries))
+        return
+    
+    database = generate_database(args.interactions)
+    model = CollaborativeFilteringModel()
+    start = time.perf_counter()
+    model.train(database)
+    train_s = time.perf_counter() - start
+    
+    with tempfile.TemporaryDirectory() as root:
+        path, save_s = timed(save_snapshot, model, root)
+        rows = [{'mode': 'retrain (no snapshot)', 'startup_s': train_s}]
+        for mode in ['copy', 'mmap']:
+            rows.append(measure_workers(path, mode, args.workers, args.queries))
+    
+    print(f'{args.interactions} interactions, matrice {model.user_item_matrix.shape}, '
+          f'enregistrement {save_s:.3f}s')
+    print_table(rows, ['mode', 'startup_s', 'rss_per_worker_mb', 'pss_per_worker_mb', 'total_pss_mb'])
+
+
+if __name__ == '__main__':
+    main()
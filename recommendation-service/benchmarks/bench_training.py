@@ -0,0 +1,114 @@
+"""
+Benchmark de la construction de la matrice utilisateur-produit
+
+Compare le pipeline creux vectorisé de `CollaborativeFilteringModel.train` à
+l'ancien pipeline (liste de dictionnaires, DataFrame, matrice dense remplie
+avec iterrows) pour 10k, 100k et 1M interactions. Chaque mesure tourne dans
+un processus séparé pour que le pic de RSS soit significatif.
+
+Usage:
+    python -m benchmarks.bench_training [--sizes 10000 100000 1000000] [--legacy-max 100000]
+"""
+import argparse
+import json
+
+import numpy as np
+
+from benchmarks.common import current_rss_mb, peak_rss_mb, print_table, run_isolated, timed
+from benchmarks.synthetic import generate_interaction_documents
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def legacy_pipeline(interactions):
+    """Reproduction de l'ancien pipeline d'entraînement (matrice dense + iterrows)"""
+    import pandas as pd
+    
+    interactions_data = []
+    for interaction in interactions:
+        interaction_type = interaction['interactionType']
+        weight = 1.0
+        if interaction_type == 'cart':
+            weight = 3.0
+        elif interaction_type == 'purchase':
+            weight = 5.0
+        interactions_data.append({
+            'userId': str(interaction['userId']),
+            'productId': str(interaction['productId']),
+            'weight': weight
+        })
+    interactions_df = pd.DataFrame(interactions_data)
+    
+    unique_users = interactions_df['userId'].unique()
+    unique_products = interactions_df['productId'].unique()
+    user_id_mapping = {user_id: idx for idx, user_id in enumerate(unique_users)}
+    product_id_mapping = {product_id: idx for idx, product_id in enumerate(unique_products)}
+    
+    matrix = np.zeros((len(unique_users), len(unique_products)))
+    for _, row in interactions_df.iterrows():
+        matrix[user_id_mapping[row['userId']], product_id_mapping[row['productId']]] = row['weight']
+    return matrix
+
+
+def sparse_pipeline(interactions, aggregation):
+    """Pipeline actuel: colonnes, factorisation vectorisée et matrice CSR"""
+    from database import interaction_columns
+    from models.collaborative_filtering import build_user_item_matrix
+    
+    matrix, _, _ = build_user_item_matrix(*interaction_columns(interactions), aggregation=aggregation)
+    return matrix
+
+
+def measure(n_interactions, pipeline, aggregation):
+    """Mesurer un pipeline sur `n_interactions` interactions (dans le processus courant)"""
+    # Importer les dépendances avant la mesure pour ne pas compter leur coût
+    import pandas  # noqa: F401
+    import models.collaborative_filtering  # noqa: F401
+    
+    interactions = generate_interaction_documents(n_interactions)
+    rss_before = current_rss_mb()
+    
+    if pipeline == 'legacy':
+        matrix, duration = timed(legacy_pipeline, interactions)
+        matrix_mb = matrix.nbytes / (1024 * 1024)
+    else:
+        matrix, duration = timed(sparse_pipeline, interactions, aggregation)
+        matrix_mb = (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / (1024 * 1024)
+    
+    return {
+        'pipeline': pipeline,
+        'interactions': n_interactions,
+        'shape': f'{matrix.shape[0]}x{matrix.shape[1]}',
+        'train_s': duration,
+        'matrix_mb': matrix_mb,
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_delta_mb': peak_rss_mb() - rss_before
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--aggregation', choices=['max', 'sum'], default='max')
+    parser.add_argument('--legacy-max', type=int, default=100_000,
+                        help="Taille maximale pour l'ancien pipeline (matrice dense)")
+    parser.add_argument('--worker', nargs=2, metavar=('PIPELINE', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        pipeline, size = args.worker
+        print(json.dumps(measure(int(size), pipeline, args.aggregation)))
+        return
+    
+    rows = []
+    for size in args.sizes:
+        pipelines = ['sparse', 'legacy'] if size <= args.legacy_max else ['sparse']
+        for pipeline in pipelines:
+            rows.append(run_isolated('benchmarks.bench_training', '--aggregation', args.aggregation,
+                                     '--worker', pipeline, size))
+    
+    print_table(rows, ['pipeline', 'interactions', 'shape', 'train_s', 'matrix_mb', 'peak_rss_mb', 'peak_rss_delta_mb'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark mémoire / rappel des voisinages d'utilisateurs bornés
+
+Compare la recherche exacte à la demande (tous les utilisateurs de similarité
+positive) aux voisinages bornés à M utilisateurs, recherchés à la demande ou
+précalculés par blocs parallèles. Le rappel est la part des N recommandations
+exactes retrouvées; la mémoire inclut les vecteurs normalisés et les listes de
+voisins, à comparer aux U × U × 8 octets de l'ancienne matrice dense.
+
+Usage:
+    python -m benchmarks.bench_user_neighbors [--users 5000] [--neighbors 10 25 50 100]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import latency_percentiles, print_table
+from benchmarks.synthetic import generate_interaction_columns
+
+
+def build_model(user_item_matrix, **kwargs):
+    from models.collaborative_filtering import CollaborativeFilteringModel
+    from models.neighbors import l2_normalize_rows, topk_neighbors
+    
+    model = CollaborativeFilteringModel(**kwargs)
+    model.user_item_matrix = user_item_matrix
+    start = time.perf_counter()
+    model.user_vectors = l2_normalize_rows(user_item_matrix)
+    if model.precompute_user_neighbors:
+        model.user_neighbor_indices, model.user_neighbor_scores = topk_neighbors(
+            user_item_matrix, model.n_user_neighbors, n_jobs=model.n_jobs
+        )
+    return model, time.perf_counter() - start
+
+
+def model_memory_mb(model):
+    arrays = [model.user_vectors.data, model.user_vectors.indices, model.user_vectors.indptr]
+    if model.user_neighbor_indices is not None:
+        arrays += [model.user_neighbor_indices, model.user_neighbor_scores]
+    return sum(array.nbytes for array in arrays) / (1024 * 1024)
+
+
+def top_n(model, user_idx, limit):
+    from models.neighbors import select_top_k
+    
+    scores = model._predict_scores(user_idx)
+    indices, top_scores = select_top_k(scores[np.newaxis, :], limit)
+    return set(indices[0][top_scores[0] > 0].tolist())
+
+
+def main():
+    from models.collaborative_filtering import build_user_item_matrix
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--neighbors', type=int, nargs='+', default=[10, 25, 50, 100])
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--jobs', type=int, default=1)
+    args = parser.parse_args()
+    
+    user_item_matrix, _, _ = build_user_item_matrix(*generate_interaction_columns(
+        args.users * 10, n_users=args.users, n_products=max(100, args.users // 5)
+    ))
+    n_users = user_item_matrix.shape[0]
+    queries = np.random.default_rng(0).integers(0, n_users, size=args.queries)
+    
+    exact, build_s = build_model(user_item_matrix)
+    exact_results = {user_idx: top_n(exact, user_idx, args.limit) for user_idx in queries}
+    
+    configurations = [('exact', {})]
+    for n_neighbors in args.neighbors:
+        configurations.append((f'on-demand M={n_neighbors}', {'n_user_neighbors': n_neighbors}))
+        configurations.append((f'precomputed M={n_neighbors}', {
+            'n_user_neighbors': n_neighbors, 'precompute_user_neighbors': True, 'n_jobs': args.jobs
+        }))
+    
+    rows = [{
+        'method': 'dense U x U (legacy)',
+        'memory_mb': n_users * n_users * 8 / (1024 * 1024)
+    }]
+    for name, kwargs in configurations:
+        model, build_s = build_model(user_item_matrix, **kwargs)
+        latencies = []
+        recalls = []
+        for user_idx in queries:
+            start = time.perf_counter()
+            result = top_n(model, user_idx, args.limit)
+            latencies.append(time.perf_counter() - start)
+            if exact_results[user_idx]:
+                recalls.append(len(result & exact_results[user_idx]) / len(exact_results[user_idx]))
+        rows.append({
+            'method': name,
+            'build_s': build_s,
+            'memory_mb': model_memory_mb(model),
+            f'recall@{args.limit}': float(np.mean(recalls)),
+            **latency_percentiles(latencies)
+        })
+    
+    print(f'{n_users} utilisateurs, {user_item_matrix.shape[1]} produits, {user_item_matrix.nnz} interactions')
+    print_table(rows, ['method', 'build_s', 'memory_mb', f'recall@{args.limit}', 'p50_ms', 'p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
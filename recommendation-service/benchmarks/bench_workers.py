@@ -0,0 +1,74 @@
+"""
+Benchmark du débit HTTP par nombre de workers gunicorn
+
+Un modèle synthétique est entraîné et enregistré en instantané, puis le
+service est lancé avec gunicorn (gunicorn.conf.py: application préchargée,
+instantané projeté en mémoire) pour chaque nombre de workers. Des clients
+(processus séparés, connexions persistantes) interrogent
+/recommend/user/<id> pendant une durée fixe; le cache des résultats est
+désactivé pour mesurer le calcul. Pour chaque configuration: débit,
+latences et mémoire PSS cumulée des workers.
+
+Le débit ne peut pas dépasser le nombre de cœurs de la machine: sur une
+machine à un cœur, ajouter des workers ne fait qu'ajouter de la mémoire.
+
+Usage:
+    python -m benchmarks.bench_workers [--interactions 200000] [--workers 1 2 4] [--clients 8] [--duration 10]
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.bench_snapshot import memory_usage_mb
+from benchmarks.common import print_table
+from benchmarks.load import run_load, start_service
+from benchmarks.synthetic import generate_database
+
+
+def worker_pids(master_pid):
+    """PID des workers d'un maître gunicorn"""
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as children:
+        return [int(pid) for pid in children.read().split()]
+
+
+def measure(snapshot_root, n_workers, user_ids, n_clients, duration):
+    """Lancer gunicorn avec `n_workers` workers et mesurer débit, latences et mémoire"""
+    requests = [('user', 'GET', f'/recommend/user/{user_id}?limit=10', None) for user_id in user_ids]
+    with start_service(f'/recommend/user/{user_ids[0]}', MODEL_SNAPSHOT_DIR=snapshot_root,
+                       WEB_CONCURRENCY=str(n_workers), RESULT_CACHE_SIZE='0',
+                       MODEL_SNAPSHOT_POLL_SECONDS='0') as (url, server):
+        load = run_load(url, requests, n_clients, duration)
+        pids = worker_pids(server.pid)
+        return {
+            'workers': n_workers,
+            'requests_per_s': load['requests_per_s'],
+            'p50_ms': load['p50_ms'],
+            'p99_ms': load['p99_ms'],
+            'workers_pss_mb': sum(memory_usage_mb(pid)['pss_mb'] for pid in pids)
+        }
+
+
+def main():
+    from models.collaborative_filtering import CollaborativeFilteringModel
+    from models.snapshot import save_snapshot
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interactions', type=int, default=200_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+    
+    model = CollaborativeFilteringModel()
+    model.train(generate_database(args.interactions))
+    snapshot_root = tempfile.mkdtemp()
+    save_snapshot(model, snapshot_root)
+    user_ids = list(model.user_id_mapping)
+    
+    print(f'{os.cpu_count()} cœur(s), {len(user_ids)} utilisateurs, {args.clients} clients')
+    rows = [measure(snapshot_root, n_workers, user_ids, args.clients, args.duration) for n_workers in args.workers]
+    print_table(rows, ['workers', 'requests_per_s', 'p50_ms', 'p99_ms', 'workers_pss_mb'])
+
+
+if __name__ == '__main__':
+    main()
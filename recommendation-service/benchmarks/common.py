@@ -0,0 +1,134 @@
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+def current_rss_mb():
+    """Mémoire résidente actuelle du processus (Mo)"""
+    with open('/proc/self/statm') as statm:
+        resident_pages = int(statm.read().split()[1])
+    return resident_pages * resource.getpagesize() / (1024 * 1024)
+
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus depuis son démarrage (Mo)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def reset_peak_rss():
+    """
+    Remettre le pic de mémoire résidente au niveau actuel (Linux, /proc/self/clear_refs)
+    
+    Permet de mesurer le pic d'une étape sans compter les étapes précédentes
+    du même processus. Sans effet si le noyau ne le permet pas.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+
+def timed(function, *args, **kwargs):
+    """
+    Exécuter une fonction et mesurer sa durée
+    
+    Returns:
+        tuple: (résultat, durée en secondes)
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def latency_percentiles(latencies):
+    """
+    Résumer une liste de latences (secondes) en percentiles (millisecondes)
+    
+    Returns:
+        dict: Percentiles p50/p95/p99 et moyenne
+    """
+    latencies_ms = np.asarray(latencies, dtype=np.float64) * 1000
+    return {
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'mean_ms': float(latencies_ms.mean())
+    }
+
+
+def run_isolated(module, *args):
+    """
+    Lancer `python -m module args...` dans un processus séparé
+    
+    Chaque mesure de pic mémoire doit tourner dans un processus neuf: le pic
+    d'un processus ne redescend jamais. Le processus enfant doit écrire un
+    objet JSON sur sa dernière ligne de sortie.
+    
+    Returns:
+        dict: Résultat JSON du processus enfant
+    """
+    completed = subprocess.run(
+        [sys.executable, '-m', module, *map(str, args)],
+        check=True,
+        capture_output=True,
+        text=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_revision():
+    """Commit courant du dépôt (None hors d'un dépôt git)"""
+    try:
+        completed = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], check=True, capture_output=True, text=True)
+        return completed.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(results, path=None):
+    """
+    Enregistrer des résultats de benchmark en JSON, avec le contexte de la mesure
+    
+    Le commit, la machine et les versions sont ajoutés pour comparer deux
+    exécutions (python -m benchmarks.suite compare).
+    
+    Args:
+        results (dict): Résultats par benchmark
+        path (str): Fichier de sortie (None: sortie standard)
+    """
+    document = {
+        'commit': git_revision(),
+        'createdAt': datetime.datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'machine': {'python': platform.python_version(), 'numpy': np.__version__, 'cpus': os.cpu_count(),
+                    'platform': platform.platform()},
+        'results': results
+    }
+    if path is None:
+        print(json.dumps(document, indent=2))
+        return
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(document, output, indent=2)
+
+
+def print_table(rows, columns):
+    """Afficher une liste de dictionnaires sous forme de tableau"""
+    widths = [max(len(column), *(len(_format(row.get(column))) for row in rows)) for column in columns]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(_format(row.get(column)).ljust(width) for column, width in zip(columns, widths)))
+
+
+def _format(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f'{value:.3f}'
+    return str(value)
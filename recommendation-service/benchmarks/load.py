@@ -0,0 +1,138 @@
+"""
+Générateur de charge HTTP pour les endpoints du service
+
+Des clients (processus séparés, une connexion persistante chacun) envoient
+des requêtes tirées au hasard dans une liste pendant une durée fixe. Le
+service peut être lancé localement avec gunicorn (`start_service`) ou
+désigné par son adresse.
+"""
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from benchmarks.common import latency_percentiles
+
+SERVICE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url, path, timeout=120):
+    """Attendre que le service réponde 200 sur `path`"""
+    address = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(address.hostname, address.port, timeout=5)
+            connection.request('GET', path)
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'le service ne répond pas sur {url}')
+
+
+@contextmanager
+def start_service(ready_path, **environment):
+    """
+    Lancer le service avec gunicorn (gunicorn.conf.py) sur un port libre
+    
+    Args:
+        ready_path (str): Chemin interrogé pour savoir si le service est prêt
+        **environment: Variables d'environnement du service (MODEL_SNAPSHOT_DIR, WEB_CONCURRENCY...)
+    
+    Yields:
+        tuple: (URL du service, processus maître gunicorn)
+    """
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=SERVICE_DIRECTORY, env=dict(os.environ, PORT=str(port), **environment),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_ready(url, ready_path)
+        yield url, server
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run_client(arguments):
+    """
+    Processus client: requêtes sur une connexion persistante jusqu'à la fin de la durée
+    
+    Returns:
+        list: (nom de la requête, latence en secondes, statut HTTP) de chaque requête
+    """
+    url, requests, duration, seed = arguments
+    address = urlsplit(url)
+    rng = np.random.default_rng(seed)
+    connection = http.client.HTTPConnection(address.hostname, address.port, timeout=30)
+    results = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        name, method, path, body = requests[rng.integers(len(requests))]
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=None if body is None else json.dumps(body),
+                               headers={'Content-Type': 'application/json'} if body is not None else {})
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except OSError:
+            connection.close()
+            status = 0
+        results.append((name, time.perf_counter() - start, status))
+    return results
+
+
+def run_load(url, requests, n_clients=8, duration=10.0):
+    """
+    Charger le service avec `n_clients` clients pendant `duration` secondes
+    
+    Args:
+        url (str): Adresse du service (http://hôte:port)
+        requests (list): Requêtes (nom, méthode, chemin, corps JSON ou None), tirées au hasard
+        n_clients (int): Nombre de clients simultanés
+        duration (float): Durée de la charge (secondes)
+    
+    Returns:
+        dict: Débit, taux d'erreurs et percentiles de latence, au total et par nom de requête
+    """
+    with multiprocessing.Pool(n_clients) as pool:
+        start = time.perf_counter()
+        clients = pool.map(run_client, [(url, requests, duration, seed) for seed in range(n_clients)])
+        elapsed = time.perf_counter() - start
+    
+    results = [result for client in clients for result in client]
+    summary = {'clients': n_clients, 'duration_s': elapsed, **summarize(results, elapsed)}
+    summary['endpoints'] = {
+        name: summarize([result for result in results if result[0] == name], elapsed)
+        for name in sorted({result[0] for result in results})
+    }
+    return summary
+
+
+def summarize(results, elapsed):
+    errors = sum(1 for _, _, status in results if status != 200)
+    return {
+        'requests': len(results),
+        'requests_per_s': len(results) / elapsed,
+        'error_rate': errors / len(results) if results else 0.0,
+        **(latency_percentiles([latency for _, latency, _ in results]) if results else {})
+    }
@@ -0,0 +1,235 @@
+"""
+Suite de benchmarks du service, résultats en JSON pour comparer des commits
+
+Trois commandes, sur des données synthétiques en loi de puissance écrites
+dans mongomock (par défaut) ou dans un mongod local (--uri):
+
+    micro    Entraînement (durée, pic de RSS), recommend_for_user et
+             find_similar_products (percentiles de latence, débit)
+    http     Charge HTTP sur /recommend/user, /recommend/similar et
+             /recommend/batch: service lancé avec gunicorn sur un instantané
+             du modèle entraîné, ou service existant (--url, avec --uri)
+    compare  Comparer deux fichiers de résultats et signaler les régressions
+
+Le modèle est configuré par les mêmes variables d'environnement que le
+service (RECOMMENDATION_MODEL, RECOMMENDATION_ANN...).
+
+Usage:
+    python -m benchmarks.suite micro [--interactions 100000] [--users N] [--products N] [--output micro.json]
+    python -m benchmarks.suite http [--workers 2] [--clients 8] [--duration 10] [--output http.json]
+    python -m benchmarks.suite compare base.json new.json [--threshold 0.2]
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import (current_rss_mb, latency_percentiles, peak_rss_mb, print_table, reset_peak_rss,
+                               timed, write_results)
+from benchmarks.load import run_load, start_service, wait_until_ready
+from benchmarks.synthetic import connect_database, seed_database
+
+# Suffixes des métriques dont une hausse est une amélioration (les autres: une baisse)
+HIGHER_IS_BETTER = ('_per_s', 'recall', 'hit_rate')
+
+# Paramètres de la mesure, exclus de la comparaison
+CONTEXT_KEYS = {'dataset', 'settings', 'calls', 'requests', 'clients', 'workers', 'duration_s'}
+
+
+def sample_ids(db, n_samples, seed=0):
+    """
+    IDs d'utilisateurs et de produits tirés parmi les interactions
+    
+    Chaque ID est tiré avec une probabilité proportionnelle à son nombre
+    d'interactions: les requêtes suivent la même loi de puissance que l'activité.
+    """
+    rng = np.random.default_rng(seed)
+    interactions = list(db.productinteractions.find({}, {'userId': 1, 'productId': 1}))
+    rows = rng.integers(len(interactions), size=n_samples)
+    return ([str(interactions[row]['userId']) for row in rows],
+            [str(interactions[row]['productId']) for row in rows])
+
+
+def measure_calls(function, ids):
+    """Latences et débit d'appels successifs de `function` sur chaque ID"""
+    reset_peak_rss()
+    rss_before = current_rss_mb()
+    latencies = []
+    for entry_id in ids:
+        start = time.perf_counter()
+        function(entry_id)
+        latencies.append(time.perf_counter() - start)
+    return {
+        'calls': len(ids),
+        'calls_per_s': len(ids) / sum(latencies),
+        **latency_percentiles(latencies),
+        'peak_rss_delta_mb': max(0.0, peak_rss_mb() - rss_before)
+    }
+
+
+def train_model(db):
+    """Entraîner le modèle configuré par l'environnement et mesurer l'entraînement"""
+    from config import model_settings
+    from models import create_model
+    
+    settings = model_settings()
+    model = create_model(**settings)
+    reset_peak_rss()
+    rss_before = current_rss_mb()
+    trained, train_s = timed(model.train, db)
+    if not trained:
+        raise RuntimeError("Erreur lors de l'entraînement du modèle")
+    return model, {
+        'settings': settings,
+        'train_s': train_s,
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_delta_mb': peak_rss_mb() - rss_before
+    }
+
+
+def seed(args):
+    db = connect_database(args.uri)
+    dataset = seed_database(db, args.interactions, n_users=args.users, n_products=args.products)
+    return db, dataset
+
+
+def run_micro(args):
+    db, dataset = seed(args)
+    model, training = train_model(db)
+    user_ids, product_ids = sample_ids(db, args.queries)
+    results = {
+        'dataset': dataset,
+        'train': training,
+        'recommend_for_user': measure_calls(lambda user_id: model.recommend_for_user(user_id, args.limit), user_ids),
+        'find_similar_products': measure_calls(
+            lambda product_id: model.find_similar_products(product_id, args.limit), product_ids
+        )
+    }
+    print_table([{'benchmark': name, **values} for name, values in results.items() if name != 'dataset'],
+                ['benchmark', 'train_s', 'calls_per_s', 'p50_ms', 'p99_ms', 'peak_rss_delta_mb'])
+    return results
+
+
+def http_requests(user_ids, product_ids, limit, batch_size=10):
+    """Requêtes de la charge HTTP: autant de requêtes unitaires par utilisateur et par produit, et des lots"""
+    requests = [('user', 'GET', f'/recommend/user/{user_id}?limit={limit}', None) for user_id in user_ids]
+    requests += [('similar', 'GET', f'/recommend/similar/{product_id}?limit={limit}', None)
+                 for product_id in product_ids]
+    requests += [
+        ('batch', 'POST', '/recommend/batch', {'users': user_ids[start:start + batch_size],
+                                               'products': product_ids[start:start + batch_size], 'limit': limit})
+        for start in range(0, len(user_ids), batch_size * 10)
+    ]
+    return requests
+
+
+def run_http(args):
+    from models.snapshot import save_snapshot
+    
+    db, dataset = seed(args)
+    user_ids, product_ids = sample_ids(db, args.queries)
+    requests = http_requests(user_ids, product_ids, args.limit)
+    results = {'dataset': dataset}
+    
+    if args.url:
+        wait_until_ready(args.url, '/health')
+        results['load'] = run_load(args.url, requests, args.clients, args.duration)
+    else:
+        model, results['train'] = train_model(db)
+        snapshot_root = tempfile.mkdtemp()
+        save_snapshot(model, snapshot_root)
+        with start_service(f'/recommend/user/{user_ids[0]}', MODEL_SNAPSHOT_DIR=snapshot_root,
+                           WEB_CONCURRENCY=str(args.workers), RESULT_CACHE_SIZE=str(args.cache_size),
+                           MODEL_SNAPSHOT_POLL_SECONDS='0') as (url, _):
+            results['load'] = run_load(url, requests, args.clients, args.duration)
+        results['load']['workers'] = args.workers
+    
+    print_table([{'endpoint': name, **values} for name, values in
+                 [('total', results['load']), *results['load']['endpoints'].items()]],
+                ['endpoint', 'requests', 'requests_per_s', 'error_rate', 'p50_ms', 'p95_ms', 'p99_ms'])
+    return results
+
+
+def flatten(values, prefix=''):
+    """Métriques numériques d'un document de résultats, par chemin ('train.train_s')"""
+    metrics = {}
+    for key, value in values.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f'{path}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[path] = value
+    return metrics
+
+
+def run_compare(args):
+    """
+    Comparer deux exécutions
+    
+    Returns:
+        int: Code de sortie, 1 si une métrique régresse de plus de `threshold`
+    """
+    with open(args.base, encoding='utf-8') as base_file, open(args.new, encoding='utf-8') as new_file:
+        base, new = json.load(base_file), json.load(new_file)
+    base_metrics, new_metrics = flatten(base['results']), flatten(new['results'])
+    
+    rows, regressions = [], 0
+    for path in sorted(base_metrics.keys() & new_metrics.keys()):
+        keys = path.split('.')
+        if CONTEXT_KEYS & set(keys) or not base_metrics[path]:
+            continue
+        change = new_metrics[path] / base_metrics[path] - 1
+        worse = -change if path.endswith(HIGHER_IS_BETTER) else change
+        regression = worse > args.threshold
+        regressions += regression
+        rows.append({'metric': path, 'base': base_metrics[path], 'new': new_metrics[path],
+                     'change': f'{change:+.1%}', 'regression': 'oui' if regression else ''})
+    
+    print(f"{base.get('commit')} -> {new.get('commit')}")
+    print_table(rows, ['metric', 'base', 'new', 'change', 'regression'])
+    return 1 if regressions else 0
+
+
+def add_dataset_arguments(parser):
+    parser.add_argument('--interactions', type=int, default=100_000)
+    parser.add_argument('--users', type=int, help='Nombre d\'utilisateurs (par défaut interactions / 10)')
+    parser.add_argument('--products', type=int, help='Nombre de produits (par défaut interactions / 50)')
+    parser.add_argument('--uri', help='URI d\'un mongod local (mongomock par défaut)')
+    parser.add_argument('--queries', type=int, default=1000, help='Nombre d\'IDs interrogés')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--output', help='Fichier JSON des résultats (par défaut: sortie standard)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    micro = commands.add_parser('micro', help='Entraînement et appels du modèle')
+    add_dataset_arguments(micro)
+    
+    http = commands.add_parser('http', help='Charge HTTP sur les endpoints')
+    add_dataset_arguments(http)
+    http.add_argument('--url', help='Service existant (par défaut: gunicorn lancé sur un instantané)')
+    http.add_argument('--workers', type=int, default=2)
+    http.add_argument('--clients', type=int, default=8)
+    http.add_argument('--duration', type=float, default=10.0)
+    http.add_argument('--cache-size', type=int, default=0, help='RESULT_CACHE_SIZE du service lancé')
+    
+    compare = commands.add_parser('compare', help='Comparer deux fichiers de résultats')
+    compare.add_argument('base')
+    compare.add_argument('new')
+    compare.add_argument('--threshold', type=float, default=0.2, help='Dégradation relative tolérée')
+    
+    args = parser.parse_args()
+    if args.command == 'compare':
+        sys.exit(run_compare(args))
+    
+    results = run_micro(args) if args.command == 'micro' else run_http(args)
+    write_results({args.command: results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
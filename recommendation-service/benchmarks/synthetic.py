@@ -0,0 +1,171 @@
+import datetime
+
+import numpy as np
+
+INTERACTION_TYPES = np.array(['view', 'cart', 'purchase'], dtype=object)
+INTERACTION_TYPE_PROBABILITIES = [0.80, 0.15, 0.05]
+
+
+def object_ids(prefix, count):
+    """Générer `count` identifiants de 24 caractères hexadécimaux, comme des ObjectId"""
+    return np.array([f'{prefix:02x}{idx:022x}' for idx in range(count)], dtype=object)
+
+
+def power_law_probabilities(count, exponent, rng):
+    """
+    Probabilités de tirage suivant une loi de puissance (rang^-exponent)
+    
+    Les rangs sont mélangés pour que la popularité ne suive pas l'ordre des IDs.
+    """
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def generate_interaction_columns(n_interactions, n_users=None, n_products=None,
+                                 user_exponent=0.8, product_exponent=1.0, seed=42):
+    """
+    Générer des interactions synthétiques sous forme de colonnes
+    
+    Args:
+        n_interactions (int): Nombre d'interactions
+        n_users (int): Nombre d'utilisateurs (par défaut n_interactions / 10)
+        n_products (int): Nombre de produits (par défaut n_interactions / 50, au moins 100)
+        user_exponent (float): Exposant de la loi de puissance de l'activité des utilisateurs
+        product_exponent (float): Exposant de la loi de puissance de la popularité des produits
+        seed (int): Graine aléatoire
+        
+    Returns:
+        tuple: Tableaux (userId, productId, interactionType)
+    """
+    rng = np.random.default_rng(seed)
+    n_users = n_users or max(10, n_interactions // 10)
+    n_products = n_products or max(100, n_interactions // 50)
+    
+    users = object_ids(1, n_users)
+    products = object_ids(2, n_products)
+    
+    user_codes = rng.choice(n_users, size=n_interactions, p=power_law_probabilities(n_users, user_exponent, rng))
+    product_codes = rng.choice(n_products, size=n_interactions, p=power_law_probabilities(n_products, product_exponent, rng))
+    type_codes = rng.choice(len(INTERACTION_TYPES), size=n_interactions, p=INTERACTION_TYPE_PROBABILITIES)
+    
+    return users[user_codes], products[product_codes], INTERACTION_TYPES[type_codes]
+
+
+def generate_interaction_documents(n_interactions, **kwargs):
+    """Générer des interactions synthétiques sous forme de documents MongoDB"""
+    user_ids, product_ids, interaction_types = generate_interaction_columns(n_interactions, **kwargs)
+    return [
+        {'userId': user_id, 'productId': product_id, 'interactionType': interaction_type}
+        for user_id, product_id, interaction_type in zip(user_ids, product_ids, interaction_types)
+    ]
+
+
+def generate_product_documents(product_ids, n_categories=20, collected_ratio=0.05, seed=42):
+    """Générer les documents produits correspondant à des IDs de produits"""
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            '_id': product_id,
+            'title': f'Produit {idx}',
+            'image': f'https://example.com/images/{product_id}.png',
+            'category': f'category{rng.integers(n_categories)}',
+            'price': float(rng.integers(1, 500)),
+            'isCollected': bool(rng.random() < collected_ratio)
+        }
+        for idx, product_id in enumerate(product_ids)
+    ]
+
+
+class InMemoryCollection:
+    """Collection MongoDB minimale en mémoire (find sans filtre)"""
+    
+    def __init__(self, documents):
+        self.documents = documents
+    
+    def find(self, *args, **kwargs):
+        return iter(self.documents)
+    
+    def find_one(self, *args, **kwargs):
+        # Sans tri ni _id: pas de filigrane, les entraînements sont complets
+        return None
+
+
+class InMemoryDatabase:
+    """Base de données en mémoire exposant les collections lues par l'entraînement"""
+    
+    def __init__(self, interactions, products):
+        self.productinteractions = InMemoryCollection(interactions)
+        self.productstree = InMemoryCollection(products)
+
+
+def generate_database(n_interactions, **kwargs):
+    """
+    Générer une base en mémoire d'interactions et de produits synthétiques
+    
+    Args:
+        n_interactions (int): Nombre d'interactions
+        **kwargs: Paramètres de generate_interaction_columns
+        
+    Returns:
+        InMemoryDatabase: Base utilisable par CollaborativeFilteringModel.train
+    """
+    interactions = generate_interaction_documents(n_interactions, **kwargs)
+    product_ids = sorted({interaction['productId'] for interaction in interactions})
+    return InMemoryDatabase(interactions, generate_product_documents(product_ids))
+
+
+def seed_database(db, n_interactions, max_age_days=90, seed=0, **kwargs):
+    """
+    Remplir une base MongoDB (mongomock ou mongod) d'interactions et de produits synthétiques
+    
+    Les collections existantes sont remplacées. Les interactions sont datées
+    uniformément sur les `max_age_days` derniers jours; les produits portent
+    la date d'insertion dans updatedAt, comme les documents Mongoose.
+    
+    Args:
+        db: Base MongoDB
+        n_interactions (int): Nombre d'interactions
+        max_age_days (float): Âge maximum des interactions (jours)
+        seed (int): Graine aléatoire des dates
+        **kwargs: Paramètres de generate_interaction_columns (n_users, n_products, exposants)
+        
+    Returns:
+        dict: Nombre d'interactions, d'utilisateurs et de produits insérés
+    """
+    rng = np.random.default_rng(seed)
+    now = datetime.datetime.utcnow()
+    interactions = generate_interaction_documents(n_interactions, **kwargs)
+    for interaction, age in zip(interactions, rng.uniform(0, max_age_days, size=len(interactions))):
+        interaction['timestamp'] = now - datetime.timedelta(days=float(age))
+    product_ids = sorted({interaction['productId'] for interaction in interactions})
+    
+    db.productinteractions.drop()
+    db.productstree.drop()
+    db.productinteractions.insert_many(interactions)
+    products = generate_product_documents(product_ids)
+    for product in products:
+        product['updatedAt'] = now
+    db.productstree.insert_many(products)
+    db.productinteractions.create_index('timestamp')
+    return {
+        'interactions': len(interactions),
+        'users': len({interaction['userId'] for interaction in interactions}),
+        'products': len(product_ids)
+    }
+
+
+def connect_database(uri=None, name='bench'):
+    """
+    Base de benchmark: mongomock par défaut, ou un mongod local avec `uri`
+    
+    Args:
+        uri (str): URI MongoDB (None: base mongomock en mémoire)
+        name (str): Nom de la base si l'URI n'en précise pas
+    """
+    if uri:
+        from pymongo import MongoClient
+        return MongoClient(uri).get_default_database(name)
+    
+    import mongomock
+    return mongomock.MongoClient()[name]
@@ -0,0 +1,305 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    Cache LRU à durée de vie limitée des résultats de recommandation
+    
+    Les résultats sont des listes classées: une entrée calculée pour une
+    limite donnée sert toutes les requêtes de limite inférieure ou égale. Les
+    clés incluent la révision du modèle, si bien qu'un nouveau modèle ne lit
+    jamais les résultats d'un ancien. Un magasin partagé (`SqliteResultStore`)
+    peut compléter le cache local pour que plusieurs workers partagent leurs
+    résultats.
+    """
+    
+    def __init__(self, max_entries=10000, ttl=300.0, shared=None, clock=time.monotonic):
+        """
+        Args:
+            max_entries (int): Nombre maximal d'entrées locales (0 désactive le cache)
+            ttl (float): Durée de vie d'une entrée en secondes (None: illimitée)
+            shared (SqliteResultStore): Magasin partagé entre workers, facultatif
+            clock (callable): Horloge en secondes, remplaçable pour les tests
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'shared_hits': 0}
+    
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+    
+    def get(self, key, limit):
+        """
+        Lire les `limit` premiers résultats d'une entrée
+        
+        Args:
+            key (str): Clé de l'entrée
+            limit (int): Nombre de résultats demandés
+        
+        Returns:
+            list: Résultats, ou None si l'entrée est absente, expirée ou
+            calculée pour une limite inférieure
+        """
+        if not self.enabled:
+            return None
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and entry[0] <= self._clock():
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                entry = None
+            if entry is not None and entry[1] >= limit:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[2][:limit]
+        
+        if self.shared is not None:
+            shared_entry = self.shared.get(key)
+            if shared_entry is not None and shared_entry[0] >= limit:
+                self._store(key, *shared_entry)
+                with self._lock:
+                    self._stats['shared_hits'] += 1
+                return shared_entry[1][:limit]
+        
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+    
+    def set(self, key, limit, results):
+        """
+        Enregistrer les résultats calculés pour une limite
+        
+        Args:
+            key (str): Clé de l'entrée
+            limit (int): Limite utilisée pour calculer les résultats
+            results (list): Résultats classés
+        """
+        if not self.enabled:
+            return
+        
+        self._store(key, limit, results)
+        if self.shared is not None:
+            self.shared.set(key, limit, results, self.ttl)
+    
+    def _store(self, key, limit, results):
+        expires_at = self._clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, limit, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+    
+    def invalidate(self, key):
+        """Supprimer une entrée du cache local et du magasin partagé"""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(key)
+    
+    def invalidate_with_variants(self, keys):
+        """
+        Supprimer des entrées et toutes leurs variantes (clés `<clé>:...`, ex: par catégorie)
+        
+        Le cache local est parcouru une seule fois pour toutes les clés.
+        
+        Args:
+            keys (iterable): Clés des entrées
+        """
+        keys = set(keys)
+        if not keys:
+            return
+        prefixes = tuple(f'{key}:' for key in keys)
+        with self._lock:
+            for key in [key for key in self._entries if key in keys or key.startswith(prefixes)]:
+                del self._entries[key]
+        if self.shared is not None:
+            self.shared.delete_with_variants(keys)
+    
+    def clear(self):
+        """Vider le cache local"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """
+        Compteurs du cache
+        
+        Returns:
+            dict: Succès, échecs, évictions, expirations et taille courante
+        """
+        with self._lock:
+            return {**self._stats, 'size': len(self._entries), 'maxEntries': self.max_entries}
+
+
+class SqliteResultStore:
+    """
+    Magasin de résultats partagé entre les workers d'une même machine
+    
+    Les entrées sont stockées en JSON dans une base SQLite locale (mode WAL),
+    avec leur date d'expiration. Chaque thread utilise sa propre connexion.
+    
+    Après `max_errors` erreurs SQLite consécutives, le magasin est désactivé
+    pendant `retry_after` secondes: le cache local sert seul, sans une erreur
+    journalisée par requête. Des invalidations ont pu être perdues entre-temps:
+    le magasin est vidé avant d'être réactivé.
+    """
+    
+    def __init__(self, path, timeout=1.0, max_errors=5, retry_after=60.0):
+        """
+        Args:
+            path (str): Chemin du fichier SQLite
+            timeout (float): Attente maximale d'un verrou d'écriture, en secondes
+            max_errors (int): Erreurs consécutives avant la désactivation du magasin
+            retry_after (float): Durée de la désactivation, en secondes
+        """
+        self.path = path
+        self.timeout = timeout
+        self.max_errors = max_errors
+        self.retry_after = retry_after
+        self._local = threading.local()
+        self._state_lock = threading.Lock()
+        self._errors = 0
+        self._disabled_until = None
+        
+        # Une connexion SQLite ne doit pas être utilisée de part et d'autre d'un fork
+        os.register_at_fork(after_in_child=self._reset_connections)
+        connection = self._connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS results '
+            '(key TEXT PRIMARY KEY, expires_at REAL, result_limit INTEGER, results TEXT)'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS results_expires_at ON results (expires_at)')
+        connection.commit()
+    
+    def _reset_connections(self):
+        self._local = threading.local()
+    
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+    
+    @property
+    def disabled(self):
+        """True si le magasin est désactivé après des erreurs répétées"""
+        return self._disabled_until is not None
+    
+    def _available(self):
+        """Vérifier que le magasin est actif, en le vidant à la fin d'une désactivation"""
+        if self._disabled_until is None:
+            return True
+        if time.monotonic() < self._disabled_until:
+            return False
+        try:
+            connection = self._connection()
+            connection.execute('DELETE FROM results')
+            connection.commit()
+        except sqlite3.Error as e:
+            self._failed("la réactivation", e)
+            return False
+        with self._state_lock:
+            if self._disabled_until is not None:
+                self._disabled_until = None
+                self._errors = 0
+                logger.warning("Cache partagé %s réactivé", self.path)
+        return True
+    
+    def _failed(self, operation, error):
+        """Compter une erreur SQLite et désactiver le magasin si elles se répètent"""
+        with self._state_lock:
+            self._errors += 1
+            if self._disabled_until is None and self._errors < self.max_errors:
+                logger.warning("Erreur lors de %s du cache partagé: %s", operation, error)
+                return
+            self._disabled_until = time.monotonic() + self.retry_after
+        logger.warning("Cache partagé %s désactivé pendant %s s après %d erreurs consécutives (%s: %s)",
+                       self.path, self.retry_after, self._errors, operation, error)
+    
+    def _succeeded(self):
+        if self._errors:
+            with self._state_lock:
+                self._errors = 0
+    
+    def get(self, key):
+        """
+        Lire une entrée non expirée
+        
+        Returns:
+            tuple: (limite, résultats), ou None
+        """
+        if not self._available():
+            return None
+        try:
+            row = self._connection().execute(
+                'SELECT result_limit, results FROM results WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._failed("la lecture", e)
+            return None
+        self._succeeded()
+        return (row[0], json.loads(row[1])) if row is not None else None
+    
+    def set(self, key, limit, results, ttl):
+        """Enregistrer une entrée, et supprimer au passage les entrées expirées"""
+        if not self._available():
+            return
+        now = time.time()
+        try:
+            connection = self._connection()
+            connection.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                (key, now + ttl if ttl is not None else None, limit, json.dumps(results))
+            )
+            connection.execute('DELETE FROM results WHERE expires_at <= ?', (now,))
+            connection.commit()
+        except sqlite3.Error as e:
+            self._failed("l'écriture", e)
+            return
+        self._succeeded()
+    
+    def delete(self, key):
+        """Supprimer une entrée"""
+        if not self._available():
+            return
+        try:
+            connection = self._connection()
+            connection.execute('DELETE FROM results WHERE key = ?', (key,))
+            connection.commit()
+        except sqlite3.Error as e:
+            self._failed("l'écriture", e)
+            return
+        self._succeeded()
+    
+    def delete_with_variants(self, keys):
+        """Supprimer des entrées et leurs variantes `<clé>:...` (intervalle de la clé primaire)"""
+        if not self._available():
+            return
+        try:
+            connection = self._connection()
+            # ';' suit ':' dans l'ordre des caractères: [clé:, clé;) contient toutes les variantes
+            connection.executemany('DELETE FROM results WHERE key = ? OR (key >= ? AND key < ?)',
+                                   [(key, f'{key}:', f'{key};') for key in keys])
+            connection.commit()
+        except sqlite3.Error as e:
+            self._failed("l'écriture", e)
+            return
+        self._succeeded()
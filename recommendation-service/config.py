@@ -0,0 +1,259 @@
+import os
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+
+def env_int(name, default=None):
+    """
+    Lire une variable d'environnement entière
+    
+    Args:
+        name (str): Nom de la variable
+        default (int): Valeur si la variable est absente ou vide
+        
+    Returns:
+        int: Valeur de la variable
+    """
+    value = os.environ.get(name, '')
+    return int(value) if value.strip() else default
+
+
+def env_bool(name, default=False):
+    """
+    Lire une variable d'environnement booléenne ('1', 'true', 'yes', 'on')
+    
+    Args:
+        name (str): Nom de la variable
+        default (bool): Valeur si la variable est absente ou vide
+        
+    Returns:
+        bool: Valeur de la variable
+    """
+    value = os.environ.get(name, '')
+    return value.strip().lower() in ('1', 'true', 'yes', 'on') if value.strip() else default
+
+
+def env_float_mapping(name):
+    """
+    Lire une variable d'environnement de la forme 'clé=valeur,clé=valeur' (valeurs décimales)
+    
+    Args:
+        name (str): Nom de la variable
+        
+    Returns:
+        dict: Valeur de chaque clé, ou None si la variable est absente ou vide
+    """
+    value = os.environ.get(name, '')
+    if not value.strip():
+        return None
+    mapping = {}
+    for item in value.split(','):
+        key, _, item_value = item.partition('=')
+        mapping[key.strip()] = float(item_value)
+    return mapping
+
+
+def model_settings():
+    """
+    Paramètres du modèle de recommandation lus depuis l'environnement
+    
+    Returns:
+        dict: Arguments de models.create_model: nom du modèle
+        (RECOMMENDATION_MODEL, 'cosine' ou 'als') et paramètres de son constructeur
+    """
+    model = os.environ.get('RECOMMENDATION_MODEL', 'cosine')
+    settings = {
+        'model': model,
+        'aggregation': os.environ.get('RECOMMENDATION_AGGREGATION', 'max'),
+        'n_item_neighbors': env_int('RECOMMENDATION_ITEM_NEIGHBORS', 50),
+        'n_jobs': env_int('RECOMMENDATION_JOBS', 1),
+        'batch_size': env_int('INGESTION_BATCH_SIZE', 10000),
+        'aggregate_in_database': env_bool('INGESTION_AGGREGATE_IN_DATABASE'),
+        'popularity_half_life_days': env_float('POPULARITY_HALF_LIFE_DAYS', 30.0),
+        'interaction_half_lives': env_float_mapping('INTERACTION_HALF_LIFE_DAYS'),
+        'category_shards': env_bool('CATEGORY_SHARDS'),
+        'shard_jobs': env_int('CATEGORY_SHARD_JOBS', 1)
+    }
+    if model == 'als':
+        settings.update({
+            'factors': env_int('ALS_FACTORS', 64),
+            'regularization': env_float('ALS_REGULARIZATION', 100.0),
+            'alpha': env_float('ALS_ALPHA', 1.0),
+            'iterations': env_int('ALS_ITERATIONS', 15)
+        })
+    else:
+        settings.update({
+            'n_user_neighbors': env_int('RECOMMENDATION_USER_NEIGHBORS'),
+            'precompute_user_neighbors': env_bool('RECOMMENDATION_PRECOMPUTE_USER_NEIGHBORS')
+        })
+    
+    ann = os.environ.get('RECOMMENDATION_ANN', '').strip()
+    if ann:
+        settings.update({'ann': ann, 'ann_params': ann_settings(ann)})
+    return settings
+
+
+def ann_settings(ann):
+    """
+    Paramètres de l'index approché (models.ann) lus depuis l'environnement
+    
+    Args:
+        ann (str): Type d'index ('brute', 'lsh' ou 'hnsw')
+        
+    Returns:
+        dict: Paramètres du constructeur de l'index
+    """
+    if ann == 'lsh':
+        return {
+            'n_tables': env_int('ANN_TABLES', 16),
+            'n_bits': env_int('ANN_BITS', 8),
+            'n_probes': env_int('ANN_PROBES', 4)
+        }
+    if ann == 'hnsw':
+        return {
+            'm': env_int('HNSW_M', 16),
+            'ef_construction': env_int('HNSW_EF_CONSTRUCTION', 200),
+            'ef': env_int('HNSW_EF', 50)
+        }
+    return {}
+
+
+def snapshot_settings():
+    """
+    Emplacement et rétention des instantanés du modèle
+    
+    Returns:
+        dict: Répertoire des instantanés, nombre d'instantanés conservés et délai
+        entre deux recherches d'un instantané publié par un autre worker
+        (None: pas de recherche)
+    """
+    return {
+        'root': os.environ.get('MODEL_SNAPSHOT_DIR', 'snapshots'),
+        'keep': env_int('MODEL_SNAPSHOT_KEEP', 3),
+        'poll_interval': env_float('MODEL_SNAPSHOT_POLL_SECONDS', 10.0)
+    }
+
+
+def env_float(name, default=None):
+    """
+    Lire une variable d'environnement décimale
+    
+    Args:
+        name (str): Nom de la variable
+        default (float): Valeur si la variable est absente ou vide
+        
+    Returns:
+        float: Valeur de la variable
+    """
+    value = os.environ.get(name, '')
+    return float(value) if value.strip() else default
+
+
+def incremental_settings():
+    """
+    Paramètres des mises à jour incrémentales du modèle
+    
+    Returns:
+        dict: Arguments de IncrementalUpdater
+    """
+    return {
+        'batch_size': env_int('INCREMENTAL_BATCH_SIZE', 100),
+        'flush_interval': env_float('INCREMENTAL_FLUSH_INTERVAL_SECONDS', 5.0),
+        'drift_threshold': env_float('INCREMENTAL_DRIFT_THRESHOLD', 0.2),
+        'full_retrain_interval': env_float('FULL_RETRAIN_INTERVAL_SECONDS'),
+        'decay_interval': env_float('DECAY_RESCALE_INTERVAL_SECONDS', 3600.0)
+    }
+
+
+def delta_settings():
+    """
+    Paramètres des entraînements différentiels (depuis le filigrane du dernier instantané)
+    
+    Returns:
+        dict: Activation (DELTA_TRAINING) et nombre d'entraînements différentiels
+        successifs avant un entraînement complet (DELTA_TRAINING_FULL_EVERY)
+    """
+    return {
+        'enabled': env_bool('DELTA_TRAINING', True),
+        'full_every': env_int('DELTA_TRAINING_FULL_EVERY', 24)
+    }
+
+
+def interaction_queue_settings():
+    """
+    Paramètres de la file d'écriture des interactions reçues (write-behind)
+    
+    Returns:
+        dict: Arguments d'InteractionQueue et activation de l'enregistrement des
+        interactions dans MongoDB (PERSIST_INTERACTIONS)
+    """
+    return {
+        'max_size': env_int('INTERACTION_QUEUE_SIZE', 10000),
+        'batch_size': env_int('INTERACTION_FLUSH_SIZE', 500),
+        'flush_interval': env_float('INTERACTION_FLUSH_INTERVAL_SECONDS', 1.0),
+        'put_timeout': env_float('INTERACTION_QUEUE_TIMEOUT_SECONDS', 0.1),
+        'persist': env_bool('PERSIST_INTERACTIONS')
+    }
+
+
+def batch_settings():
+    """
+    Limites de l'endpoint de recommandations par lot
+    
+    Returns:
+        dict: Nombre maximal d'utilisateurs et de produits par requête
+    """
+    return {
+        'max_items': env_int('RECOMMENDATION_BATCH_MAX_ITEMS', 500)
+    }
+
+
+def cache_settings():
+    """
+    Paramètres du cache des résultats de recommandation
+    
+    Returns:
+        dict: Taille du cache local, durée de vie des entrées, chemin du
+        magasin SQLite partagé entre workers (None: cache local seulement) et
+        désactivation de ce magasin après des erreurs répétées
+    """
+    return {
+        'max_entries': env_int('RESULT_CACHE_SIZE', 10000),
+        'ttl': env_float('RESULT_CACHE_TTL_SECONDS', 300.0),
+        'shared_path': os.environ.get('RESULT_CACHE_SQLITE_PATH') or None,
+        'shared_max_errors': env_int('RESULT_CACHE_SQLITE_MAX_ERRORS', 5),
+        'shared_retry_after': env_float('RESULT_CACHE_SQLITE_RETRY_SECONDS', 60.0)
+    }
+
+
+def metrics_settings():
+    """
+    Paramètres de l'instrumentation lus depuis l'environnement
+    
+    Returns:
+        dict: Activation de /metrics et de la mesure des latences, profilage
+        d'une requête sur `profile_every` (0: désactivé) et répertoire des profils
+    """
+    return {
+        'enabled': env_bool('METRICS_ENABLED', True),
+        'profile_every': env_int('PROFILE_EVERY_N_REQUESTS', 0),
+        'profile_dir': os.environ.get('PROFILE_DIR', 'profiles')
+    }
+
+
+def materialization_settings():
+    """
+    Paramètres du précalcul des recommandations après chaque entraînement
+    
+    Returns:
+        dict: Activation, nombre de recommandations par utilisateur, nombre de
+        processus et export des résultats vers MongoDB
+    """
+    return {
+        'enabled': env_bool('MATERIALIZE_RECOMMENDATIONS'),
+        'n_recommendations': env_int('MATERIALIZE_TOP_N', 20),
+        'n_jobs': env_int('MATERIALIZE_JOBS', 1),
+        'export_to_mongo': env_bool('MATERIALIZE_EXPORT_TO_MONGO')
+    }
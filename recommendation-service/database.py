@@ -1,10 +1,189 @@
+import logging
 import os
-from pymongo import MongoClient
+import threading
+import time
+from itertools import islice
+import numpy as np
 from dotenv import load_dotenv
+from config import env_int
 
 # Charger les variables d'environnement
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Champs lus par l'entraînement du modèle
+INTERACTION_PROJECTION = {'_id': 0, 'userId': 1, 'productId': 1, 'interactionType': 1, 'timestamp': 1, 'createdAt': 1}
+PRODUCT_PROJECTION = {'title': 1, 'image': 1, 'category': 1, 'price': 1, 'isCollected': 1}
+
+# Client MongoDB partagé par tous les threads du processus (créé à la première utilisation)
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_mongo_uri():
+    """URI de connexion MongoDB configurée"""
+    return os.environ.get('MONGO_URI', 'mongodb://localhost:27017/oussamradwh')
+
+def client_settings():
+    """
+    Options du pool de connexions MongoDB lues depuis l'environnement
+    
+    Returns:
+        dict: Arguments nommés de MongoClient
+    """
+    settings = {
+        'maxPoolSize': env_int('MONGO_MAX_POOL_SIZE', 50),
+        'minPoolSize': env_int('MONGO_MIN_POOL_SIZE', 0),
+        'connectTimeoutMS': env_int('MONGO_CONNECT_TIMEOUT_MS', 5000),
+        'serverSelectionTimeoutMS': env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+        'socketTimeoutMS': env_int('MONGO_SOCKET_TIMEOUT_MS'),
+        'readPreference': os.environ.get('MONGO_READ_PREFERENCE', 'primary')
+    }
+    return {name: value for name, value in settings.items() if value is not None}
+
+class PoolEventCounter:
+    """
+    Compteurs des événements du pool de connexions du client partagé
+    
+    Les événements sont reçus de pymongo par l'écouteur de pool_listener:
+    les compteurs sont lisibles sans importer pymongo.
+    """
+    
+    EVENTS = ('created', 'closed', 'checked_out', 'checked_in', 'check_out_failed', 'cleared')
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self._counts = dict.fromkeys(self.EVENTS, 0)
+    
+    def stats(self):
+        """
+        Returns:
+            dict: Nombre d'événements par type et connexions actuellement empruntées
+        """
+        with self._lock:
+            return {**self._counts, 'in_use': self._counts['checked_out'] - self._counts['checked_in']}
+    
+    def _count(self, event):
+        with self._lock:
+            self._counts[event] += 1
+    
+    def connection_created(self, event):
+        self._count('created')
+    
+    def connection_closed(self, event):
+        self._count('closed')
+    
+    def connection_checked_out(self, event):
+        self._count('checked_out')
+    
+    def connection_checked_in(self, event):
+        self._count('checked_in')
+    
+    def connection_check_out_failed(self, event):
+        self._count('check_out_failed')
+    
+    def pool_cleared(self, event):
+        self._count('cleared')
+
+def pool_listener(counter):
+    """
+    Écouteur pymongo qui transmet les événements du pool à `counter`
+    
+    Args:
+        counter (PoolEventCounter): Compteurs à incrémenter
+    
+    Returns:
+        pymongo.monitoring.ConnectionPoolListener: Écouteur à passer à MongoClient
+    """
+    from pymongo import monitoring
+    
+    class PoolEventListener(monitoring.ConnectionPoolListener):
+        def connection_created(self, event):
+            counter.connection_created(event)
+        
+        def connection_closed(self, event):
+            counter.connection_closed(event)
+        
+        def connection_checked_out(self, event):
+            counter.connection_checked_out(event)
+        
+        def connection_checked_in(self, event):
+            counter.connection_checked_in(event)
+        
+        def connection_check_out_failed(self, event):
+            counter.connection_check_out_failed(event)
+        
+        def pool_cleared(self, event):
+            counter.pool_cleared(event)
+        
+        def pool_created(self, event):
+            pass
+        
+        def pool_ready(self, event):
+            pass
+        
+        def pool_closed(self, event):
+            pass
+        
+        def connection_ready(self, event):
+            pass
+        
+        def connection_check_out_started(self, event):
+            pass
+    
+    return PoolEventListener()
+
+def mongo_client_class():
+    """
+    Classe du client MongoDB, importée à la première connexion
+    
+    Le service qui répond depuis un instantané n'importe pas pymongo tant
+    qu'il n'interroge pas la base.
+    """
+    from pymongo import MongoClient
+    return MongoClient
+
+# Événements du pool du client partagé, exposés par /metrics
+pool_events = PoolEventCounter()
+
+def get_client():
+    """
+    Retourne le client MongoDB du processus, en le créant à la première utilisation
+    
+    Le client (et son pool de connexions) est partagé entre les threads. Un
+    processus créé par fork ne réutilise jamais le client de son parent: il
+    crée le sien à sa première requête.
+    
+    Returns:
+        pymongo.MongoClient: Client MongoDB partagé
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = mongo_client_class()(get_mongo_uri(), event_listeners=[pool_listener(pool_events)],
+                                               **client_settings())
+                _client_pid = pid
+    return _client
+
+def reset_client():
+    """Oublier le client partagé (il sera recréé à la prochaine utilisation)"""
+    global _client, _client_pid, _client_lock
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+    pool_events.reset()
+
+# Un client MongoDB n'est pas utilisable après fork: chaque processus enfant crée le sien
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_client)
+
 def get_database_connection():
     """
     Établit une connexion à la base de données MongoDB
@@ -13,74 +192,265 @@ def get_database_connection():
         pymongo.database.Database: Instance de la base de données MongoDB
     """
     try:
-        # Récupérer l'URI de connexion depuis les variables d'environnement
-        mongo_uri = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/oussamradwh')
-        
-        # Créer un client MongoDB
-        client = MongoClient(mongo_uri)
-        
-        # Récupérer la base de données
-        db_name = mongo_uri.split('/')[-1]
-        db = client[db_name]
+        # Récupérer la base de données depuis le client partagé
+        db_name = get_mongo_uri().split('/')[-1]
+        db = get_client()[db_name]
         
         return db
+    except Exception:
+        logger.exception("Erreur de connexion à la base de données")
+        raise
+
+def ping_database():
+    """
+    Vérifie que la base de données répond, via le client partagé
+    
+    Returns:
+        dict: Statut ('ok' ou 'error'), latence du ping et message d'erreur éventuel
+    """
+    start = time.perf_counter()
+    try:
+        get_client().admin.command('ping')
+        return {
+            'status': 'ok',
+            'latencyMs': round((time.perf_counter() - start) * 1000, 2)
+        }
     except Exception as e:
-        print(f"Erreur de connexion à la base de données: {str(e)}")
-        raise e
+        return {
+            'status': 'error',
+            'message': str(e)
+        }
+
+def interaction_columns(interactions):
+    """
+    Extraire les colonnes utilisées par le modèle à partir de documents d'interaction
+    
+    Args:
+        interactions (list): Documents de la collection productinteractions
+    
+    Returns:
+        tuple: Tableaux (userId, productId, interactionType)
+    """
+    user_ids = np.array([str(interaction['userId']) for interaction in interactions], dtype=object)
+    product_ids = np.array([str(interaction['productId']) for interaction in interactions], dtype=object)
+    interaction_types = np.array([interaction['interactionType'] for interaction in interactions], dtype=object)
+    return user_ids, product_ids, interaction_types
 
-def get_product_interactions(db):
+def interaction_timestamps(interactions):
     """
-    Récupère toutes les interactions utilisateur-produit depuis la base de données
+    Extraire la date de documents d'interaction (champ timestamp, sinon createdAt)
+    
+    Args:
+        interactions (list): Documents de la collection productinteractions
+    
+    Returns:
+        numpy.ndarray: Dates datetime64[ms] (NaT si le document n'en a pas)
+    """
+    return np.array(
+        [interaction.get('timestamp') or interaction.get('createdAt') for interaction in interactions],
+        dtype='datetime64[ms]'
+    )
+
+def latest_interaction_id(db):
+    """
+    _id de la dernière interaction insérée (les ObjectId croissent avec la date d'insertion)
     
     Args:
         db (pymongo.database.Database): Instance de la base de données MongoDB
-        
+    
     Returns:
-        list: Liste des interactions utilisateur-produit
+        _id de l'interaction, ou None si la collection est vide
     """
-    try:
-        # Récupérer la collection des interactions
-        interactions = list(db.productinteractions.find())
-        return interactions
-    except Exception as e:
-        print(f"Erreur lors de la récupération des interactions: {str(e)}")
-        return []
+    document = db.productinteractions.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+    return document['_id'] if document is not None else None
 
-def get_products(db):
+def latest_product_update(db):
     """
-    Récupère tous les produits depuis la base de données
+    Date de la dernière modification d'un produit (champ updatedAt des documents Mongoose)
     
     Args:
         db (pymongo.database.Database): Instance de la base de données MongoDB
-        
+    
     Returns:
-        list: Liste des produits
+        datetime.datetime: Date, ou None si aucun produit n'a de champ updatedAt
     """
-    try:
-        # Récupérer la collection des produits
-        products = list(db.productstree.find())
-        return products
-    except Exception as e:
-        print(f"Erreur lors de la récupération des produits: {str(e)}")
-        return []
+    document = db.productstree.find_one({'updatedAt': {'$exists': True}}, {'updatedAt': 1},
+                                        sort=[('updatedAt', -1)])
+    return document['updatedAt'] if document is not None else None
 
-def get_users(db):
+def interaction_id_range(after=None, until=None):
     """
-    Récupère tous les utilisateurs depuis la base de données
+    Filtre des interactions dont le _id est dans ]after, until]
+    
+    Args:
+        after (str): _id exclu (None: depuis la première interaction)
+        until (str): _id inclus (None: jusqu'à la dernière interaction)
+    
+    Returns:
+        dict: Filtre MongoDB
+    """
+    from bson.objectid import ObjectId
+    
+    bounds = {}
+    if after is not None:
+        bounds['$gt'] = ObjectId(after) if ObjectId.is_valid(after) else after
+    if until is not None:
+        bounds['$lte'] = ObjectId(until) if ObjectId.is_valid(until) else until
+    return {'_id': bounds} if bounds else {}
+
+def iter_interaction_chunks(db, batch_size=10000, query=None):
+    """
+    Lit les interactions par morceaux, sans jamais charger toute la collection
+    
+    Seuls les champs utiles sont demandés à MongoDB et au plus `batch_size`
+    documents sont en mémoire à la fois.
     
     Args:
         db (pymongo.database.Database): Instance de la base de données MongoDB
-        
+        batch_size (int): Nombre de documents par morceau
+        query (dict): Filtre des interactions lues (toutes par défaut)
+    
+    Yields:
+        tuple: Tableaux (userId, productId, interactionType, date) d'un morceau
+    """
+    cursor = db.productinteractions.find(query or {}, INTERACTION_PROJECTION, batch_size=batch_size)
+    while True:
+        documents = list(islice(cursor, batch_size))
+        if not documents:
+            return
+        yield (*interaction_columns(documents), interaction_timestamps(documents))
+
+def iter_aggregated_interaction_chunks(db, weights, default_weight, aggregation, batch_size=10000, query=None,
+                                       half_lives=None, now=None):
+    """
+    Lit les interactions regroupées par paire (utilisateur, produit) par MongoDB
+    
+    Le poids de chaque interaction est calculé dans le pipeline d'agrégation à
+    partir de son type, puis agrégé ($max ou $sum) par paire, avec le nombre
+    d'interactions de la paire et la date de la plus récente. Avec
+    `half_lives`, le poids décroît avec l'âge de l'interaction
+    (0.5 ** (âge / demi-vie du type)) et les paires sont aussi séparées par
+    type d'interaction.
+    
+    Args:
+        db (pymongo.database.Database): Instance de la base de données MongoDB
+        weights (dict): Poids de chaque type d'interaction
+        default_weight (float): Poids d'un type inconnu
+        aggregation (str): 'max' ou 'sum'
+        batch_size (int): Nombre de paires par morceau
+        query (dict): Filtre des interactions regroupées (toutes par défaut)
+        half_lives (dict): Demi-vie (jours) de chaque type d'interaction; les types
+            absents ne décroissent pas (None: pas de décroissance)
+        now (datetime.datetime): Date de référence de la décroissance
+    
+    Yields:
+        tuple: Tableaux (userId, productId, poids, nombre, date, type d'interaction) d'un
+        morceau; les types sont None sans `half_lives`
+    """
+    weight_expression = default_weight
+    for interaction_type, weight in weights.items():
+        weight_expression = {'$cond': [{'$eq': ['$interactionType', interaction_type]}, weight, weight_expression]}
+    
+    group_key = {'userId': '$userId', 'productId': '$productId'}
+    if half_lives:
+        # Âge en jours, nul pour une interaction sans date ou datée après `now`
+        age_days = {'$divide': [{'$max': [{'$subtract': [now, '$timestamp']}, 0]}, 86_400_000]}
+        decay_expression = 1.0
+        for interaction_type, days in half_lives.items():
+            if days:
+                decay_expression = {'$cond': [{'$eq': ['$interactionType', interaction_type]},
+                                              {'$pow': [0.5, {'$divide': [age_days, days]}]}, decay_expression]}
+        weight_expression = {'$multiply': [weight_expression, decay_expression]}
+        group_key['interactionType'] = '$interactionType'
+    
+    pipeline = [{'$match': query}] if query else []
+    pipeline += [
+        {'$project': {'_id': 0, 'userId': 1, 'productId': 1, 'interactionType': 1,
+                      'timestamp': {'$ifNull': ['$timestamp', '$createdAt']}}},
+        {'$group': {
+            '_id': group_key,
+            'weight': {f'${aggregation}': weight_expression},
+            'count': {'$sum': 1},
+            'timestamp': {'$max': '$timestamp'}
+        }}
+    ]
+    cursor = db.productinteractions.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size)
+    while True:
+        documents = list(islice(cursor, batch_size))
+        if not documents:
+            return
+        yield (
+            np.array([str(document['_id']['userId']) for document in documents], dtype=object),
+            np.array([str(document['_id']['productId']) for document in documents], dtype=object),
+            np.array([document['weight'] for document in documents], dtype=np.float64),
+            np.array([document['count'] for document in documents], dtype=np.float64),
+            interaction_timestamps(documents),
+            np.array([document['_id'].get('interactionType') for document in documents], dtype=object)
+        )
+
+def iter_products(db, batch_size=10000, query=None):
+    """
+    Parcourt les produits avec les seuls champs utilisés par le catalogue du modèle
+    
+    Args:
+        db (pymongo.database.Database): Instance de la base de données MongoDB
+        batch_size (int): Nombre de documents par aller-retour avec MongoDB
+        query (dict): Filtre des produits lus (tous par défaut)
+    
     Returns:
-        list: Liste des utilisateurs
+        pymongo.cursor.Cursor: Curseur sur les produits
     """
-    try:
-        # Récupérer la collection des utilisateurs
-        users = list(db.users.find())
-        return users
-    except Exception as e:
-        print(f"Erreur lors de la récupération des utilisateurs: {str(e)}")
+    return db.productstree.find(query or {}, PRODUCT_PROJECTION, batch_size=batch_size)
+
+def product_ids_query(product_ids):
+    """
+    Filtre des produits d'une liste d'ID (ObjectId ou chaînes)
+    
+    Args:
+        product_ids (list): ID des produits, en chaînes
+    
+    Returns:
+        dict: Filtre MongoDB
+    """
+    from bson.objectid import ObjectId
+    
+    values = list(product_ids)
+    values += [ObjectId(product_id) for product_id in product_ids if ObjectId.is_valid(product_id)]
+    return {'_id': {'$in': values}}
+
+def insert_interactions(db, interactions):
+    """
+    Enregistrer des interactions dans productinteractions, comme le schéma Mongoose du serveur Node
+    
+    L'insertion est non ordonnée: un document refusé n'empêche pas
+    l'insertion des suivants.
+    
+    Args:
+        db (pymongo.database.Database): Instance de la base de données MongoDB
+        interactions (list): Interactions (user_id, product_id, interaction_type, timestamp)
+    
+    Returns:
+        list: _id (chaîne) de chaque interaction, None pour celles qui ont été refusées
+    """
+    from bson.objectid import ObjectId
+    from pymongo.errors import BulkWriteError
+    
+    def object_id(value):
+        return ObjectId(value) if ObjectId.is_valid(value) else value
+    
+    documents = [
+        {'_id': ObjectId(), 'userId': object_id(user_id), 'productId': object_id(product_id),
+         'interactionType': interaction_type, 'timestamp': timestamp, 'createdAt': timestamp, 'updatedAt': timestamp}
+        for user_id, product_id, interaction_type, timestamp in interactions
+    ]
+    if not documents:
         return []
+    refused = set()
+    try:
+        db.productinteractions.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        refused = {error['index'] for error in e.details['writeErrors']}
+    return [str(document['_id']) if idx not in refused else None for idx, document in enumerate(documents)]
 
 def get_product_by_id(db, product_id):
     """
@@ -89,7 +459,7 @@ def get_product_by_id(db, product_id):
     Args:
         db (pymongo.database.Database): Instance de la base de données MongoDB
         product_id (str): ID du produit
-        
+    
     Returns:
         dict: Données du produit
     """
@@ -98,5 +468,5 @@ def get_product_by_id(db, product_id):
         product = db.productstree.find_one({"_id": ObjectId(product_id)})
         return product
     except Exception as e:
-        print(f"Erreur lors de la récupération du produit: {str(e)}")
+        logger.warning("Erreur lors de la récupération du produit %s: %s", product_id, e)
         return None
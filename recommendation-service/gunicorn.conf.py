@@ -0,0 +1,41 @@
+"""
+Configuration gunicorn du service de recommandation (production)
+
+    gunicorn -c gunicorn.conf.py app:app
+
+L'application est chargée une seule fois dans le processus maître
+(preload_app), avant le fork des workers: le modèle servi, chargé depuis
+le dernier instantané en projection mémoire, est partagé entre les workers
+par le cache de pages du système au lieu d'être copié dans chacun. Les
+threads d'arrière-plan (mises à jour incrémentales, surveillance des
+instantanés) sont démarrés après le fork, dans chaque worker.
+
+Un seul worker entraîne à la fois (verrou dans le répertoire des
+instantanés); les autres chargent l'instantané qu'il publie. À l'arrêt
+d'un worker, les interactions encore en file sont écrites (worker_exit)
+dans le délai graceful_timeout.
+"""
+import multiprocessing
+import os
+
+# Les threads d'arrière-plan ne survivent pas au fork: ils sont démarrés par post_fork
+os.environ.setdefault('DEFER_BACKGROUND_SERVICES', 'true')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+preload_app = True
+
+
+def post_fork(server, worker):
+    import app
+    app.start_background_services()
+
+
+def worker_exit(server, worker):
+    # Écrire les interactions acceptées avant l'arrêt du worker
+    import app
+    app.stop_background_services()
@@ -0,0 +1,173 @@
+import datetime
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """La file des interactions est pleine (ou arrêtée): l'appelant doit réessayer plus tard"""
+
+
+class InteractionQueue:
+    """
+    File bornée des interactions reçues, écrites en arrière-plan (write-behind)
+    
+    `/record-interaction` et `/record-interactions` ajoutent les interactions
+    à la file et répondent sans attendre. Un thread les retire par lots de
+    `batch_size`, ou au plus tard toutes les `flush_interval` secondes, les
+    enregistre avec `persist` (si défini) puis les transmet à `on_batch`
+    (mise à jour du modèle servi) avec leurs _id MongoDB. Quand la file est pleine, un ajout attend
+    au plus `put_timeout` secondes avant de lever QueueFull. `stop` écrit
+    toutes les interactions acceptées avant de rendre la main.
+    """
+    
+    def __init__(self, on_batch, persist=None, max_size=10000, batch_size=500, flush_interval=1.0,
+                 put_timeout=0.1, persist_retries=2):
+        """
+        Args:
+            on_batch (callable): Reçoit chaque lot d'interactions
+                (user_id, product_id, interaction_type, timestamp) et la liste de leurs
+                _id MongoDB (None si le lot n'a pas été enregistré)
+            persist (callable): Enregistre un lot dans la base et retourne le _id de chaque
+                interaction (None si elle est refusée); None pour ne rien enregistrer
+            max_size (int): Nombre maximal d'interactions en file
+            batch_size (int): Taille des lots écrits
+            flush_interval (float): Délai maximal avant l'écriture d'une interaction (secondes)
+            put_timeout (float): Attente maximale d'une place dans la file pleine (secondes)
+            persist_retries (int): Nouvelles tentatives d'enregistrement d'un lot en échec
+        """
+        self._on_batch = on_batch
+        self._persist = persist
+        self._max_size = max_size
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._put_timeout = put_timeout
+        self._persist_retries = persist_retries
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._stopped = False
+        self._thread = None
+        self._stats = {'accepted': 0, 'rejected': 0, 'written': 0, 'persisted': 0, 'persist_errors': 0,
+                       'batches': 0}
+    
+    def __len__(self):
+        return len(self._queue)
+    
+    def start(self):
+        """Démarrer le thread d'écriture"""
+        self._thread = threading.Thread(target=self._run, name='interaction-writer', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """
+        Refuser les nouvelles interactions et écrire celles déjà acceptées
+        
+        Sans thread d'écriture démarré, la file est vidée dans le thread appelant.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        else:
+            self._run()
+    
+    def submit(self, interactions):
+        """
+        Ajouter des interactions à la file, toutes ou aucune
+        
+        Args:
+            interactions (list): Interactions (user_id, product_id, interaction_type)
+        
+        Returns:
+            int: Nombre d'interactions acceptées
+        
+        Raises:
+            QueueFull: Pas de place pour toutes les interactions avant `put_timeout`,
+                ou file arrêtée
+            ValueError: Plus d'interactions que la capacité de la file
+        """
+        timestamp = datetime.datetime.utcnow()
+        entries = [(user_id, product_id, interaction_type, timestamp)
+                   for user_id, product_id, interaction_type in interactions]
+        if len(entries) > self._max_size:
+            raise ValueError(f"Au plus {self._max_size} interactions par ajout")
+        
+        deadline = time.monotonic() + self._put_timeout
+        with self._condition:
+            while not self._stopped and len(self._queue) + len(entries) > self._max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            if self._stopped or len(self._queue) + len(entries) > self._max_size:
+                self._stats['rejected'] += len(entries)
+                raise QueueFull("File des interactions pleine" if not self._stopped
+                                else "File des interactions arrêtée")
+            
+            self._queue.extend(entries)
+            self._stats['accepted'] += len(entries)
+            if len(self._queue) >= self._batch_size:
+                self._condition.notify_all()
+        return len(entries)
+    
+    def stats(self):
+        """
+        Compteurs de la file
+        
+        Returns:
+            dict: Interactions acceptées, refusées, écrites, enregistrées, en échec
+            d'enregistrement, lots écrits et taille actuelle de la file
+        """
+        with self._condition:
+            return dict(self._stats, queued=len(self._queue))
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self._flush_interval
+                while not self._stopped and len(self._queue) < self._batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if self._stopped and not self._queue:
+                    return
+                batch = [self._queue.popleft() for _ in range(min(self._batch_size, len(self._queue)))]
+                # Libérer de la place pour les ajouts en attente
+                self._condition.notify_all()
+            
+            if batch:
+                self._write(batch)
+    
+    def _write(self, batch):
+        """Enregistrer un lot puis le transmettre à on_batch"""
+        persisted, failed = 0, 0
+        interaction_ids = None
+        if self._persist is not None:
+            for attempt in range(self._persist_retries + 1):
+                try:
+                    interaction_ids = self._persist(batch)
+                    persisted = sum(interaction_id is not None for interaction_id in interaction_ids)
+                    failed = len(batch) - persisted
+                    break
+                except Exception:
+                    if attempt == self._persist_retries:
+                        logger.exception("Erreur lors de l'enregistrement d'un lot de %d interactions", len(batch))
+                        failed = len(batch)
+                    else:
+                        time.sleep(0.1 * 2 ** attempt)
+        
+        try:
+            self._on_batch(batch, interaction_ids)
+        except Exception:
+            logger.exception("Erreur lors de la mise à jour du modèle avec un lot d'interactions")
+        
+        with self._condition:
+            self._stats['written'] += len(batch)
+            self._stats['persisted'] += persisted
+            self._stats['persist_errors'] += failed
+            self._stats['batches'] += 1
@@ -0,0 +1,390 @@
+import bisect
+import cProfile
+import logging
+import os
+import re
+import resource
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import scipy.sparse as sp
+
+# Bornes des histogrammes de latence (secondes)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Type de contenu du format texte Prometheus
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Metric:
+    """Métrique à étiquettes: une valeur par combinaison de valeurs d'étiquettes"""
+    
+    kind = None
+    
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def render(self):
+        """Lignes de la métrique au format texte Prometheus"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in sorted(values):
+            lines.extend(self._render_value(label_values, value))
+        return lines
+    
+    def _render_value(self, label_values, value):
+        return [f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}']
+
+
+class Counter(Metric):
+    """Compteur croissant"""
+    
+    kind = 'counter'
+    
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+    
+    def set_total(self, value, *label_values):
+        """Reprendre un total tenu par un autre composant (ex: statistiques du cache)"""
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Gauge(Metric):
+    """Valeur instantanée"""
+    
+    kind = 'gauge'
+    
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+    
+    def clear(self):
+        """Oublier toutes les valeurs (ex: étapes d'un entraînement précédent)"""
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Metric):
+    """
+    Histogramme cumulatif (compteurs par borne, somme et nombre d'observations)
+    
+    Chaque observation ne coûte qu'une recherche dichotomique parmi les bornes
+    et trois incréments, sous le verrou de la métrique.
+    """
+    
+    kind = 'histogram'
+    
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+    
+    def observe(self, value, *label_values):
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+    
+    def _render_value(self, label_values, state):
+        counts, total, count = state
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip((*self.buckets, float('inf')), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labels, label_values, [('le', _format_value(bound))])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labels, label_values)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Ensemble des métriques exposées par /metrics
+    
+    Les métriques sont propres au processus: sous gunicorn, chaque worker
+    expose les siennes, étiquetées par son PID. Les collecteurs
+    (`add_collector`) sont appelés à chaque lecture pour mettre à jour les
+    jauges calculées à la demande (taille du modèle, cache, mémoire).
+    """
+    
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+    
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+    
+    def gauge(self, name, documentation, labels=()):
+        return self._register(Gauge(name, documentation, labels))
+    
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+    
+    def add_collector(self, collector):
+        """Enregistrer une fonction appelée avant chaque lecture des métriques"""
+        self._collectors.append(collector)
+    
+    def render(self):
+        """
+        Toutes les métriques au format texte Prometheus
+        
+        Returns:
+            str: Corps de la réponse de /metrics
+        """
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                logging.getLogger(__name__).exception("Erreur lors de la collecte des métriques")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+    
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+class StageTimer:
+    """
+    Durées des étapes successives d'un traitement (ex: entraînement)
+    
+    Utilisation: `with stages('fetch'): ...`; `durations` associe à chaque
+    étape sa durée en secondes, dans l'ordre d'exécution.
+    """
+    
+    def __init__(self):
+        self.durations = {}
+    
+    @contextmanager
+    def __call__(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[stage] = self.durations.get(stage, 0.0) + time.perf_counter() - start
+
+
+class ErrorCountingHandler(logging.Handler):
+    """Gestionnaire de logs qui compte les erreurs journalisées par logger"""
+    
+    def __init__(self, counter):
+        super().__init__(level=logging.ERROR)
+        self._counter = counter
+    
+    def emit(self, record):
+        self._counter.inc(record.name)
+
+
+class RequestProfiler:
+    """
+    Profilage échantillonné des requêtes HTTP
+    
+    Une requête sur `every` est exécutée sous cProfile; le profil est écrit
+    dans `directory` (<date>-<pid>-<id>-<endpoint>.prof, lisible avec pstats ou
+    snakeviz). Désactivé (`every` = 0), `instrument` ne l'installe pas.
+    """
+    
+    def __init__(self, every=0, directory='profiles'):
+        """
+        Args:
+            every (int): Profiler une requête sur `every` (0: désactivé)
+            directory (str): Répertoire des profils
+        """
+        self.every = every
+        self.directory = directory
+        self._requests = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self):
+        return self.every > 0
+    
+    def start(self):
+        """
+        Démarrer le profilage de la requête courante si c'est son tour
+        
+        Returns:
+            cProfile.Profile: Profileur démarré, ou None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._requests += 1
+            if self._requests % self.every:
+                return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    
+    def stop(self, profiler, endpoint):
+        """Arrêter un profileur démarré par `start` et écrire son profil"""
+        profiler.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        endpoint = re.sub(r'[^\w-]+', '_', endpoint).strip('_') or 'unknown'
+        name = f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}-{endpoint}.prof"
+        profiler.dump_stats(os.path.join(self.directory, name))
+
+
+def array_nbytes(value):
+    """Octets occupés par un tableau NumPy ou une matrice creuse (0 pour les autres objets)"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if sp.issparse(value):
+        return sum(array.nbytes for array in (value.data, value.indices, value.indptr))
+    return 0
+
+
+def model_nbytes(model):
+    """Octets des tableaux servis par un modèle (projetés en mémoire ou non)"""
+    return sum(array_nbytes(value) for value in vars(model).values())
+
+
+def resident_memory_bytes():
+    """Mémoire résidente actuelle du processus"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def instrument(app, registry=None, profiler=None):
+    """
+    Mesurer la latence de chaque endpoint d'une application Flask
+    
+    Les latences sont regroupées par règle d'URL (et non par chemin, pour
+    ne pas créer une série par ID), méthode et statut HTTP.
+    
+    Args:
+        app (flask.Flask): Application
+        registry (MetricsRegistry): Registre des métriques (None: pas de mesure des latences)
+        profiler (RequestProfiler): Profilage échantillonné des requêtes, facultatif
+    
+    Returns:
+        Histogram: Histogramme des latences, ou None
+    """
+    from flask import g, request
+    
+    latency = None
+    if registry is not None:
+        latency = registry.histogram('recommendation_http_request_duration_seconds',
+                                     'Durée de traitement des requêtes HTTP', ('endpoint', 'method', 'status'))
+    if profiler is not None and not profiler.enabled:
+        profiler = None
+    if latency is None and profiler is None:
+        return None
+    
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+        if profiler is not None:
+            g.request_profiler = profiler.start()
+    
+    @app.after_request
+    def record_latency(response):
+        start = g.pop('request_start', None)
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        if latency is not None and start is not None:
+            latency.observe(time.perf_counter() - start, endpoint, request.method, str(response.status_code))
+        request_profiler = g.pop('request_profiler', None)
+        if request_profiler is not None:
+            profiler.stop(request_profiler, endpoint)
+        return response
+    
+    return latency
+
+
+def register_service_metrics(registry, model_store, result_cache, pool_stats, interaction_stats=None):
+    """
+    Jauges du service lues à chaque appel de /metrics
+    
+    Args:
+        registry (MetricsRegistry): Registre des métriques
+        model_store (ModelStore): Référence vers le modèle servi
+        result_cache (ResultCache): Cache des résultats
+        pool_stats (callable): Compteurs du pool de connexions MongoDB
+        interaction_stats (callable): Compteurs de la file des interactions reçues
+    """
+    model_info = registry.gauge('recommendation_model_info', 'Modèle servi (valeur 1)', ('version', 'model', 'pid'))
+    model_shape = registry.gauge('recommendation_model_entries', 'Taille du modèle servi', ('dimension',))
+    model_bytes = registry.gauge('recommendation_model_array_bytes',
+                                 'Octets des tableaux du modèle servi (projetés en mémoire ou non)')
+    model_drift = registry.gauge('recommendation_model_drift',
+                                 'Part des interactions appliquées incrémentalement depuis l\'entraînement')
+    training_stages = registry.gauge('recommendation_training_stage_seconds',
+                                     'Durée de chaque étape de l\'entraînement du modèle servi', ('stage',))
+    resident_memory = registry.gauge('process_resident_memory_bytes', 'Mémoire résidente du processus')
+    cache_events = registry.counter('recommendation_cache_events_total', 'Événements du cache des résultats',
+                                    ('event',))
+    cache_entries = registry.gauge('recommendation_cache_entries', 'Entrées du cache local des résultats')
+    pool_events = registry.counter('recommendation_mongo_pool_events_total', 'Événements du pool MongoDB',
+                                   ('event',))
+    pool_in_use = registry.gauge('recommendation_mongo_pool_connections_in_use',
+                                 'Connexions MongoDB empruntées au pool')
+    interaction_events = registry.counter('recommendation_interaction_queue_events_total',
+                                          'Interactions reçues par la file d\'écriture', ('event',))
+    interaction_queued = registry.gauge('recommendation_interaction_queue_size',
+                                        'Interactions en file, pas encore écrites')
+    
+    def collect():
+        model = model_store.get()
+        model_info.clear()
+        model_info.set(1, str(model.version), type(model).__name__, str(os.getpid()))
+        if model.is_trained:
+            model_shape.set(len(model.user_id_mapping), 'users')
+            model_shape.set(len(model.product_id_mapping), 'products')
+            model_shape.set(model.user_item_matrix.nnz, 'interactions')
+        model_shape.set(len(model.pending_interactions), 'pending_interactions')
+        model_bytes.set(model_nbytes(model))
+        model_drift.set(model.drift())
+        training_stages.clear()
+        for stage, seconds in model.training_stages.items():
+            training_stages.set(seconds, stage)
+        resident_memory.set(resident_memory_bytes())
+        
+        stats = result_cache.stats()
+        for event in ('hits', 'misses', 'evictions', 'expirations', 'shared_hits'):
+            cache_events.set_total(stats[event], event)
+        cache_entries.set(stats['size'])
+        pool = pool_stats()
+        for event, count in pool.items():
+            if event != 'in_use':
+                pool_events.set_total(count, event)
+        pool_in_use.set(pool['in_use'])
+        if interaction_stats is not None:
+            interactions = interaction_stats()
+            for event, count in interactions.items():
+                if event != 'queued':
+                    interaction_events.set_total(count, event)
+            interaction_queued.set(interactions['queued'])
+    
+    registry.add_collector(collect)
@@ -0,0 +1,76 @@
+import threading
+
+
+class ModelStore:
+    """
+    Référence vers le modèle servi par l'application
+    
+    Les requêtes lisent le modèle courant avec `get`; un nouveau modèle,
+    entièrement construit à part, remplace l'ancien d'un seul coup avec `swap`.
+    Une requête en cours garde donc un modèle cohérent jusqu'à sa fin.
+    
+    Les interactions en attente sont ajoutées avec `queue`, sous le même verrou
+    que les remplacements: aucune n'est ajoutée à un modèle déjà remplacé.
+    """
+    
+    def __init__(self, model):
+        self._model = model
+        self._lock = threading.Lock()
+    
+    def get(self):
+        """Modèle actuellement servi"""
+        return self._model
+    
+    def swap(self, model):
+        """
+        Remplacer le modèle servi
+        
+        Les interactions en attente de l'ancien modèle sont transmises au nouveau,
+        sauf celles que son entraînement a déjà lues dans la base (enregistrées
+        avec un _id inférieur ou égal à son filigrane).
+        
+        Args:
+            model: Nouveau modèle, qui ne doit plus être modifié ensuite
+        
+        Returns:
+            Ancien modèle
+        """
+        with self._lock:
+            watermark = getattr(model, 'watermark', None) or {}
+            model.pending_interactions.extend(
+                *self._model.pending_interactions.drain_after(watermark.get('interaction_id'))
+            )
+            previous, self._model = self._model, model
+        return previous
+    
+    def queue(self, interactions, interaction_ids=None):
+        """
+        Mettre des interactions en attente dans le modèle servi
+        
+        Args:
+            interactions (iterable): Interactions (user_id, product_id, interaction_type)
+            interaction_ids (list): _id MongoDB de chaque interaction enregistrée par le service
+        
+        Returns:
+            Modèle qui a reçu les interactions
+        """
+        with self._lock:
+            self._model.pending_interactions.extend(interactions, interaction_ids)
+            return self._model
+    
+    def update(self, function):
+        """
+        Remplacer le modèle servi par `function(modèle courant)`
+        
+        Les mises à jour et les remplacements sont sérialisés: aucune mise à
+        jour ne s'applique à un modèle déjà remplacé.
+        
+        Args:
+            function (callable): Construit le nouveau modèle à partir du modèle courant
+        
+        Returns:
+            Nouveau modèle
+        """
+        with self._lock:
+            self._model = function(self._model)
+            return self._model
@@ -1 +1,41 @@
 # Ce fichier est nécessaire pour que Python traite le répertoire comme un package
+from models.collaborative_filtering import CollaborativeFilteringModel
+from models.als import ImplicitALSModel
+
+# Modèles sélectionnables par la variable RECOMMENDATION_MODEL
+MODEL_CLASSES = {
+    'cosine': CollaborativeFilteringModel,
+    'als': ImplicitALSModel
+}
+
+
+def create_model(model='cosine', **settings):
+    """
+    Créer un modèle de recommandation non entraîné
+    
+    Args:
+        model (str): Nom du modèle ('cosine' ou 'als')
+        **settings: Arguments du constructeur du modèle
+        
+    Returns:
+        CollaborativeFilteringModel: Modèle de la classe demandée
+    """
+    if model not in MODEL_CLASSES:
+        raise ValueError(f"Modèle inconnu: {model} (valeurs possibles: {', '.join(MODEL_CLASSES)})")
+    return MODEL_CLASSES[model](**settings)
+
+
+def model_class(class_name):
+    """
+    Classe d'un modèle à partir du nom enregistré dans un instantané
+    
+    Args:
+        class_name (str): Nom de la classe
+        
+    Returns:
+        type: Classe du modèle
+    """
+    for cls in MODEL_CLASSES.values():
+        if cls.__name__ == class_name:
+            return cls
+    raise ValueError(f"Classe de modèle inconnue: {class_name}")
@@ -0,0 +1,305 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+from models.ann import ANN_INDEXES
+from models.collaborative_filtering import CollaborativeFilteringModel
+from models.neighbors import l2_normalize_rows, refresh_topk_neighbors, select_top_k, topk_neighbors
+
+# Nombre d'utilisateurs (ou de produits) résolus ensemble par np.linalg.solve
+SOLVE_BLOCK_SIZE = 1024
+
+
+def solve_factors(ratings, fixed, regularization, alpha, rows=None, n_jobs=1):
+    """
+    Résoudre les facteurs d'un côté de l'ALS implicite, l'autre côté étant fixé
+    
+    Pour chaque ligne u de `ratings` (formulation de Hu, Koren et Volinsky):
+    x_u = (YᵀY + Yᵀ(C_u - I)Y + λI)⁻¹ Yᵀ C_u p_u, avec une confiance
+    c_ui = 1 + alpha·r_ui et une préférence p_ui = 1 pour chaque produit
+    noté. YᵀY est commun à toutes les lignes; seuls les produits notés par
+    la ligne s'y ajoutent. Les systèmes sont résolus par blocs avec un seul
+    appel à np.linalg.solve, répartis sur `n_jobs` threads (BLAS et LAPACK
+    libèrent le GIL).
+    
+    Args:
+        ratings (scipy.sparse.csr_matrix): Notes (lignes à résoudre × colonnes fixées)
+        fixed (numpy.ndarray): Facteurs fixés, un par colonne de `ratings`
+        regularization (float): Régularisation λ
+        alpha (float): Pente de la confiance
+        rows (numpy.ndarray): Lignes à résoudre (toutes par défaut)
+        n_jobs (int): Nombre de threads
+    
+    Returns:
+        numpy.ndarray: Facteurs float32 des lignes `rows`
+    """
+    rows = np.arange(ratings.shape[0]) if rows is None else np.asarray(rows)
+    fixed = np.asarray(fixed, dtype=np.float64)
+    n_factors = fixed.shape[1]
+    base = fixed.T @ fixed + regularization * np.eye(n_factors)
+    factors = np.zeros((len(rows), n_factors), dtype=np.float32)
+    
+    def solve_block(start):
+        block_rows = rows[start:start + SOLVE_BLOCK_SIZE]
+        systems = np.repeat(base[np.newaxis], len(block_rows), axis=0)
+        targets = np.zeros((len(block_rows), n_factors))
+        for position, row in enumerate(block_rows):
+            begin, end = ratings.indptr[row], ratings.indptr[row + 1]
+            rated = fixed[ratings.indices[begin:end]]
+            confidence = alpha * np.asarray(ratings.data[begin:end], dtype=np.float64)
+            systems[position] += (rated.T * confidence) @ rated
+            targets[position] = (1 + confidence) @ rated
+        factors[start:start + len(block_rows)] = np.linalg.solve(systems, targets[..., np.newaxis])[..., 0]
+    
+    starts = range(0, len(rows), SOLVE_BLOCK_SIZE)
+    if n_jobs > 1:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            list(executor.map(solve_block, starts))
+    else:
+        for start in starts:
+            solve_block(start)
+    return factors
+
+
+class ImplicitALSModel(CollaborativeFilteringModel):
+    """
+    Factorisation matricielle par moindres carrés alternés pour retours implicites
+    
+    Même interface que CollaborativeFilteringModel (train, recommend_for_user,
+    find_similar_products, mises à jour incrémentales, instantanés), mais les
+    recommandations sont servies à partir de facteurs latents float32 de
+    faible rang: un produit scalaire par produit au lieu d'une recherche de
+    voisins parmi les utilisateurs. Les poids view=1/cart=3/purchase=5 de la
+    matrice deviennent des confiances 1 + alpha·r.
+    
+    Avec un index approché, les produits candidats d'un utilisateur sont
+    cherchés dans l'index au lieu d'être tous scorés: la recherche du
+    produit scalaire maximal est ramenée à une recherche cosinus en
+    complétant chaque facteur produit y d'une coordonnée √(M² - |y|²), où
+    M est la plus grande norme, et chaque requête d'une coordonnée nulle.
+    """
+    
+    # La confiance 1 + alpha·r et la régularisation ne sont pas invariantes par
+    # changement d'échelle des poids: les facteurs sont recalculés par decay_to(reselect=True)
+    SCALE_INVARIANT = False
+    
+    def __init__(self, factors=64, regularization=100.0, alpha=1.0, iterations=15, random_state=0,
+                 aggregation='max', n_item_neighbors=50, n_jobs=1, batch_size=10000, aggregate_in_database=False,
+                 ann=None, ann_params=None, popularity_half_life_days=30.0, interaction_half_lives=None,
+                 category_shards=False, shard_jobs=1):
+        """
+        Initialiser le modèle
+        
+        Args:
+            factors (int): Nombre de facteurs latents
+            regularization (float): Régularisation λ des facteurs
+            alpha (float): Pente de la confiance accordée à une interaction
+            iterations (int): Nombre d'itérations (une résolution des utilisateurs
+                puis des produits par itération)
+            random_state (int): Graine de l'initialisation des facteurs
+            aggregation (str): Agrégation des interactions dupliquées ('max' ou 'sum')
+            n_item_neighbors (int): Nombre de produits similaires conservés par produit
+            n_jobs (int): Nombre de threads des résolutions et du calcul des voisins
+            batch_size (int): Nombre de documents lus par morceau à l'entraînement
+            aggregate_in_database (bool): Regrouper les interactions dans MongoDB
+            ann (str): Index approché des produits ('brute', 'lsh' ou 'hnsw', voir
+                models.ann); None pour scorer tous les produits
+            ann_params (dict): Paramètres de l'index approché
+            popularity_half_life_days (float): Demi-vie (jours) du poids des interactions
+                dans les classements de popularité (None: pas de pondération)
+            interaction_half_lives (dict): Demi-vie (jours) du poids de chaque type
+                d'interaction dans la matrice (None: poids fixes)
+            category_shards (bool): Calculer aussi les produits similaires de chaque catégorie
+            shard_jobs (int): Nombre de processus du calcul des fragments par catégorie
+        """
+        super().__init__(aggregation=aggregation, n_item_neighbors=n_item_neighbors, n_jobs=n_jobs,
+                         batch_size=batch_size, aggregate_in_database=aggregate_in_database,
+                         popularity_half_life_days=popularity_half_life_days,
+                         interaction_half_lives=interaction_half_lives, category_shards=category_shards,
+                         shard_jobs=shard_jobs)
+        if ann and ann not in ANN_INDEXES:
+            raise ValueError(f"Index inconnu: {ann} (valeurs possibles: {', '.join(ANN_INDEXES)})")
+        self.ann = ann
+        self.ann_params = dict(ann_params or {})
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.random_state = random_state
+        self.user_factors = None
+        self.item_factors = None
+    
+    def _fit(self):
+        """Calculer les facteurs par ALS puis l'index des produits similaires"""
+        ratings = self.user_item_matrix
+        ratings_t = sp.csr_matrix(ratings.T)
+        rng = np.random.default_rng(self.random_state)
+        self.item_factors = (rng.standard_normal((ratings.shape[1], self.factors)) * 0.01).astype(np.float32)
+        
+        for _ in range(self.iterations):
+            self.user_factors = solve_factors(ratings, self.item_factors, self.regularization, self.alpha,
+                                              n_jobs=self.n_jobs)
+            self.item_factors = solve_factors(ratings_t, self.user_factors, self.regularization, self.alpha,
+                                              n_jobs=self.n_jobs)
+        
+        # Produits similaires: cosinus entre facteurs des produits
+        self.item_neighbor_indices, self.item_neighbor_scores = topk_neighbors(
+            self.item_factors, self.n_item_neighbors, n_jobs=self.n_jobs
+        )
+        self._build_ann()
+    
+    def _item_vectors(self):
+        """Facteurs des produits, comparés pour trouver les produits similaires"""
+        return self.item_factors
+    
+    def _item_similarities(self, product_idx, columns):
+        """Similarités cosinus entre les facteurs d'un produit et ceux de quelques colonnes"""
+        vectors = l2_normalize_rows(self.item_factors[np.r_[product_idx, columns]])
+        return vectors[1:] @ vectors[0]
+    
+    def _rescale_neighbors(self):
+        """
+        Les scores et les voisins sont calculés sur les facteurs, inchangés par la
+        décroissance des poids: ils suivront au prochain entraînement
+        """
+    
+    def _ann_vectors(self):
+        """
+        Facteurs des produits complétés pour la recherche du produit scalaire maximal
+        
+        Returns:
+            numpy.ndarray: Facteurs des produits et coordonnée √(M² - |y|²)
+        """
+        norms = np.linalg.norm(self.item_factors, axis=1)
+        complement = np.sqrt(np.maximum(norms.max(initial=0) ** 2 - norms ** 2, 0))
+        return np.hstack([self.item_factors, complement[:, np.newaxis]]).astype(np.float32)
+    
+    def _refresh(self, touched_users, touched_products):
+        """
+        Replier les lignes modifiées dans les facteurs existants
+        
+        Les facteurs des utilisateurs du lot sont résolus avec les facteurs
+        des produits fixés, puis ceux des produits du lot avec les facteurs
+        des utilisateurs mis à jour: une demi-itération d'ALS limitée aux
+        lignes touchées. Les autres facteurs ne changent qu'au prochain
+        entraînement complet.
+        """
+        n_users, n_products = self.user_item_matrix.shape
+        max_norm = np.linalg.norm(self.item_factors, axis=1).max(initial=0)
+        user_factors = np.zeros((n_users, self.factors), dtype=np.float32)
+        user_factors[:len(self.user_factors)] = self.user_factors
+        item_factors = np.zeros((n_products, self.factors), dtype=np.float32)
+        item_factors[:len(self.item_factors)] = self.item_factors
+        
+        user_factors[touched_users] = solve_factors(self.user_item_matrix, item_factors, self.regularization,
+                                                    self.alpha, rows=touched_users, n_jobs=self.n_jobs)
+        item_factors[touched_products] = solve_factors(sp.csr_matrix(self.user_item_matrix.T), user_factors,
+                                                       self.regularization, self.alpha, rows=touched_products,
+                                                       n_jobs=self.n_jobs)
+        self.user_factors, self.item_factors = user_factors, item_factors
+        
+        self.item_neighbor_indices, self.item_neighbor_scores = refresh_topk_neighbors(
+            self.item_factors, self.item_neighbor_indices, self.item_neighbor_scores,
+            touched_products, self.n_item_neighbors, n_jobs=self.n_jobs
+        )
+        # La coordonnée ajoutée aux facteurs dépend de la plus grande norme: si elle
+        # change, tous les vecteurs indexés changent et l'index est reconstruit
+        unchanged_norm = np.linalg.norm(self.item_factors, axis=1).max(initial=0) == max_norm
+        self._update_ann(touched_products if unchanged_norm else None)
+    
+    def _top_products(self, user_indices, k, columns=None):
+        """
+        Sélectionner les k produits recommandables de meilleur score de plusieurs utilisateurs
+        
+        Sans index approché, tous les produits sont scorés (ou les seules
+        `columns`, toujours scorées exactement). Sinon, l'index fournit des
+        candidats (k plus une marge pour les produits déjà vus ou non
+        recommandables), classés ensuite par produit scalaire exact.
+        
+        Args:
+            user_indices (numpy.ndarray): Indices des utilisateurs dans la matrice
+            k (int): Nombre de produits par utilisateur
+            columns (numpy.ndarray): Colonnes des produits candidats (None: tous)
+            
+        Returns:
+            tuple: (indices int32, scores float32), une ligne par utilisateur, triés par
+            score décroissant; seuls les produits de score positif sont recommandables
+        """
+        if self.ann_index is None or columns is not None:
+            return super()._top_products(user_indices, k, columns)
+        
+        n_products = self.user_item_matrix.shape[1]
+        interacted = self.user_item_matrix[user_indices]
+        n_candidates = min(n_products, 2 * (k + int(np.diff(interacted.indptr).max(initial=0))))
+        user_factors = self.user_factors[user_indices]
+        queries = np.hstack([user_factors, np.zeros((len(user_indices), 1), dtype=np.float32)])
+        candidates, _ = self.ann_index.query(queries, n_candidates)
+        valid = candidates >= 0
+        candidates = np.where(valid, candidates, 0)
+        scores = np.einsum('uf,ucf->uc', user_factors, self.item_factors[candidates]).astype(np.float64)
+        
+        # Écarter les places vides, les produits déjà interagis et les produits non recommandables
+        interacted = interacted.tocoo()
+        positive = interacted.data > 0
+        seen_keys = interacted.row[positive].astype(np.int64) * n_products + interacted.col[positive]
+        rows = np.arange(len(user_indices), dtype=np.int64)[:, np.newaxis]
+        seen = np.isin(rows * n_products + candidates, seen_keys)
+        scores[~valid | seen | ~self.catalog.available[candidates]] = 0
+        
+        top, top_scores = select_top_k(scores, k)
+        return np.take_along_axis(candidates, top, axis=1).astype(np.int32), top_scores
+    
+    def _predict_scores_batch(self, user_indices, columns=None):
+        """
+        Calculer les scores de plusieurs utilisateurs pour tous les produits
+        
+        Le score est le produit scalaire des facteurs de l'utilisateur et du
+        produit; les produits déjà vus par l'utilisateur ont un score nul.
+        
+        Args:
+            user_indices (numpy.ndarray): Indices des utilisateurs dans la matrice
+            columns (numpy.ndarray): Colonnes des produits à scorer (None: tous)
+        
+        Returns:
+            numpy.ndarray: Score de chaque produit (de `columns`), une ligne par utilisateur
+        """
+        item_factors = self.item_factors if columns is None else self.item_factors[columns]
+        prediction_scores = (self.user_factors[user_indices] @ item_factors.T).astype(np.float64)
+        
+        # Exclure les produits déjà interagis
+        interacted = self.user_item_matrix[user_indices]
+        interacted = (interacted if columns is None else interacted[:, columns]).tocoo()
+        positive = interacted.data > 0
+        prediction_scores[interacted.row[positive], interacted.col[positive]] = 0
+        return prediction_scores
+    
+    def settings(self):
+        return {
+            'factors': self.factors,
+            'regularization': self.regularization,
+            'alpha': self.alpha,
+            'iterations': self.iterations,
+            'random_state': self.random_state,
+            'aggregation': self.aggregation,
+            'n_item_neighbors': self.n_item_neighbors,
+            'n_jobs': self.n_jobs,
+            'batch_size': self.batch_size,
+            'aggregate_in_database': self.aggregate_in_database,
+            'ann': self.ann,
+            'ann_params': self.ann_params,
+            'popularity_half_life_days': self.popularity_half_life_days,
+            'interaction_half_lives': self.interaction_half_lives,
+            'category_shards': self.category_shards,
+            'shard_jobs': self.shard_jobs
+        }
+    
+    def _snapshot_arrays(self):
+        arrays = super()._snapshot_arrays()
+        arrays['user_factors'] = self.user_factors
+        arrays['item_factors'] = self.item_factors
+        return arrays
+    
+    def _restore_arrays(self, arrays, catalog_records):
+        super()._restore_arrays(arrays, catalog_records)
+        self.user_factors = arrays['user_factors']
+        self.item_factors = arrays['item_factors']
@@ -0,0 +1,383 @@
+import copy
+import os
+import tempfile
+
+import numpy as np
+import scipy.sparse as sp
+
+from models.neighbors import l2_normalize_rows, select_top_k
+
+
+def _dense_rows(vectors, rows=None):
+    """Lignes (toutes par défaut) d'une matrice creuse ou dense, en tableau dense float32"""
+    selected = vectors if rows is None else vectors[rows]
+    selected = selected.toarray() if sp.issparse(selected) else np.asarray(selected)
+    return selected.astype(np.float32, copy=False)
+
+
+class BruteForceIndex:
+    """
+    Recherche exacte des plus proches voisins (cosinus)
+    
+    Sert de référence aux index approchés: chaque requête est comparée à
+    tous les vecteurs indexés.
+    """
+    
+    kind = 'brute'
+    sparse_vectors = True
+    
+    def __init__(self, vectors):
+        """
+        Args:
+            vectors (scipy.sparse.spmatrix | numpy.ndarray): Vecteurs indexés, un par ligne
+        """
+        self.vectors = l2_normalize_rows(vectors)
+    
+    def query(self, queries, k):
+        """
+        Trouver les k vecteurs indexés les plus similaires à chaque requête
+        
+        Args:
+            queries (scipy.sparse.spmatrix | numpy.ndarray): Requêtes, une par ligne
+            k (int): Nombre de voisins par requête
+        
+        Returns:
+            tuple: (indices int32, similarités cosinus float32), de forme (requêtes, k);
+            les places sans voisin valent -1 (indice) et -inf (similarité)
+        """
+        similarities = l2_normalize_rows(queries) @ self.vectors.T
+        similarities = similarities.toarray() if sp.issparse(similarities) else np.asarray(similarities)
+        return _pad(*select_top_k(similarities, k), k)
+    
+    def update(self, vectors, rows):
+        """Index des vecteurs mis à jour (la recherche exacte n'a rien à réindexer)"""
+        return BruteForceIndex(vectors)
+    
+    def settings(self):
+        return {}
+    
+    def arrays(self):
+        return {}
+    
+    @classmethod
+    def from_arrays(cls, vectors, arrays, **settings):
+        return cls(vectors)
+
+
+class RandomProjectionIndex:
+    """
+    Index LSH par projections aléatoires (hachage SimHash du cosinus)
+    
+    Chaque table code un vecteur par le signe de `n_bits` projections
+    aléatoires; les vecteurs de même code partagent un seau. Une requête
+    lit son seau dans chaque table et, en multi-probe, les `n_probes` seaux
+    voisins obtenus en inversant les bits dont la projection est la plus
+    proche de zéro. Les candidats sont ensuite classés exactement. Plus de
+    tables ou de seaux sondés augmentent le rappel et la latence; plus de
+    bits réduisent la taille des seaux.
+    """
+    
+    kind = 'lsh'
+    sparse_vectors = True
+    
+    def __init__(self, vectors, n_tables=16, n_bits=8, n_probes=4, seed=0, planes=None):
+        """
+        Args:
+            vectors (scipy.sparse.spmatrix | numpy.ndarray): Vecteurs indexés, un par ligne
+            n_tables (int): Nombre de tables de hachage
+            n_bits (int): Nombre de bits (projections) par table
+            n_probes (int): Nombre de seaux voisins sondés par table, en plus du seau exact
+            seed (int): Graine des projections
+            planes (numpy.ndarray): Projections déjà tirées (rechargement d'un instantané)
+        """
+        self.vectors = l2_normalize_rows(vectors)
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.n_probes = min(n_probes, n_bits)
+        self.seed = seed
+        self.planes = planes if planes is not None else self._draw_planes(vectors.shape[1])
+        
+        # Seaux de toutes les tables dans un seul tableau trié par clé (table, code)
+        keys = self._keys(self._codes(self._project(self.vectors)))
+        order = np.argsort(keys.ravel(), kind='stable')
+        self.bucket_keys = keys.ravel()[order]
+        self.bucket_members = (order // self.n_tables).astype(np.int32)
+    
+    def _draw_planes(self, dim):
+        """
+        Projections aléatoires de vecteurs de dimension `dim`
+        
+        Les tirages sont faits ligne par ligne: les projections d'une dimension
+        plus grande commencent par celles d'une dimension plus petite, ce qui
+        permet d'ajouter des colonnes (nouveaux produits) sans rehacher les
+        vecteurs qui n'ont pas de valeur dans ces colonnes.
+        """
+        return np.random.default_rng(self.seed).standard_normal((dim, self.n_tables * self.n_bits)).astype(np.float32)
+    
+    def _project(self, vectors):
+        projections = vectors @ self.planes
+        projections = projections.toarray() if sp.issparse(projections) else np.asarray(projections)
+        return projections.reshape(vectors.shape[0], self.n_tables, self.n_bits)
+    
+    def _codes(self, projections):
+        """Code de chaque vecteur dans chaque table (vecteurs × tables)"""
+        return (projections > 0).astype(np.int64) @ (np.int64(1) << np.arange(self.n_bits, dtype=np.int64))
+    
+    def _keys(self, codes):
+        """Clé de seau unique à toutes les tables: numéro de table puis code"""
+        tables = np.arange(codes.shape[-1], dtype=np.int64)
+        return (tables << np.int64(self.n_bits)) | codes
+    
+    def candidates(self, projections):
+        """
+        Vecteurs indexés présents dans les seaux sondés par une requête
+        
+        Args:
+            projections (numpy.ndarray): Projections de la requête (tables × bits)
+        
+        Returns:
+            numpy.ndarray: Indices des candidats, sans doublons
+        """
+        codes = self._codes(projections[np.newaxis])[0]
+        
+        # Seau exact puis seaux voisins: inverser les bits les moins sûrs
+        flips = np.argsort(np.abs(projections), axis=1)[:, :self.n_probes]
+        probes = np.concatenate([codes[:, np.newaxis], codes[:, np.newaxis] ^ (np.int64(1) << flips)], axis=1)
+        
+        keys = self._keys(probes.T).ravel()
+        starts = np.searchsorted(self.bucket_keys, keys, side='left')
+        lengths = np.searchsorted(self.bucket_keys, keys, side='right') - starts
+        
+        # Positions de tous les membres des seaux sondés, sans boucle par seau
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = offsets + np.arange(lengths.sum())
+        return np.unique(self.bucket_members[positions])
+    
+    def query(self, queries, k):
+        """
+        Trouver (approximativement) les k vecteurs indexés les plus similaires à chaque requête
+        
+        Args:
+            queries (scipy.sparse.spmatrix | numpy.ndarray): Requêtes, une par ligne
+            k (int): Nombre de voisins par requête
+        
+        Returns:
+            tuple: (indices int32, similarités cosinus float32), de forme (requêtes, k);
+            les places sans voisin valent -1 (indice) et -inf (similarité)
+        """
+        normalized = l2_normalize_rows(queries)
+        projections = self._project(normalized)
+        indices = np.full((normalized.shape[0], k), -1, dtype=np.int32)
+        scores = np.full((normalized.shape[0], k), -np.inf, dtype=np.float32)
+        
+        for row in range(normalized.shape[0]):
+            candidates = self.candidates(projections[row])
+            if not len(candidates):
+                continue
+            query = _dense_rows(normalized, [row])[0]
+            similarities = self.vectors[candidates] @ query
+            similarities = np.asarray(similarities, dtype=np.float64).ravel()
+            top, top_scores = select_top_k(similarities[np.newaxis], k)
+            indices[row, :top.shape[1]] = candidates[top[0]]
+            scores[row, :top.shape[1]] = top_scores[0]
+        return indices, scores
+    
+    def update(self, vectors, rows):
+        """
+        Rehacher quelques lignes après une mise à jour incrémentale
+        
+        Les entrées des lignes modifiées sont retirées des seaux, puis leurs
+        nouvelles clés insérées à leur place dans le tableau trié: le résultat
+        est identique à une reconstruction, sans projeter les autres vecteurs.
+        L'index d'origine n'est pas modifié (il peut encore être servi).
+        
+        Args:
+            vectors (scipy.sparse.spmatrix | numpy.ndarray): Tous les vecteurs, dont ceux mis à jour
+            rows (array-like): Lignes modifiées; les lignes ajoutées en fin de `vectors` sont incluses d'office
+        
+        Returns:
+            RandomProjectionIndex: Nouvel index
+        """
+        index = copy.copy(self)
+        index.vectors = l2_normalize_rows(vectors)
+        n_rows = index.vectors.shape[0]
+        if index.vectors.shape[1] > len(self.planes):
+            index.planes = self._draw_planes(index.vectors.shape[1])
+        n_indexed = len(self.bucket_members) // self.n_tables
+        rows = np.union1d(np.asarray(rows, dtype=np.int64), np.arange(n_indexed, n_rows))
+        
+        # Clé composite (seau, ligne): l'ordre des seaux d'une reconstruction
+        kept = ~np.isin(self.bucket_members, rows)
+        kept_keys, kept_members = self.bucket_keys[kept], self.bucket_members[kept]
+        keys = self._keys(index._codes(index._project(index.vectors[rows]))).ravel()
+        members = np.repeat(rows, self.n_tables)
+        order = np.lexsort((members, keys))
+        keys, members = keys[order], members[order]
+        positions = np.searchsorted(kept_keys.astype(np.int64) * n_rows + kept_members, keys * n_rows + members)
+        index.bucket_keys = np.insert(kept_keys, positions, keys)
+        index.bucket_members = np.insert(kept_members, positions, members).astype(np.int32)
+        return index
+    
+    def settings(self):
+        return {'n_tables': self.n_tables, 'n_bits': self.n_bits, 'n_probes': self.n_probes, 'seed': self.seed}
+    
+    def arrays(self):
+        return {'planes': self.planes, 'bucket_keys': self.bucket_keys, 'bucket_members': self.bucket_members}
+    
+    @classmethod
+    def from_arrays(cls, vectors, arrays, n_tables=16, n_bits=8, n_probes=4, seed=0):
+        index = cls.__new__(cls)
+        index.vectors = l2_normalize_rows(vectors)
+        index.n_tables, index.n_bits, index.n_probes, index.seed = n_tables, n_bits, min(n_probes, n_bits), seed
+        index.planes = arrays['planes']
+        index.bucket_keys = arrays['bucket_keys']
+        index.bucket_members = arrays['bucket_members']
+        return index
+
+
+class HNSWIndex:
+    """
+    Index de graphe HNSW (bibliothèque optionnelle hnswlib)
+    
+    `ef` règle le compromis rappel/latence à la requête; `m` et
+    `ef_construction`, la qualité du graphe construit à l'entraînement.
+    hnswlib ne stocke que des vecteurs denses: l'index est réservé aux
+    vecteurs de petite dimension (facteurs ALS), pas aux lignes creuses de
+    la matrice utilisateurs-produits qu'il faudrait densifier.
+    """
+    
+    kind = 'hnsw'
+    sparse_vectors = False
+    
+    def __init__(self, vectors, m=16, ef_construction=200, ef=50, seed=0, graph=None):
+        """
+        Args:
+            vectors (numpy.ndarray): Vecteurs denses indexés, un par ligne
+            m (int): Nombre de liens par nœud
+            ef_construction (int): Largeur de recherche à la construction
+            ef (int): Largeur de recherche à la requête
+            seed (int): Graine de la construction
+            graph (numpy.ndarray): Graphe sérialisé (rechargement d'un instantané)
+        
+        Raises:
+            ValueError: Si les vecteurs sont creux
+        """
+        try:
+            import hnswlib
+        except ImportError:
+            raise ImportError("L'index 'hnsw' nécessite le paquet hnswlib (pip install hnswlib)")
+        if sp.issparse(vectors):
+            raise ValueError("L'index 'hnsw' n'indexe que des vecteurs denses (modèle als); utiliser 'lsh' ou 'brute'")
+        
+        self.m, self.ef_construction, self.ef, self.seed = m, ef_construction, ef, seed
+        # Seules les dimensions sont lues: au rechargement, les vecteurs sont déjà dans le graphe
+        n_rows, dim = vectors.shape
+        self.index = hnswlib.Index(space='cosine', dim=dim)
+        if graph is None:
+            self.index.init_index(max_elements=max(n_rows, 1), M=m, ef_construction=ef_construction,
+                                  random_seed=seed)
+            self.index.add_items(_dense_rows(l2_normalize_rows(vectors)), np.arange(n_rows))
+        else:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'index.bin')
+                np.asarray(graph).tofile(path)
+                self.index.load_index(path, max_elements=max(n_rows, 1))
+        self.index.set_ef(ef)
+    
+    def query(self, queries, k):
+        """
+        Trouver (approximativement) les k vecteurs indexés les plus similaires à chaque requête
+        
+        Returns:
+            tuple: (indices int32, similarités cosinus float32), de forme (requêtes, k)
+        """
+        n_indexed = self.index.get_current_count()
+        labels, distances = self.index.knn_query(_dense_rows(l2_normalize_rows(queries)), k=min(k, n_indexed))
+        return _pad(labels.astype(np.int32), (1 - distances).astype(np.float32), k)
+    
+    def update(self, vectors, rows):
+        """
+        Réindexer quelques lignes après une mise à jour incrémentale
+        
+        hnswlib remplace les vecteurs des lignes existantes et insère les
+        nouvelles dans le graphe, sans le reconstruire. Le graphe est copié
+        d'abord: l'index d'origine peut encore être servi.
+        
+        Args:
+            vectors (numpy.ndarray): Tous les vecteurs, dont ceux mis à jour
+            rows (array-like): Lignes modifiées; les lignes ajoutées en fin de `vectors` sont incluses d'office
+        
+        Returns:
+            HNSWIndex: Nouvel index
+        """
+        index = copy.copy(self)
+        index.index = copy.deepcopy(self.index)
+        n_rows = vectors.shape[0]
+        if n_rows > index.index.get_max_elements():
+            index.index.resize_index(n_rows)
+        rows = np.union1d(np.asarray(rows, dtype=np.int64), np.arange(index.index.get_current_count(), n_rows))
+        if len(rows):
+            index.index.add_items(_dense_rows(l2_normalize_rows(vectors), rows), rows)
+        index.index.set_ef(self.ef)
+        return index
+    
+    def settings(self):
+        return {'m': self.m, 'ef_construction': self.ef_construction, 'ef': self.ef, 'seed': self.seed}
+    
+    def arrays(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index.bin')
+            self.index.save_index(path)
+            return {'graph': np.fromfile(path, dtype=np.uint8)}
+    
+    @classmethod
+    def from_arrays(cls, vectors, arrays, **settings):
+        return cls(vectors, graph=arrays['graph'], **settings)
+
+
+def _pad(indices, scores, k):
+    """Compléter des résultats de moins de k colonnes avec -1 / -inf"""
+    if indices.shape[1] == k:
+        return indices, scores
+    padded_indices = np.full((indices.shape[0], k), -1, dtype=np.int32)
+    padded_scores = np.full((indices.shape[0], k), -np.inf, dtype=np.float32)
+    padded_indices[:, :indices.shape[1]] = indices
+    padded_scores[:, :scores.shape[1]] = scores
+    return padded_indices, padded_scores
+
+
+# Index disponibles, par nom de configuration
+ANN_INDEXES = {index.kind: index for index in [BruteForceIndex, RandomProjectionIndex, HNSWIndex]}
+
+
+def build_index(kind, vectors, **settings):
+    """
+    Construire un index de plus proches voisins
+    
+    Args:
+        kind (str): Type d'index ('brute', 'lsh' ou 'hnsw')
+        vectors (scipy.sparse.spmatrix | numpy.ndarray): Vecteurs indexés, un par ligne
+        **settings: Paramètres de l'index
+    
+    Returns:
+        Index construit
+    """
+    if kind not in ANN_INDEXES:
+        raise ValueError(f"Index inconnu: {kind} (valeurs possibles: {', '.join(ANN_INDEXES)})")
+    return ANN_INDEXES[kind](vectors, **settings)
+
+
+def load_index(kind, vectors, arrays, **settings):
+    """
+    Reconstruire un index à partir des tableaux enregistrés avec un instantané
+    
+    Args:
+        kind (str): Type d'index
+        vectors (scipy.sparse.spmatrix | numpy.ndarray): Vecteurs indexés
+        arrays (dict): Tableaux renvoyés par `arrays()` à l'enregistrement
+        **settings: Paramètres renvoyés par `settings()` à l'enregistrement
+    
+    Returns:
+        Index reconstruit
+    """
+    return ANN_INDEXES[kind].from_arrays(vectors, arrays, **settings)
@@ -0,0 +1,134 @@
+import numpy as np
+
+
+class ProductCatalog:
+    """
+    Catalogue des produits aligné sur les colonnes de la matrice utilisateur-produit
+    
+    L'indice d'un produit dans le catalogue est son indice de colonne: les
+    réponses de l'API sont préconstruites à l'entraînement et un masque indique
+    les produits recommandables (présents dans la base et non collectés).
+    """
+    
+    def __init__(self, product_ids, records, available):
+        """
+        Initialiser le catalogue
+        
+        Args:
+            product_ids (numpy.ndarray): ID du produit de chaque colonne
+            records (list): Réponse préconstruite de chaque colonne (None si inconnue)
+            available (numpy.ndarray): Masque booléen des produits recommandables
+        """
+        self.product_ids = product_ids
+        self.records = records
+        self.available = available
+    
+    @classmethod
+    def build(cls, product_ids, products):
+        """
+        Construire le catalogue à partir des documents de la collection des produits
+        
+        Args:
+            product_ids (array-like): ID du produit de chaque colonne de la matrice
+            products (iterable): Documents de la collection productstree
+            
+        Returns:
+            ProductCatalog: Catalogue aligné sur `product_ids`
+        """
+        product_ids = np.asarray(product_ids, dtype=object)
+        column_mapping = {product_id: idx for idx, product_id in enumerate(product_ids)}
+        records = [None] * len(product_ids)
+        available = np.zeros(len(product_ids), dtype=bool)
+        
+        for product in products:
+            idx = column_mapping.get(str(product['_id']))
+            if idx is None:
+                continue
+            
+            records[idx] = cls.record(product)
+            available[idx] = not product.get('isCollected', False)
+        
+        return cls(product_ids, records, available)
+    
+    @staticmethod
+    def record(product):
+        """
+        Construire la réponse de l'API pour un document produit
+        
+        Args:
+            product (dict): Document de la collection productstree
+            
+        Returns:
+            dict: Réponse préconstruite
+        """
+        return {
+            '_id': str(product['_id']),
+            'title': product.get('title', ''),
+            'image': product.get('image', ''),
+            'category': product.get('category', ''),
+            'price': product.get('price', 0)
+        }
+    
+    def extend(self, product_ids, products):
+        """
+        Ajouter des colonnes au catalogue, sans modifier le catalogue courant
+        
+        Args:
+            product_ids (list): ID des nouveaux produits, dans l'ordre des nouvelles colonnes
+            products (list): Document de chaque nouveau produit (None si inconnu)
+            
+        Returns:
+            ProductCatalog: Nouveau catalogue
+        """
+        records = [self.record(product) if product is not None else None for product in products]
+        available = [product is not None and not product.get('isCollected', False) for product in products]
+        return ProductCatalog(
+            np.concatenate([np.asarray(self.product_ids, dtype=object), np.array(product_ids, dtype=object)]),
+            list(self.records) + records,
+            np.concatenate([self.available, np.array(available, dtype=bool)])
+        )
+    
+    def update(self, product_mapping, products):
+        """
+        Remplacer la réponse et la disponibilité de produits modifiés, sans modifier le catalogue courant
+        
+        Args:
+            product_mapping (dict): Indice de colonne de chaque ID de produit
+            products (iterable): Documents modifiés (ceux des produits hors catalogue sont ignorés)
+            
+        Returns:
+            ProductCatalog: Nouveau catalogue
+        """
+        records = list(self.records)
+        available = np.array(self.available, dtype=bool)
+        for product in products:
+            idx = product_mapping.get(str(product['_id']))
+            if idx is not None:
+                records[idx] = self.record(product)
+                available[idx] = not product.get('isCollected', False)
+        return ProductCatalog(self.product_ids, records, available)
+    
+    def categories(self):
+        """
+        Catégorie de chaque colonne
+        
+        Returns:
+            numpy.ndarray: Catégorie de chaque produit ('' si inconnu ou sans catégorie)
+        """
+        return np.array([str(record['category'] or '') if record is not None else '' for record in self.records],
+                        dtype=str)
+    
+    def __len__(self):
+        return len(self.product_ids)
+    
+    def hydrate(self, indices):
+        """
+        Convertir des indices de colonnes en réponses de l'API
+        
+        Args:
+            indices (array-like): Indices de produits recommandables
+            
+        Returns:
+            list: Réponses préconstruites, dans l'ordre des indices
+        """
+        return [self.records[idx] for idx in indices]
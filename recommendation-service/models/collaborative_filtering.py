@@ -1,8 +1,367 @@
+import copy
+import datetime
+import json
+import logging
+import os
+import time
+import uuid
+
 import numpy as np
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from database import get_product_interactions, get_products, get_product_by_id
-from bson.objectid import ObjectId
+import scipy.sparse as sp
+from models.ann import ANN_INDEXES, build_index, load_index
+from models.catalog import ProductCatalog
+from models.incremental import InteractionBuffer
+from models.materialization import MaterializedRecommendations
+from models.popularity import PopularityRankings, recency_weights
+from models.shards import CategoryShards
+from models.neighbors import (DEFAULT_BLOCK_BYTES, l2_normalize_rows, refresh_topk_neighbors, rescore_neighbors,
+                              select_top_k, topk_neighbors)
+from database import (interaction_id_range, iter_aggregated_interaction_chunks, iter_interaction_chunks,
+                      iter_products, latest_interaction_id, latest_product_update, product_ids_query)
+from metrics import StageTimer
+
+logger = logging.getLogger(__name__)
+
+# Poids attribués à chaque type d'interaction
+INTERACTION_WEIGHTS = {
+    'view': 1.0,
+    'cart': 3.0,
+    'purchase': 5.0
+}
+DEFAULT_INTERACTION_WEIGHT = 1.0
+
+# Version du format des instantanés enregistrés par CollaborativeFilteringModel.save
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Fonctions d'agrégation des interactions dupliquées (même utilisateur, même produit)
+AGGREGATIONS = {
+    'max': np.maximum,
+    'sum': np.add
+}
+
+# Taille à partir de laquelle factorize délègue à pandas (chargé seulement à l'entraînement)
+FACTORIZE_PANDAS_MIN_SIZE = 10000
+
+
+def factorize(values):
+    """
+    Coder des valeurs en entiers, dans l'ordre de leur première apparition
+    
+    Équivalent de pandas.factorize (None est codé -1). Les petits tableaux,
+    comme les lots des mises à jour incrémentales, sont codés avec un
+    dictionnaire: le chemin de service n'importe pas pandas, qui n'est chargé
+    que pour les gros tableaux lus à l'entraînement.
+    
+    Args:
+        values (array-like): Valeurs à coder
+        
+    Returns:
+        tuple: (codes numpy.ndarray, valeurs distinctes numpy.ndarray)
+    """
+    values = np.asarray(values, dtype=object)
+    if len(values) >= FACTORIZE_PANDAS_MIN_SIZE:
+        import pandas as pd
+        return pd.factorize(values)
+    
+    index = {}
+    codes = np.fromiter((-1 if value is None else index.setdefault(value, len(index)) for value in values),
+                        dtype=np.intp, count=len(values))
+    uniques = np.empty(len(index), dtype=object)
+    uniques[:] = list(index)
+    return codes, uniques
+
+
+def interaction_weights(interaction_types):
+    """
+    Convertir des types d'interaction en poids sans boucle Python par interaction
+    
+    Args:
+        interaction_types (array-like): Types d'interaction ('view', 'cart', 'purchase')
+        
+    Returns:
+        numpy.ndarray: Poids de chaque interaction
+    """
+    type_codes, unique_types = factorize(interaction_types)
+    type_weights = np.array(
+        [INTERACTION_WEIGHTS.get(interaction_type, DEFAULT_INTERACTION_WEIGHT) for interaction_type in unique_types],
+        dtype=np.float64
+    )
+    return type_weights[type_codes]
+
+
+def decay_half_lives(half_lives):
+    """
+    Demi-vie de chaque composante d'une matrice aux poids décroissants
+    
+    Les types d'interaction de même demi-vie partagent une composante; la
+    dernière regroupe les types sans décroissance (demi-vie infinie).
+    
+    Args:
+        half_lives (dict): Demi-vie (jours) de chaque type d'interaction
+        
+    Returns:
+        numpy.ndarray: Demi-vies (jours), triées
+    """
+    return np.array(sorted({float(days) for days in half_lives.values() if days}) + [np.inf])
+
+
+def interaction_components(interaction_types, half_lives):
+    """
+    Composante de décroissance (indice dans `decay_half_lives`) de chaque interaction
+    
+    Args:
+        interaction_types (array-like): Types d'interaction
+        half_lives (dict): Demi-vie (jours) de chaque type d'interaction
+        
+    Returns:
+        numpy.ndarray: Indices int8
+    """
+    type_codes, unique_types = factorize(interaction_types)
+    component_index = {days: idx for idx, days in enumerate(decay_half_lives(half_lives))}
+    type_components = np.array(
+        [component_index[float(half_lives.get(interaction_type) or np.inf)] for interaction_type in unique_types],
+        dtype=np.int8
+    )
+    return type_components[type_codes]
+
+
+def decayed_interaction_weights(interaction_types, timestamps, now, half_lives):
+    """
+    Poids d'interactions décroissant avec leur âge: poids du type · 0.5 ** (âge / demi-vie du type)
+    
+    Le calcul est vectorisé sur les tableaux de types et de dates. Une
+    interaction sans date, ou datée après `now`, garde le poids de son type.
+    
+    Args:
+        interaction_types (array-like): Types d'interaction
+        timestamps (numpy.ndarray): Dates des interactions (datetime64, NaT si inconnue)
+        now (numpy.datetime64): Date de référence
+        half_lives (dict): Demi-vie (jours) de chaque type d'interaction; les types
+            absents ne décroissent pas
+        
+    Returns:
+        tuple: (poids, composante de chaque interaction, voir `interaction_components`)
+    """
+    components = interaction_components(interaction_types, half_lives)
+    ages = (now - np.asarray(timestamps, dtype='datetime64[ms]')) / np.timedelta64(1, 'D')
+    ages = np.where(np.isnan(ages), 0.0, np.maximum(ages, 0.0))
+    weights = interaction_weights(interaction_types) * np.exp2(-ages / decay_half_lives(half_lives)[components])
+    return weights, components
+
+
+def combine_components(components, aggregation='max'):
+    """
+    Combiner des matrices de même forme comme des interactions dupliquées (somme ou maximum)
+    
+    Args:
+        components (list): Matrices creuses
+        aggregation (str): 'max' ou 'sum'
+        
+    Returns:
+        scipy.sparse.csr_matrix: Matrice combinée, indices triés
+    """
+    combined = components[0]
+    for component in components[1:]:
+        combined = combined + component if aggregation == 'sum' else combined.maximum(component)
+    combined = sp.csr_matrix(combined)
+    combined.sort_indices()
+    return combined
+
+
+def expand_rows(matrix, shape):
+    """Agrandir une matrice CSR à `shape` (nouvelles lignes vides, nouvelles colonnes) sans copier ses données"""
+    return sp.csr_matrix(
+        (matrix.data, matrix.indices, np.r_[matrix.indptr, np.full(shape[0] - matrix.shape[0], matrix.indptr[-1])]),
+        shape=shape
+    )
+
+
+def current_time():
+    """Date courante, en datetime64[ms]"""
+    return np.datetime64(int(time.time() * 1000), 'ms')
+
+
+def aggregate_interactions(user_codes, product_codes, weights, shape, aggregation='max'):
+    """
+    Construire une matrice creuse en agrégeant les paires (utilisateur, produit) dupliquées
+    
+    Args:
+        user_codes (numpy.ndarray): Indice de ligne de chaque interaction
+        product_codes (numpy.ndarray): Indice de colonne de chaque interaction
+        weights (numpy.ndarray): Poids de chaque interaction
+        shape (tuple): Dimensions de la matrice
+        aggregation (str): 'max' ou 'sum'
+        
+    Returns:
+        scipy.sparse.csr_matrix: Matrice utilisateur-produit
+    """
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Agrégation inconnue: {aggregation}")
+    
+    n_products = shape[1]
+    
+    # Regrouper les paires dupliquées via une clé linéaire triée
+    keys = np.asarray(user_codes, dtype=np.int64) * n_products + product_codes
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    if len(sorted_keys):
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        data = AGGREGATIONS[aggregation].reduceat(np.asarray(weights, dtype=np.float64)[order], starts)
+    else:
+        starts = np.array([], dtype=np.intp)
+        data = np.array([], dtype=np.float64)
+    unique_keys = sorted_keys[starts]
+    
+    return sp.csr_matrix((data, (unique_keys // n_products, unique_keys % n_products)), shape=shape)
+
+
+class InteractionAccumulator:
+    """
+    Accumule des interactions reçues par morceaux sous forme de codes entiers
+    
+    Seuls les codes (int32) et les poids (float32) de chaque interaction sont
+    conservés, avec un dictionnaire des ID uniques: les chaînes d'un morceau
+    peuvent être libérées dès qu'il a été ajouté. Les ID sont numérotés dans
+    leur ordre de première apparition. La popularité de chaque produit est
+    cumulée au fil des morceaux.
+    """
+    
+    def __init__(self):
+        self.user_index = {}
+        self.product_index = {}
+        self.product_popularity = np.zeros(0)
+        self._user_codes = []
+        self._product_codes = []
+        self._weights = []
+        self._components = []
+    
+    def __len__(self):
+        return sum(len(codes) for codes in self._user_codes)
+    
+    @staticmethod
+    def _encode(index, ids):
+        """Convertir des ID en codes globaux, en numérotant les nouveaux ID"""
+        codes, unique_ids = factorize(ids)
+        unique_codes = np.fromiter(
+            (index.setdefault(unique_id, len(index)) for unique_id in unique_ids),
+            dtype=np.int32, count=len(unique_ids)
+        )
+        return unique_codes[codes]
+    
+    def add(self, user_ids, product_ids, weights, popularity=None, components=None):
+        """
+        Ajouter un morceau d'interactions
+        
+        Args:
+            user_ids (array-like): ID utilisateur de chaque interaction
+            product_ids (array-like): ID produit de chaque interaction
+            weights (array-like): Poids de chaque interaction
+            popularity (array-like): Contribution de chaque interaction à la popularité
+                de son produit (1 par défaut)
+            components (array-like): Composante de décroissance de chaque interaction,
+                pour `build_components`
+        """
+        product_codes = self._encode(self.product_index, product_ids)
+        self._user_codes.append(self._encode(self.user_index, user_ids))
+        self._product_codes.append(product_codes)
+        self._weights.append(np.asarray(weights, dtype=np.float32))
+        if components is not None:
+            self._components.append(np.asarray(components, dtype=np.int8))
+        
+        chunk_popularity = np.bincount(product_codes, weights=popularity,
+                                       minlength=len(self.product_index)).astype(np.float64, copy=False)
+        chunk_popularity[:len(self.product_popularity)] += self.product_popularity
+        self.product_popularity = chunk_popularity
+    
+    def build(self, aggregation='max'):
+        """
+        Construire la matrice utilisateur-produit des interactions accumulées
+        
+        Returns:
+            tuple: (scipy.sparse.csr_matrix, IDs utilisateurs uniques, IDs produits uniques)
+        """
+        matrix = aggregate_interactions(*self._columns(), self._shape(), aggregation)
+        return matrix, *self._unique_ids()
+    
+    def build_components(self, aggregation, n_components):
+        """
+        Construire une matrice par composante de décroissance des interactions accumulées
+        
+        Combinées par `combine_components`, les composantes donnent la matrice de `build`.
+        
+        Args:
+            aggregation (str): 'max' ou 'sum'
+            n_components (int): Nombre de composantes
+            
+        Returns:
+            tuple: (liste de scipy.sparse.csr_matrix, IDs utilisateurs uniques, IDs produits uniques)
+        """
+        user_codes, product_codes, weights = self._columns()
+        components = np.concatenate(self._components) if self._components else np.array([], dtype=np.int8)
+        matrices = []
+        for component in range(n_components):
+            mask = components == component
+            matrices.append(aggregate_interactions(user_codes[mask], product_codes[mask], weights[mask],
+                                                   self._shape(), aggregation))
+        return matrices, *self._unique_ids()
+    
+    def _shape(self):
+        return len(self.user_index), len(self.product_index)
+    
+    def _columns(self):
+        """Codes utilisateur, codes produit et poids de toutes les interactions accumulées"""
+        return (np.concatenate(self._user_codes) if self._user_codes else np.array([], dtype=np.int32),
+                np.concatenate(self._product_codes) if self._product_codes else np.array([], dtype=np.int32),
+                np.concatenate(self._weights) if self._weights else np.array([], dtype=np.float32))
+    
+    def _unique_ids(self):
+        return np.array(list(self.user_index), dtype=object), np.array(list(self.product_index), dtype=object)
+
+
+def build_user_item_matrix(user_ids, product_ids, interaction_types, aggregation='max'):
+    """
+    Construire la matrice utilisateur-produit creuse à partir de colonnes d'interactions
+    
+    Les identifiants sont factorisés dans leur ordre de première apparition et les
+    paires (utilisateur, produit) dupliquées sont agrégées avec `aggregation`.
+    
+    Args:
+        user_ids (array-like): ID utilisateur de chaque interaction
+        product_ids (array-like): ID produit de chaque interaction
+        interaction_types (array-like): Type de chaque interaction
+        aggregation (str): 'max' ou 'sum'
+        
+    Returns:
+        tuple: (scipy.sparse.csr_matrix, IDs utilisateurs uniques, IDs produits uniques)
+    """
+    accumulator = InteractionAccumulator()
+    accumulator.add(user_ids, product_ids, interaction_weights(interaction_types))
+    return accumulator.build(aggregation)
+
+
+def read_watermark(db):
+    """
+    Filigrane des données lues par un entraînement: dernière interaction et dernière modification de produit
+    
+    Args:
+        db: Connexion à la base de données MongoDB
+        
+    Returns:
+        dict: _id de la dernière interaction et date de la dernière modification
+        de produit, en chaînes (None si inconnus)
+    """
+    interaction_id = latest_interaction_id(db)
+    product_updated_at = latest_product_update(db)
+    return {
+        'interaction_id': str(interaction_id) if interaction_id is not None else None,
+        'product_updated_at': product_updated_at.isoformat() if product_updated_at is not None else None
+    }
+
+
+def new_model_version():
+    """Générer un identifiant de version de modèle triable par date"""
+    return f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
 
 class CollaborativeFilteringModel:
     """
@@ -12,15 +371,93 @@ class CollaborativeFilteringModel:
     similaires ou des produits pour un utilisateur spécifique.
     """
     
-    def __init__(self):
-        """Initialiser le modèle de filtrage collaboratif"""
+    # Les similarités cosinus et le classement des recommandations ne changent pas quand
+    # tous les poids sont multipliés par un même facteur (voir decay_to)
+    SCALE_INVARIANT = True
+    
+    def __init__(self, aggregation='max', n_item_neighbors=50, n_user_neighbors=None,
+                 precompute_user_neighbors=False, n_jobs=1, batch_size=10000, aggregate_in_database=False,
+                 ann=None, ann_params=None, popularity_half_life_days=30.0, interaction_half_lives=None,
+                 category_shards=False, shard_jobs=1):
+        """
+        Initialiser le modèle de filtrage collaboratif
+        
+        Args:
+            aggregation (str): Agrégation des interactions dupliquées d'un même
+                utilisateur sur un même produit ('max' ou 'sum')
+            n_item_neighbors (int): Nombre de produits similaires conservés par
+                produit dans l'index de voisins
+            n_user_neighbors (int): Nombre maximal d'utilisateurs similaires pris en
+                compte pour recommander (None: tous les utilisateurs similaires)
+            precompute_user_neighbors (bool): Précalculer à l'entraînement la liste des
+                `n_user_neighbors` voisins de chaque utilisateur au lieu de les
+                chercher à chaque requête
+            n_jobs (int): Nombre de threads pour le calcul des voisins par blocs
+            batch_size (int): Nombre de documents lus par morceau lors de l'entraînement
+            aggregate_in_database (bool): Regrouper les interactions dupliquées dans
+                MongoDB ($group) plutôt qu'en Python
+            ann (str): Index approché des voisins des utilisateurs ('brute' ou 'lsh',
+                voir models.ann), construit à l'entraînement; None pour le calcul
+                exact ('hnsw' n'indexe que des vecteurs denses: modèle als)
+            ann_params (dict): Paramètres de l'index approché
+            popularity_half_life_days (float): Demi-vie (jours) du poids des interactions
+                dans les classements de popularité (None: pas de pondération)
+            interaction_half_lives (dict): Demi-vie (jours) du poids de chaque type
+                d'interaction dans la matrice utilisateur-produit; les types absents
+                ne décroissent pas (None: poids fixes)
+            category_shards (bool): Calculer aussi les produits similaires de chaque
+                catégorie du catalogue (voir models.shards)
+            shard_jobs (int): Nombre de processus du calcul des fragments par catégorie
+        """
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Agrégation inconnue: {aggregation}")
+        if precompute_user_neighbors and not n_user_neighbors:
+            raise ValueError("n_user_neighbors est requis pour précalculer les voisins des utilisateurs")
+        if ann and (not n_user_neighbors or precompute_user_neighbors):
+            raise ValueError("L'index approché des utilisateurs nécessite n_user_neighbors, sans précalcul")
+        if ann and ann not in ANN_INDEXES:
+            raise ValueError(f"Index inconnu: {ann} (valeurs possibles: {', '.join(ANN_INDEXES)})")
+        if ann and not ANN_INDEXES[ann].sparse_vectors:
+            raise ValueError(f"L'index {ann} ne peut pas indexer les vecteurs creux des utilisateurs: "
+                             "utiliser le modèle als, ou l'index lsh")
+        if interaction_half_lives and any(days is not None and days <= 0 for days in interaction_half_lives.values()):
+            raise ValueError("Les demi-vies des interactions doivent être positives")
+        
+        self.aggregation = aggregation
+        self.n_item_neighbors = n_item_neighbors
+        self.n_user_neighbors = n_user_neighbors
+        self.precompute_user_neighbors = precompute_user_neighbors
+        self.n_jobs = n_jobs
+        self.batch_size = batch_size
+        self.aggregate_in_database = aggregate_in_database
+        self.ann = ann
+        self.ann_params = dict(ann_params or {})
+        self.ann_index = None
+        self.popularity_half_life_days = popularity_half_life_days
+        self.interaction_half_lives = dict(interaction_half_lives) if interaction_half_lives else None
+        self.decay_components = None
+        self.decay_reference_time = None
+        self.category_shards = category_shards
+        self.shard_jobs = shard_jobs
+        self.shards = None
+        self.popularity = None
         self.user_item_matrix = None
-        self.item_similarity_matrix = None
-        self.user_similarity_matrix = None
-        self.products_df = None
-        self.interactions_df = None
+        self.item_neighbor_indices = None
+        self.item_neighbor_scores = None
+        self.user_vectors = None
+        self.user_neighbor_indices = None
+        self.user_neighbor_scores = None
+        self.catalog = None
         self.product_id_mapping = {}
         self.user_id_mapping = {}
+        self.version = None
+        self.training_stages = {}
+        self.watermark = None
+        self.delta_trainings = 0
+        self.pending_interactions = InteractionBuffer()
+        self.trained_interactions = 0
+        self.incremental_interactions = 0
+        self.materialized = None
         self.is_trained = False
     
     def train(self, db):
@@ -34,213 +471,594 @@ class CollaborativeFilteringModel:
             bool: True si l'entraînement a réussi, False sinon
         """
         try:
-            # Récupérer les interactions utilisateur-produit
-            interactions = get_product_interactions(db)
+            stages = StageTimer()
+            now = current_time()
             
-            if not interactions:
-                print("Aucune interaction trouvée dans la base de données")
+            # Charger les interactions utilisateur-produit par morceaux, jusqu'au filigrane
+            # lu avant la lecture: les suivantes seront lues par le prochain entraînement différentiel
+            with stages('fetch'):
+                watermark = read_watermark(db)
+                interactions = self._load_interactions(db, now,
+                                                       query=interaction_id_range(until=watermark['interaction_id']))
+            
+            if not len(interactions):
+                logger.error("Aucune interaction trouvée dans la base de données")
                 return False
             
-            # Convertir les interactions en DataFrame
-            interactions_data = []
-            for interaction in interactions:
-                user_id = str(interaction['userId'])
-                product_id = str(interaction['productId'])
-                interaction_type = interaction['interactionType']
-                
-                # Attribuer un poids à chaque type d'interaction
-                weight = 1.0
-                if interaction_type == 'view':
-                    weight = 1.0
-                elif interaction_type == 'cart':
-                    weight = 3.0
-                elif interaction_type == 'purchase':
-                    weight = 5.0
-                
-                interactions_data.append({
-                    'userId': user_id,
-                    'productId': product_id,
-                    'weight': weight
-                })
-            
-            self.interactions_df = pd.DataFrame(interactions_data)
-            
-            # Créer des mappages d'ID pour les utilisateurs et les produits
-            unique_users = self.interactions_df['userId'].unique()
-            unique_products = self.interactions_df['productId'].unique()
-            
-            self.user_id_mapping = {user_id: idx for idx, user_id in enumerate(unique_users)}
-            self.product_id_mapping = {product_id: idx for idx, product_id in enumerate(unique_products)}
-            
-            # Créer la matrice utilisateur-produit
-            self.user_item_matrix = np.zeros((len(unique_users), len(unique_products)))
-            
-            for _, row in self.interactions_df.iterrows():
-                user_idx = self.user_id_mapping[row['userId']]
-                product_idx = self.product_id_mapping[row['productId']]
-                self.user_item_matrix[user_idx, product_idx] = row['weight']
-            
-            # Calculer les matrices de similarité
-            self.item_similarity_matrix = cosine_similarity(self.user_item_matrix.T)
-            self.user_similarity_matrix = cosine_similarity(self.user_item_matrix)
-            
-            # Récupérer les produits
-            products = get_products(db)
-            products_data = []
-            
-            for product in products:
-                product_id = str(product['_id'])
-                products_data.append({
-                    'productId': product_id,
-                    'title': product.get('title', ''),
-                    'image': product.get('image', ''),
-                    'category': product.get('category', ''),
-                    'price': product.get('price', 0),
-                    'isCollected': product.get('isCollected', False)
-                })
-            
-            self.products_df = pd.DataFrame(products_data)
+            # Construire la matrice utilisateur-produit creuse et les mappages d'ID
+            with stages('matrix'):
+                if self.interaction_half_lives:
+                    # Une matrice par demi-vie, pour vieillir les poids sans relire les interactions
+                    self.decay_components, _, unique_products = interactions.build_components(
+                        self.aggregation, len(decay_half_lives(self.interaction_half_lives))
+                    )
+                    self.decay_reference_time = now
+                    self.user_item_matrix = combine_components(self.decay_components, self.aggregation)
+                else:
+                    self.user_item_matrix, _, unique_products = interactions.build(self.aggregation)
+                self.user_id_mapping = interactions.user_index
+                self.product_id_mapping = interactions.product_index
+            
+            # Calculer les structures de recommandation à partir de la matrice
+            with stages('fit'):
+                self._fit()
+            
+            # Construire le catalogue des produits aligné sur les colonnes de la matrice
+            with stages('catalog'):
+                product_categories = {}
+                self.catalog = ProductCatalog.build(
+                    unique_products, self._remember_categories(iter_products(db, batch_size=self.batch_size),
+                                                               product_categories)
+                )
             
+            # Produits similaires de chaque catégorie, calculés en parallèle
+            if self.category_shards:
+                with stages('shards'):
+                    self._build_shards()
+            
+            # Classements de popularité servis aux utilisateurs et produits inconnus
+            with stages('popularity'):
+                self.popularity = PopularityRankings.build(interactions.product_popularity, self.catalog,
+                                                           product_categories, reference_time=now)
+            
+            self.trained_interactions = self.user_item_matrix.nnz
+            self.incremental_interactions = 0
+            self.materialized = None
+            self.training_stages = stages.durations
+            self.watermark = watermark
+            self.delta_trainings = 0
+            self.version = new_model_version()
             self.is_trained = True
             return True
         
-        except Exception as e:
-            print(f"Erreur lors de l'entraînement du modèle: {str(e)}")
+        except Exception:
+            logger.exception("Erreur lors de l'entraînement du modèle")
             return False
     
-    def recommend_for_user(self, user_id, limit=5):
+    def _fit(self):
+        """
+        Calculer les structures servies à partir de `user_item_matrix`
+        
+        Les sous-classes remplacent cette étape pour utiliser un autre modèle
+        avec le même chargement des données, catalogue et instantanés.
+        """
+        # Calculer l'index des produits les plus similaires (top-K par produit)
+        self.item_neighbor_indices, self.item_neighbor_scores = topk_neighbors(
+            self.user_item_matrix.T, self.n_item_neighbors, n_jobs=self.n_jobs
+        )
+        
+        # Conserver les vecteurs utilisateurs normalisés pour chercher les voisins à la demande
+        self.user_vectors = l2_normalize_rows(self.user_item_matrix)
+        if self.precompute_user_neighbors:
+            self.user_neighbor_indices, self.user_neighbor_scores = topk_neighbors(
+                self.user_item_matrix, self.n_user_neighbors, n_jobs=self.n_jobs
+            )
+        self._build_ann()
+    
+    def _ann_vectors(self):
+        """
+        Vecteurs indexés par l'index approché
+        
+        Returns:
+            scipy.sparse.csr_matrix: Vecteurs normalisés des utilisateurs
+        """
+        return self.user_vectors
+    
+    def _build_ann(self):
+        """Construire l'index approché sur `_ann_vectors`, s'il est configuré"""
+        self.ann_index = build_index(self.ann, self._ann_vectors(), **self.ann_params) if self.ann else None
+    
+    def _update_ann(self, rows):
+        """
+        Réindexer les lignes modifiées de `_ann_vectors` dans l'index approché
+        
+        Les mises à jour incrémentales ne touchent que quelques lignes: l'index
+        existant est mis à jour (voir `update` des index) au lieu d'être
+        reconstruit, ce qui reste réservé à `_fit`.
+        
+        Args:
+            rows (numpy.ndarray): Lignes modifiées ou ajoutées, None si toutes ont changé
+        """
+        if self.ann_index is None or rows is None:
+            self._build_ann()
+        else:
+            self.ann_index = self.ann_index.update(self._ann_vectors(), rows)
+    
+    def _item_vectors(self):
+        """
+        Vecteurs comparés pour trouver les produits similaires
+        
+        Returns:
+            scipy.sparse.csr_matrix: Notes de chaque produit, une ligne par produit
+        """
+        return sp.csr_matrix(self.user_item_matrix.T)
+    
+    def _build_shards(self):
+        """Calculer les fragments par catégorie, s'ils sont configurés (le catalogue doit être construit)"""
+        self.shards = (CategoryShards.build(self._item_vectors(), self.catalog.categories(), self.n_item_neighbors,
+                                            n_jobs=self.shard_jobs)
+                       if self.category_shards else None)
+    
+    def _refresh_shards(self, touched_products):
+        """Mettre à jour les fragments des catégories des produits modifiés ou ajoutés"""
+        if self.shards is not None:
+            self.shards = self.shards.refresh(self._item_vectors(), self.catalog.categories(), touched_products,
+                                              self.n_item_neighbors)
+    
+    def _category_columns(self, category):
+        """
+        Colonnes des produits d'une catégorie
+        
+        Lues dans le fragment de la catégorie; sans fragments, retrouvées dans
+        le catalogue à chaque appel.
+        
+        Returns:
+            numpy.ndarray: Colonnes croissantes (vide si la catégorie est inconnue)
+        """
+        if self.shards is not None:
+            columns = self.shards.category_members(category)
+            return columns if columns is not None else np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.catalog.categories() == category)
+    
+    def _item_similarities(self, product_idx, columns):
+        """
+        Similarités cosinus d'un produit avec les produits de quelques colonnes
+        
+        Args:
+            product_idx (int): Colonne du produit
+            columns (numpy.ndarray): Colonnes comparées
+            
+        Returns:
+            numpy.ndarray: Similarité avec chaque colonne de `columns`
+        """
+        vectors = l2_normalize_rows(sp.csr_matrix(self.user_item_matrix[:, np.r_[product_idx, columns]].T))
+        return (vectors[1:] @ vectors[0].T).toarray().ravel()
+    
+    @staticmethod
+    def _remember_categories(products, product_categories):
+        """Parcourir des documents produits en notant la catégorie de chacun"""
+        for product in products:
+            product_categories[str(product['_id'])] = str(product.get('category') or '')
+            yield product
+    
+    def _load_interactions(self, db, now, query=None):
+        """
+        Charger les interactions de la base par morceaux de `batch_size` documents
+        
+        Avec `aggregate_in_database`, MongoDB regroupe lui-même les paires
+        (utilisateur, produit) dupliquées et calcule leur poids. Avec
+        `interaction_half_lives`, les poids décroissent avec l'âge des
+        interactions à la date `now`. La popularité
+        de chaque produit compte ses interactions, pondérées par leur récence
+        (ou, après regroupement, par la récence de la plus récente de la paire).
+        
+        Args:
+            db: Connexion à la base de données MongoDB
+            now (numpy.datetime64): Date de référence des poids de récence et de la décroissance
+            query (dict): Filtre des interactions lues (toutes par défaut)
+            
+        Returns:
+            InteractionAccumulator: Interactions chargées
+        """
+        interactions = InteractionAccumulator()
+        if self.aggregate_in_database:
+            chunks = iter_aggregated_interaction_chunks(
+                db, INTERACTION_WEIGHTS, DEFAULT_INTERACTION_WEIGHT, self.aggregation, batch_size=self.batch_size,
+                query=query, half_lives=self.interaction_half_lives, now=now.astype(datetime.datetime)
+            )
+            for user_ids, product_ids, weights, counts, timestamps, interaction_types in chunks:
+                popularity = counts * recency_weights(timestamps, now, self.popularity_half_life_days)
+                components = (interaction_components(interaction_types, self.interaction_half_lives)
+                              if self.interaction_half_lives else None)
+                interactions.add(user_ids, product_ids, weights, popularity, components)
+        else:
+            chunks = iter_interaction_chunks(db, batch_size=self.batch_size, query=query)
+            for user_ids, product_ids, interaction_types, timestamps in chunks:
+                popularity = recency_weights(timestamps, now, self.popularity_half_life_days)
+                if self.interaction_half_lives:
+                    weights, components = decayed_interaction_weights(interaction_types, timestamps, now,
+                                                                      self.interaction_half_lives)
+                else:
+                    weights, components = interaction_weights(interaction_types), None
+                interactions.add(user_ids, product_ids, weights, popularity, components)
+        return interactions
+    
+    def recommend_for_user(self, user_id, limit=5, category=None):
         """
         Recommander des produits pour un utilisateur spécifique
         
         Args:
             user_id (str): ID de l'utilisateur
             limit (int): Nombre maximum de recommandations à retourner
+            category (str): Ne recommander que des produits de cette catégorie
             
         Returns:
             list: Liste des produits recommandés
         """
+        return self.recommend_for_users({user_id: limit}, category=category).get(user_id, [])
+    
+    def recommend_for_users(self, limits, category=None):
+        """
+        Recommander des produits pour plusieurs utilisateurs en un seul calcul
+        
+        Les recommandations précalculées sont servies telles quelles; les
+        meilleurs produits des autres utilisateurs connus sont calculés
+        ensemble par `_top_products`. Les utilisateurs inconnus, ou sans
+        recommandation, reçoivent les produits les plus populaires.
+        
+        Avec une catégorie, seuls les produits de la catégorie (colonnes de
+        son fragment) sont scorés; les recommandations précalculées, qui
+        portent sur tout le catalogue, ne sont pas utilisées.
+        
+        Args:
+            limits (dict): Nombre maximum de recommandations par ID d'utilisateur
+            category (str): Ne recommander que des produits de cette catégorie
+            
+        Returns:
+            dict: Liste des produits recommandés par ID d'utilisateur
+        """
+        recommendations = {user_id: [] for user_id in limits}
         if not self.is_trained:
-            return []
+            return recommendations
         
         try:
-            # Vérifier si l'utilisateur existe dans le modèle
-            if user_id not in self.user_id_mapping:
-                return []
+            # Seuls les utilisateurs présents dans le modèle ont des recommandations personnalisées
+            user_ids = [user_id for user_id in limits if user_id in self.user_id_mapping]
             
-            user_idx = self.user_id_mapping[user_id]
+            # Lire d'abord les recommandations précalculées, s'il y en a
+            if self.materialized is not None and category is None:
+                live_user_ids = []
+                for user_id in user_ids:
+                    recommended_indices = self.materialized.lookup(self.user_id_mapping[user_id], limits[user_id])
+                    if recommended_indices is None:
+                        live_user_ids.append(user_id)
+                    else:
+                        recommendations[user_id] = self.catalog.hydrate(recommended_indices)
+                user_ids = live_user_ids
             
-            # Obtenir les scores de prédiction pour tous les produits
-            user_ratings = self.user_item_matrix[user_idx]
-            similar_users = self.user_similarity_matrix[user_idx]
+            if user_ids:
+                # Obtenir les indices des produits avec les scores les plus élevés
+                user_indices = np.array([self.user_id_mapping[user_id] for user_id in user_ids])
+                columns = None if category is None else self._category_columns(category)
+                top_indices, top_scores = self._top_products(user_indices, max(limits[user_id] for user_id in user_ids),
+                                                             columns=columns)
+                for row, user_id in enumerate(user_ids):
+                    limit = limits[user_id]
+                    recommended_indices = top_indices[row, :limit][top_scores[row, :limit] > 0]
+                    recommendations[user_id] = self.catalog.hydrate(recommended_indices)
             
-            # Exclure les produits déjà interagis
-            interacted_products = np.where(user_ratings > 0)[0]
+            return self._with_popular_fallback(recommendations, limits, category)
+        
+        except Exception:
+            logger.exception("Erreur lors de la recommandation pour l'utilisateur")
+            return recommendations
+    
+    def _with_popular_fallback(self, recommendations, limits, category=None):
+        """
+        Compléter les listes vides par les produits les plus populaires
+        
+        Les produits déjà vus par un utilisateur connu sont écartés.
+        
+        Args:
+            recommendations (dict): Liste des produits recommandés par ID d'utilisateur
+            limits (dict): Nombre maximum de recommandations par ID d'utilisateur
+            category (str): Ne compléter qu'avec les produits de cette catégorie
             
-            # Calculer les scores de prédiction
-            prediction_scores = np.zeros(self.user_item_matrix.shape[1])
+        Returns:
+            dict: Recommandations complétées
+        """
+        if self.popularity is None:
+            return recommendations
+        for user_id, recommended in recommendations.items():
+            if recommended:
+                continue
+            user_idx = self.user_id_mapping.get(user_id)
+            seen = self.user_item_matrix[user_idx].indices if user_idx is not None else ()
+            recommendations[user_id] = self.catalog.hydrate(self.popularity.top(
+                limits[user_id], category=category, exclude=seen, only_category=category is not None
+            ))
+        return recommendations
+    
+    def _top_products(self, user_indices, k, columns=None):
+        """
+        Sélectionner les k produits recommandables de meilleur score de plusieurs utilisateurs
+        
+        Les scores de tous les produits (ou des seules `columns`) sont calculés
+        par blocs d'utilisateurs, chaque bloc en une seule multiplication de
+        matrices creuses; les produits non recommandables sont écartés avant
+        la sélection.
+        
+        Args:
+            user_indices (numpy.ndarray): Indices des utilisateurs dans la matrice
+            k (int): Nombre de produits par utilisateur
+            columns (numpy.ndarray): Colonnes des produits candidats (None: tous)
             
-            for product_idx in range(self.user_item_matrix.shape[1]):
-                if product_idx in interacted_products:
-                    continue
-                
-                # Calculer le score de prédiction basé sur les utilisateurs similaires
-                weighted_sum = 0
-                similarity_sum = 0
-                
-                for other_user_idx in range(self.user_item_matrix.shape[0]):
-                    if other_user_idx == user_idx:
-                        continue
-                    
-                    similarity = similar_users[other_user_idx]
-                    rating = self.user_item_matrix[other_user_idx, product_idx]
-                    
-                    if rating > 0 and similarity > 0:
-                        weighted_sum += similarity * rating
-                        similarity_sum += similarity
-                
-                if similarity_sum > 0:
-                    prediction_scores[product_idx] = weighted_sum / similarity_sum
+        Returns:
+            tuple: (indices int32, scores float32), une ligne par utilisateur, triés par
+            score décroissant; seuls les produits de score positif sont recommandables
+        """
+        available = self.catalog.available if columns is None else self.catalog.available[columns]
+        block_size = max(1, DEFAULT_BLOCK_BYTES // (8 * max(len(available), 1)))
+        top_indices, top_scores = [], []
+        for start in range(0, len(user_indices), block_size):
+            # Obtenir les scores de prédiction pour tous les produits candidats
+            prediction_scores = self._predict_scores_batch(user_indices[start:start + block_size], columns)
+            
+            # Écarter les produits non recommandables avant la sélection
+            prediction_scores[:, ~available] = 0
+            
+            block_indices, block_scores = select_top_k(prediction_scores, k)
+            if columns is not None:
+                block_indices = columns[block_indices].astype(np.int32)
+            top_indices.append(block_indices)
+            top_scores.append(block_scores)
+        return np.concatenate(top_indices), np.concatenate(top_scores)
+    
+    def _user_neighbors(self, user_idx):
+        """
+        Trouver les utilisateurs de similarité cosinus positive avec un utilisateur
+        
+        Args:
+            user_idx (int): Indice de l'utilisateur dans la matrice
+            
+        Returns:
+            tuple: (indices des voisins, similarités)
+        """
+        return self._user_neighbors_batch(np.array([user_idx]))[0]
+    
+    def _user_neighbors_batch(self, user_indices):
+        """
+        Trouver les voisins de similarité cosinus positive de plusieurs utilisateurs
+        
+        Les voisins sont lus dans la liste précalculée s'il y en a une,
+        cherchés dans l'index approché s'il est configuré, sinon calculés à
+        la demande à partir des vecteurs normalisés, en un seul produit
+        matriciel pour tous les utilisateurs, et limités aux
+        `n_user_neighbors` plus similaires si cette limite est définie.
+        
+        Args:
+            user_indices (numpy.ndarray): Indices des utilisateurs dans la matrice
             
-            # Obtenir les indices des produits avec les scores les plus élevés
-            recommended_indices = np.argsort(prediction_scores)[::-1][:limit]
+        Returns:
+            list: (indices des voisins, similarités) de chaque utilisateur
+        """
+        if self.user_neighbor_indices is not None:
+            neighbors = []
+            for user_idx in user_indices:
+                user_neighbors = self.user_neighbor_indices[user_idx]
+                valid = user_neighbors >= 0
+                neighbors.append((
+                    user_neighbors[valid], self.user_neighbor_scores[user_idx][valid].astype(np.float64)
+                ))
+            return neighbors
+        
+        if self.ann_index is not None:
+            # L'utilisateur lui-même fait partie des résultats de l'index
+            found_indices, found_scores = self.ann_index.query(
+                self.user_vectors[user_indices], self.n_user_neighbors + 1
+            )
+            neighbors = []
+            for user_idx, candidates, candidate_similarities in zip(user_indices, found_indices, found_scores):
+                keep = (candidates >= 0) & (candidate_similarities > 0) & (candidates != user_idx)
+                candidates = candidates[keep][:self.n_user_neighbors]
+                candidate_similarities = candidate_similarities[keep][:self.n_user_neighbors].astype(np.float64)
+                order = np.argsort(candidates)
+                neighbors.append((candidates[order], candidate_similarities[order]))
+            return neighbors
+        
+        similarities = (self.user_vectors[user_indices] @ self.user_vectors.T).tocsr()
+        neighbors = []
+        for row, user_idx in enumerate(user_indices):
+            start, end = similarities.indptr[row], similarities.indptr[row + 1]
+            candidates = similarities.indices[start:end]
+            candidate_similarities = similarities.data[start:end].astype(np.float64)
             
-            # Convertir les indices en IDs de produits
-            reverse_mapping = {idx: product_id for product_id, idx in self.product_id_mapping.items()}
-            recommended_product_ids = [reverse_mapping[idx] for idx in recommended_indices if prediction_scores[idx] > 0]
+            # Seuls les autres utilisateurs de similarité positive contribuent aux scores
+            keep = (candidate_similarities > 0) & (candidates != user_idx)
+            candidates, candidate_similarities = candidates[keep], candidate_similarities[keep]
+            if self.n_user_neighbors and len(candidates) > self.n_user_neighbors:
+                top, _ = select_top_k(candidate_similarities[np.newaxis, :], self.n_user_neighbors)
+                candidates, candidate_similarities = candidates[top[0]], candidate_similarities[top[0]]
             
-            # Récupérer les détails des produits recommandés
-            recommended_products = []
-            for product_id in recommended_product_ids:
-                product = self.products_df[self.products_df['productId'] == product_id]
-                if not product.empty and not product.iloc[0]['isCollected']:
-                    recommended_products.append({
-                        '_id': product_id,
-                        'title': product.iloc[0]['title'],
-                        'image': product.iloc[0]['image'],
-                        'category': product.iloc[0]['category'],
-                        'price': product.iloc[0]['price']
-                    })
+            order = np.argsort(candidates)
+            neighbors.append((candidates[order], candidate_similarities[order]))
+        return neighbors
+    
+    def _predict_scores(self, user_idx):
+        """
+        Calculer les scores de prédiction d'un utilisateur pour tous les produits
+        
+        Args:
+            user_idx (int): Indice de l'utilisateur dans la matrice
             
-            return recommended_products
+        Returns:
+            numpy.ndarray: Score de chaque produit
+        """
+        return self._predict_scores_batch(np.array([user_idx]))[0]
+    
+    def _predict_scores_batch(self, user_indices, columns=None):
+        """
+        Calculer les scores de prédiction de plusieurs utilisateurs pour tous les produits
+        
+        Le score d'un produit est la moyenne des notes des autres utilisateurs,
+        pondérée par leur similarité (positive) avec l'utilisateur, restreinte
+        aux utilisateurs ayant noté ce produit. Les produits déjà vus par
+        l'utilisateur ont un score nul. Les similarités des utilisateurs sont
+        empilées dans une matrice creuse, multipliée en une fois par les notes
+        de leurs voisins.
+        
+        Args:
+            user_indices (numpy.ndarray): Indices des utilisateurs dans la matrice
+            columns (numpy.ndarray): Colonnes des produits à scorer (None: tous)
+            
+        Returns:
+            numpy.ndarray: Score de chaque produit (de `columns`), une ligne par utilisateur
+        """
+        neighbors = self._user_neighbors_batch(user_indices)
+        n_products = self.user_item_matrix.shape[1] if columns is None else len(columns)
+        
+        # Ne garder que les lignes des voisins d'au moins un utilisateur
+        neighbor_indices = np.concatenate([indices for indices, _ in neighbors])
+        neighbor_rows, neighbor_columns = np.unique(neighbor_indices, return_inverse=True)
+        similarities = sp.csr_matrix(
+            (
+                np.concatenate([scores for _, scores in neighbors]),
+                neighbor_columns,
+                np.concatenate(([0], np.cumsum([len(indices) for indices, _ in neighbors])))
+            ),
+            shape=(len(user_indices), len(neighbor_rows))
+        )
+        neighbor_ratings = self.user_item_matrix[neighbor_rows]
+        if columns is not None:
+            neighbor_ratings = neighbor_ratings[:, columns]
+        rated = sp.csr_matrix(
+            (np.ones(neighbor_ratings.nnz), neighbor_ratings.indices, neighbor_ratings.indptr),
+            shape=neighbor_ratings.shape
+        )
+        
+        weighted_sums = (similarities @ neighbor_ratings).toarray()
+        similarity_sums = (similarities @ rated).toarray()
+        
+        prediction_scores = np.divide(
+            weighted_sums, similarity_sums,
+            out=np.zeros((len(user_indices), n_products)), where=similarity_sums > 0
+        )
         
-        except Exception as e:
-            print(f"Erreur lors de la recommandation pour l'utilisateur: {str(e)}")
-            return []
+        # Exclure les produits déjà interagis
+        interacted = self.user_item_matrix[user_indices]
+        interacted = (interacted if columns is None else interacted[:, columns]).tocoo()
+        positive = interacted.data > 0
+        prediction_scores[interacted.row[positive], interacted.col[positive]] = 0
+        return prediction_scores
     
-    def find_similar_products(self, product_id, limit=5):
+    def find_similar_products(self, product_id, limit=5, category=None):
         """
         Trouver des produits similaires à un produit spécifique
         
         Args:
             product_id (str): ID du produit
             limit (int): Nombre maximum de produits similaires à retourner
+            category (str): Ne retourner que des produits de cette catégorie
             
         Returns:
             list: Liste des produits similaires
         """
+        return self.find_similar_products_batch({product_id: limit}, category=category).get(product_id, [])
+    
+    def find_similar_products_batch(self, limits, category=None):
+        """
+        Trouver des produits similaires à plusieurs produits
+        
+        Les produits inconnus du modèle, ou sans voisin recommandable,
+        reçoivent les produits les plus populaires de leur catégorie,
+        complétés par les plus populaires de tout le catalogue. Avec une
+        catégorie, les voisins sont lus dans son fragment (voir
+        `_similar_indices`) et seuls les produits populaires de la catégorie
+        complètent les listes vides.
+        
+        Args:
+            limits (dict): Nombre maximum de produits similaires par ID de produit
+            category (str): Ne retourner que des produits de cette catégorie
+            
+        Returns:
+            dict: Liste des produits similaires par ID de produit
+        """
+        similar_products = {product_id: [] for product_id in limits}
         if not self.is_trained:
-            return []
+            return similar_products
         
         try:
-            # Vérifier si le produit existe dans le modèle
-            if product_id not in self.product_id_mapping:
-                return []
-            
-            product_idx = self.product_id_mapping[product_id]
-            
-            # Obtenir les scores de similarité pour tous les produits
-            similarity_scores = self.item_similarity_matrix[product_idx]
-            
-            # Obtenir les indices des produits les plus similaires (exclure le produit lui-même)
-            similar_indices = np.argsort(similarity_scores)[::-1][1:limit+1]
-            
-            # Convertir les indices en IDs de produits
-            reverse_mapping = {idx: product_id for product_id, idx in self.product_id_mapping.items()}
-            similar_product_ids = [reverse_mapping[idx] for idx in similar_indices]
-            
-            # Récupérer les détails des produits similaires
-            similar_products = []
-            for product_id in similar_product_ids:
-                product = self.products_df[self.products_df['productId'] == product_id]
-                if not product.empty and not product.iloc[0]['isCollected']:
-                    similar_products.append({
-                        '_id': product_id,
-                        'title': product.iloc[0]['title'],
-                        'image': product.iloc[0]['image'],
-                        'category': product.iloc[0]['category'],
-                        'price': product.iloc[0]['price']
-                    })
+            for product_id, limit in limits.items():
+                product_idx = self.product_id_mapping.get(product_id)
+                similar_indices = []
+                if product_idx is not None:
+                    # Écarter les produits non recommandables des voisins, triés par similarité décroissante
+                    neighbor_indices = self._similar_indices(product_id, product_idx, category)
+                    similar_indices = neighbor_indices[self.catalog.available[neighbor_indices]][:limit]
+                
+                if not len(similar_indices) and self.popularity is not None:
+                    fallback_category = category if category is not None else self._product_category(product_id,
+                                                                                                      product_idx)
+                    similar_indices = self.popularity.top(
+                        limit, category=fallback_category, exclude=() if product_idx is None else (product_idx,),
+                        only_category=category is not None
+                    )
+                
+                similar_products[product_id] = self.catalog.hydrate(similar_indices)
             
             return similar_products
         
-        except Exception as e:
-            print(f"Erreur lors de la recherche de produits similaires: {str(e)}")
-            return []
+        except Exception:
+            logger.exception("Erreur lors de la recherche de produits similaires")
+            return similar_products
+    
+    def _similar_indices(self, product_id, product_idx, category=None):
+        """
+        Produits les plus similaires à un produit du modèle, par similarité décroissante
+        
+        Sans catégorie, les voisins sont lus dans l'index global. Pour la
+        catégorie du produit, ils sont lus dans son fragment. Pour une autre
+        catégorie, le produit est comparé aux produits du fragment demandé
+        (calcul à la demande). Sans fragments, les voisins de l'index global
+        sont filtrés par catégorie.
+        
+        Args:
+            product_id (str): ID du produit
+            product_idx (int): Colonne du produit
+            category (str): Catégorie des produits retournés (None: toutes)
+            
+        Returns:
+            numpy.ndarray: Colonnes des produits similaires
+        """
+        if category is None:
+            neighbor_indices = self.item_neighbor_indices[product_idx]
+        elif self.shards is not None and self._product_category(product_id, product_idx) == category:
+            neighbor_indices = self.shards.neighbor_indices[product_idx]
+        elif self.shards is not None:
+            columns = self._category_columns(category)
+            similarities = self._item_similarities(product_idx, columns)
+            keep = (similarities > 0) & (columns != product_idx)
+            columns, similarities = columns[keep], similarities[keep]
+            neighbor_indices = columns[np.lexsort((columns, -similarities))]
+        else:
+            neighbor_indices = self.item_neighbor_indices[product_idx]
+            neighbor_indices = neighbor_indices[np.isin(neighbor_indices, self._category_columns(category))]
+        return neighbor_indices[neighbor_indices >= 0]
+    
+    def _product_category(self, product_id, product_idx=None):
+        """Catégorie d'un produit, lue dans le catalogue ou parmi les produits de la base"""
+        if product_idx is not None and self.catalog.records[product_idx] is not None:
+            return str(self.catalog.records[product_idx]['category'] or '')
+        return self.popularity.category_of(product_id)
     
     def update_with_interaction(self, user_id, product_id, interaction_type):
         """
         Mettre à jour le modèle avec une nouvelle interaction
         
+        L'interaction est mise en attente; elle est prise en compte par le
+        prochain appel à `apply_pending_interactions`, qui traite les
+        interactions en attente par lot.
+        
         Args:
             user_id (str): ID de l'utilisateur
             product_id (str): ID du produit
@@ -249,7 +1067,492 @@ class CollaborativeFilteringModel:
         Returns:
             bool: True si la mise à jour a réussi, False sinon
         """
-        # Cette méthode est simplifiée - dans un système de production,
-        # vous voudriez probablement réentraîner le modèle périodiquement
-        # plutôt que de le mettre à jour à chaque interaction
+        self.pending_interactions.append(str(user_id), str(product_id), interaction_type)
         return True
+    
+    @property
+    def revision(self):
+        """
+        Identifiant de l'état servi du modèle
+        
+        La version change à chaque entraînement; le suffixe, à chaque lot
+        d'interactions appliqué incrémentalement et à chaque vieillissement
+        des poids (`decay_to`).
+        
+        Returns:
+            str: Version, nombre d'interactions incrémentales et date de référence des poids
+        """
+        revision = f"{self.version}+{self.incremental_interactions}"
+        if self.decay_reference_time is not None:
+            revision += f"@{self.decay_reference_time.astype(np.int64)}"
+        return revision
+    
+    def drift(self):
+        """
+        Part des interactions appliquées incrémentalement depuis le dernier entraînement complet
+        
+        Returns:
+            float: Interactions incrémentales / paires utilisateur-produit à l'entraînement
+        """
+        return self.incremental_interactions / max(1, self.trained_interactions)
+    
+    def apply_pending_interactions(self, product_lookup=None):
+        """
+        Appliquer les interactions en attente
+        
+        Args:
+            product_lookup (callable): Retourne le document d'un produit inconnu du
+                modèle à partir de son ID (ou None)
+            
+        Returns:
+            CollaborativeFilteringModel: Modèle mis à jour (self s'il n'y a rien à appliquer)
+        """
+        # Sans modèle entraîné, les interactions seront lues en base au prochain entraînement
+        interactions = self.pending_interactions.drain()
+        if not interactions or not self.is_trained:
+            return self
+        return self.apply_interactions(interactions, product_lookup=product_lookup)
+    
+    def apply_interactions(self, interactions, product_lookup=None):
+        """
+        Appliquer un lot d'interactions sans réentraîner tout le modèle
+        
+        La matrice grandit pour les nouveaux utilisateurs et produits, les
+        interactions sont agrégées avec les poids existants, puis seules les
+        listes de voisins concernées sont recalculées. Le modèle courant n'est
+        pas modifié: le résultat est un nouveau modèle, à mettre en service
+        d'un seul coup.
+        
+        Args:
+            interactions (list): Interactions (user_id, product_id, interaction_type)
+            product_lookup (callable): Retourne le document d'un produit inconnu du
+                modèle à partir de son ID (ou None)
+            
+        Returns:
+            CollaborativeFilteringModel: Nouveau modèle
+        """
+        user_ids, product_ids, interaction_types = zip(*interactions)
+        weights, components = interaction_weights(interaction_types), None
+        if self.decay_components is not None:
+            # Exprimer les poids des nouvelles interactions à la date de référence des composantes
+            components = interaction_components(interaction_types, self.interaction_half_lives)
+            elapsed_days = max(0.0, (current_time() - self.decay_reference_time) / np.timedelta64(1, 'D'))
+            weights = weights * np.exp2(elapsed_days / decay_half_lives(self.interaction_half_lives)[components])
+        batch = InteractionAccumulator()
+        batch.add([str(user_id) for user_id in user_ids], [str(product_id) for product_id in product_ids],
+                  weights, components=components)
+        updated, _ = self._merge_interactions(batch, product_lookup)
+        updated.incremental_interactions = self.incremental_interactions + len(interactions)
+        return updated
+    
+    def _merge_interactions(self, batch, product_lookup=None):
+        """
+        Fusionner des interactions accumulées dans un nouveau modèle
+        
+        Args:
+            batch (InteractionAccumulator): Interactions à fusionner
+            product_lookup (callable): Retourne le document d'un produit inconnu du
+                modèle à partir de son ID (ou None)
+            
+        Returns:
+            tuple: (nouveau modèle, colonne du modèle de chaque produit de `batch`)
+        """
+        updated = copy.copy(self)
+        updated.user_id_mapping = dict(self.user_id_mapping)
+        updated.product_id_mapping = dict(self.product_id_mapping)
+        
+        # Agréger le lot, le ramener aux indices du modèle puis le combiner avec la matrice agrandie
+        unique_users, unique_products = list(batch.user_index), list(batch.product_index)
+        user_codes = np.fromiter(
+            (updated.user_id_mapping.setdefault(user_id, len(updated.user_id_mapping)) for user_id in unique_users),
+            dtype=np.int64, count=len(unique_users)
+        )
+        product_codes = np.fromiter(
+            (updated.product_id_mapping.setdefault(product_id, len(updated.product_id_mapping))
+             for product_id in unique_products),
+            dtype=np.int64, count=len(unique_products)
+        )
+        shape = (len(updated.user_id_mapping), len(updated.product_id_mapping))
+        
+        def merge(current, delta):
+            delta = delta.tocoo()
+            delta = sp.csr_matrix((delta.data, (user_codes[delta.row], product_codes[delta.col])), shape=shape)
+            return combine_components([expand_rows(current, shape), delta], self.aggregation)
+        
+        if self.decay_components is not None:
+            deltas, _, _ = batch.build_components(self.aggregation, len(self.decay_components))
+            updated.decay_components = [merge(current, delta) for current, delta in zip(self.decay_components, deltas)]
+            updated.user_item_matrix = combine_components(updated.decay_components, self.aggregation)
+        else:
+            updated.user_item_matrix = merge(self.user_item_matrix, batch.build(self.aggregation)[0])
+        updated._refresh(np.unique(user_codes), np.unique(product_codes))
+        
+        # Ajouter les nouveaux produits au catalogue
+        new_product_ids = [product_id for product_id in unique_products if product_id not in self.product_id_mapping]
+        if new_product_ids:
+            lookup = product_lookup or (lambda product_id: None)
+            updated.catalog = self.catalog.extend(new_product_ids, [lookup(product_id) for product_id in new_product_ids])
+        updated._refresh_shards(product_codes)
+        
+        # Les recommandations précalculées des utilisateurs du lot sont périmées
+        if self.materialized is not None:
+            updated.materialized = self.materialized.without(np.unique(user_codes))
+        return updated, product_codes
+    
+    def can_train_delta(self):
+        """Le modèle a un filigrane et peut servir de base à `train_delta`"""
+        return (self.is_trained and self.watermark is not None and self.watermark['interaction_id'] is not None
+                and self.popularity is not None and self.popularity.scores is not None)
+    
+    def train_delta(self, db):
+        """
+        Entraîner un nouveau modèle à partir de celui-ci et des seules données arrivées depuis
+        
+        Seules les interactions dont le _id dépasse le filigrane et les produits
+        modifiés depuis (updatedAt) sont lus. Les poids existants sont vieillis
+        (`decay_to`), les interactions sont fusionnées dans la matrice comme par
+        `apply_interactions` (seules les listes de voisins touchées sont
+        recalculées) et les scores de popularité sont vieillis puis complétés. Les interactions lues comptent dans `drift`:
+        un entraînement complet reste nécessaire de temps en temps.
+        
+        Args:
+            db: Connexion à la base de données MongoDB
+            
+        Returns:
+            CollaborativeFilteringModel: Nouveau modèle, avec une nouvelle version
+        """
+        if not self.can_train_delta():
+            raise ValueError("Le modèle n'a pas de filigrane: un entraînement complet est nécessaire")
+        
+        stages = StageTimer()
+        now = current_time()
+        with stages('fetch'):
+            watermark = read_watermark(db)
+            batch = self._load_interactions(db, now, query=interaction_id_range(
+                after=self.watermark['interaction_id'], until=watermark['interaction_id']
+            ))
+            changed_products = {}
+            if self.watermark.get('product_updated_at'):
+                since = datetime.datetime.fromisoformat(self.watermark['product_updated_at'])
+                query = {'updatedAt': {'$gte': since}}
+                changed_products = {str(product['_id']): product
+                                    for product in iter_products(db, batch_size=self.batch_size, query=query)}
+            new_product_ids = [product_id for product_id in batch.product_index
+                               if product_id not in self.product_id_mapping and product_id not in changed_products]
+            if new_product_ids:
+                changed_products.update({str(product['_id']): product for product in iter_products(
+                    db, batch_size=self.batch_size, query=product_ids_query(new_product_ids)
+                )})
+        
+        with stages('merge'):
+            # Les poids existants sont vieillis jusqu'à la date des nouvelles interactions
+            base = self.decay_to(now, reselect=True)
+            if len(batch):
+                updated, product_codes = base._merge_interactions(batch, changed_products.get)
+            else:
+                updated, product_codes = copy.copy(base), np.empty(0, dtype=np.int64)
+        
+        with stages('catalog'):
+            updated.catalog = updated.catalog.update(updated.product_id_mapping, changed_products.values())
+            product_categories = dict(self.popularity.product_categories)
+            product_categories.update({product_id: str(product.get('category') or '')
+                                       for product_id, product in changed_products.items()})
+        
+        if updated.shards is not None:
+            with stages('shards'):
+                # Un produit modifié a pu changer de catégorie
+                updated._refresh_shards([updated.product_id_mapping[product_id] for product_id in changed_products
+                                         if product_id in updated.product_id_mapping])
+        
+        with stages('popularity'):
+            scores = self.popularity.scores_at(now, self.popularity_half_life_days, len(updated.catalog))
+            np.add.at(scores, product_codes, batch.product_popularity)
+            updated.popularity = PopularityRankings.build(scores, updated.catalog, product_categories,
+                                                          reference_time=now)
+        
+        updated.pending_interactions = InteractionBuffer()
+        updated.incremental_interactions = self.incremental_interactions + len(batch)
+        updated.delta_trainings = self.delta_trainings + 1
+        updated.watermark = watermark
+        updated.materialized = None
+        updated.training_stages = stages.durations
+        updated.version = new_model_version()
+        return updated
+    
+    def decay_to(self, now=None, reselect=False):
+        """
+        Vieillir les poids des interactions jusqu'à `now`, sans relire la base
+        
+        Chaque composante de la matrice (une par demi-vie) est multipliée par
+        0.5 ** (temps écoulé / demi-vie) depuis la date de référence. Si tous
+        les poids sont multipliés par le même facteur, les similarités et le
+        classement des recommandations ne changent pas (SCALE_INVARIANT).
+        Sinon, par défaut, seules les similarités des voisins conservés sont
+        recalculées (`_rescale_neighbors`): c'est le vieillissement appliqué
+        par le service, entre deux entraînements. La nouvelle sélection des
+        voisins (`reselect`, recalcul complet des structures servies) est
+        laissée au processus d'entraînement, publiée avec son instantané.
+        
+        Args:
+            now (numpy.datetime64): Nouvelle date de référence (par défaut: maintenant)
+            reselect (bool): Recalculer les structures servies à partir de la matrice vieillie
+            
+        Returns:
+            CollaborativeFilteringModel: Nouveau modèle (self si les poids ne décroissent pas)
+        """
+        if self.decay_components is None:
+            return self
+        now = current_time() if now is None else now
+        elapsed_days = max(0.0, (now - self.decay_reference_time) / np.timedelta64(1, 'D'))
+        factors = np.exp2(-elapsed_days / decay_half_lives(self.interaction_half_lives))
+        
+        updated = copy.copy(self)
+        updated.decay_components = [component * factor if factor != 1 else component
+                                    for component, factor in zip(self.decay_components, factors)]
+        updated.user_item_matrix = combine_components(updated.decay_components, self.aggregation)
+        updated.decay_reference_time = now
+        
+        uniform = len({factor for component, factor in zip(self.decay_components, factors) if component.nnz}) <= 1
+        if reselect and not (uniform and self.SCALE_INVARIANT):
+            updated._fit()
+            updated._build_shards()
+            updated.materialized = None
+        elif not uniform:
+            updated._rescale_neighbors()
+        return updated
+    
+    def _rescale_neighbors(self):
+        """
+        Recalculer les similarités après une décroissance non uniforme des poids, sans nouvelle sélection
+        
+        Les vecteurs normalisés des utilisateurs (recherche des voisins à la
+        demande et index approché) sont recalculés; les listes de voisins
+        précalculées gardent leurs membres et reçoivent leurs similarités sur
+        la matrice vieillie (`rescore_neighbors`), en O(k) par ligne.
+        """
+        self.user_vectors = l2_normalize_rows(self.user_item_matrix)
+        self.item_neighbor_indices, self.item_neighbor_scores = rescore_neighbors(
+            self.user_item_matrix.T, self.item_neighbor_indices
+        )
+        if self.user_neighbor_indices is not None:
+            self.user_neighbor_indices, self.user_neighbor_scores = rescore_neighbors(
+                self.user_item_matrix, self.user_neighbor_indices
+            )
+        if self.shards is not None:
+            self.shards = self.shards.rescore(self._item_vectors())
+        self._build_ann()
+        self.materialized = None
+    
+    def _refresh(self, touched_users, touched_products):
+        """
+        Mettre à jour les structures servies après la modification de quelques lignes
+        
+        Appelé sur le nouveau modèle de `apply_interactions`, dont la matrice est
+        déjà à jour et les autres structures encore celles du modèle précédent.
+        
+        Args:
+            touched_users (numpy.ndarray): Indices des utilisateurs modifiés ou ajoutés
+            touched_products (numpy.ndarray): Indices des produits modifiés ou ajoutés
+        """
+        self.user_vectors = l2_normalize_rows(self.user_item_matrix)
+        
+        # Recalculer uniquement les listes de voisins touchées par le lot
+        self.item_neighbor_indices, self.item_neighbor_scores = refresh_topk_neighbors(
+            self.user_item_matrix.T, self.item_neighbor_indices, self.item_neighbor_scores,
+            touched_products, self.n_item_neighbors, n_jobs=self.n_jobs
+        )
+        if self.user_neighbor_indices is not None:
+            self.user_neighbor_indices, self.user_neighbor_scores = refresh_topk_neighbors(
+                self.user_item_matrix, self.user_neighbor_indices, self.user_neighbor_scores,
+                touched_users, self.n_user_neighbors, n_jobs=self.n_jobs
+            )
+        self._update_ann(touched_users)
+    
+    def settings(self):
+        """
+        Paramètres du modèle, tels que passés au constructeur
+        
+        Returns:
+            dict: Arguments du constructeur
+        """
+        return {
+            'aggregation': self.aggregation,
+            'n_item_neighbors': self.n_item_neighbors,
+            'n_user_neighbors': self.n_user_neighbors,
+            'precompute_user_neighbors': self.precompute_user_neighbors,
+            'n_jobs': self.n_jobs,
+            'batch_size': self.batch_size,
+            'aggregate_in_database': self.aggregate_in_database,
+            'ann': self.ann,
+            'ann_params': self.ann_params,
+            'popularity_half_life_days': self.popularity_half_life_days,
+            'interaction_half_lives': self.interaction_half_lives,
+            'category_shards': self.category_shards,
+            'shard_jobs': self.shard_jobs
+        }
+    
+    def _snapshot_arrays(self):
+        """
+        Tableaux NumPy enregistrés dans un instantané
+        
+        Les identifiants sont enregistrés en chaînes de taille fixe pour pouvoir
+        être projetés en mémoire, sans pickle.
+        
+        Returns:
+            dict: Tableaux indexés par nom de fichier (sans extension)
+        """
+        arrays = {
+            'user_ids': np.array(list(self.user_id_mapping), dtype=str),
+            'product_ids': np.array(self.catalog.product_ids, dtype=str),
+            'user_item_data': self.user_item_matrix.data,
+            'user_item_indices': self.user_item_matrix.indices,
+            'user_item_indptr': self.user_item_matrix.indptr,
+            'item_neighbor_indices': self.item_neighbor_indices,
+            'item_neighbor_scores': self.item_neighbor_scores,
+            'catalog_available': self.catalog.available
+        }
+        if self.user_vectors is not None:
+            # Les vecteurs normalisés partagent la structure de la matrice
+            arrays['user_vectors_data'] = self.user_vectors.data
+        if self.user_neighbor_indices is not None:
+            arrays['user_neighbor_indices'] = self.user_neighbor_indices
+            arrays['user_neighbor_scores'] = self.user_neighbor_scores
+        if self.ann_index is not None:
+            arrays.update({f'ann_{name}': array for name, array in self.ann_index.arrays().items()})
+        if self.popularity is not None:
+            arrays.update({f'popularity_{name}': array for name, array in self.popularity.arrays().items()})
+        if self.shards is not None:
+            arrays.update({f'shard_{name}': array for name, array in self.shards.arrays().items()})
+        if self.decay_components is not None:
+            arrays['decay_reference_time'] = np.array([self.decay_reference_time], dtype='datetime64[ms]')
+            for idx, component in enumerate(self.decay_components):
+                arrays.update({f'decay_{idx}_data': component.data, f'decay_{idx}_indices': component.indices,
+                               f'decay_{idx}_indptr': component.indptr})
+        return arrays
+    
+    def _restore_arrays(self, arrays, catalog_records):
+        """
+        Reconstruire l'état du modèle à partir des tableaux d'un instantané
+        
+        Args:
+            arrays (dict): Tableaux indexés par nom de fichier (sans extension)
+            catalog_records (list): Réponses préconstruites du catalogue
+        """
+        user_ids = arrays['user_ids']
+        product_ids = arrays['product_ids']
+        shape = (len(user_ids), len(product_ids))
+        structure = (arrays['user_item_indices'], arrays['user_item_indptr'])
+        
+        self.user_id_mapping = {str(user_id): idx for idx, user_id in enumerate(user_ids)}
+        self.product_id_mapping = {str(product_id): idx for idx, product_id in enumerate(product_ids)}
+        self.user_item_matrix = sp.csr_matrix((arrays['user_item_data'], *structure), shape=shape, copy=False)
+        if 'user_vectors_data' in arrays:
+            self.user_vectors = sp.csr_matrix((arrays['user_vectors_data'], *structure), shape=shape, copy=False)
+        self.item_neighbor_indices = arrays['item_neighbor_indices']
+        self.item_neighbor_scores = arrays['item_neighbor_scores']
+        self.user_neighbor_indices = arrays.get('user_neighbor_indices')
+        self.user_neighbor_scores = arrays.get('user_neighbor_scores')
+        self.catalog = ProductCatalog(product_ids, catalog_records, arrays['catalog_available'])
+        popularity_arrays = {
+            name[len('popularity_'):]: array for name, array in arrays.items() if name.startswith('popularity_')
+        }
+        if popularity_arrays:
+            self.popularity = PopularityRankings.from_arrays(popularity_arrays)
+        shard_arrays = {name[len('shard_'):]: array for name, array in arrays.items() if name.startswith('shard_')}
+        if shard_arrays:
+            self.shards = CategoryShards.from_arrays(shard_arrays)
+        if 'decay_reference_time' in arrays:
+            self.decay_reference_time = arrays['decay_reference_time'][0]
+            self.decay_components = [
+                sp.csr_matrix((arrays[f'decay_{idx}_data'], arrays[f'decay_{idx}_indices'],
+                               arrays[f'decay_{idx}_indptr']), shape=shape, copy=False)
+                for idx in range(len(decay_half_lives(self.interaction_half_lives)))
+            ]
+    
+    def save(self, directory):
+        """
+        Enregistrer le modèle entraîné dans un répertoire
+        
+        Le répertoire contient un manifeste JSON (écrit en dernier), un fichier
+        .npy par tableau et les réponses préconstruites du catalogue.
+        
+        Args:
+            directory (str): Répertoire de l'instantané (créé s'il n'existe pas)
+        """
+        if not self.is_trained:
+            raise ValueError("Impossible d'enregistrer un modèle non entraîné")
+        
+        os.makedirs(directory, exist_ok=True)
+        arrays = self._snapshot_arrays()
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f'{name}.npy'), array, allow_pickle=False)
+        
+        with open(os.path.join(directory, 'catalog_records.json'), 'w', encoding='utf-8') as records_file:
+            json.dump(self.catalog.records, records_file, ensure_ascii=False)
+        
+        manifest = {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'model': type(self).__name__,
+            'version': self.version,
+            'created_at': time.time(),
+            'settings': self.settings(),
+            'arrays': sorted(arrays),
+            'shape': list(self.user_item_matrix.shape),
+            'training_stages': self.training_stages,
+            'watermark': self.watermark,
+            'delta_trainings': self.delta_trainings,
+            'trained_interactions': self.trained_interactions,
+            'incremental_interactions': self.incremental_interactions
+        }
+        with open(os.path.join(directory, 'manifest.json'), 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+    
+    @classmethod
+    def load(cls, directory, mmap=True, **overrides):
+        """
+        Charger un modèle enregistré par `save`
+        
+        Avec `mmap`, les tableaux sont projetés en mémoire en lecture seule: le
+        chargement ne lit pas les données et plusieurs processus qui chargent
+        le même instantané partagent les mêmes pages.
+        
+        Args:
+            directory (str): Répertoire de l'instantané
+            mmap (bool): Projeter les tableaux en mémoire au lieu de les lire
+            **overrides: Paramètres du constructeur à remplacer (ex: n_jobs)
+            
+        Returns:
+            CollaborativeFilteringModel: Modèle entraîné
+        """
+        with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest['format_version'] != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Format d'instantané non supporté: {manifest['format_version']}")
+        
+        if manifest.get('model', cls.__name__) != cls.__name__:
+            raise ValueError(f"L'instantané contient un modèle {manifest['model']}, pas {cls.__name__}")
+        
+        model = cls(**{**manifest['settings'], **overrides})
+        arrays = {
+            name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r' if mmap else None, allow_pickle=False)
+            for name in manifest['arrays']
+        }
+        with open(os.path.join(directory, 'catalog_records.json'), encoding='utf-8') as records_file:
+            catalog_records = json.load(records_file)
+        
+        model._restore_arrays(arrays, catalog_records)
+        if model.ann:
+            # L'index approché est reconstruit à partir de ses tableaux, sans nouvel apprentissage
+            index_arrays = {name[len('ann_'):]: array for name, array in arrays.items() if name.startswith('ann_')}
+            model.ann_index = load_index(model.ann, model._ann_vectors(), index_arrays, **model.ann_params)
+        model.version = manifest['version']
+        model.training_stages = manifest.get('training_stages', {})
+        model.watermark = manifest.get('watermark')
+        model.delta_trainings = manifest.get('delta_trainings', 0)
+        model.trained_interactions = manifest.get('trained_interactions', model.user_item_matrix.nnz)
+        model.incremental_interactions = manifest.get('incremental_interactions', 0)
+        materialized = MaterializedRecommendations.load(directory, mmap=mmap)
+        if materialized is not None and materialized.version == model.version:
+            model.materialized = materialized
+        model.is_trained = True
+        return model
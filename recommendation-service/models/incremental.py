@@ -0,0 +1,72 @@
+import threading
+
+
+class InteractionBuffer:
+    """
+    Tampon des interactions reçues depuis le dernier entraînement, pas encore appliquées
+    
+    Le tampon est partagé entre threads: `/record-interaction` y ajoute des
+    interactions et la mise à jour incrémentale les retire par lots. Chaque
+    interaction garde son _id MongoDB quand le service l'a enregistrée lui-même
+    (PERSIST_INTERACTIONS), pour reconnaître celles qu'un entraînement a déjà lues.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._interactions = []
+        self._interaction_ids = []
+    
+    def __len__(self):
+        return len(self._interactions)
+    
+    def append(self, user_id, product_id, interaction_type):
+        """Ajouter une interaction au tampon"""
+        with self._lock:
+            self._interactions.append((user_id, product_id, interaction_type))
+            self._interaction_ids.append(None)
+    
+    def extend(self, interactions, interaction_ids=None):
+        """
+        Ajouter plusieurs interactions au tampon
+        
+        Args:
+            interactions (iterable): Interactions (user_id, product_id, interaction_type)
+            interaction_ids (list): _id MongoDB (chaînes) de chaque interaction, None si
+                elle n'a pas été enregistrée par le service
+        """
+        interactions = list(interactions)
+        with self._lock:
+            self._interactions.extend(interactions)
+            self._interaction_ids.extend(interaction_ids if interaction_ids is not None
+                                         else [None] * len(interactions))
+    
+    def drain(self):
+        """
+        Retirer toutes les interactions du tampon
+        
+        Returns:
+            list: Interactions (user_id, product_id, interaction_type) dans leur ordre d'arrivée
+        """
+        return self.drain_after(None)[0]
+    
+    def drain_after(self, interaction_id):
+        """
+        Retirer toutes les interactions, en abandonnant celles déjà lues par un entraînement
+        
+        Args:
+            interaction_id (str): _id de la dernière interaction lue (filigrane d'un
+                entraînement); les interactions enregistrées avec un _id inférieur ou
+                égal sont abandonnées (None: toutes sont gardées)
+        
+        Returns:
+            tuple: (interactions gardées dans leur ordre d'arrivée, leurs _id)
+        """
+        with self._lock:
+            interactions, self._interactions = self._interactions, []
+            interaction_ids, self._interaction_ids = self._interaction_ids, []
+        if interaction_id is None:
+            return interactions, interaction_ids
+        # Les _id sont des ObjectId en hexadécimal: l'ordre des chaînes est celui des ObjectId
+        kept = [idx for idx, pending_id in enumerate(interaction_ids)
+                if pending_id is None or pending_id > interaction_id]
+        return [interactions[idx] for idx in kept], [interaction_ids[idx] for idx in kept]
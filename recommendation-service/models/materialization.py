@@ -0,0 +1,232 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+# Sous-répertoire d'un instantané contenant les recommandations précalculées
+MATERIALIZED_DIR = 'materialized'
+
+# Modèle chargé par chaque processus du pool de matérialisation
+_worker_model = None
+
+
+class MaterializedRecommendations:
+    """
+    Recommandations précalculées pour tous les utilisateurs d'un modèle
+    
+    Chaque ligne contient les `n_recommendations` meilleurs produits d'un
+    utilisateur (indices du catalogue, -1 au-delà des produits de score
+    positif). Les lignes des utilisateurs dont les interactions ont changé
+    depuis le précalcul sont ignorées.
+    """
+    
+    def __init__(self, version, indices, scores, stale_users=frozenset()):
+        """
+        Args:
+            version (str): Version du modèle utilisé pour le précalcul
+            indices (numpy.ndarray): Indices des produits recommandés (utilisateurs × N)
+            scores (numpy.ndarray): Scores correspondants
+            stale_users (frozenset): Indices des utilisateurs dont la ligne est périmée
+        """
+        self.version = version
+        self.indices = indices
+        self.scores = scores
+        self.stale_users = stale_users
+    
+    @property
+    def n_recommendations(self):
+        return self.indices.shape[1]
+    
+    def lookup(self, user_idx, limit):
+        """
+        Lire les recommandations précalculées d'un utilisateur
+        
+        Args:
+            user_idx (int): Indice de l'utilisateur dans le modèle
+            limit (int): Nombre maximum de recommandations
+        
+        Returns:
+            numpy.ndarray: Indices des produits recommandés, ou None si la ligne
+            est absente, périmée ou trop courte pour `limit`
+        """
+        if user_idx >= len(self.indices) or user_idx in self.stale_users or limit > self.n_recommendations:
+            return None
+        return self.indices[user_idx, :limit][self.scores[user_idx, :limit] > 0]
+    
+    def without(self, user_indices):
+        """
+        Marquer des lignes comme périmées
+        
+        Args:
+            user_indices (iterable): Indices des utilisateurs concernés
+        
+        Returns:
+            MaterializedRecommendations: Nouvel objet partageant les mêmes tableaux
+        """
+        return MaterializedRecommendations(
+            self.version, self.indices, self.scores, self.stale_users | frozenset(map(int, user_indices))
+        )
+    
+    def save(self, directory):
+        """
+        Enregistrer les recommandations dans le répertoire d'un instantané
+        
+        Args:
+            directory (str): Répertoire de l'instantané
+        """
+        path = os.path.join(directory, MATERIALIZED_DIR)
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'user_indices.npy'), self.indices, allow_pickle=False)
+        np.save(os.path.join(path, 'user_scores.npy'), self.scores, allow_pickle=False)
+        with open(os.path.join(path, 'manifest.json'), 'w', encoding='utf-8') as manifest_file:
+            json.dump({'version': self.version, 'shape': list(self.indices.shape)}, manifest_file, indent=2)
+    
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Charger les recommandations enregistrées dans un instantané
+        
+        Args:
+            directory (str): Répertoire de l'instantané
+            mmap (bool): Projeter les tableaux en mémoire au lieu de les lire
+        
+        Returns:
+            MaterializedRecommendations: Recommandations, ou None si l'instantané n'en a pas
+        """
+        path = os.path.join(directory, MATERIALIZED_DIR)
+        try:
+            with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+        except FileNotFoundError:
+            return None
+        
+        mmap_mode = 'r' if mmap else None
+        return cls(
+            manifest['version'],
+            np.load(os.path.join(path, 'user_indices.npy'), mmap_mode=mmap_mode, allow_pickle=False),
+            np.load(os.path.join(path, 'user_scores.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+        )
+
+
+def _score_users(model, start, stop, n_recommendations):
+    """
+    Calculer les meilleures recommandations des utilisateurs [start, stop)
+    
+    Returns:
+        tuple: (start, indices int32, scores float32)
+    """
+    indices = np.full((stop - start, n_recommendations), -1, dtype=np.int32)
+    scores = np.zeros((stop - start, n_recommendations), dtype=np.float32)
+    
+    top_indices, top_scores = model._top_products(np.arange(start, stop), n_recommendations)
+    columns = slice(0, top_indices.shape[1])
+    indices[:, columns] = np.where(top_scores > 0, top_indices, -1)
+    scores[:, columns] = np.maximum(top_scores, 0)
+    return start, indices, scores
+
+
+def _init_worker(directory):
+    """Charger l'instantané (projeté en mémoire) une fois par processus du pool"""
+    global _worker_model
+    from models.snapshot import load_snapshot
+    _worker_model = load_snapshot(directory, mmap=True, n_jobs=1)
+
+
+def _score_users_in_worker(start, stop, n_recommendations):
+    return _score_users(_worker_model, start, stop, n_recommendations)
+
+
+def materialize_recommendations(directory, n_recommendations=20, n_jobs=1, chunk_size=2048, model=None):
+    """
+    Précalculer les recommandations de tous les utilisateurs d'un instantané
+    
+    Les utilisateurs sont découpés en morceaux de `chunk_size`, répartis sur
+    un pool de `n_jobs` processus. Chaque processus charge l'instantané
+    projeté en mémoire: les tableaux du modèle ne sont lus qu'une fois en
+    mémoire partagée, quel que soit le nombre de processus.
+    
+    Args:
+        directory (str): Répertoire de l'instantané
+        n_recommendations (int): Nombre de recommandations par utilisateur
+        n_jobs (int): Nombre de processus
+        chunk_size (int): Nombre d'utilisateurs par tâche
+        model (CollaborativeFilteringModel): Modèle déjà chargé, utilisé à la place
+            de l'instantané quand `n_jobs` vaut 1
+    
+    Returns:
+        MaterializedRecommendations: Recommandations, enregistrées dans l'instantané
+    """
+    if model is None or n_jobs > 1:
+        from models.snapshot import load_snapshot
+        model = load_snapshot(directory, mmap=True)
+    
+    n_users = model.user_item_matrix.shape[0]
+    indices = np.full((n_users, n_recommendations), -1, dtype=np.int32)
+    scores = np.zeros((n_users, n_recommendations), dtype=np.float32)
+    chunks = [(start, min(start + chunk_size, n_users)) for start in range(0, n_users, chunk_size)]
+    
+    if n_jobs > 1:
+        # spawn: le processus parent a des threads (service, mises à jour incrémentales)
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(directory,)) as executor:
+            futures = [executor.submit(_score_users_in_worker, start, stop, n_recommendations)
+                       for start, stop in chunks]
+            results = (future.result() for future in futures)
+            for start, chunk_indices, chunk_scores in results:
+                indices[start:start + len(chunk_indices)] = chunk_indices
+                scores[start:start + len(chunk_scores)] = chunk_scores
+    else:
+        for start, stop in chunks:
+            _, indices[start:stop], scores[start:stop] = _score_users(model, start, stop, n_recommendations)
+    
+    materialized = MaterializedRecommendations(model.version, indices, scores)
+    materialized.save(directory)
+    return materialized
+
+
+def export_to_mongo(db, model, materialized, batch_size=1000):
+    """
+    Écrire les recommandations précalculées et les produits similaires dans MongoDB
+    
+    Les documents sont écrits par lots de `batch_size` avec `bulk_write`
+    non ordonné, dans les collections `materializedrecommendations` (par
+    utilisateur) et `materializedsimilarproducts` (par produit), pour les
+    applications qui les lisent directement.
+    
+    Args:
+        db: Connexion à la base de données MongoDB
+        model (CollaborativeFilteringModel): Modèle entraîné
+        materialized (MaterializedRecommendations): Recommandations précalculées
+        batch_size (int): Nombre de documents par appel à bulk_write
+    """
+    from pymongo import ReplaceOne
+    product_ids = np.asarray(model.catalog.product_ids, dtype=object)
+    
+    def documents(ids, indices, scores):
+        for entity_id, row_indices, row_scores in zip(ids, indices, scores):
+            # Écarter les emplacements vides et les produits non recommandables
+            valid = row_indices >= 0
+            valid[valid] = model.catalog.available[row_indices[valid]]
+            yield ReplaceOne({'_id': entity_id}, {
+                'version': model.version,
+                'productIds': product_ids[row_indices[valid]].tolist(),
+                'scores': row_scores[valid].astype(float).tolist()
+            }, upsert=True)
+    
+    exports = [
+        (db.materializedrecommendations, list(model.user_id_mapping), materialized.indices, materialized.scores),
+        (db.materializedsimilarproducts, list(model.product_id_mapping),
+         model.item_neighbor_indices, model.item_neighbor_scores)
+    ]
+    for collection, ids, indices, scores in exports:
+        for start in range(0, len(ids), batch_size):
+            stop = start + batch_size
+            collection.bulk_write(
+                list(documents(ids[start:stop], indices[start:stop], scores[start:stop])), ordered=False
+            )
+        
+        # Supprimer les documents d'un modèle précédent
+        collection.delete_many({'version': {'$ne': model.version}})
@@ -0,0 +1,259 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+
+# Budget mémoire d'un bloc de similarités denses lors du calcul des voisins
+DEFAULT_BLOCK_BYTES = 16 * 1024 * 1024
+
+
+def l2_normalize_rows(matrix):
+    """
+    Normaliser chaque ligne d'une matrice creuse ou dense (norme L2)
+    
+    Les lignes nulles restent nulles. Pour une matrice creuse, le résultat a
+    exactement la structure (indices, indptr) de la matrice d'entrée au
+    format CSR, ce qui permet aux instantanés de ne l'enregistrer qu'une fois.
+    
+    Args:
+        matrix (scipy.sparse.spmatrix | numpy.ndarray): Matrice à normaliser
+    
+    Returns:
+        scipy.sparse.csr_matrix | numpy.ndarray: Matrice dont les lignes sont de norme 1
+    """
+    if isinstance(matrix, np.ndarray):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.divide(matrix, norms, out=np.zeros_like(matrix, dtype=np.result_type(matrix, np.float32)),
+                         where=norms > 0)
+    
+    normalized = sp.csr_matrix(matrix, dtype=np.float64, copy=True)
+    row_lengths = np.diff(normalized.indptr)
+    rows = np.repeat(np.arange(normalized.shape[0]), row_lengths)
+    norms = np.sqrt(np.bincount(rows, weights=normalized.data ** 2, minlength=normalized.shape[0]))
+    inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalized.data *= inverse_norms[rows]
+    return normalized
+
+
+def select_top_k(scores, k):
+    """
+    Sélectionner les k meilleurs scores de chaque ligne, triés par score décroissant
+    
+    Les égalités sont départagées par indice croissant pour que le résultat
+    soit déterministe.
+    
+    Args:
+        scores (numpy.ndarray): Matrice dense (lignes × candidats)
+        k (int): Nombre de candidats à garder par ligne
+    
+    Returns:
+        tuple: (indices int32, scores float32), de forme (lignes, k)
+    """
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return (np.empty((scores.shape[0], 0), dtype=np.int32),
+                np.empty((scores.shape[0], 0), dtype=np.float32))
+    
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    
+    # argpartition choisit arbitrairement parmi les ex-aequo du k-ième score:
+    # garder ceux d'indice le plus petit pour que le résultat ne dépende pas de k
+    kth_scores = candidate_scores.min(axis=1)
+    ties = scores == kth_scores[:, np.newaxis]
+    tied_rows = np.flatnonzero(ties.sum(axis=1) > (candidate_scores == kth_scores[:, np.newaxis]).sum(axis=1))
+    if len(tied_rows):
+        row_ties = ties[tied_rows]
+        n_above = k - (candidate_scores[tied_rows] == kth_scores[tied_rows, np.newaxis]).sum(axis=1)
+        selected = (scores[tied_rows] > kth_scores[tied_rows, np.newaxis]) | (
+            row_ties & (np.cumsum(row_ties, axis=1) <= (k - n_above)[:, np.newaxis])
+        )
+        candidates[tied_rows] = np.nonzero(selected)[1].reshape(len(tied_rows), k)
+        candidate_scores[tied_rows] = np.take_along_axis(scores[tied_rows], candidates[tied_rows], axis=1)
+    order = np.lexsort((candidates, -candidate_scores), axis=1)
+    return (np.take_along_axis(candidates, order, axis=1).astype(np.int32),
+            np.take_along_axis(candidate_scores, order, axis=1).astype(np.float32))
+
+
+def _transpose(normalized):
+    """Transposée adaptée aux produits par blocs de lignes (CSC si la matrice est creuse)"""
+    return sp.csc_matrix(normalized.T) if sp.issparse(normalized) else normalized.T
+
+
+def _similarities(normalized, normalized_t, rows):
+    """Similarités denses des lignes `rows` avec toutes les lignes"""
+    similarities = normalized[rows] @ normalized_t
+    return similarities.toarray() if sp.issparse(similarities) else similarities
+
+
+def _topk_rows(normalized, normalized_t, rows, k, indices, scores, block_bytes, n_jobs):
+    """
+    Calculer les k voisins des lignes `rows` et les écrire dans `indices`/`scores`
+    
+    Args:
+        normalized (scipy.sparse.csr_matrix | numpy.ndarray): Vecteurs normalisés, un par ligne
+        normalized_t (scipy.sparse.csc_matrix | numpy.ndarray): Transposée de `normalized`
+        rows (numpy.ndarray): Lignes à calculer
+        k (int): Nombre de voisins par ligne
+        indices (numpy.ndarray): Tableau des indices de voisins, modifié en place
+        scores (numpy.ndarray): Tableau des scores de voisins, modifié en place
+        block_bytes (int): Taille maximale d'un bloc de similarités denses
+        n_jobs (int): Nombre de threads
+    """
+    n_rows = normalized.shape[0]
+    block_size = max(1, block_bytes // max(1, n_rows * 8))
+    
+    def compute_block(start):
+        block_rows = rows[start:start + block_size]
+        similarities = _similarities(normalized, normalized_t, block_rows)
+        
+        # Exclure chaque ligne de ses propres voisins
+        similarities[np.arange(len(block_rows)), block_rows] = -np.inf
+        
+        block_indices, block_scores = select_top_k(similarities, k)
+        positive = block_scores > 0
+        indices[block_rows] = np.where(positive, block_indices, -1)
+        scores[block_rows] = np.where(positive, block_scores, 0)
+    
+    starts = range(0, len(rows), block_size)
+    if n_jobs > 1:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            list(executor.map(compute_block, starts))
+    else:
+        for start in starts:
+            compute_block(start)
+
+
+def topk_neighbors(vectors, k, block_bytes=DEFAULT_BLOCK_BYTES, n_jobs=1):
+    """
+    Calculer les k plus proches voisins (cosinus) de chaque ligne de `vectors`
+    
+    Les similarités sont calculées par blocs de lignes pour que la matrice
+    complète (lignes × lignes) ne soit jamais matérialisée; les blocs sont
+    répartis sur `n_jobs` threads (les produits matriciels et argpartition
+    libèrent le GIL). Les vecteurs peuvent être creux (notes) ou denses
+    (facteurs latents). Une ligne n'est jamais sa propre voisine et seuls les voisins de
+    similarité strictement positive sont conservés; les places restantes
+    valent -1 (indice) et 0 (score).
+    
+    Args:
+        vectors (scipy.sparse.spmatrix | numpy.ndarray): Vecteurs à comparer, un par ligne
+        k (int): Nombre de voisins par ligne
+        block_bytes (int): Taille maximale d'un bloc de similarités denses
+        n_jobs (int): Nombre de threads
+    
+    Returns:
+        tuple: (indices int32, scores float32), de forme (lignes, k)
+    """
+    normalized = l2_normalize_rows(vectors)
+    n_rows = normalized.shape[0]
+    k = min(k, max(n_rows - 1, 0))
+    
+    indices = np.full((n_rows, k), -1, dtype=np.int32)
+    scores = np.zeros((n_rows, k), dtype=np.float32)
+    _topk_rows(normalized, _transpose(normalized), np.arange(n_rows), k, indices, scores, block_bytes, n_jobs)
+    return indices, scores
+
+
+def refresh_topk_neighbors(vectors, indices, scores, touched, k, block_bytes=DEFAULT_BLOCK_BYTES, n_jobs=1):
+    """
+    Mettre à jour les voisins après la modification de quelques lignes de `vectors`
+    
+    Seules les similarités impliquant une ligne modifiée changent. Sont donc
+    recalculées: les lignes modifiées, les lignes dont la liste contient une
+    ligne modifiée (son score a pu baisser) et celles où une ligne modifiée
+    dépasse désormais le dernier voisin. Le résultat est identique à un
+    recalcul complet avec `topk_neighbors`. Les tableaux d'origine ne sont
+    pas modifiés (ils peuvent être projetés en lecture seule).
+    
+    Args:
+        vectors (scipy.sparse.spmatrix | numpy.ndarray): Nouveaux vecteurs, un par ligne (les
+            nouvelles lignes sont à la fin)
+        indices (numpy.ndarray): Indices de voisins calculés avant la modification
+        scores (numpy.ndarray): Scores de voisins calculés avant la modification
+        touched (array-like): Lignes modifiées ou ajoutées
+        k (int): Nombre de voisins par ligne demandé
+        block_bytes (int): Taille maximale d'un bloc de similarités denses
+        n_jobs (int): Nombre de threads
+    
+    Returns:
+        tuple: (indices int32, scores float32), de forme (lignes, k)
+    """
+    normalized = l2_normalize_rows(vectors)
+    n_rows = normalized.shape[0]
+    k = min(k, max(n_rows - 1, 0))
+    if k != indices.shape[1]:
+        # Le nombre de voisins possibles a changé: toutes les listes sont à refaire
+        return topk_neighbors(vectors, k, block_bytes=block_bytes, n_jobs=n_jobs)
+    
+    touched = np.unique(np.asarray(touched, dtype=np.int64))
+    new_indices = np.full((n_rows, k), -1, dtype=np.int32)
+    new_scores = np.zeros((n_rows, k), dtype=np.float32)
+    new_indices[:len(indices)] = indices
+    new_scores[:len(scores)] = scores
+    
+    # Similarité maximale de chaque ligne avec une ligne modifiée
+    normalized_t = _transpose(normalized)
+    best_touched = np.zeros(n_rows)
+    block_size = max(1, block_bytes // max(1, n_rows * 8))
+    for start in range(0, len(touched), block_size):
+        block_rows = touched[start:start + block_size]
+        similarities = _similarities(normalized, normalized_t, block_rows)
+        similarities[np.arange(len(block_rows)), block_rows] = 0
+        best_touched = np.maximum(best_touched, similarities.max(axis=0))
+    
+    # Score du dernier voisin de chaque ligne (0 si la liste n'est pas pleine)
+    last_scores = np.where(new_indices[:, -1] >= 0, new_scores[:, -1], 0) if k else np.zeros(n_rows)
+    contains_touched = np.isin(new_indices, touched).any(axis=1) if k else np.zeros(n_rows, dtype=bool)
+    
+    # Les égalités comptent: l'ordre des ex-aequo dépend des indices
+    affected = contains_touched | (best_touched > last_scores) | ((best_touched == last_scores) & (best_touched > 0))
+    affected[touched] = True
+    _topk_rows(normalized, normalized_t, np.flatnonzero(affected), k, new_indices, new_scores, block_bytes, n_jobs)
+    return new_indices, new_scores
+
+
+def rescore_neighbors(vectors, indices, block_rows=512):
+    """
+    Recalculer les similarités de listes de voisins existantes, sans chercher de nouveaux voisins
+    
+    Sert après une décroissance non uniforme des poids: seules les paires
+    déjà présentes dans les listes sont comparées (k produits scalaires par
+    ligne au lieu d'une recherche sur toutes les lignes), puis chaque liste
+    est retriée par similarité décroissante, à indice croissant pour les
+    ex-aequo. Les voisins devenus de similarité nulle sont retirés. Les
+    tableaux d'origine ne sont pas modifiés.
+    
+    Args:
+        vectors (scipy.sparse.spmatrix | numpy.ndarray): Vecteurs, un par ligne
+        indices (numpy.ndarray): Indices des voisins de chaque ligne (-1: place vide)
+        block_rows (int): Nombre de lignes traitées ensemble
+    
+    Returns:
+        tuple: (indices int32, scores float32), de même forme que `indices`
+    """
+    normalized = l2_normalize_rows(vectors)
+    n_rows, k = indices.shape
+    new_indices = np.full((n_rows, k), -1, dtype=np.int32)
+    new_scores = np.zeros((n_rows, k), dtype=np.float32)
+    
+    for start in range(0, n_rows, block_rows):
+        block = np.asarray(indices[start:start + block_rows])
+        rows = np.repeat(np.arange(start, start + len(block)), k)
+        columns = block.ravel()
+        valid = columns >= 0
+        scores = np.zeros(len(columns))
+        if sp.issparse(normalized):
+            products = normalized[rows[valid]].multiply(normalized[columns[valid]])
+            scores[valid] = np.asarray(products.sum(axis=1)).ravel()
+        else:
+            scores[valid] = np.einsum('ij,ij->i', normalized[rows[valid]], normalized[columns[valid]])
+        scores = scores.reshape(block.shape)
+        
+        # Places vides et similarités nulles en fin de liste
+        keep = (block >= 0) & (scores > 0)
+        order = np.lexsort((block, np.where(keep, -scores, np.inf)), axis=-1)
+        keep = np.take_along_axis(keep, order, axis=1)
+        new_indices[start:start + len(block)] = np.where(keep, np.take_along_axis(block, order, axis=1), -1)
+        new_scores[start:start + len(block)] = np.where(keep, np.take_along_axis(scores, order, axis=1), 0)
+    return new_indices, new_scores
@@ -0,0 +1,177 @@
+import numpy as np
+
+# Nombre de produits conservés par classement (global et par catégorie)
+POPULARITY_TOP_N = 100
+
+
+def recency_weights(timestamps, now, half_life_days):
+    """
+    Poids de récence d'interactions: 0.5 ** (âge / demi-vie)
+    
+    Args:
+        timestamps (numpy.ndarray): Dates des interactions (datetime64, NaT si inconnue)
+        now (numpy.datetime64): Date de référence
+        half_life_days (float): Demi-vie en jours (None: pas de pondération)
+    
+    Returns:
+        numpy.ndarray: Poids de chaque interaction (1 si la date est inconnue)
+    """
+    timestamps = np.asarray(timestamps, dtype='datetime64[ms]')
+    if not half_life_days:
+        return np.ones(len(timestamps))
+    ages = (now - timestamps) / np.timedelta64(1, 'D')
+    weights = np.exp2(-np.maximum(ages, 0) / half_life_days)
+    weights[np.isnan(ages)] = 1.0
+    return weights
+
+
+class PopularityRankings:
+    """
+    Classements de popularité précalculés à l'entraînement
+    
+    Un classement global et un classement par catégorie des produits
+    recommandables, par nombre d'interactions pondéré par leur récence.
+    Ils servent de repli, en temps constant, aux utilisateurs et produits
+    inconnus du modèle (ou sans résultat). Les classements par catégorie
+    sont concaténés dans un seul tableau, délimité par `category_indptr`.
+    """
+    
+    def __init__(self, global_ranking, category_names, category_indptr, category_members, product_categories,
+                 scores=None, reference_time=None):
+        """
+        Args:
+            global_ranking (numpy.ndarray): Indices du catalogue, du plus populaire au moins populaire
+            category_names (numpy.ndarray): Nom de chaque catégorie classée
+            category_indptr (numpy.ndarray): Début du classement de chaque catégorie dans `category_members`
+            category_members (numpy.ndarray): Classements des catégories, concaténés
+            product_categories (dict): Catégorie de chaque ID de produit de la base
+            scores (numpy.ndarray): Popularité de chaque colonne du catalogue, à `reference_time`
+            reference_time (numpy.datetime64): Date de référence des poids de récence de `scores`
+        """
+        self.global_ranking = global_ranking
+        self.category_names = category_names
+        self.category_indptr = category_indptr
+        self.category_members = category_members
+        self.category_index = {str(name): idx for idx, name in enumerate(category_names)}
+        self.product_categories = product_categories
+        self.scores = scores
+        self.reference_time = reference_time
+    
+    @classmethod
+    def build(cls, scores, catalog, product_categories, top_n=POPULARITY_TOP_N, reference_time=None):
+        """
+        Classer les produits recommandables du catalogue
+        
+        Args:
+            scores (numpy.ndarray): Popularité de chaque colonne du catalogue
+            catalog (ProductCatalog): Catalogue des produits
+            product_categories (dict): Catégorie de chaque ID de produit de la base
+            top_n (int): Nombre de produits conservés par classement
+            reference_time (numpy.datetime64): Date de référence des poids de récence de `scores`
+        
+        Returns:
+            PopularityRankings: Classements
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        candidates = np.flatnonzero(catalog.available[:len(scores)] & (scores > 0))
+        ranking = candidates[np.lexsort((candidates, -scores[candidates]))].astype(np.int32)
+        
+        # Grouper le classement par catégorie en conservant l'ordre de popularité
+        # (pandas n'est chargé que par l'entraînement, pas par le service)
+        import pandas as pd
+        codes, category_names = pd.factorize(
+            np.array([str(catalog.records[idx]['category'] or '') for idx in ranking], dtype=object)
+        )
+        order = np.argsort(codes, kind='stable')
+        grouped, grouped_codes = ranking[order], codes[order]
+        starts = np.searchsorted(grouped_codes, np.arange(len(category_names)))
+        ends = np.minimum(np.r_[starts[1:], len(grouped)], starts + top_n)
+        members = [grouped[start:end] for start, end in zip(starts, ends)]
+        
+        return cls(
+            ranking[:top_n],
+            np.array(category_names, dtype=str),
+            np.r_[0, np.cumsum([len(category) for category in members])].astype(np.int64),
+            np.concatenate(members) if members else np.empty(0, dtype=np.int32),
+            product_categories,
+            scores,
+            reference_time
+        )
+    
+    def scores_at(self, now, half_life_days, size):
+        """
+        Popularité ramenée à une date plus récente, pour y ajouter de nouvelles interactions
+        
+        Les poids de récence sont exponentiels: vieillir les scores revient à
+        les multiplier tous par 0.5 ** (écart / demi-vie).
+        
+        Args:
+            now (numpy.datetime64): Nouvelle date de référence
+            half_life_days (float): Demi-vie en jours (None: pas de pondération)
+            size (int): Nombre de colonnes du catalogue (les nouvelles sont à 0)
+        
+        Returns:
+            numpy.ndarray: Popularité de chaque colonne à `now`
+        """
+        scores = np.zeros(size)
+        scores[:len(self.scores)] = self.scores
+        if half_life_days and self.reference_time is not None:
+            scores *= recency_weights(np.array([self.reference_time]), now, half_life_days)[0]
+        return scores
+    
+    def category_of(self, product_id):
+        """Catégorie d'un produit de la base (None s'il est inconnu)"""
+        return self.product_categories.get(product_id)
+    
+    def top(self, limit, category=None, exclude=(), only_category=False):
+        """
+        Produits les plus populaires d'une catégorie, complétés par le classement global
+        
+        Args:
+            limit (int): Nombre maximum de produits
+            category (str): Catégorie (None: classement global seulement)
+            exclude (set): Indices du catalogue à écarter
+            only_category (bool): Ne pas compléter par le classement global
+        
+        Returns:
+            list: Indices du catalogue, du plus populaire au moins populaire
+        """
+        rankings = [] if only_category else [self.global_ranking]
+        if category in self.category_index:
+            row = self.category_index[category]
+            rankings.insert(0, self.category_members[self.category_indptr[row]:self.category_indptr[row + 1]])
+        
+        selected, seen = [], set(exclude)
+        for ranking in rankings:
+            for idx in ranking:
+                if len(selected) >= limit:
+                    return selected
+                if idx not in seen:
+                    seen.add(idx)
+                    selected.append(idx)
+        return selected
+    
+    def arrays(self):
+        """Tableaux enregistrés dans un instantané"""
+        product_ids = np.array(list(self.product_categories), dtype=str)
+        arrays = {
+            'global_ranking': self.global_ranking,
+            'category_names': self.category_names,
+            'category_indptr': self.category_indptr,
+            'category_members': self.category_members,
+            'product_ids': product_ids,
+            'product_categories': np.array([self.product_categories[product_id] for product_id in product_ids],
+                                           dtype=str)
+        }
+        if self.scores is not None:
+            arrays['scores'] = self.scores
+            arrays['reference_time'] = np.array([self.reference_time], dtype='datetime64[ms]')
+        return arrays
+    
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Reconstruire les classements enregistrés par `arrays`"""
+        product_categories = dict(zip(map(str, arrays['product_ids']), map(str, arrays['product_categories'])))
+        return cls(arrays['global_ranking'], arrays['category_names'], arrays['category_indptr'],
+                   arrays['category_members'], product_categories, arrays.get('scores'),
+                   arrays['reference_time'][0] if 'reference_time' in arrays else None)
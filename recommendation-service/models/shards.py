@@ -0,0 +1,219 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from models.neighbors import refresh_topk_neighbors, rescore_neighbors, topk_neighbors
+
+
+def group_categories(categories):
+    """
+    Regrouper les colonnes du catalogue par catégorie
+    
+    Args:
+        categories (numpy.ndarray): Catégorie de chaque colonne ('' si aucune)
+    
+    Returns:
+        tuple: (noms des catégories triés, début de chaque catégorie dans
+        `members`, colonnes des catégories concaténées, croissantes dans chacune)
+    """
+    names, codes = np.unique(np.asarray(categories, dtype=str), return_inverse=True)
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes, minlength=len(names))
+    keep = names != ''
+    members = order[np.repeat(keep, counts)]
+    indptr = np.r_[0, np.cumsum(counts[keep])].astype(np.int64)
+    return names[keep], indptr, members.astype(np.int64)
+
+
+def _shard_neighbors(vectors, k, previous=None):
+    """
+    Voisins des produits d'une catégorie (exécuté dans un processus du pool)
+    
+    Args:
+        vectors (scipy.sparse.csr_matrix | numpy.ndarray): Vecteurs des produits de la catégorie
+        k (int): Nombre de voisins par produit
+        previous (tuple): (indices, scores, lignes modifiées) calculés avant une mise à jour,
+            en indices locaux; None pour tout calculer
+    
+    Returns:
+        tuple: (indices locaux int32, scores float32)
+    """
+    if previous is None:
+        return topk_neighbors(vectors, k)
+    indices, scores, touched = previous
+    return refresh_topk_neighbors(vectors, indices, scores, touched, k)
+
+
+def _run_shards(tasks, n_jobs):
+    """Calculer les voisins de chaque fragment, dans un pool de `n_jobs` processus si n_jobs > 1"""
+    if n_jobs <= 1 or len(tasks) <= 1:
+        return [_shard_neighbors(*task) for task in tasks]
+    
+    # Les plus gros fragments d'abord, pour que les processus finissent ensemble
+    order = sorted(range(len(tasks)), key=lambda idx: -tasks[idx][0].shape[0])
+    # spawn: le processus parent a des threads (service, mises à jour incrémentales)
+    with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {idx: executor.submit(_shard_neighbors, *tasks[idx]) for idx in order}
+        return [futures[idx].result() for idx in range(len(tasks))]
+
+
+class CategoryShards:
+    """
+    Index des produits similaires partitionné par catégorie du catalogue
+    
+    Chaque catégorie forme un fragment: ses produits (colonnes de la
+    matrice, croissantes) et, pour chacun, ses k voisins les plus proches
+    parmi les produits de la même catégorie. Les fragments sont calculés
+    indépendamment, en parallèle dans un pool de processus. Les voisins
+    sont rangés par colonne globale dans un seul tableau (-1 pour les
+    produits sans catégorie); l'index global du modèle reste le fragment
+    transversal des vues sans catégorie.
+    """
+    
+    def __init__(self, category_names, category_indptr, members, neighbor_indices, neighbor_scores):
+        """
+        Args:
+            category_names (numpy.ndarray): Nom de chaque catégorie
+            category_indptr (numpy.ndarray): Début des produits de chaque catégorie dans `members`
+            members (numpy.ndarray): Colonnes des produits des catégories, concaténées
+            neighbor_indices (numpy.ndarray): Colonnes des voisins de même catégorie (produits × k)
+            neighbor_scores (numpy.ndarray): Similarités correspondantes
+        """
+        self.category_names = category_names
+        self.category_indptr = category_indptr
+        self.members = members
+        self.neighbor_indices = neighbor_indices
+        self.neighbor_scores = neighbor_scores
+        self.category_index = {str(name): idx for idx, name in enumerate(category_names)}
+    
+    @classmethod
+    def build(cls, vectors, categories, k, n_jobs=1):
+        """
+        Calculer les voisins de chaque catégorie
+        
+        Args:
+            vectors (scipy.sparse.csr_matrix | numpy.ndarray): Vecteur de chaque produit, un par ligne
+            categories (numpy.ndarray): Catégorie de chaque produit ('' si aucune)
+            k (int): Nombre de voisins par produit
+            n_jobs (int): Nombre de processus
+        
+        Returns:
+            CategoryShards: Fragments
+        """
+        category_names, category_indptr, members = group_categories(categories)
+        shards = [members[start:end] for start, end in zip(category_indptr[:-1], category_indptr[1:])]
+        neighbor_indices = np.full((len(categories), k), -1, dtype=np.int32)
+        neighbor_scores = np.zeros((len(categories), k), dtype=np.float32)
+        results = _run_shards([(vectors[shard], k) for shard in shards], n_jobs)
+        for shard, (indices, scores) in zip(shards, results):
+            cls._store(neighbor_indices, neighbor_scores, shard, indices, scores)
+        return cls(category_names, category_indptr, members, neighbor_indices, neighbor_scores)
+    
+    @staticmethod
+    def _store(neighbor_indices, neighbor_scores, shard, indices, scores):
+        """Écrire les voisins locaux d'un fragment en colonnes globales"""
+        width = indices.shape[1]
+        neighbor_indices[shard] = -1
+        neighbor_scores[shard] = 0
+        neighbor_indices[shard, :width] = np.where(indices >= 0, shard[np.maximum(indices, 0)], -1)
+        neighbor_scores[shard, :width] = scores
+    
+    def category_members(self, category):
+        """
+        Colonnes des produits d'une catégorie
+        
+        Returns:
+            numpy.ndarray: Colonnes croissantes, ou None si la catégorie n'a pas de fragment
+        """
+        row = self.category_index.get(category)
+        if row is None:
+            return None
+        return self.members[self.category_indptr[row]:self.category_indptr[row + 1]]
+    
+    def refresh(self, vectors, categories, touched, k):
+        """
+        Mettre à jour les fragments après la modification de quelques produits
+        
+        Seuls les fragments qui contiennent un produit modifié, ou dont les
+        produits ont changé, sont recalculés. Quand une catégorie n'a fait que
+        gagner de nouveaux produits (ajoutés en fin de matrice), seules ses
+        listes touchées sont recalculées (refresh_topk_neighbors); sinon le
+        fragment est recalculé entièrement. Le calcul a lieu dans le
+        processus appelant: les lots incrémentaux sont petits.
+        
+        Args:
+            vectors (scipy.sparse.csr_matrix | numpy.ndarray): Vecteur de chaque produit, un par ligne
+            categories (numpy.ndarray): Catégorie de chaque produit ('' si aucune)
+            touched (array-like): Colonnes des produits modifiés ou ajoutés
+            k (int): Nombre de voisins par produit
+        
+        Returns:
+            CategoryShards: Nouveaux fragments (ceux-ci ne sont pas modifiés)
+        """
+        category_names, category_indptr, members = group_categories(categories)
+        touched = np.unique(np.asarray(touched, dtype=np.int64))
+        neighbor_indices = np.full((len(categories), k), -1, dtype=np.int32)
+        neighbor_scores = np.zeros((len(categories), k), dtype=np.float32)
+        neighbor_indices[:len(self.neighbor_indices)] = self.neighbor_indices
+        neighbor_scores[:len(self.neighbor_scores)] = self.neighbor_scores
+        
+        # Les produits sortis de toute catégorie n'ont plus de voisins
+        uncategorized = np.ones(len(categories), dtype=bool)
+        uncategorized[members] = False
+        neighbor_indices[uncategorized] = -1
+        neighbor_scores[uncategorized] = 0
+        
+        shards, tasks = [], []
+        for name, start, end in zip(category_names, category_indptr[:-1], category_indptr[1:]):
+            shard = members[start:end]
+            previous = self.category_members(str(name))
+            local_touched = np.flatnonzero(np.isin(shard, touched))
+            unchanged = previous is not None and np.array_equal(previous, shard)
+            if unchanged and not len(local_touched):
+                continue
+            
+            task = (vectors[shard], k)
+            if previous is not None and len(previous) <= len(shard) and np.array_equal(shard[:len(previous)], previous):
+                # Nouveaux produits en fin de fragment: repartir des voisins existants, en indices locaux
+                width = min(k, max(len(previous) - 1, 0))
+                indices = self.neighbor_indices[previous, :width]
+                local_indices = np.where(indices >= 0, np.searchsorted(previous, indices), -1).astype(np.int32)
+                local_touched = np.union1d(local_touched, np.arange(len(previous), len(shard)))
+                task += ((local_indices, self.neighbor_scores[previous, :width], local_touched),)
+            shards.append(shard)
+            tasks.append(task)
+        
+        for shard, (indices, scores) in zip(shards, _run_shards(tasks, 1)):
+            self._store(neighbor_indices, neighbor_scores, shard, indices, scores)
+        return CategoryShards(category_names, category_indptr, members, neighbor_indices, neighbor_scores)
+    
+    def rescore(self, vectors):
+        """
+        Recalculer les similarités des voisins de chaque fragment, sans en chercher de nouveaux
+        
+        Args:
+            vectors (scipy.sparse.csr_matrix | numpy.ndarray): Vecteur de chaque produit, un par ligne
+        
+        Returns:
+            CategoryShards: Nouveaux fragments (ceux-ci ne sont pas modifiés)
+        """
+        neighbor_indices, neighbor_scores = rescore_neighbors(vectors, self.neighbor_indices)
+        return CategoryShards(self.category_names, self.category_indptr, self.members,
+                              neighbor_indices, neighbor_scores)
+    
+    def arrays(self):
+        """Tableaux enregistrés dans un instantané"""
+        return {
+            'category_names': self.category_names,
+            'category_indptr': self.category_indptr,
+            'members': self.members,
+            'neighbor_indices': self.neighbor_indices,
+            'neighbor_scores': self.neighbor_scores
+        }
+    
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Reconstruire les fragments enregistrés par `arrays`"""
+        return cls(arrays['category_names'], arrays['category_indptr'], arrays['members'],
+                   arrays['neighbor_indices'], arrays['neighbor_scores'])
@@ -0,0 +1,155 @@
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+from models import model_class
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: le serveur de développement n'a qu'un processus
+    fcntl = None
+
+# Fichier contenant le nom de l'instantané le plus récent
+LATEST_FILE = 'LATEST'
+
+# Fichier verrouillé pendant l'entraînement d'un nouvel instantané
+TRAINING_LOCK_FILE = '.training.lock'
+
+
+def save_snapshot(model, root, keep=3, prepare=None):
+    """
+    Enregistrer un modèle comme nouvel instantané versionné
+    
+    L'instantané est écrit dans un répertoire temporaire puis renommé, et le
+    pointeur LATEST est remplacé atomiquement: un processus qui charge le
+    dernier instantané ne voit jamais un instantané partiel.
+    
+    Args:
+        model (CollaborativeFilteringModel): Modèle entraîné
+        root (str): Répertoire des instantanés
+        keep (int): Nombre d'instantanés conservés (les plus anciens sont supprimés)
+        prepare (callable): Appelé avec le chemin de l'instantané complet, avant sa
+            publication, pour y ajouter des fichiers (ex: recommandations précalculées)
+        
+    Returns:
+        str: Chemin de l'instantané
+    """
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, model.version)
+    temporary_path = os.path.join(root, f'.{model.version}.tmp')
+    
+    shutil.rmtree(temporary_path, ignore_errors=True)
+    model.save(temporary_path)
+    if prepare is not None:
+        prepare(temporary_path)
+    os.rename(temporary_path, path)
+    
+    temporary_latest = os.path.join(root, f'.{LATEST_FILE}.tmp')
+    with open(temporary_latest, 'w') as latest_file:
+        latest_file.write(model.version)
+    os.replace(temporary_latest, os.path.join(root, LATEST_FILE))
+    
+    prune_snapshots(root, keep)
+    return path
+
+
+def latest_snapshot_path(root):
+    """
+    Chemin du dernier instantané enregistré
+    
+    Args:
+        root (str): Répertoire des instantanés
+        
+    Returns:
+        str: Chemin de l'instantané, ou None s'il n'y en a pas
+    """
+    try:
+        with open(os.path.join(root, LATEST_FILE)) as latest_file:
+            version = latest_file.read().strip()
+    except FileNotFoundError:
+        return None
+    
+    path = os.path.join(root, version)
+    return path if os.path.isdir(path) else None
+
+
+def load_latest_snapshot(root, mmap=True, **overrides):
+    """
+    Charger le dernier instantané enregistré
+    
+    Args:
+        root (str): Répertoire des instantanés
+        mmap (bool): Projeter les tableaux en mémoire
+        **overrides: Paramètres du constructeur à remplacer
+        
+    Returns:
+        CollaborativeFilteringModel: Modèle chargé, ou None s'il n'y a pas d'instantané
+    """
+    path = latest_snapshot_path(root)
+    if path is None:
+        return None
+    return load_snapshot(path, mmap=mmap, **overrides)
+
+
+def load_snapshot(path, mmap=True, **overrides):
+    """
+    Charger un instantané avec la classe de modèle enregistrée dans son manifeste
+    
+    Args:
+        path (str): Répertoire de l'instantané
+        mmap (bool): Projeter les tableaux en mémoire
+        **overrides: Paramètres du constructeur à remplacer
+        
+    Returns:
+        CollaborativeFilteringModel: Modèle chargé
+    """
+    with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as manifest_file:
+        manifest = json.load(manifest_file)
+    return model_class(manifest['model']).load(path, mmap=mmap, **overrides)
+
+
+@contextmanager
+def training_lock(root):
+    """
+    Verrou exclusif, entre processus, sur l'entraînement des instantanés de `root`
+    
+    Le verrou (flock) est libéré par le système si le processus qui le
+    détient s'arrête. Il n'attend pas: si un autre processus le détient,
+    le bloc reçoit False.
+    
+    Args:
+        root (str): Répertoire des instantanés
+        
+    Yields:
+        bool: True si le verrou est obtenu
+    """
+    if fcntl is None:
+        yield True
+        return
+    
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, TRAINING_LOCK_FILE), 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def prune_snapshots(root, keep):
+    """Supprimer les instantanés les plus anciens en gardant les `keep` plus récents"""
+    latest = latest_snapshot_path(root)
+    versions = sorted(
+        name for name in os.listdir(root)
+        if not name.startswith('.') and os.path.isdir(os.path.join(root, name))
+    )
+    for version in versions[:max(0, len(versions) - keep)]:
+        path = os.path.join(root, version)
+        if path != latest:
+            shutil.rmtree(path, ignore_errors=True)
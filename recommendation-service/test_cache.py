@@ -0,0 +1,127 @@
+import logging
+import os
+import tempfile
+import time
+
+from cache import ResultCache, SqliteResultStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+def test_entry_serves_every_lower_limit():
+    """Une entrée calculée pour une limite sert toute limite inférieure"""
+    cache = ResultCache(max_entries=10)
+    cache.set('similar:v1:product0', 50, list(range(50)))
+    
+    assert cache.get('similar:v1:product0', 5) == list(range(5))
+    assert cache.get('similar:v1:product0', 50) == list(range(50))
+    assert cache.get('similar:v1:product0', 51) is None
+    assert cache.get('similar:v2:product0', 5) is None
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 2
+
+
+def test_least_recently_used_entries_are_evicted():
+    """Le cache est borné et évince l'entrée la moins récemment utilisée"""
+    cache = ResultCache(max_entries=2)
+    cache.set('a', 5, ['a'])
+    cache.set('b', 5, ['b'])
+    assert cache.get('a', 5) == ['a']
+    cache.set('c', 5, ['c'])
+    
+    assert cache.get('b', 5) is None
+    assert cache.get('a', 5) == ['a'] and cache.get('c', 5) == ['c']
+    assert cache.stats()['evictions'] == 1 and cache.stats()['size'] == 2
+
+
+def test_entries_expire_and_can_be_invalidated():
+    """Les entrées expirent après leur durée de vie ou à leur invalidation"""
+    clock = FakeClock()
+    cache = ResultCache(max_entries=10, ttl=60, clock=clock)
+    cache.set('user:v1:user0', 5, ['product1'])
+    cache.set('user:v1:user1', 5, ['product2'])
+    
+    cache.invalidate('user:v1:user0')
+    assert cache.get('user:v1:user0', 5) is None
+    clock.now = 59
+    assert cache.get('user:v1:user1', 5) == ['product2']
+    clock.now = 60
+    assert cache.get('user:v1:user1', 5) is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_shared_store_serves_other_workers():
+    """Les résultats d'un worker sont servis aux autres via le magasin SQLite"""
+    path = os.path.join(tempfile.mkdtemp(), 'results.sqlite')
+    first = ResultCache(max_entries=10, shared=SqliteResultStore(path))
+    second = ResultCache(max_entries=10, shared=SqliteResultStore(path))
+    
+    first.set('user:v1:user0', 5, [{'_id': 'product1'}])
+    assert second.get('user:v1:user0', 3) == [{'_id': 'product1'}]
+    assert second.stats()['shared_hits'] == 1
+    
+    first.invalidate('user:v1:user0')
+    second.clear()
+    assert second.get('user:v1:user0', 3) is None
+
+
+def test_invalidating_a_key_removes_its_variants():
+    """Invalider la clé d'un utilisateur supprime aussi ses entrées par catégorie, ici et dans le magasin partagé"""
+    path = os.path.join(tempfile.mkdtemp(), 'results.sqlite')
+    first = ResultCache(max_entries=10, shared=SqliteResultStore(path))
+    second = ResultCache(max_entries=10, shared=SqliteResultStore(path))
+    for key in ['user:v1:user0', 'user:v1:user0:category:shoes', 'user:v1:user01', 'user:v1:user1:category:shoes']:
+        first.set(key, 5, [key])
+    
+    first.invalidate_with_variants(['user:v1:user0', 'user:v1:user1'])
+    second.clear()
+    for cache in [first, second]:
+        assert cache.get('user:v1:user0', 5) is None
+        assert cache.get('user:v1:user0:category:shoes', 5) is None
+        assert cache.get('user:v1:user1:category:shoes', 5) is None
+        assert cache.get('user:v1:user01', 5) == ['user:v1:user01']
+
+
+def test_shared_store_is_disabled_after_repeated_errors():
+    """Les erreurs répétées du magasin partagé sont journalisées une fois chacune puis le désactivent"""
+    path = os.path.join(tempfile.mkdtemp(), 'results.sqlite')
+    store = SqliteResultStore(path, max_errors=3, retry_after=0.2)
+    other = SqliteResultStore(path)
+    warnings = []
+    handler = logging.Handler(logging.WARNING)
+    handler.emit = warnings.append
+    logging.getLogger('cache').addHandler(handler)
+    try:
+        # Une connexion fermée fait échouer toutes les opérations du thread
+        store._connection().close()
+        for _ in range(10):
+            assert store.get('user:v1:user0') is None
+            store.set('user:v1:user0', 5, ['product1'], ttl=None)
+        assert store.disabled and len(warnings) == 3
+        
+        # Désactivé, le magasin n'est plus lu; une invalidation manquée est couverte par le vidage à la réactivation
+        store._reset_connections()
+        other.set('user:v1:user0', 5, ['stale'], ttl=None)
+        assert store.get('user:v1:user0') is None and store.disabled
+        time.sleep(0.25)
+        assert store.get('user:v1:user0') is None and not store.disabled
+        store.set('user:v1:user0', 5, ['product1'], ttl=None)
+        assert other.get('user:v1:user0') == (5, ['product1'])
+        assert len(warnings) == 4
+    finally:
+        logging.getLogger('cache').removeHandler(handler)
+
+
+if __name__ == '__main__':
+    test_entry_serves_every_lower_limit()
+    test_least_recently_used_entries_are_evicted()
+    test_entries_expire_and_can_be_invalidated()
+    test_shared_store_serves_other_workers()
+    test_invalidating_a_key_removes_its_variants()
+    test_shared_store_is_disabled_after_repeated_errors()
+    print("Tous les tests du cache sont passés")
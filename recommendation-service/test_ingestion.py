@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import mongomock
+import pytest
+from bson.objectid import ObjectId
+
+import database
+from database import INTERACTION_PROJECTION, insert_interactions, iter_interaction_chunks
+from ingestion import InteractionQueue, QueueFull
+
+
+def test_full_queue_rejects_and_stop_drains_accepted_interactions():
+    """Une file pleine refuse les ajouts (tous ou aucun); l'arrêt écrit toutes les interactions acceptées"""
+    written = []
+    release = threading.Event()
+    
+    def on_batch(batch, interaction_ids):
+        release.wait()
+        written.extend(batch)
+    
+    queue = InteractionQueue(on_batch, max_size=5, batch_size=2, flush_interval=60, put_timeout=0)
+    queue.start()
+    # Le premier lot est bloqué dans on_batch: la file se remplit derrière lui
+    queue.submit([('user0', 'product0', 'view'), ('user0', 'product1', 'cart')])
+    while queue.stats()['queued']:
+        time.sleep(0.001)
+    assert queue.submit([(f'user{idx}', 'product0', 'view') for idx in range(1, 6)]) == 5
+    with pytest.raises(QueueFull):
+        queue.submit([('user6', 'product0', 'view')])
+    with pytest.raises(ValueError):
+        queue.submit([('user7', 'product0', 'view')] * 6)
+    
+    release.set()
+    queue.stop()
+    with pytest.raises(QueueFull):
+        queue.submit([('user8', 'product0', 'view')])
+    
+    assert [interaction[0] for interaction in written] == [f'user{idx}' for idx in [0, 0, 1, 2, 3, 4, 5]]
+    stats = queue.stats()
+    assert stats['accepted'] == stats['written'] == 7 and stats['rejected'] == 2 and stats['queued'] == 0
+
+
+def test_batches_are_persisted_unordered():
+    """Les lots sont enregistrés comme les documents du serveur Node; un échec est réessayé"""
+    db = mongomock.MongoClient().db
+    user_id, product_id = str(ObjectId()), str(ObjectId())
+    failures = [RuntimeError('mongo indisponible')]
+    
+    def persist(batch):
+        if failures:
+            raise failures.pop()
+        return insert_interactions(db, batch)
+    
+    batches, batch_ids = [], []
+    
+    def on_batch(batch, interaction_ids):
+        batches.append(batch)
+        batch_ids.extend(interaction_ids)
+    
+    queue = InteractionQueue(on_batch, persist=persist, batch_size=2)
+    queue.submit([(user_id, product_id, 'view'), (user_id, 'legacy-id', 'cart'), (user_id, product_id, 'purchase')])
+    queue.stop()
+    
+    assert [len(batch) for batch in batches] == [2, 1]
+    documents = list(db.productinteractions.find({}, sort=[('_id', 1)]))
+    assert [document['interactionType'] for document in documents] == ['view', 'cart', 'purchase']
+    assert batch_ids == [str(document['_id']) for document in documents]
+    assert documents[0]['userId'] == ObjectId(user_id) and documents[0]['productId'] == ObjectId(product_id)
+    assert documents[1]['productId'] == 'legacy-id'
+    assert documents[0]['timestamp'] == documents[0]['createdAt']
+    assert queue.stats()['persisted'] == 3 and queue.stats()['persist_errors'] == 0
+
+
+class RecordingCollection:
+    """Collection qui garde les arguments de find et les documents lus dans le curseur"""
+    
+    def __init__(self, collection):
+        self.collection = collection
+        self.calls = []
+        self.documents = []
+    
+    def find(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        for document in self.collection.find(*args, **kwargs):
+            self.documents.append(document)
+            yield document
+
+
+def test_interaction_chunks_are_bounded_and_projected():
+    """Les interactions sont lues par morceaux de batch_size, avec les seuls champs utiles"""
+    db = mongomock.MongoClient().db
+    users = [str(ObjectId()) for _ in range(3)]
+    products = [str(ObjectId()) for _ in range(4)]
+    insert_interactions(db, [(users[idx % 3], products[idx % 4], 'view', None) for idx in range(23)])
+    db.productinteractions.update_many({}, {'$set': {'description': 'x' * 100}})
+    
+    recording = RecordingCollection(db.productinteractions)
+    sizes = []
+    for chunk in iter_interaction_chunks(SimpleNamespace(productinteractions=recording), batch_size=10):
+        user_ids, product_ids, interaction_types, timestamps = chunk
+        assert len(user_ids) == len(product_ids) == len(interaction_types) == len(timestamps)
+        sizes.append(len(user_ids))
+        # Le morceau suivant n'est pas lu avant d'avoir été demandé
+        assert len(recording.documents) == sum(sizes)
+    
+    assert sizes == [10, 10, 3]
+    (args, kwargs), = recording.calls
+    assert args == ({}, INTERACTION_PROJECTION) and kwargs == {'batch_size': 10}
+    assert all(set(document) <= set(INTERACTION_PROJECTION) - {'_id'} for document in recording.documents)
+    assert all(set(document) >= {'userId', 'productId', 'interactionType'} for document in recording.documents)
+
+
+def test_mongo_client_is_shared_and_recreated_after_fork(monkeypatch):
+    """Les threads d'un processus partagent un client; un processus créé par fork crée le sien"""
+    clients = []
+    
+    def client_class(*args, **kwargs):
+        kwargs.pop('event_listeners')
+        clients.append(mongomock.MongoClient(*args, **kwargs))
+        return clients[-1]
+    
+    monkeypatch.setattr(database, 'mongo_client_class', lambda: client_class)
+    monkeypatch.setenv('MONGO_URI', 'mongodb://localhost:27017/recommendations')
+    database.reset_client()
+    try:
+        connections = []
+        threads = [threading.Thread(target=lambda: connections.append(database.get_database_connection()))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(clients) == 1 and all(db.client is clients[0] for db in connections)
+        assert database.get_database_connection().name == 'recommendations'
+        
+        pid = os.fork()
+        if pid == 0:
+            # Enfant: le hook at-fork a oublié le client du parent
+            ok = database._client is None and database.get_database_connection().client is clients[-1] is not clients[0]
+            os._exit(0 if ok and len(clients) == 2 else 1)
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+        assert database.get_database_connection().client is clients[0] and len(clients) == 1
+    finally:
+        database.reset_client()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+
+from flask import Flask
+
+from cache import ResultCache
+from metrics import MetricsRegistry, RequestProfiler, StageTimer, instrument, register_service_metrics
+from model_store import ModelStore
+from models.collaborative_filtering import CollaborativeFilteringModel
+from test_model import train_model
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Les histogrammes suivent le format texte Prometheus (compteurs cumulés, somme, nombre)"""
+    registry = MetricsRegistry()
+    latency = registry.histogram('latency_seconds', 'Latence', ('endpoint',), buckets=(0.1, 1.0))
+    latency.observe(0.05, '/a')
+    latency.observe(0.5, '/a')
+    latency.observe(5.0, '/a')
+    registry.counter('errors_total', 'Erreurs', ('logger',)).inc('app')
+    
+    lines = registry.render().splitlines()
+    assert '# TYPE latency_seconds histogram' in lines
+    assert 'latency_seconds_bucket{endpoint="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{endpoint="/a",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{endpoint="/a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{endpoint="/a"} 3' in lines
+    assert 'errors_total{logger="app"} 1.0' in lines
+
+
+def test_requests_are_timed_and_sampled_for_profiling():
+    """Les latences sont regroupées par règle d'URL; une requête sur N est profilée"""
+    app = Flask(__name__)
+    
+    @app.route('/recommend/user/<user_id>')
+    def recommend(user_id):
+        return user_id
+    
+    registry = MetricsRegistry()
+    directory = tempfile.mkdtemp()
+    instrument(app, registry, RequestProfiler(every=2, directory=directory))
+    client = app.test_client()
+    for user_id in range(4):
+        assert client.get(f'/recommend/user/{user_id}').status_code == 200
+    
+    assert ('recommendation_http_request_duration_seconds_count'
+            '{endpoint="/recommend/user/<user_id>",method="GET",status="200"} 4') in registry.render()
+    assert len(os.listdir(directory)) == 2
+
+
+def test_service_gauges_describe_the_served_model():
+    """Les jauges reflètent le modèle servi, ses étapes d'entraînement et le cache"""
+    model = train_model()
+    assert list(model.training_stages) == ['fetch', 'matrix', 'fit', 'catalog', 'popularity']
+    
+    registry = MetricsRegistry()
+    store = ModelStore(CollaborativeFilteringModel())
+    register_service_metrics(registry, store, ResultCache(), lambda: {'created': 1, 'in_use': 0})
+    assert 'recommendation_model_entries{dimension="pending_interactions"} 0.0' in registry.render()
+    
+    store.swap(model)
+    text = registry.render()
+    assert 'recommendation_model_entries{dimension="users"} 60.0' in text
+    assert 'recommendation_training_stage_seconds{stage="fit"}' in text
+    assert 'recommendation_mongo_pool_events_total{event="created"} 1.0' in text
+    
+    stages = StageTimer()
+    with stages('fetch'):
+        pass
+    assert list(stages.durations) == ['fetch']
@@ -0,0 +1,1017 @@
+import datetime
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import mongomock
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from sklearn.metrics.pairwise import cosine_similarity
+
+from models.collaborative_filtering import (INTERACTION_WEIGHTS, CollaborativeFilteringModel, build_user_item_matrix,
+                                           factorize)
+from models.als import ImplicitALSModel, solve_factors
+from models.ann import BruteForceIndex, HNSWIndex, RandomProjectionIndex, load_index
+from models.materialization import materialize_recommendations
+from models.neighbors import l2_normalize_rows, topk_neighbors
+from models.snapshot import load_snapshot, save_snapshot, training_lock
+from database import insert_interactions
+from model_store import ModelStore
+from training import FAILED, SUCCEEDED, SharedTrainingJobs, SnapshotWatcher, TrainingManager
+
+
+class FakeCollection:
+    """Collection MongoDB minimale en mémoire"""
+    
+    def __init__(self, documents):
+        self.documents = documents
+    
+    def find(self, *args, **kwargs):
+        return iter(self.documents)
+    
+    def find_one(self, *args, **kwargs):
+        # Sans tri ni _id: pas de filigrane, les entraînements sont complets
+        return None
+
+
+class FakeDatabase:
+    """Base de données MongoDB minimale en mémoire"""
+    
+    def __init__(self, interactions, products):
+        self.productinteractions = FakeCollection(interactions)
+        self.productstree = FakeCollection(products)
+
+
+def make_database(n_users=60, n_products=40, n_interactions=600, seed=0, collected=()):
+    """Générer une base synthétique d'interactions et de produits"""
+    rng = np.random.default_rng(seed)
+    interaction_types = ['view', 'cart', 'purchase']
+    interactions = [
+        {
+            'userId': f'user{rng.integers(n_users)}',
+            'productId': f'product{rng.integers(n_products)}',
+            'interactionType': interaction_types[rng.choice(3, p=[0.7, 0.2, 0.1])]
+        }
+        for _ in range(n_interactions)
+    ]
+    products = [
+        {
+            '_id': f'product{idx}',
+            'title': f'Produit {idx}',
+            'image': f'https://example.com/{idx}.png',
+            'category': f'category{idx % 4}',
+            'price': float(idx),
+            'isCollected': idx in collected
+        }
+        for idx in range(n_products)
+    ]
+    return FakeDatabase(interactions, products)
+
+
+def legacy_prediction_scores(model, user_idx):
+    """Scores calculés par l'ancienne double boucle de recommend_for_user"""
+    ratings = model.user_item_matrix.toarray()
+    similar_users = cosine_similarity(ratings)[user_idx]
+    interacted_products = np.where(ratings[user_idx] > 0)[0]
+    prediction_scores = np.zeros(ratings.shape[1])
+    
+    for product_idx in range(ratings.shape[1]):
+        if product_idx in interacted_products:
+            continue
+        weighted_sum = 0
+        similarity_sum = 0
+        for other_user_idx in range(ratings.shape[0]):
+            if other_user_idx == user_idx:
+                continue
+            similarity = similar_users[other_user_idx]
+            rating = ratings[other_user_idx, product_idx]
+            if rating > 0 and similarity > 0:
+                weighted_sum += similarity * rating
+                similarity_sum += similarity
+        if similarity_sum > 0:
+            prediction_scores[product_idx] = weighted_sum / similarity_sum
+    
+    return prediction_scores
+
+
+def train_model(database=None, **kwargs):
+    model = CollaborativeFilteringModel(**kwargs)
+    assert model.train(database or make_database())
+    return model
+
+
+def test_duplicate_interactions_are_aggregated_in_the_sparse_matrix():
+    """Les paires (utilisateur, produit) dupliquées sont agrégées par max ou par somme dans une matrice CSR"""
+    user_ids = ['user1', 'user0', 'user1', 'user1', 'user0', 'user2', 'user1']
+    product_ids = ['product2', 'product0', 'product2', 'product0', 'product0', 'product1', 'product2']
+    interaction_types = ['view', 'cart', 'purchase', 'view', 'view', 'unknown', 'cart']
+    expected = {
+        'max': [[5.0, 1.0, 0.0], [0.0, 3.0, 0.0], [0.0, 0.0, 1.0]],
+        'sum': [[9.0, 1.0, 0.0], [0.0, 4.0, 0.0], [0.0, 0.0, 1.0]]
+    }
+    for aggregation, dense in expected.items():
+        matrix, users, products = build_user_item_matrix(user_ids, product_ids, interaction_types, aggregation)
+        assert sp.isspmatrix_csr(matrix) and matrix.has_sorted_indices and matrix.nnz == 4
+        assert list(users) == ['user1', 'user0', 'user2'] and list(products) == ['product2', 'product0', 'product1']
+        np.testing.assert_array_equal(matrix.toarray(), dense)
+    with pytest.raises(ValueError):
+        build_user_item_matrix(user_ids, product_ids, interaction_types, 'mean')
+
+
+def test_vectorized_scores_match_legacy_loop():
+    """Les scores vectorisés sont identiques à ceux de l'ancienne boucle"""
+    model = train_model()
+    for user_idx in range(model.user_item_matrix.shape[0]):
+        np.testing.assert_allclose(
+            model._predict_scores(user_idx),
+            legacy_prediction_scores(model, user_idx),
+            rtol=1e-9, atol=1e-12
+        )
+
+
+def test_recommend_for_user_matches_legacy_ranking():
+    """Les recommandations suivent le classement de l'ancienne implémentation"""
+    model = train_model()
+    for user_id, user_idx in model.user_id_mapping.items():
+        expected_scores = legacy_prediction_scores(model, user_idx)
+        recommendations = model.recommend_for_user(user_id, limit=5)
+        
+        # Comparer les scores plutôt que les IDs: l'ordre des ex-aequo est arbitraire
+        returned_scores = [expected_scores[model.product_id_mapping[product['_id']]] for product in recommendations]
+        positive_scores = np.sort(expected_scores[expected_scores > 0])[::-1]
+        np.testing.assert_allclose(returned_scores, positive_scores[:5])
+
+
+def test_precomputed_user_neighbors_match_on_demand_search():
+    """Une liste de voisins précalculée assez longue donne les scores exacts"""
+    exact = train_model()
+    precomputed = train_model(n_user_neighbors=exact.user_item_matrix.shape[0], precompute_user_neighbors=True, n_jobs=2)
+    assert not hasattr(precomputed, 'user_similarity_matrix')
+    for user_idx in range(exact.user_item_matrix.shape[0]):
+        np.testing.assert_allclose(precomputed._predict_scores(user_idx), exact._predict_scores(user_idx), rtol=1e-6)
+
+
+def test_user_neighbors_are_bounded():
+    """La recherche à la demande ne garde que les n_user_neighbors plus similaires"""
+    model = train_model(n_user_neighbors=5)
+    for user_idx in range(model.user_item_matrix.shape[0]):
+        neighbors, similarities = model._user_neighbors(user_idx)
+        assert len(neighbors) <= 5
+        assert user_idx not in neighbors
+        assert np.all(similarities > 0)
+
+
+def test_collected_products_are_filtered_before_selection():
+    """Les produits collectés sont écartés sans réduire le nombre de résultats"""
+    collected = set(range(0, 40, 3))
+    model = train_model(make_database(collected=collected))
+    collected_ids = {f'product{idx}' for idx in collected}
+    
+    for user_id in model.user_id_mapping:
+        recommendations = model.recommend_for_user(user_id, limit=5)
+        assert not collected_ids & {product['_id'] for product in recommendations}
+    
+    for product_id in model.product_id_mapping:
+        similar_products = model.find_similar_products(product_id, limit=5)
+        assert not collected_ids & {product['_id'] for product in similar_products}
+        
+        # Autant de résultats que de voisins recommandables, dans la limite demandée
+        neighbors = model.item_neighbor_indices[model.product_id_mapping[product_id]]
+        n_available = int(model.catalog.available[neighbors[neighbors >= 0]].sum())
+        assert len(similar_products) == min(5, n_available)
+
+
+def test_batch_recommendations_match_single_calls():
+    """Les recommandations par lot sont identiques aux appels unitaires"""
+    for kwargs in [{}, {'n_user_neighbors': 5}, {'n_user_neighbors': 5, 'precompute_user_neighbors': True}]:
+        model = train_model(make_database(collected=set(range(0, 40, 7))), **kwargs)
+        user_limits = {user_id: 1 + idx % 7 for idx, user_id in enumerate(model.user_id_mapping)}
+        user_limits['unknown'] = 5
+        
+        recommendations = model.recommend_for_users(user_limits)
+        assert list(recommendations) == list(user_limits)
+        for user_id, limit in user_limits.items():
+            assert recommendations[user_id] == model.recommend_for_user(user_id, limit)
+        
+        product_limits = {product_id: 3 for product_id in model.product_id_mapping}
+        product_limits['unknown'] = 3
+        similar_products = model.find_similar_products_batch(product_limits)
+        for product_id, limit in product_limits.items():
+            assert similar_products[product_id] == model.find_similar_products(product_id, limit)
+
+
+def test_materialized_recommendations_match_live_scoring():
+    """Les recommandations précalculées sont identiques au calcul à la demande"""
+    live = train_model(make_database(collected=set(range(0, 40, 7))))
+    for n_jobs in [1, 2]:
+        directory = tempfile.mkdtemp()
+        live.save(directory)
+        materialize_recommendations(directory, n_recommendations=8, n_jobs=n_jobs, chunk_size=16)
+        model = CollaborativeFilteringModel.load(directory)
+        assert model.materialized is not None
+        
+        for user_id in live.user_id_mapping:
+            for limit in [1, 5, 8, 12]:
+                assert model.recommend_for_user(user_id, limit) == live.recommend_for_user(user_id, limit)
+    
+    # Une interaction rend périmée la ligne précalculée de l'utilisateur concerné
+    user_id = next(iter(live.user_id_mapping))
+    model.update_with_interaction(user_id, 'product0', 'purchase')
+    live.update_with_interaction(user_id, 'product0', 'purchase')
+    model, live = model.apply_pending_interactions(), live.apply_pending_interactions()
+    assert model.materialized.lookup(model.user_id_mapping[user_id], 5) is None
+    assert model.recommend_for_user(user_id) == live.recommend_for_user(user_id)
+
+
+def test_als_factors_solve_the_normal_equations():
+    """Chaque facteur résolu minimise la perte pondérée de son utilisateur"""
+    ratings = train_model().user_item_matrix
+    item_factors = np.random.default_rng(0).standard_normal((ratings.shape[1], 8))
+    user_factors = solve_factors(ratings, item_factors, regularization=0.5, alpha=2.0, n_jobs=2)
+    
+    for user_idx in range(ratings.shape[0]):
+        confidence = 1 + 2.0 * ratings[user_idx].toarray().ravel()
+        preference = (ratings[user_idx].toarray().ravel() > 0).astype(float)
+        system = item_factors.T @ (confidence[:, np.newaxis] * item_factors) + 0.5 * np.eye(8)
+        expected = np.linalg.solve(system, item_factors.T @ (confidence * preference))
+        np.testing.assert_allclose(user_factors[user_idx], expected, rtol=1e-4, atol=1e-5)
+
+
+def test_als_model_serves_the_same_interface():
+    """Le modèle ALS recommande, se sauvegarde et se met à jour comme le modèle cosinus"""
+    collected = set(range(0, 40, 7))
+    collected_ids = {f'product{idx}' for idx in collected}
+    model = ImplicitALSModel(factors=8, iterations=5, n_item_neighbors=10)
+    assert model.train(make_database(collected=collected))
+    assert model.user_factors.dtype == np.float32 and model.user_factors.shape == (60, 8)
+    
+    for user_id, user_idx in model.user_id_mapping.items():
+        recommendations = model.recommend_for_user(user_id, limit=5)
+        interacted = {model.catalog.product_ids[idx] for idx in model.user_item_matrix[user_idx].indices}
+        assert not (interacted | collected_ids) & {product['_id'] for product in recommendations}
+    for product_id in model.product_id_mapping:
+        assert not collected_ids & {product['_id'] for product in model.find_similar_products(product_id)}
+    
+    directory = tempfile.mkdtemp()
+    model.save(directory)
+    loaded = load_snapshot(directory)
+    assert isinstance(loaded, ImplicitALSModel)
+    for user_id in model.user_id_mapping:
+        assert loaded.recommend_for_user(user_id) == model.recommend_for_user(user_id)
+    
+    # Un nouvel utilisateur reçoit des facteurs dès l'application de ses interactions
+    loaded.update_with_interaction('new-user', 'product1', 'purchase')
+    loaded.update_with_interaction('new-user', 'product2', 'cart')
+    updated = loaded.apply_pending_interactions()
+    assert updated.user_factors.shape == (61, 8)
+    assert updated.recommend_for_user('new-user')
+    # Avant l'application de ses interactions, il reçoit les produits les plus populaires
+    assert loaded.recommend_for_user('new-user') == loaded.catalog.hydrate(loaded.popularity.top(5))
+
+
+def exact_topk_neighbors(vectors, k):
+    """Voisins de référence: similarités cosinus complètes, triées par score décroissant puis indice croissant"""
+    normalized = l2_normalize_rows(vectors)
+    similarities = normalized @ normalized.T
+    similarities = similarities.toarray() if sp.issparse(similarities) else similarities
+    np.fill_diagonal(similarities, -np.inf)
+    order = np.lexsort((np.broadcast_to(np.arange(len(similarities)), similarities.shape), -similarities), axis=1)[:, :k]
+    scores = np.take_along_axis(similarities, order, axis=1)
+    return np.where(scores > 0, order, -1), np.where(scores > 0, scores, 0)
+
+
+def test_blockwise_topk_neighbors_match_dense_cosine():
+    """Le calcul par blocs et par threads donne les voisins de la matrice cosinus complète, ex-aequo compris"""
+    rng = np.random.default_rng(0)
+    # 10 vecteurs distincts répétés: chaque ligne a des voisins ex-aequo dans plusieurs blocs
+    base = rng.integers(0, 3, size=(10, 12)).astype(np.float64)
+    base[0] = 0
+    n_rows, k = 53, 8
+    dense = base[np.arange(n_rows) % 10]
+    for vectors in [sp.csr_matrix(dense), dense + rng.normal(scale=1e-3, size=dense.shape)]:
+        expected_indices, expected_scores = exact_topk_neighbors(vectors, k)
+        # 7 lignes par bloc: 53 n'en est pas un multiple
+        for block_bytes in [7 * n_rows * 8, n_rows * 8, 10 ** 9]:
+            for n_jobs in [1, 2, 4]:
+                indices, scores = topk_neighbors(vectors, k, block_bytes=block_bytes, n_jobs=n_jobs)
+                np.testing.assert_array_equal(indices, expected_indices)
+                np.testing.assert_allclose(scores, expected_scores, rtol=1e-6, atol=1e-6)
+    
+    # Les doublons de la ligne 1 passent en premier, par indice croissant; la ligne nulle n'a aucun voisin
+    indices, scores = topk_neighbors(sp.csr_matrix(dense), k, block_bytes=7 * n_rows * 8, n_jobs=4)
+    assert list(indices[1, :5]) == [11, 21, 31, 41, 51] and np.allclose(scores[1, :5], 1)
+    assert (indices[0] == -1).all() and (scores[0] == 0).all()
+
+
+def test_ann_indexes_recall_exact_neighbors():
+    """Les index approchés retrouvent les voisins exacts et se rechargent à l'identique"""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((500, 16)).astype(np.float32)
+    queries = vectors[:50] + 0.1 * rng.standard_normal((50, 16)).astype(np.float32)
+    exact, _ = BruteForceIndex(vectors).query(queries, 10)
+    expected = np.argsort(-cosine_similarity(queries, vectors), axis=1, kind='stable')[:, :10]
+    assert np.array_equal(np.sort(exact, axis=1), np.sort(expected, axis=1))
+    
+    index = RandomProjectionIndex(vectors, n_tables=8, n_bits=6, n_probes=2)
+    found, scores = index.query(queries, 10)
+    recall = np.mean([len(set(row) & set(exact_row)) / 10 for row, exact_row in zip(found, exact)])
+    assert recall >= 0.8
+    assert np.all(np.diff(scores, axis=1) <= 0)
+    
+    reloaded = load_index('lsh', vectors, index.arrays(), **index.settings())
+    assert np.array_equal(reloaded.query(queries, 10)[0], found)
+
+
+def test_ann_indexes_update_only_touched_rows():
+    """Réindexer les lignes modifiées donne le même index qu'une reconstruction, sans modifier l'index servi"""
+    rng = np.random.default_rng(1)
+    vectors = sp.random(300, 40, density=0.1, format='csr', random_state=1, dtype=np.float32)
+    index = RandomProjectionIndex(vectors, n_tables=8, n_bits=6)
+    bucket_keys, bucket_members = index.bucket_keys.copy(), index.bucket_members.copy()
+    
+    # Lignes modifiées, nouvelles lignes et nouvelles colonnes (nouveaux utilisateurs et produits)
+    touched = rng.choice(300, size=20, replace=False)
+    updated_vectors = sp.lil_matrix((320, 45), dtype=np.float32)
+    updated_vectors[:300, :40] = vectors
+    updated_vectors[touched, 40 + rng.integers(5, size=20)] = 1.0
+    updated_vectors[300:] = sp.random(20, 45, density=0.2, random_state=2)
+    updated_vectors = updated_vectors.tocsr()
+    
+    updated = index.update(updated_vectors, touched)
+    rebuilt = RandomProjectionIndex(updated_vectors, n_tables=8, n_bits=6)
+    np.testing.assert_array_equal(updated.planes, rebuilt.planes)
+    np.testing.assert_array_equal(updated.bucket_keys, rebuilt.bucket_keys)
+    np.testing.assert_array_equal(updated.bucket_members, rebuilt.bucket_members)
+    np.testing.assert_array_equal(index.bucket_keys, bucket_keys)
+    np.testing.assert_array_equal(index.bucket_members, bucket_members)
+    
+    # Les modèles réindexent les lignes touchées par chaque lot d'interactions
+    database = make_database(n_users=80, n_products=50, n_interactions=800, seed=1)
+    products = {product['_id']: product for product in database.productstree.documents}
+    interactions = database.productinteractions.documents
+    model = train_model(FakeDatabase(interactions[:600], list(products.values())), n_user_neighbors=10, ann='lsh')
+    for interaction in interactions[600:]:
+        model.update_with_interaction(interaction['userId'], interaction['productId'], interaction['interactionType'])
+    model = model.apply_pending_interactions(product_lookup=products.get)
+    rebuilt = RandomProjectionIndex(model.user_vectors, **model.ann_params)
+    np.testing.assert_array_equal(model.ann_index.bucket_keys, rebuilt.bucket_keys)
+    np.testing.assert_array_equal(model.ann_index.bucket_members, rebuilt.bucket_members)
+    
+    if importlib.util.find_spec('hnswlib'):
+        als = ImplicitALSModel(factors=8, iterations=5, ann='hnsw', ann_params={'ef': 100})
+        assert als.train(FakeDatabase(interactions[:600], list(products.values())))
+        graph = als.ann_index.index
+        for interaction in interactions[600:]:
+            als.update_with_interaction(interaction['userId'], interaction['productId'], interaction['interactionType'])
+        updated_als = als.apply_pending_interactions(product_lookup=products.get)
+        assert als.ann_index.index is graph and updated_als.ann_index.index is not graph
+        assert updated_als.ann_index.index.get_current_count() == len(updated_als.product_id_mapping)
+        np.testing.assert_allclose(updated_als.ann_index.index.get_items(np.arange(len(updated_als.product_id_mapping))),
+                                   l2_normalize_rows(updated_als._ann_vectors()), atol=1e-5)
+
+
+def test_hnsw_index_serves_dense_factors():
+    """L'index hnsw retrouve les voisins des facteurs denses, se recharge sans les relire et refuse les vecteurs creux"""
+    pytest.importorskip('hnswlib')
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((500, 16)).astype(np.float32)
+    queries = vectors[:50] + 0.1 * rng.standard_normal((50, 16)).astype(np.float32)
+    exact, _ = BruteForceIndex(vectors).query(queries, 10)
+    
+    index = HNSWIndex(vectors, ef=100)
+    found, scores = index.query(queries, 10)
+    recall = np.mean([len(set(row) & set(exact_row)) / 10 for row, exact_row in zip(found, exact)])
+    assert recall >= 0.95
+    assert np.all(np.diff(scores, axis=1) <= 1e-6)
+    
+    # Le graphe enregistré contient les vecteurs: seules les dimensions sont lues au rechargement
+    reloaded = load_index('hnsw', np.zeros_like(vectors), index.arrays(), **index.settings())
+    assert np.array_equal(reloaded.query(queries, 10)[0], found)
+    
+    with pytest.raises(ValueError):
+        HNSWIndex(sp.csr_matrix(vectors))
+    with pytest.raises(ValueError):
+        CollaborativeFilteringModel(n_user_neighbors=10, ann='hnsw')
+    
+    database = make_database()
+    exact_als = ImplicitALSModel(factors=8, iterations=5)
+    hnsw_als = ImplicitALSModel(factors=8, iterations=5, ann='hnsw', ann_params={'ef': 100})
+    assert exact_als.train(database) and hnsw_als.train(database)
+    for user_id in exact_als.user_id_mapping:
+        assert hnsw_als.recommend_for_user(user_id) == exact_als.recommend_for_user(user_id)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        hnsw_als.save(directory)
+        loaded = load_snapshot(directory)
+        assert isinstance(loaded.ann_index, HNSWIndex)
+        for user_id in exact_als.user_id_mapping:
+            assert loaded.recommend_for_user(user_id) == hnsw_als.recommend_for_user(user_id)
+
+
+def test_models_serve_recommendations_through_the_ann_index():
+    """Avec un index approché exhaustif, les modèles trouvent les mêmes voisins et recommandations"""
+    database = make_database()
+    exact = train_model(database, n_user_neighbors=10)
+    approximate = train_model(database, n_user_neighbors=10, ann='brute')
+    user_indices = np.arange(exact.user_item_matrix.shape[0])
+    neighbors = zip(exact._user_neighbors_batch(user_indices), approximate._user_neighbors_batch(user_indices))
+    for (_, exact_scores), (_, approximate_scores) in neighbors:
+        # Les voisins ex-aequo peuvent différer d'un arrondi près: comparer les similarités
+        assert np.allclose(np.sort(exact_scores), np.sort(approximate_scores), atol=1e-6)
+    
+    exact_als = ImplicitALSModel(factors=8, iterations=5)
+    approximate_als = ImplicitALSModel(factors=8, iterations=5, ann='lsh',
+                                       ann_params={'n_tables': 16, 'n_bits': 2, 'n_probes': 2})
+    assert exact_als.train(database) and approximate_als.train(database)
+    for user_id in exact_als.user_id_mapping:
+        expected = exact_als.recommend_for_user(user_id)
+        assert approximate_als.recommend_for_user(user_id) == expected
+    
+    directory = tempfile.mkdtemp()
+    approximate_als.save(directory)
+    loaded = load_snapshot(directory)
+    assert isinstance(loaded.ann_index, RandomProjectionIndex)
+    for user_id in exact_als.user_id_mapping:
+        assert loaded.recommend_for_user(user_id) == approximate_als.recommend_for_user(user_id)
+
+
+def test_unknown_users_and_products_get_popularity_fallbacks():
+    """Utilisateurs et produits inconnus reçoivent les produits populaires récents, par catégorie"""
+    now = datetime.datetime.utcnow()
+    old = now - datetime.timedelta(days=365)
+    interactions = [
+        # product0 a le plus d'interactions, mais anciennes: product1 est le plus populaire
+        *({'userId': f'user{idx}', 'productId': 'product0', 'interactionType': 'view', 'timestamp': old}
+          for idx in range(6)),
+        *({'userId': f'user{idx}', 'productId': 'product1', 'interactionType': 'view', 'timestamp': now}
+          for idx in range(3)),
+        *({'userId': f'user{idx}', 'productId': 'product2', 'interactionType': 'view', 'createdAt': now}
+          for idx in range(2)),
+        {'userId': 'user0', 'productId': 'product4', 'interactionType': 'view', 'timestamp': now},
+        {'userId': 'user1', 'productId': 'product3', 'interactionType': 'view', 'timestamp': now}
+    ]
+    database = make_database(n_products=8)
+    database.productinteractions = FakeCollection(interactions)
+    model = train_model(database)
+    
+    ranking = [product['_id'] for product in model.recommend_for_user('unknown-user', limit=4)]
+    assert ranking == ['product1', 'product2', 'product4', 'product3']
+    
+    # product5 (category1) n'a aucune interaction: produits de sa catégorie d'abord
+    similar = [product['_id'] for product in model.find_similar_products('product5', limit=3)]
+    assert similar == ['product1', 'product2', 'product4']
+    
+    directory = tempfile.mkdtemp()
+    model.save(directory)
+    loaded = load_snapshot(directory)
+    assert loaded.find_similar_products('product5', limit=3) == model.find_similar_products('product5', limit=3)
+    assert loaded.recommend_for_user('unknown-user') == model.recommend_for_user('unknown-user')
+
+
+def test_delta_training_matches_full_retrain():
+    """Un entraînement différentiel depuis le filigrane donne le même modèle qu'un entraînement complet"""
+    import mongomock
+    
+    source = make_database(n_users=80, n_products=50, n_interactions=800, seed=2)
+    for aggregate_in_database in [False, True]:
+        db = mongomock.MongoClient().db
+        updated_at = datetime.datetime(2024, 1, 1)
+        db.productstree.insert_many([{**product, 'updatedAt': updated_at} for product in source.productstree.documents])
+        interactions = [dict(interaction) for interaction in source.productinteractions.documents]
+        db.productinteractions.insert_many(interactions[:700])
+        
+        settings = dict(n_item_neighbors=10, aggregate_in_database=aggregate_in_database)
+        model = train_model(db, **settings)
+        assert model.can_train_delta()
+        
+        # Nouvelles interactions, dont un nouveau produit, et un produit désormais collecté
+        db.productstree.insert_one({'_id': 'product99', 'title': 'Nouveau', 'category': 'category0',
+                                    'isCollected': False, 'updatedAt': updated_at})
+        db.productinteractions.insert_many(interactions[700:] + [
+            {'userId': 'user1', 'productId': 'product99', 'interactionType': 'purchase'}
+        ])
+        db.productstree.update_one({'_id': 'product3'}, {'$set': {'isCollected': True,
+                                                                  'updatedAt': datetime.datetime(2024, 1, 2)}})
+        
+        delta = model.train_delta(db)
+        retrained = train_model(db, **settings)
+        assert delta.version != model.version and delta.delta_trainings == 1 and delta.drift() > 0
+        assert delta.watermark == retrained.watermark
+        
+        # L'ordre des paires regroupées par MongoDB n'est pas garanti: comparer par ID
+        def by_id(trained):
+            users, products = list(trained.user_id_mapping), list(trained.product_id_mapping)
+            matrix = trained.user_item_matrix.tocoo()
+            weights = {(users[row], products[col]): weight
+                       for row, col, weight in zip(matrix.row, matrix.col, matrix.data)}
+            return weights, dict(zip(products, trained.catalog.available))
+        assert by_id(delta) == by_id(retrained)
+        order = [delta.product_id_mapping[product_id] for product_id in retrained.product_id_mapping]
+        np.testing.assert_allclose(delta.popularity.scores[order], retrained.popularity.scores, rtol=1e-5)
+        if not aggregate_in_database:
+            assert delta.product_id_mapping == retrained.product_id_mapping
+            np.testing.assert_array_equal(delta.item_neighbor_indices, retrained.item_neighbor_indices)
+            for user_id in retrained.user_id_mapping:
+                assert delta.recommend_for_user(user_id) == retrained.recommend_for_user(user_id)
+        
+        # Le filigrane est enregistré avec l'instantané
+        directory = tempfile.mkdtemp()
+        delta.save(directory)
+        loaded = load_snapshot(directory)
+        assert loaded.watermark == delta.watermark and loaded.drift() == delta.drift()
+        assert loaded.train_delta(db).user_item_matrix.nnz == delta.user_item_matrix.nnz
+
+
+def test_time_decayed_weights_rescale_without_rereading():
+    """Les poids décroissent avec l'âge des interactions; les vieillir équivaut à les recalculer plus tard"""
+    import mongomock
+    
+    half_lives = {'view': 7, 'cart': 30}
+    source = make_database(n_users=40, n_products=30, n_interactions=400, seed=3)
+    rng = np.random.default_rng(3)
+    start = datetime.datetime.utcnow()
+    for interaction in source.productinteractions.documents:
+        interaction['timestamp'] = start - datetime.timedelta(days=float(rng.uniform(0, 60)))
+    
+    def expected_weights(at, aggregation):
+        """Poids décroissants calculés interaction par interaction, agrégés par paire"""
+        weights = {}
+        for interaction in source.productinteractions.documents:
+            age = (at - np.datetime64(interaction['timestamp'], 'ms')) / np.timedelta64(1, 'D')
+            half_life = half_lives.get(interaction['interactionType'], np.inf)
+            weight = INTERACTION_WEIGHTS[interaction['interactionType']] * 0.5 ** (max(age, 0) / half_life)
+            key = (interaction['userId'], interaction['productId'])
+            weights[key] = weight + weights.get(key, 0) if aggregation == 'sum' else max(weight, weights.get(key, 0))
+        return weights
+    
+    def by_id(trained):
+        users, products = list(trained.user_id_mapping), list(trained.product_id_mapping)
+        matrix = trained.user_item_matrix.tocoo()
+        return {(users[row], products[col]): weight for row, col, weight in zip(matrix.row, matrix.col, matrix.data)}
+    
+    def assert_weights(trained, expected):
+        weights = by_id(trained)
+        assert weights.keys() == expected.keys()
+        np.testing.assert_allclose([weights[key] for key in expected], list(expected.values()), rtol=1e-5)
+    
+    db = mongomock.MongoClient().db
+    db.productinteractions.insert_many([dict(interaction) for interaction in source.productinteractions.documents])
+    db.productstree.insert_many([dict(product) for product in source.productstree.documents])
+    for aggregation in ['max', 'sum']:
+        model = train_model(source, aggregation=aggregation, interaction_half_lives=half_lives)
+        assert_weights(model, expected_weights(model.decay_reference_time, aggregation))
+        
+        # Vieillir de 10 jours: les poids sont ceux d'un entraînement 10 jours plus tard
+        later = model.decay_reference_time + np.timedelta64(10, 'D')
+        decayed = model.decay_to(later)
+        assert_weights(decayed, expected_weights(later, aggregation))
+        assert decayed.revision != model.revision
+        assert_weights(model, expected_weights(model.decay_reference_time, aggregation))
+        
+        # Le service ne fait que recalculer les similarités des voisins conservés
+        similarities = cosine_similarity(decayed.user_item_matrix.T)
+        for product_idx, (before, after) in enumerate(zip(model.item_neighbor_indices, decayed.item_neighbor_indices)):
+            assert set(after[after >= 0]) == set(before[before >= 0])
+            np.testing.assert_allclose(decayed.item_neighbor_scores[product_idx, :np.sum(after >= 0)],
+                                       similarities[product_idx, after[after >= 0]], rtol=1e-5)
+        assert np.all(np.diff(decayed.item_neighbor_scores, axis=1) <= 0)
+        
+        # L'entraînement sélectionne de nouveaux voisins sur la matrice vieillie
+        reselected = model.decay_to(later, reselect=True)
+        refit = CollaborativeFilteringModel(aggregation=aggregation)
+        refit.user_item_matrix = reselected.user_item_matrix
+        refit._fit()
+        np.testing.assert_array_equal(reselected.item_neighbor_indices, refit.item_neighbor_indices)
+        
+        # MongoDB calcule les mêmes poids dans le pipeline d'agrégation
+        aggregated = train_model(db, aggregation=aggregation, interaction_half_lives=half_lives,
+                                 aggregate_in_database=True)
+        assert_weights(aggregated.decay_to(later), expected_weights(later, aggregation))
+        
+        # Les composantes sont enregistrées avec l'instantané
+        directory = tempfile.mkdtemp()
+        model.save(directory)
+        assert_weights(load_snapshot(directory).decay_to(later), expected_weights(later, aggregation))
+    
+    # Avec une seule demi-vie, les poids sont multipliés par le même facteur: rien à recalculer
+    model = train_model(source, interaction_half_lives={'view': 7, 'cart': 7, 'purchase': 7})
+    decayed = model.decay_to(model.decay_reference_time + np.timedelta64(10, 'D'))
+    np.testing.assert_allclose(decayed.user_item_matrix.data, model.user_item_matrix.data * 0.5 ** (10 / 7))
+    assert decayed.item_neighbor_indices is model.item_neighbor_indices
+    for user_id in model.user_id_mapping:
+        assert decayed.recommend_for_user(user_id) == model.recommend_for_user(user_id)
+    
+    # Les facteurs ALS ne changent qu'au prochain entraînement
+    als = ImplicitALSModel(factors=8, iterations=3, interaction_half_lives=half_lives)
+    assert als.train(source)
+    decayed = als.decay_to(als.decay_reference_time + np.timedelta64(10, 'D'))
+    assert decayed.item_factors is als.item_factors and decayed.user_item_matrix is not als.user_item_matrix
+
+
+def test_workers_share_training_through_snapshots():
+    """Un seul processus entraîne à la fois; les autres chargent l'instantané publié"""
+    root = tempfile.mkdtemp()
+    with training_lock(root) as acquired:
+        assert acquired
+        with training_lock(root) as concurrent:
+            assert not concurrent
+    with training_lock(root) as acquired:
+        assert acquired
+    
+    store = ModelStore(CollaborativeFilteringModel())
+    installed = []
+    watcher = SnapshotWatcher(store, root, lambda model: installed.append(store.swap(model)))
+    assert watcher.check() is None
+    
+    model = train_model()
+    save_snapshot(model, root)
+    loaded = watcher.check()
+    assert loaded.version == model.version and store.get() is loaded and len(installed) == 1
+    assert watcher.check() is None
+    for user_id in model.user_id_mapping:
+        assert loaded.recommend_for_user(user_id) == model.recommend_for_user(user_id)
+
+
+def wait_for_job(manager, job_id, timeout=10.0):
+    """Attendre la fin d'une tâche d'entraînement"""
+    deadline = time.monotonic() + timeout
+    while manager.get(job_id)['finishedAt'] is None:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return manager.get(job_id)
+
+
+def test_training_manager_coalesces_requests_and_swaps_only_on_success():
+    """Les demandes concurrentes partagent un entraînement; un échec laisse le modèle servi en place"""
+    served = CollaborativeFilteringModel()
+    store = ModelStore(served)
+    started, release = threading.Event(), threading.Event()
+    builds = []
+    
+    def build_model():
+        builds.append(None)
+        started.set()
+        release.wait(10)
+        if len(builds) > 1:
+            raise RuntimeError("base indisponible")
+        return train_model()
+    
+    manager = TrainingManager(build_model, store.swap)
+    job, coalesced = manager.submit()
+    assert not coalesced
+    assert started.wait(10)
+    requests = [manager.submit() for _ in range(5)]
+    assert all(coalesced and other['jobId'] == job['jobId'] for other, coalesced in requests)
+    release.set()
+    job = wait_for_job(manager, job['jobId'])
+    assert job['status'] == SUCCEEDED and len(builds) == 1
+    trained = store.get()
+    assert trained is not served and job['modelVersion'] == trained.version
+    
+    failed, coalesced = manager.submit()
+    assert not coalesced
+    failed = wait_for_job(manager, failed['jobId'])
+    assert failed['status'] == FAILED and failed['error'] == "base indisponible"
+    assert store.get() is trained
+
+
+def test_training_jobs_are_shared_between_workers():
+    """Une tâche lancée par un worker est regroupée et consultable depuis les autres"""
+    root = tempfile.mkdtemp()
+    started, release = threading.Event(), threading.Event()
+    builds = []
+    
+    def build_model():
+        builds.append(None)
+        started.set()
+        release.wait(10)
+        return train_model()
+    
+    first = TrainingManager(build_model, lambda model: None, jobs=SharedTrainingJobs(root))
+    second = TrainingManager(build_model, lambda model: None, jobs=SharedTrainingJobs(root))
+    job, coalesced = first.submit()
+    assert not coalesced and started.wait(10)
+    other, coalesced = second.submit()
+    assert coalesced and other['jobId'] == job['jobId']
+    assert second.get(job['jobId'])['status'] == 'running' and 'pid' not in second.get(job['jobId'])
+    assert second.get('unknown') is None and second.get('../LATEST') is None
+    
+    release.set()
+    assert wait_for_job(second, job['jobId'])['status'] == SUCCEEDED and len(builds) == 1
+    
+    # Une tâche restée active dans un processus arrêté ne bloque pas les suivantes
+    stopped = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+    jobs = SharedTrainingJobs(root)
+    jobs.claim({'jobId': 'f' * 32, 'status': 'running', 'pid': int(stopped.stdout)})
+    job, coalesced = second.submit()
+    assert not coalesced and wait_for_job(first, job['jobId'])['status'] == SUCCEEDED and len(builds) == 2
+
+
+def test_model_store_keeps_interactions_queued_during_a_swap():
+    """Aucune interaction mise en attente pendant les remplacements du modèle n'est perdue"""
+    store = ModelStore(CollaborativeFilteringModel())
+    interactions = [(f'user{i}', f'product{i}', 'view') for i in range(2000)]
+    
+    def queue():
+        for interaction in interactions:
+            store.queue([interaction])
+    
+    thread = threading.Thread(target=queue)
+    thread.start()
+    while thread.is_alive():
+        store.swap(CollaborativeFilteringModel())
+    thread.join()
+    assert store.get().pending_interactions.drain() == interactions
+
+
+def matrix_weights(model):
+    """Poids de la matrice d'un modèle par paire (utilisateur, produit)"""
+    users = {idx: user_id for user_id, idx in model.user_id_mapping.items()}
+    products = {idx: product_id for product_id, idx in model.product_id_mapping.items()}
+    matrix = model.user_item_matrix.tocoo()
+    return {(users[row], products[col]): value for row, col, value in zip(matrix.row, matrix.col, matrix.data)}
+
+
+def test_swap_drops_pending_interactions_read_by_the_training():
+    """Les interactions enregistrées par le service et déjà lues par l'entraînement ne sont pas comptées deux fois"""
+    db = mongomock.MongoClient().db
+    source = make_database(n_users=20, n_products=12, n_interactions=200, seed=3)
+    db.productstree.insert_many([dict(product) for product in source.productstree.documents])
+    now = datetime.datetime.utcnow()
+    insert_interactions(db, [(interaction['userId'], interaction['productId'], interaction['interactionType'], now)
+                             for interaction in source.productinteractions.documents])
+    store = ModelStore(train_model(db, aggregation='sum'))
+    
+    # Enregistrées (PERSIST_INTERACTIONS) avant l'entraînement: lues par celui-ci
+    read = [('user0', 'product1', 'purchase'), ('user1', 'product2', 'cart')]
+    store.queue(read, insert_interactions(db, [(*interaction, now) for interaction in read]))
+    retrained = train_model(db, aggregation='sum')
+    # Arrivées après la lecture de l'entraînement, dont une que le service n'a pas enregistrée
+    later = [('user0', 'product1', 'view'), ('user2', 'product3', 'purchase')]
+    store.queue(later, insert_interactions(db, [(*interaction, now) for interaction in later]))
+    store.queue([('user3', 'product4', 'cart')])
+    
+    store.swap(retrained)
+    assert len(store.get().pending_interactions) == 3
+    updated = matrix_weights(store.update(lambda current: current.apply_pending_interactions()))
+    
+    insert_interactions(db, [('user3', 'product4', 'cart', now)])
+    expected = matrix_weights(train_model(db, aggregation='sum'))
+    assert updated.keys() == expected.keys()
+    for pair, weight in expected.items():
+        assert updated[pair] == pytest.approx(weight)
+
+
+def test_incremental_updates_converge_to_full_retrain():
+    """Appliquer des interactions par lots donne le même modèle qu'un réentraînement complet"""
+    for aggregation in ['max', 'sum']:
+        full_database = make_database(n_users=80, n_products=50, n_interactions=800, seed=1)
+        products = {product['_id']: product for product in full_database.productstree.documents}
+        
+        # Placer à la fin les interactions de quelques utilisateurs et produits pour qu'ils
+        # n'apparaissent que dans les mises à jour incrémentales
+        late = {'user0', 'user1', 'user2', 'product0', 'product1'}
+        interactions = sorted(
+            full_database.productinteractions.documents,
+            key=lambda interaction: interaction['userId'] in late or interaction['productId'] in late
+        )
+        full_database.productinteractions.documents = interactions
+        split = int(len(interactions) * 0.8)
+        assert not late & {value for interaction in interactions[:split] for value in interaction.values()}
+        
+        model = train_model(FakeDatabase(interactions[:split], list(products.values())),
+                            aggregation=aggregation, n_item_neighbors=10,
+                            n_user_neighbors=15, precompute_user_neighbors=True)
+        for start in range(split, len(interactions), 25):
+            for interaction in interactions[start:start + 25]:
+                model.update_with_interaction(interaction['userId'], interaction['productId'],
+                                              interaction['interactionType'])
+            model = model.apply_pending_interactions(product_lookup=products.get)
+        
+        retrained = train_model(full_database, aggregation=aggregation, n_item_neighbors=10,
+                                n_user_neighbors=15, precompute_user_neighbors=True)
+        
+        assert model.user_id_mapping == retrained.user_id_mapping
+        assert model.product_id_mapping == retrained.product_id_mapping
+        assert (model.user_item_matrix != retrained.user_item_matrix).nnz == 0
+        np.testing.assert_array_equal(model.item_neighbor_indices, retrained.item_neighbor_indices)
+        np.testing.assert_allclose(model.item_neighbor_scores, retrained.item_neighbor_scores, rtol=1e-6)
+        np.testing.assert_array_equal(model.user_neighbor_indices, retrained.user_neighbor_indices)
+        np.testing.assert_array_equal(model.catalog.available, retrained.catalog.available)
+        for user_id in retrained.user_id_mapping:
+            assert model.recommend_for_user(user_id) == retrained.recommend_for_user(user_id)
+        for product_id in retrained.product_id_mapping:
+            assert model.find_similar_products(product_id) == retrained.find_similar_products(product_id)
+        assert model.drift() > 0
+
+
+def test_serving_from_a_snapshot_does_not_import_training_dependencies():
+    """Le service répond depuis un instantané sans importer pandas, scikit-learn ni pymongo"""
+    import pandas as pd
+    for values in [['b', 'a', None, 'b', 'c'], [], ['view'] * 3]:
+        codes, uniques = factorize(values)
+        expected_codes, expected_uniques = pd.factorize(np.asarray(values, dtype=object))
+        np.testing.assert_array_equal(codes, expected_codes)
+        assert list(uniques) == list(expected_uniques)
+    
+    model = train_model()
+    root = tempfile.mkdtemp()
+    save_snapshot(model, root)
+    user_id, product_id = next(iter(model.user_id_mapping)), next(iter(model.product_id_mapping))
+    script = f"""
+import sys
+import app
+client = app.app.test_client()
+assert client.get('/recommend/user/{user_id}').status_code == 200
+assert client.get('/recommend/similar/{product_id}').status_code == 200
+assert client.post('/record-interaction', json={{'userId': 'new-user', 'productId': '{product_id}',
+                                                 'interactionType': 'cart'}}).status_code == 200
+app.interaction_queue.stop()
+assert 'new-user' in app.incremental_updater.flush().user_id_mapping
+print(sorted({{'pandas', 'sklearn', 'pymongo', 'bson'}} & set(sys.modules)))
+"""
+    env = dict(os.environ, MODEL_SNAPSHOT_DIR=root, DEFER_BACKGROUND_SERVICES='true', RESULT_CACHE_SQLITE_PATH='')
+    result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == '[]'
+
+
+def test_recorded_interactions_refresh_category_results():
+    """Enregistrer une interaction invalide les recommandations en cache de l'utilisateur, filtrées par catégorie comprises"""
+    model = train_model(category_shards=True)
+    root = tempfile.mkdtemp()
+    save_snapshot(model, root)
+    user_id = next(user_id for user_id in model.user_id_mapping
+                   if model.recommend_for_user(user_id, limit=3, category='category1'))
+    script = f"""
+import app
+client = app.app.test_client()
+url = '/recommend/user/{user_id}?limit=3&category=category1'
+before = client.get(url).get_json()['data']
+key = app.user_cache_key(app.model_store.get(), '{user_id}', 'category1')
+assert app.result_cache.get(key, 3) == before
+assert client.post('/record-interaction', json={{'userId': '{user_id}', 'productId': before[0]['_id'],
+                                                 'interactionType': 'purchase'}}).status_code == 200
+app.interaction_queue.stop()
+assert app.result_cache.get(key, 3) is None
+updated = app.incremental_updater.flush()
+after = client.get(url).get_json()['data']
+assert after == updated.recommend_for_user('{user_id}', 3, category='category1')
+assert before[0]['_id'] not in [product['_id'] for product in after]
+"""
+    env = dict(os.environ, MODEL_SNAPSHOT_DIR=root, DEFER_BACKGROUND_SERVICES='true', RESULT_CACHE_SQLITE_PATH='',
+               CATEGORY_SHARDS='true')
+    result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+
+
+def test_interaction_batches_larger_than_the_queue_are_rejected():
+    """Un lot d'interactions plus grand que la file reçoit une réponse 400, pas une erreur 500"""
+    root = tempfile.mkdtemp()
+    save_snapshot(train_model(), root)
+    script = """
+import app
+client = app.app.test_client()
+interactions = [{'userId': 'user0', 'productId': f'product{idx}', 'interactionType': 'view'} for idx in range(20)]
+response = client.post('/record-interactions', json={'interactions': interactions})
+assert response.status_code == 400 and '10' in response.get_json()['message'], response.get_json()
+assert client.post('/record-interactions', json={'interactions': interactions[:10]}).status_code == 200
+"""
+    env = dict(os.environ, MODEL_SNAPSHOT_DIR=root, DEFER_BACKGROUND_SERVICES='true', RESULT_CACHE_SQLITE_PATH='',
+               RECOMMENDATION_BATCH_MAX_ITEMS='50', INTERACTION_QUEUE_SIZE='10')
+    result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+
+
+def test_request_bodies_that_are_not_objects_are_rejected():
+    """Un corps JSON valide qui n'est pas un objet reçoit une réponse 400, pas une erreur 500"""
+    root = tempfile.mkdtemp()
+    save_snapshot(train_model(), root)
+    script = """
+import app
+client = app.app.test_client()
+for body in [['user0'], 'user0', 3]:
+    for url in ['/recommend/batch', '/record-interactions']:
+        response = client.post(url, json=body)
+        assert response.status_code == 400 and not response.get_json()['success'], (url, body, response.status_code)
+"""
+    env = dict(os.environ, MODEL_SNAPSHOT_DIR=root, DEFER_BACKGROUND_SERVICES='true', RESULT_CACHE_SQLITE_PATH='')
+    result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+
+
+def test_category_shards_answer_filtered_queries():
+    """Les fragments par catégorie donnent les voisins exacts de chaque catégorie et servent les requêtes filtrées"""
+    database = make_database(n_users=80, n_products=50, n_interactions=800, seed=2, collected={3, 8})
+    products = {product['_id']: product for product in database.productstree.documents}
+    model = train_model(database, n_item_neighbors=5, category_shards=True)
+    categories = model.catalog.categories()
+    similarities = cosine_similarity(model.user_item_matrix.T)
+    
+    for product_idx, category in enumerate(categories):
+        same_category = np.flatnonzero((categories == category) & (similarities[product_idx] > 0))
+        expected = np.sort(similarities[product_idx, same_category[same_category != product_idx]])[::-1][:5]
+        neighbors = model.shards.neighbor_indices[product_idx]
+        neighbors = neighbors[neighbors >= 0]
+        assert (categories[neighbors] == category).all()
+        np.testing.assert_allclose(model.shards.neighbor_scores[product_idx, :len(neighbors)], expected, rtol=1e-5)
+        np.testing.assert_allclose(similarities[product_idx, neighbors], expected, rtol=1e-5)
+    
+    # Sans fragments, les mêmes requêtes post-filtrent l'index global
+    unsharded = train_model(database, n_item_neighbors=5)
+    for product_id in model.product_id_mapping:
+        for category in ['category0', 'category1']:
+            for candidate in [model, unsharded]:
+                similar = candidate.find_similar_products(product_id, limit=5, category=category)
+                assert {product['category'] for product in similar} <= {category}
+            
+            # Autre catégorie: similarités calculées à la demande sur le fragment
+            product_idx = model.product_id_mapping[product_id]
+            columns = np.flatnonzero((categories == category) & model.catalog.available)
+            columns = columns[(columns != product_idx) & (similarities[product_idx, columns] > 0)]
+            expected = np.sort(similarities[product_idx, columns])[::-1][:5]
+            similar = model.find_similar_products(product_id, limit=5, category=category)
+            if category != categories[product_idx] and len(expected):
+                found = [similarities[product_idx, model.product_id_mapping[product['_id']]] for product in similar]
+                np.testing.assert_allclose(found, expected, rtol=1e-5)
+    
+    for user_id in model.user_id_mapping:
+        ranking = model.recommend_for_user(user_id, limit=len(products))
+        for category in ['category2', 'category3']:
+            expected = [product for product in ranking if product['category'] == category][:3]
+            filtered = model.recommend_for_user(user_id, limit=3, category=category)
+            assert {product['category'] for product in filtered} <= {category}
+            if expected:
+                assert filtered == expected
+            assert unsharded.recommend_for_user(user_id, limit=3, category=category) == filtered
+    assert model.recommend_for_user('inconnu', limit=3, category='category1')
+    assert not model.find_similar_products('product0', category='inconnue')
+    
+    # Calcul dans un pool de processus et instantané: mêmes fragments
+    pooled = train_model(database, n_item_neighbors=5, category_shards=True, shard_jobs=2)
+    with tempfile.TemporaryDirectory() as directory:
+        model.save(directory)
+        loaded = load_snapshot(directory)
+        for other in [pooled, loaded]:
+            np.testing.assert_array_equal(other.shards.members, model.shards.members)
+            np.testing.assert_array_equal(other.shards.neighbor_indices, model.shards.neighbor_indices)
+            np.testing.assert_allclose(other.shards.neighbor_scores, model.shards.neighbor_scores)
+        for product_id in model.product_id_mapping:
+            assert (loaded.find_similar_products(product_id, category='category0')
+                    == model.find_similar_products(product_id, category='category0'))
+    
+    # Les mises à jour incrémentales ne recalculent que les fragments touchés, comme un réentraînement
+    interactions = database.productinteractions.documents
+    split = int(len(interactions) * 0.8)
+    updated = train_model(FakeDatabase(interactions[:split], list(products.values())),
+                          n_item_neighbors=5, category_shards=True)
+    for start in range(split, len(interactions), 40):
+        for interaction in interactions[start:start + 40]:
+            updated.update_with_interaction(interaction['userId'], interaction['productId'],
+                                            interaction['interactionType'])
+        updated = updated.apply_pending_interactions(product_lookup=products.get)
+    assert updated.product_id_mapping == model.product_id_mapping
+    np.testing.assert_array_equal(updated.shards.members, model.shards.members)
+    np.testing.assert_allclose(updated.shards.neighbor_scores, model.shards.neighbor_scores, rtol=1e-5)
+
+
+if __name__ == '__main__':
+    test_duplicate_interactions_are_aggregated_in_the_sparse_matrix()
+    test_vectorized_scores_match_legacy_loop()
+    test_recommend_for_user_matches_legacy_ranking()
+    test_precomputed_user_neighbors_match_on_demand_search()
+    test_user_neighbors_are_bounded()
+    test_collected_products_are_filtered_before_selection()
+    test_batch_recommendations_match_single_calls()
+    test_materialized_recommendations_match_live_scoring()
+    test_als_factors_solve_the_normal_equations()
+    test_als_model_serves_the_same_interface()
+    test_blockwise_topk_neighbors_match_dense_cosine()
+    test_ann_indexes_recall_exact_neighbors()
+    test_ann_indexes_update_only_touched_rows()
+    test_hnsw_index_serves_dense_factors()
+    test_models_serve_recommendations_through_the_ann_index()
+    test_unknown_users_and_products_get_popularity_fallbacks()
+    test_delta_training_matches_full_retrain()
+    test_time_decayed_weights_rescale_without_rereading()
+    test_workers_share_training_through_snapshots()
+    test_training_manager_coalesces_requests_and_swaps_only_on_success()
+    test_training_jobs_are_shared_between_workers()
+    test_model_store_keeps_interactions_queued_during_a_swap()
+    test_swap_drops_pending_interactions_read_by_the_training()
+    test_incremental_updates_converge_to_full_retrain()
+    test_serving_from_a_snapshot_does_not_import_training_dependencies()
+    test_category_shards_answer_filtered_queries()
+    test_recorded_interactions_refresh_category_results()
+    test_interaction_batches_larger_than_the_queue_are_rejected()
+    test_request_bodies_that_are_not_objects_are_rejected()
+    print("Tous les tests du modèle sont passés")
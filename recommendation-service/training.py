@@ -0,0 +1,430 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from models.snapshot import latest_snapshot_path, load_snapshot
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: le serveur de développement n'a qu'un processus
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Statuts d'une tâche d'entraînement
+PENDING = 'pending'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+# Répertoire des tâches partagées entre workers, dans le répertoire des instantanés
+JOBS_DIRECTORY = '.jobs'
+ACTIVE_JOB_FILE = 'ACTIVE'
+JOB_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+
+class TrainingSkipped(Exception):
+    """L'entraînement n'a pas été lancé (ex: déjà en cours dans un autre processus)"""
+
+
+class TrainingJobs:
+    """
+    Tâches d'entraînement d'un processus, gardées en mémoire
+    
+    Au plus une tâche est active (en attente ou en cours) à la fois; les
+    `history_size` tâches les plus récentes restent consultables.
+    """
+    
+    def __init__(self, history_size=50):
+        """
+        Args:
+            history_size (int): Nombre de tâches conservées pour /train/<job_id>
+        """
+        self.history_size = history_size
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._active_job_id = None
+    
+    def claim(self, job):
+        """
+        Enregistrer une nouvelle tâche, sauf si une autre est déjà active
+        
+        Args:
+            job (dict): Nouvelle tâche
+        
+        Returns:
+            tuple: (tâche active, True si c'est une tâche existante)
+        """
+        with self._locked():
+            active_job_id = self._read_active()
+            active = self._read(active_job_id) if active_job_id is not None else None
+            if active is not None and self._is_active(active):
+                return active, True
+            self._write(job)
+            self._write_active(job['jobId'])
+            self._prune(job['jobId'])
+            return dict(job), False
+    
+    def update(self, job_id, finished=False, **fields):
+        """
+        Modifier les champs d'une tâche
+        
+        Args:
+            job_id (str): ID de la tâche
+            finished (bool): La tâche est terminée et n'est plus active
+            **fields: Champs modifiés
+        """
+        with self._locked():
+            job = self._read(job_id)
+            job.update(fields)
+            self._write(job)
+            if finished and self._read_active() == job_id:
+                self._write_active(None)
+    
+    def get(self, job_id):
+        """
+        Obtenir l'état d'une tâche
+        
+        Returns:
+            dict: Copie de la tâche, ou None si elle est inconnue
+        """
+        with self._locked():
+            return self._read(job_id)
+    
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            yield
+    
+    def _is_active(self, job):
+        return job['status'] in (PENDING, RUNNING)
+    
+    def _read(self, job_id):
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+    
+    def _write(self, job):
+        self._jobs[job['jobId']] = dict(job)
+    
+    def _read_active(self):
+        return self._active_job_id
+    
+    def _write_active(self, job_id):
+        self._active_job_id = job_id
+    
+    def _prune(self, active_job_id):
+        """Oublier les tâches terminées les plus anciennes"""
+        finished = [job_id for job_id in self._jobs if job_id != active_job_id]
+        for job_id in finished[:max(0, len(self._jobs) - self.history_size)]:
+            del self._jobs[job_id]
+
+
+class SharedTrainingJobs(TrainingJobs):
+    """
+    Tâches d'entraînement partagées par les workers d'une même machine
+    
+    Chaque tâche est un fichier JSON du répertoire `<root>/.jobs`, et le
+    fichier ACTIVE désigne la tâche active: une demande reçue par n'importe
+    quel worker est regroupée avec elle et /train/<job_id> répond depuis
+    n'importe quel worker. Les fichiers sont modifiés sous un verrou flock.
+    Une tâche dont le processus s'est arrêté avant de la terminer n'est plus
+    considérée comme active.
+    """
+    
+    def __init__(self, root, history_size=50):
+        """
+        Args:
+            root (str): Répertoire des instantanés
+            history_size (int): Nombre de tâches conservées pour /train/<job_id>
+        """
+        super().__init__(history_size)
+        self.path = os.path.join(root, JOBS_DIRECTORY)
+        os.makedirs(self.path, exist_ok=True)
+    
+    @contextmanager
+    def _locked(self):
+        with self._lock, open(os.path.join(self.path, '.lock'), 'w') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+    
+    def _is_active(self, job):
+        if not super()._is_active(job):
+            return False
+        try:
+            os.kill(job['pid'], 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+    
+    def _job_path(self, job_id):
+        return os.path.join(self.path, f'{job_id}.json')
+    
+    def _read(self, job_id):
+        # L'ID vient de l'URL: il ne doit désigner qu'un fichier de tâche
+        if not JOB_ID_PATTERN.fullmatch(job_id):
+            return None
+        try:
+            with open(self._job_path(job_id), encoding='utf-8') as job_file:
+                return json.load(job_file)
+        except FileNotFoundError:
+            return None
+    
+    def _write(self, job):
+        self._replace(self._job_path(job['jobId']), json.dumps({**job, 'pid': job.get('pid', os.getpid())}))
+    
+    def _read_active(self):
+        try:
+            with open(os.path.join(self.path, ACTIVE_JOB_FILE)) as active_file:
+                return active_file.read().strip() or None
+        except FileNotFoundError:
+            return None
+    
+    def _write_active(self, job_id):
+        self._replace(os.path.join(self.path, ACTIVE_JOB_FILE), job_id or '')
+    
+    def _replace(self, path, content):
+        """Remplacer un fichier atomiquement: un autre worker ne lit jamais un fichier partiel"""
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as temporary_file:
+            temporary_file.write(content)
+        os.replace(temporary_path, path)
+    
+    def _prune(self, active_job_id):
+        """Supprimer les fichiers des tâches terminées les plus anciennes"""
+        paths = sorted((os.path.join(self.path, name) for name in os.listdir(self.path) if name.endswith('.json')),
+                       key=os.path.getmtime)
+        finished = [path for path in paths if path != self._job_path(active_job_id)]
+        for path in finished[:max(0, len(paths) - self.history_size)]:
+            os.remove(path)
+
+
+class TrainingManager:
+    """
+    Exécute les entraînements du modèle en arrière-plan, un seul à la fois
+    
+    Chaque entraînement construit un nouveau modèle avec `build_model`; le
+    modèle n'est transmis à `on_success` (qui le met en service) que si
+    l'entraînement réussit. Une demande d'entraînement reçue pendant qu'un
+    autre est en attente ou en cours est regroupée avec lui. Avec des
+    tâches partagées (`SharedTrainingJobs`), c'est aussi le cas entre workers.
+    """
+    
+    def __init__(self, build_model, on_success, history_size=50, jobs=None):
+        """
+        Args:
+            build_model (callable): Construit et entraîne un nouveau modèle; lève une
+                exception en cas d'échec
+            on_success (callable): Reçoit le modèle entraîné
+            history_size (int): Nombre de tâches terminées conservées pour /train/<job_id>
+            jobs (TrainingJobs): Registre des tâches (par défaut, en mémoire du processus)
+        """
+        self._build_model = build_model
+        self._on_success = on_success
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='training')
+        self._jobs = jobs if jobs is not None else TrainingJobs(history_size)
+    
+    def submit(self):
+        """
+        Demander un entraînement
+        
+        Returns:
+            tuple: (tâche, True si la demande a été regroupée avec une tâche existante)
+        """
+        job_id = uuid.uuid4().hex
+        job, coalesced = self._jobs.claim({
+            'jobId': job_id,
+            'status': PENDING,
+            'submittedAt': time.time(),
+            'startedAt': None,
+            'finishedAt': None,
+            'modelVersion': None,
+            'error': None
+        })
+        if not coalesced:
+            self._executor.submit(self._run, job_id)
+        return public_job(job), coalesced
+    
+    def get(self, job_id):
+        """
+        Obtenir l'état d'une tâche
+        
+        Returns:
+            dict: Copie de la tâche, ou None si elle est inconnue
+        """
+        job = self._jobs.get(job_id)
+        return public_job(job) if job is not None else None
+    
+    def _run(self, job_id):
+        self._jobs.update(job_id, status=RUNNING, startedAt=time.time())
+        try:
+            model = self._build_model()
+            self._on_success(model)
+            result = {'status': SUCCEEDED, 'modelVersion': model.version}
+        except TrainingSkipped as e:
+            result = {'status': SKIPPED, 'error': str(e)}
+        except Exception as e:
+            logger.exception("Erreur lors de l'entraînement du modèle en arrière-plan")
+            result = {'status': FAILED, 'error': str(e)}
+        
+        self._jobs.update(job_id, finished=True, finishedAt=time.time(), **result)
+
+
+def public_job(job):
+    """Champs d'une tâche renvoyés par /train (sans le processus qui l'exécute)"""
+    return {key: value for key, value in job.items() if key != 'pid'}
+
+
+class IncrementalUpdater:
+    """
+    Applique par lots, en arrière-plan, les interactions en attente du modèle servi
+    
+    Un lot est appliqué dès que `batch_size` interactions sont en attente, ou
+    au plus tard toutes les `flush_interval` secondes. Un réentraînement
+    complet est demandé quand la dérive du modèle dépasse `drift_threshold`,
+    ou toutes les `full_retrain_interval` secondes si cet intervalle est défini.
+    Les poids décroissants du modèle servi sont vieillis toutes les
+    `decay_interval` secondes (voir CollaborativeFilteringModel.decay_to).
+    """
+    
+    def __init__(self, model_store, training_manager, batch_size=100, flush_interval=5.0,
+                 drift_threshold=0.2, full_retrain_interval=None, product_lookup=None, decay_interval=None):
+        self._model_store = model_store
+        self._training_manager = training_manager
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._drift_threshold = drift_threshold
+        self._full_retrain_interval = full_retrain_interval
+        self._product_lookup = product_lookup
+        self._decay_interval = decay_interval
+        self._last_full_retrain = time.monotonic()
+        self._last_decay = time.monotonic()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Démarrer le thread de mise à jour"""
+        self._thread = threading.Thread(target=self._run, name='incremental-updates', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Arrêter le thread après avoir appliqué les interactions en attente"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+    
+    def notify(self):
+        """Signaler une nouvelle interaction en attente"""
+        if len(self._model_store.get().pending_interactions) >= self._batch_size:
+            self._wakeup.set()
+    
+    def flush(self):
+        """
+        Appliquer immédiatement les interactions en attente
+        
+        Returns:
+            Modèle servi après la mise à jour
+        """
+        model = self._model_store.update(
+            lambda current: current.apply_pending_interactions(product_lookup=self._product_lookup)
+        )
+        if self._decay_interval and time.monotonic() - self._last_decay >= self._decay_interval:
+            model = self._model_store.update(lambda current: current.decay_to())
+            self._last_decay = time.monotonic()
+        
+        # Réentraîner complètement si le modèle a trop dérivé ou selon le calendrier
+        schedule_due = (self._full_retrain_interval
+                        and time.monotonic() - self._last_full_retrain >= self._full_retrain_interval)
+        if model.is_trained and (model.drift() >= self._drift_threshold or schedule_due):
+            self._training_manager.submit()
+            self._last_full_retrain = time.monotonic()
+        return model
+    
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Erreur lors de la mise à jour incrémentale du modèle")
+
+
+class SnapshotWatcher:
+    """
+    Met en service les instantanés publiés par un autre processus
+    
+    Toutes les `interval` secondes, le pointeur LATEST du répertoire des
+    instantanés est relu; s'il désigne une version plus récente que celle
+    du modèle servi, l'instantané est chargé (projeté en mémoire) et
+    transmis à `on_new_model`. Un seul worker entraîne le modèle: les
+    autres le reprennent ainsi dès sa publication.
+    """
+    
+    def __init__(self, model_store, root, on_new_model, interval=10.0, **overrides):
+        """
+        Args:
+            model_store (ModelStore): Référence vers le modèle servi
+            root (str): Répertoire des instantanés
+            on_new_model (callable): Reçoit le modèle chargé
+            interval (float): Délai entre deux lectures de LATEST (secondes)
+            **overrides: Paramètres du constructeur du modèle à remplacer au chargement
+        """
+        self._model_store = model_store
+        self._root = root
+        self._on_new_model = on_new_model
+        self._interval = interval
+        self._overrides = overrides
+        self._stopped = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Démarrer le thread de surveillance"""
+        self._thread = threading.Thread(target=self._run, name='snapshot-watcher', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Arrêter le thread de surveillance"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+    
+    def check(self):
+        """
+        Charger le dernier instantané s'il est plus récent que le modèle servi
+        
+        Returns:
+            Modèle chargé, ou None si le modèle servi est à jour
+        """
+        path = latest_snapshot_path(self._root)
+        if path is None:
+            return None
+        
+        # Les versions sont triables par date d'entraînement
+        served_version = self._model_store.get().version
+        if served_version is not None and os.path.basename(path) <= served_version:
+            return None
+        
+        model = load_snapshot(path, mmap=True, **self._overrides)
+        self._on_new_model(model)
+        return model
+    
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Erreur lors du chargement du dernier instantané du modèle")